@@ -1,3 +1,4 @@
+-- Null counts and basic stats are also in etl/data_profile.py (cached, no table scan)
 --Checkiing if every single null has been filled 
 select 
 	COUNT(*) as n_counts,
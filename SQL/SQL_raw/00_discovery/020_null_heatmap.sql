@@ -1,5 +1,7 @@
 -- File: 020_null_heatmap.sql
 -- Purpose: Counting all nulls in each housing_raw columns
+-- The same numbers for the processed parquet, without a table scan:
+-- python -m etl.data_profile --dataset housing (cached per data version)
 
 SELECT
     COUNT(*) AS n_rows,
@@ -1,5 +1,7 @@
 -- File: 030_basic_stats.sql
 -- Purpose: Basic stats for housing_raw
+-- The same numbers for the processed parquet, without a table scan:
+-- python -m etl.data_profile --dataset housing (cached per data version)
 
 SELECT
     MIN(rooms)              						AS min_rooms,
@@ -1,5 +1,20 @@
-create or replace view silver.housing_typed as
-WITH src AS (     
+-- Mediany do imputacji trzyma silver.housing_impute_stats (odświeżane przez
+-- 115_refresh_impute_stats.sql), więc odczyt widoku nie liczy PERCENTILE_CONT
+-- po całym bronze.housing_raw. Przed pierwszym odświeżeniem tabela jest pusta
+-- i braki zostają NULL.
+create table if not exists silver.housing_impute_stats (
+	id                  boolean primary key default true check (id),
+	median_rooms        double precision,
+	median_area         double precision,
+	median_floors       double precision,
+	median_floors_total double precision,
+	median_year         double precision,
+	median_distance     double precision,
+	source_rows         bigint not null,
+	refreshed_at        timestamptz not null default now()
+);
+
+create or replace view silver.housing_parsed as
   SELECT
     listing_id,
     date,
@@ -20,40 +35,31 @@ WITH src AS (
     END AS has_elevator_int,
     price_sqm,
     price_total
-  FROM bronze.housing_raw
-),
-median_calc AS(
-	select
-		PERCENTILE_CONT(0.5) within group (order by rooms_num) as median_rooms,
-		PERCENTILE_CONT(0.5) within group (order by area_num) as median_area,
-		PERCENTILE_CONT(0.5) within group (order by floor_num) as median_floors,
-		PERCENTILE_CONT(0.5) within group (order by total_floors_num) as median_floors_total,
-		PERCENTILE_CONT(0.5) within group (order by year_num) as median_year,
-		PERCENTILE_CONT(0.5) within group (order by dist_num) as median_distance
-	from src
-)
+  FROM bronze.housing_raw;
+
+create or replace view silver.housing_typed as
 SELECT
   s.listing_id,
   s.date,
   s.city,
   s.district,
-  COALESCE(s.rooms_num,            m.median_rooms)        AS rooms,             
-  COALESCE(s.area_num,             m.median_area)         AS area_sqm,          
-  COALESCE(s.floor_num,            m.median_floors)        AS floor,             
-  COALESCE(s.total_floors_num,     m.median_floors_total) AS total_floors,      
-  COALESCE(s.year_num,             m.median_year)         AS year_built,        
+  COALESCE(s.rooms_num,            m.median_rooms)        AS rooms,
+  COALESCE(s.area_num,             m.median_area)         AS area_sqm,
+  COALESCE(s.floor_num,            m.median_floors)        AS floor,
+  COALESCE(s.total_floors_num,     m.median_floors_total) AS total_floors,
+  COALESCE(s.year_num,             m.median_year)         AS year_built,
   COALESCE(s.dist_num,             m.median_distance)         AS distance_center_km,
   COALESCE(
     CASE WHEN s.has_elevator_int = 1 THEN TRUE
          WHEN s.has_elevator_int = 0 THEN FALSE
          ELSE NULL END,
-    TRUE  
+    TRUE
   ) AS has_elevator,
   s.postal_code,
   s.price_sqm,
   s.price_total
-FROM src s
-CROSS JOIN median_calc m;
+FROM silver.housing_parsed s
+LEFT JOIN silver.housing_impute_stats m ON true;
 
 
 
@@ -0,0 +1,36 @@
+-- Mediany do imputacji (silver.housing_typed) liczone po całym bronze.housing_raw,
+-- ale najwyżej raz na 7 dni: dzienny przyrost prawie ich nie zmienia. Wcześniej
+-- warunek NOT EXISTS jest fałszywy i zapytanie kończy się bez skanu bronze.
+-- Wymuszenie przeliczenia: DELETE FROM silver.housing_impute_stats;
+INSERT INTO silver.housing_impute_stats AS st (
+	id, median_rooms, median_area, median_floors, median_floors_total,
+	median_year, median_distance, source_rows, refreshed_at
+)
+SELECT true, m.*, now()
+FROM (
+	select
+		PERCENTILE_CONT(0.5) within group (order by rooms_num) as median_rooms,
+		PERCENTILE_CONT(0.5) within group (order by area_num) as median_area,
+		PERCENTILE_CONT(0.5) within group (order by floor_num) as median_floors,
+		PERCENTILE_CONT(0.5) within group (order by total_floors_num) as median_floors_total,
+		PERCENTILE_CONT(0.5) within group (order by year_num) as median_year,
+		PERCENTILE_CONT(0.5) within group (order by dist_num) as median_distance,
+		COUNT(*) as source_rows
+	from silver.housing_parsed
+) m
+WHERE NOT EXISTS (
+	SELECT 1 FROM silver.housing_impute_stats
+	WHERE refreshed_at > now() - interval '7 days'
+)
+ON CONFLICT (id) DO UPDATE
+SET median_rooms        = EXCLUDED.median_rooms,
+    median_area         = EXCLUDED.median_area,
+    median_floors       = EXCLUDED.median_floors,
+    median_floors_total = EXCLUDED.median_floors_total,
+    median_year         = EXCLUDED.median_year,
+    median_distance     = EXCLUDED.median_distance,
+    source_rows         = EXCLUDED.source_rows,
+    refreshed_at        = EXCLUDED.refreshed_at;
+
+-- jeden wiersz: bez statystyk planner zakłada ~900 i źle szacuje złączenie w silver.housing_typed
+ANALYZE silver.housing_impute_stats;
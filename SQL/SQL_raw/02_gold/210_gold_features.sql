@@ -1,85 +1,202 @@
+-- Przyrostowa budowa gold.housing_features: tabela i indeksy zostają między
+-- uruchomieniami, przeliczane są tylko listing_id nowe lub zmienione od
+-- poprzedniego uruchomienia, więc czas zależy od dziennego przyrostu, nie od całej historii.
+-- Znacznik zmian: bronze.housing_raw.ingested_at, czyli ta sama relacja, z której
+-- czytają widoki silver/gold. Filtr po listing_id przechodzi przez te widoki aż do
+-- indeksu na bronze.housing_raw; wiersze są upsertowane.
+-- Pełna przebudowa (np. po zmianie cech): TRUNCATE gold.housing_features;
 BEGIN;
 
-DROP TABLE IF EXISTS gold.housing_features CASCADE;
-
-CREATE TABLE gold.housing_features AS
-with features as (
-	select 
-		case
-			when invalid_floor_flag = False then ROUND((floor::float/nullif(total_floors::float, 0))::numeric, 3)
-		else 0
-		end as floor_ratio,
-		(year_built/10)*10 AS decade,
-		(extract(year from CURRENT_DATE) - year_built)::int 		as building_age,
-		EXTRACT(year from listing_date)::int 						as listing_year,
-		EXTRACT(month from listing_date)::int 						as listing_month,
-		EXTRACT(day from listing_date)::int 						as listing_day,
-		to_char(listing_date,'FMDay')			         			AS listing_day_of_week,
-			
-		CASE EXTRACT(MONTH FROM listing_date)::int
-	      	WHEN 12 THEN 'Winter' 
-	      	WHEN 1 THEN 'Winter' 	
-	      	WHEN 2 THEN 'Winter'
-	      	WHEN 3  THEN 'Spring' 
-	      	WHEN 4 THEN 'Spring' 
-	      	WHEN 5 THEN 'Spring'
-	      	WHEN 6  THEN 'Summer' 
-	      	WHEN 7 THEN 'Summer' 
-	      	WHEN 8 THEN 'Summer'
-	      	ELSE 'Autumn'
-	    END AS season,
-	    
-	    CASE
-	      WHEN area_sqm IS NULL   THEN 'unknown'
-	      WHEN area_sqm < 35      THEN '<35'
-	      WHEN area_sqm < 50      THEN '35-49'
-	      WHEN area_sqm < 70      THEN '50-69'
-	      WHEN area_sqm < 100     THEN '70-99'
-	      ELSE '100+'
-	    END AS area_sqm_bucket,
-	    
-	    CASE
-	      WHEN distance_center_km IS NULL THEN 'unk'
-	      WHEN distance_center_km < 1     THEN '<1'
-	      WHEN distance_center_km < 3     THEN '1-2.9'
-	      WHEN distance_center_km < 5     THEN '3-4.9'
-	      WHEN distance_center_km < 10    THEN '5-9.9'
-	      ELSE '10+'
-	    END AS distance_km_bucket,
-	    
-	    CASE WHEN has_elevator THEN 1 ELSE 0 END      AS has_elevator_int,
-	    listing_id
-			
-	from gold.clean
+-- indeks na wyrażeniu, którym silver.housing_clean liczy listing_id; load_raw.py
+-- podmienia tabelę, więc po pełnym przeładowaniu bronze indeks powstaje tu od nowa
+CREATE INDEX IF NOT EXISTS housing_raw_listing_id_idx
+	ON bronze.housing_raw ((replace(listing_id::text, ',', '')::bigint));
+
+-- ingested_at ustawia sam Postgres: DEFAULT przy każdym wstawieniu (COPY, INSERT),
+-- trigger przy UPDATE, więc nic, co pisze do bronze, nie musi o nim wiedzieć.
+-- Podmieniona tabela dostaje kolumnę od nowa, z jedną wartością dla wszystkich
+-- wierszy - a więc pełną przebudowę.
+ALTER TABLE bronze.housing_raw ADD COLUMN IF NOT EXISTS ingested_at timestamptz NOT NULL DEFAULT now();
+CREATE INDEX IF NOT EXISTS housing_raw_ingested_at_idx ON bronze.housing_raw (ingested_at);
+
+CREATE OR REPLACE FUNCTION bronze.touch_ingested_at() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+	NEW.ingested_at := now();
+	RETURN NEW;
+END
+$$;
+DROP TRIGGER IF EXISTS housing_raw_touch_ingested_at ON bronze.housing_raw;
+CREATE TRIGGER housing_raw_touch_ingested_at
+	BEFORE UPDATE ON bronze.housing_raw
+	FOR EACH ROW EXECUTE FUNCTION bronze.touch_ingested_at();
+
+create or replace view gold.housing_features_src as
+select
+	listing_id,
+	listing_date,
+	CASE EXTRACT(MONTH FROM listing_date)::int
+      	WHEN 12 THEN 'Winter'
+      	WHEN 1 THEN 'Winter'
+      	WHEN 2 THEN 'Winter'
+      	WHEN 3  THEN 'Spring'
+      	WHEN 4 THEN 'Spring'
+      	WHEN 5 THEN 'Spring'
+      	WHEN 6  THEN 'Summer'
+      	WHEN 7 THEN 'Summer'
+      	WHEN 8 THEN 'Summer'
+      	ELSE 'Autumn'
+    END AS season,
+	EXTRACT(year from listing_date)::int 						as listing_year,
+	(year_built/10)*10 AS decade,
+	EXTRACT(month from listing_date)::int 						as listing_month,
+	EXTRACT(day from listing_date)::int 						as listing_day,
+	to_char(listing_date,'FMDay')			         			AS listing_day_of_week,
+	city,
+	district,
+	postal_code,
+	rooms,
+	floor,
+	total_floors,
+	case
+		when invalid_floor_flag = False then ROUND((floor::float/nullif(total_floors::float, 0))::numeric, 3)
+	else 0
+	end as floor_ratio,
+	year_built,
+	(extract(year from CURRENT_DATE) - year_built)::int 		as building_age,
+	area_sqm,
+    CASE
+      WHEN area_sqm IS NULL   THEN 'unknown'
+      WHEN area_sqm < 35      THEN '<35'
+      WHEN area_sqm < 50      THEN '35-49'
+      WHEN area_sqm < 70      THEN '50-69'
+      WHEN area_sqm < 100     THEN '70-99'
+      ELSE '100+'
+    END AS area_sqm_bucket,
+	distance_center_km,
+    CASE
+      WHEN distance_center_km IS NULL THEN 'unk'
+      WHEN distance_center_km < 1     THEN '<1'
+      WHEN distance_center_km < 3     THEN '1-2.9'
+      WHEN distance_center_km < 5     THEN '3-4.9'
+      WHEN distance_center_km < 10    THEN '5-9.9'
+      ELSE '10+'
+    END AS distance_km_bucket,
+	price_sqm,
+	price_total,
+    CASE WHEN has_elevator THEN 1 ELSE 0 END      AS has_elevator_int,
+	invalid_floor_flag
+from gold.clean;
+
+CREATE TABLE IF NOT EXISTS gold.housing_features AS
+SELECT * FROM gold.housing_features_src WITH NO DATA;
+-- ostatnia zmiana wiersza; ml/predict_sample.py --only-changed wycenia tylko wiersze zmienione od swojego poprzedniego runu
+ALTER TABLE gold.housing_features ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+
+-- rok, od którego liczone jest building_age wierszy w tabeli, i czas ostatniej budowy
+CREATE TABLE IF NOT EXISTS gold.housing_features_state (
+	id       boolean primary key default true check (id),
+	age_year int not null
+);
+ALTER TABLE gold.housing_features_state ADD COLUMN IF NOT EXISTS built_at timestamptz;
+
+-- dni (listing_date), których wiersze ta budowa dodała, zmieniła lub usunęła;
+-- etl/gold_aggregates.py agreguje je od nowa i czyści tabelę (CHANGED_DAYS_DDL)
+CREATE TABLE IF NOT EXISTS gold.price_days_changed (
+	d date
+);
+
+-- unikalny klucz dla ON CONFLICT; zastępuje dawny zwykły indeks na listing_id
+DROP INDEX IF EXISTS gold.housing_features_listing_id_idx;
+CREATE UNIQUE INDEX IF NOT EXISTS housing_features_listing_id_key ON gold.housing_features (listing_id);
+
+-- listing_id do przeliczenia: wiersze bronze wstawione lub zmienione od ostatniej budowy
+-- (bez built_at - pierwsze uruchomienie - wszystkie)
+CREATE TEMP TABLE housing_features_changed ON COMMIT DROP AS
+SELECT DISTINCT replace(r.listing_id::text, ',', '')::bigint AS listing_id
+FROM bronze.housing_raw r
+WHERE r.ingested_at > coalesce((SELECT built_at FROM gold.housing_features_state), '-infinity');
+ANALYZE housing_features_changed;
+
+-- dotychczasowe dni przeliczanych wierszy (zmiana daty przenosi wiersz do innego dnia)
+INSERT INTO gold.price_days_changed (d)
+SELECT DISTINCT g.listing_date
+FROM gold.housing_features g
+WHERE g.listing_id IN (SELECT listing_id FROM housing_features_changed);
+
+-- jeden wiersz na listing_id (najnowszy, jak w gold.duplicates), bez near-duplikatów,
+-- żeby powtórzone ogłoszenia nie trafiały do treningu; zmienione listingi nadpisują stary wiersz.
+-- silver.near_duplicates tworzy i wypełnia etap load (etl/load.py, NEAR_DUPLICATES_DDL)
+INSERT INTO gold.housing_features
+SELECT DISTINCT ON (s.listing_id) s.*
+FROM gold.housing_features_src s
+WHERE s.listing_id IN (SELECT listing_id FROM housing_features_changed)
+AND NOT EXISTS (
+	SELECT 1 FROM silver.near_duplicates d WHERE d.listing_id = s.listing_id
 )
-select 
-gc.listing_id,
-gc.listing_date,
-f.season,
-f.listing_year,
-f.decade,
-f.listing_month,
-f.listing_day,
-f.listing_day_of_week,
-gc.city,
-gc.district,
-gc.postal_code,
-gc.rooms,
-gc.floor,
-gc.total_floors,
-f.floor_ratio,
-gc.year_built,
-f.building_age,
-gc.area_sqm,
-f.area_sqm_bucket,
-gc.distance_center_km,
-f.distance_km_bucket,
-gc.price_sqm,
-gc.price_total,
-f.has_elevator_int,
-gc.invalid_floor_flag
-
-from gold.clean gc
-JOIN features f USING (listing_id);
-
-COMMIT;
\ No newline at end of file
+ORDER BY s.listing_id, s.listing_date DESC
+ON CONFLICT (listing_id) DO UPDATE SET
+	listing_date        = EXCLUDED.listing_date,
+	season              = EXCLUDED.season,
+	listing_year        = EXCLUDED.listing_year,
+	decade              = EXCLUDED.decade,
+	listing_month       = EXCLUDED.listing_month,
+	listing_day         = EXCLUDED.listing_day,
+	listing_day_of_week = EXCLUDED.listing_day_of_week,
+	city                = EXCLUDED.city,
+	district            = EXCLUDED.district,
+	postal_code         = EXCLUDED.postal_code,
+	rooms               = EXCLUDED.rooms,
+	floor               = EXCLUDED.floor,
+	total_floors        = EXCLUDED.total_floors,
+	floor_ratio         = EXCLUDED.floor_ratio,
+	year_built          = EXCLUDED.year_built,
+	building_age        = EXCLUDED.building_age,
+	area_sqm            = EXCLUDED.area_sqm,
+	area_sqm_bucket     = EXCLUDED.area_sqm_bucket,
+	distance_center_km  = EXCLUDED.distance_center_km,
+	distance_km_bucket  = EXCLUDED.distance_km_bucket,
+	price_sqm           = EXCLUDED.price_sqm,
+	price_total         = EXCLUDED.price_total,
+	has_elevator_int    = EXCLUDED.has_elevator_int,
+	invalid_floor_flag  = EXCLUDED.invalid_floor_flag,
+	updated_at          = now();
+
+-- dni wierszy po przeliczeniu
+INSERT INTO gold.price_days_changed (d)
+SELECT DISTINCT g.listing_date
+FROM gold.housing_features g
+WHERE g.listing_id IN (SELECT listing_id FROM housing_features_changed);
+
+-- listingi oznaczone jako near-duplikaty już po trafieniu do tabeli; ich dni do przeliczenia
+WITH removed AS (
+	DELETE FROM gold.housing_features g
+	USING silver.near_duplicates d
+	WHERE g.listing_id = d.listing_id
+	RETURNING g.listing_date
+)
+INSERT INTO gold.price_days_changed (d)
+SELECT DISTINCT listing_date FROM removed;
+
+-- keyset pagination po listing_id (batch scoring w ml/predict_sample.py) idzie po unikalnym indeksie wyżej;
+-- przy pierwszym uruchomieniu pozostałe indeksy powstają po załadowaniu tabeli, potem tylko się je aktualizuje
+CREATE INDEX IF NOT EXISTS housing_features_listing_date_idx ON gold.housing_features (listing_date);
+CREATE INDEX IF NOT EXISTS housing_features_city_idx ON gold.housing_features (city);
+
+-- building_age liczone od bieżącego roku: zmienia się raz w roku dla wszystkich wierszy,
+-- więc tabela jest przeliczana tylko przy pierwszym uruchomieniu w nowym roku
+UPDATE gold.housing_features
+SET building_age = (extract(year from CURRENT_DATE) - year_built)::int, updated_at = now()
+WHERE NOT EXISTS (
+	SELECT 1 FROM gold.housing_features_state WHERE age_year = extract(year from CURRENT_DATE)::int
+)
+AND building_age IS DISTINCT FROM (extract(year from CURRENT_DATE) - year_built)::int;
+
+-- now() to początek transakcji: listingi załadowane w trakcie budowy trafią do następnej
+INSERT INTO gold.housing_features_state (age_year, built_at)
+VALUES (extract(year from CURRENT_DATE)::int, now())
+ON CONFLICT (id) DO UPDATE SET age_year = excluded.age_year, built_at = excluded.built_at;
+
+ANALYZE gold.housing_features;
+
+COMMIT;
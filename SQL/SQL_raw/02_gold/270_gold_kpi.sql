@@ -1,18 +1,16 @@
+-- KPI z gold.city_price_stats (etl/gold_aggregates.py): mediana z t-digest,
+-- średnie z przechowywanych sum, więc odczyt widoku nie skanuje gold.housing_valid.
+-- median_ppsqm nie jest dokładnym PERCENTILE_CONT: błąd rangi t-digest poniżej 1 p.p.
+-- (wartość między 49. a 51. percentylem), zmierzony najwyżej 0,035% wartości
+-- (benchmarks/bench_quantiles.py --rows 800k). Dokładne mediany dzienne: gold.price_city_daily.
+-- base_year = rok odświeżenia - building_age, stąd wiek liczony od bieżącego roku.
 CREATE OR REPLACE VIEW gold.kpi_overview AS
-SELECT
-  'ALL'::text AS city,
-  COUNT(*) AS active_listings,
-  percentile_cont(0.5) WITHIN GROUP (ORDER BY price_sqm) AS median_ppsqm,
-  AVG(building_age)::int AS avg_building_age,
-  AVG(has_elevator_int)::numeric(5,2) AS share_elevator
-FROM gold.housing_valid
-UNION ALL
 SELECT
   city,
-  COUNT(*),
-  percentile_cont(0.5) WITHIN GROUP (ORDER BY price_sqm),
-  AVG(building_age)::int,
-  AVG(has_elevator_int)::numeric(5,2)
-FROM gold.housing_valid
-GROUP BY city
-ORDER BY city;
\ No newline at end of file
+  active_listings,
+  median_sqm AS median_ppsqm,
+  ((extract(year FROM CURRENT_DATE)::int * base_year_n - base_year_sum)::numeric
+    / NULLIF(base_year_n, 0))::int AS avg_building_age,
+  (elevator_sum::numeric / NULLIF(elevator_n, 0))::numeric(5,2) AS share_elevator
+FROM gold.city_price_stats
+ORDER BY city;
@@ -1,10 +1,12 @@
+import os
 from datetime import datetime, timedelta
 from airflow import DAG
-from airflow.operators.bash import BashOperator
+from airflow.operators.python import PythonOperator
 from airflow.providers.common.sql.operators.sql import SQLExecuteQueryOperator
 from airflow.providers.common.sql.sensors.sql import SqlSensor 
 
 REPO = "/opt/airflow/repo"
+DELTA_TAG = "housing_{{ ds_nodash }}"
 
 default_args = {
     "owner": "wyko",
@@ -12,6 +14,33 @@ default_args = {
     "retry_delay": timedelta(minutes=5),
 }
 
+
+def _in_repo(run_id: str) -> None:
+    # etl.* and ml.* (PYTHONPATH=/opt/airflow/repo in docker-compose.airflow.yml) are imported
+    # inside the task process only, so parsing the DAG stays cheap; artifacts/ is relative to the repo
+    os.chdir(REPO)
+    # one run id for the stage metrics of every task (etl/profiling.py)
+    os.environ["PIPELINE_RUN_ID"] = run_id
+
+
+def run_chain(chain: str, run_id: str, run_tag: str = "", tasks=None):
+    """Run a chain of etl/tasks.py in this worker process, data passed between steps in memory."""
+    _in_repo(run_id)
+    from etl.tasks import chain as chain_tasks, run_tasks
+
+    ctx = {"run_tag": run_tag, "src": f"{REPO}/data/raw/housing_800k.csv"}
+    run_tasks(chain_tasks(chain), ctx, tasks)
+
+
+def publish_metrics(run_id: str):
+    _in_repo(run_id)
+    from sqlalchemy import create_engine
+
+    from etl.profiling import PG_URL, publish
+
+    publish(run_id, create_engine(PG_URL))
+
+
 with DAG(
     dag_id="warehouse_daily",
     start_date=datetime(2025, 1, 1),
@@ -31,23 +60,18 @@ with DAG(
         sql="SELECT 1;"
     )
 
-    extract_to_minio = BashOperator(
-        task_id="extract_to_minio",
-        bash_command="cd /opt/airflow/repo && python etl/extract.py"
-    )
-
-    transform_to_parquet = BashOperator(
-        task_id="transform_to_parquet",
-        bash_command=(
-            f"python {REPO}/etl/transform.py "
-            f"--src housing_800k.csv "
-            f"--dst housing_800k.parquet"
-        )
+    # ETL: extract → transform → load in one process, the delta passed on in memory
+    etl_delta = PythonOperator(
+        task_id="etl_delta",
+        python_callable=run_chain,
+        op_kwargs={"chain": "etl", "run_tag": DELTA_TAG, "tasks": ["extract", "transform", "load"]},
     )
 
-    load_processed_to_pg = BashOperator(
-        task_id="load_processed_to_pg",
-        bash_command=f"python {REPO}/etl/load.py"
+    # profil kolumn z parquetu: czytane są tylko nowe pliki, odczyt profilu bez skanu tabel
+    data_profile = PythonOperator(
+        task_id="data_profile",
+        python_callable=run_chain,
+        op_kwargs={"chain": "etl", "tasks": ["data_profile"]},
     )
 
     silver_handle_missing = SQLExecuteQueryOperator(
@@ -55,6 +79,12 @@ with DAG(
         conn_id="warehouse_pg",
         sql="SQL_raw/01_staging/110_handle_missing_values.sql",
     )
+    # mediany do imputacji: przeliczane najwyżej raz na 7 dni
+    silver_impute_stats = SQLExecuteQueryOperator(
+        task_id="silver_impute_stats",
+        conn_id="warehouse_pg",
+        sql="SQL_raw/01_staging/115_refresh_impute_stats.sql",
+    )
     silver_cast_normalize = SQLExecuteQueryOperator(
         task_id="silver_cast_normalize",
         conn_id="warehouse_pg",
@@ -76,24 +106,36 @@ with DAG(
         conn_id="warehouse_pg",
         sql="SQL_raw/02_gold/220_gold_valid.sql",
     )
-    train_models = BashOperator(
-        task_id="train_models",
-        bash_command=f"cd {REPO} && python ml/ml_final.py",
+    # jeden odczyt gold.housing_valid: szkice dzienne (t-digest) → price_city_daily i city_price_stats
+    gold_aggregates = PythonOperator(
+        task_id="gold_aggregates",
+        python_callable=run_chain,
+        op_kwargs={"chain": "etl", "tasks": ["gold_aggregates"]},
+    )
+    gold_outliers_iqr = SQLExecuteQueryOperator(
+        task_id="gold_outliers_iqr",
+        conn_id="warehouse_pg",
+        sql="SQL_raw/02_gold/250_gold_outliers_iqr.sql",
     )
-    feature_importance = BashOperator(
-        task_id="feature_importance_ml",
-        bash_command=f"cd {REPO} && python ml/feature_importance.py"
+    gold_kpi = SQLExecuteQueryOperator(
+        task_id="gold_kpi",
+        conn_id="warehouse_pg",
+        sql="SQL_raw/02_gold/270_gold_kpi.sql",
     )
-    shap_explainer = BashOperator(
-        task_id="shap_explainer_ml",
-        bash_command=f"cd {REPO} && python ml/shap_explainer.py"
+    # ML: train → feature importance → SHAP → batch prediction, the fitted model passed on in memory
+    ml_chain = PythonOperator(
+        task_id="ml_train_explain_predict",
+        python_callable=run_chain,
+        op_kwargs={"chain": "ml"},
     )
-    Model_prediction = BashOperator(
-        task_id="Model_prediction_sample",
-        bash_command=f"cd {REPO} && python ml/predict_sample.py"
+    publish_stage_metrics = PythonOperator(
+        task_id="publish_stage_metrics",
+        python_callable=publish_metrics,
+        trigger_rule="all_done",
     )
     # Pipeline
-    wait_db >> extract_to_minio >> transform_to_parquet >> load_processed_to_pg
-    load_processed_to_pg >> [silver_handle_missing, silver_cast_normalize] >> silver_logic_checks
-    silver_logic_checks >> gold_features >> gold_valid >> train_models >> feature_importance >> shap_explainer 
-    shap_explainer >> Model_prediction
\ No newline at end of file
+    wait_db >> etl_delta >> [silver_handle_missing, silver_cast_normalize] >> silver_logic_checks
+    silver_handle_missing >> silver_impute_stats
+    [silver_logic_checks, silver_impute_stats] >> gold_features >> gold_valid >> ml_chain >> publish_stage_metrics
+    gold_valid >> gold_aggregates >> [gold_outliers_iqr, gold_kpi] >> publish_stage_metrics
+    etl_delta >> data_profile >> publish_stage_metrics
\ No newline at end of file
@@ -0,0 +1,96 @@
+# benchmarks/bench_compiled.py
+"""Latency of Pipeline.predict vs the compiled model (ml/compiled_model.py) at batch sizes 1..100k.
+
+Every batch is also a parity check against Pipeline.predict. Without
+--model the three ml_final models are fitted on synthetic listings, with a
+few missing values and unseen categories, plus an XGBoost pipeline with a
+sparse `pre` output.
+
+Usage:
+    python -m benchmarks.bench_compiled
+    python -m benchmarks.bench_compiled --model artifacts/best_model_RandomForest.joblib
+"""
+import time
+import argparse
+from pathlib import Path
+from typing import Dict
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.pipeline import Pipeline
+
+from benchmarks.bench_serve import synthetic_listings
+from ml.compiled_model import check_parity, compile_pipeline
+from ml.ml_final import build_preprocessor, get_models
+
+
+BATCH_SIZES = [1, 10, 100, 1_000, 10_000, 100_000]
+
+
+def synthetic_frame(rows: int, seed: int = 42, null_frac: float = 0.02) -> pd.DataFrame:
+    """Listings with a price target, some NaNs and some categories the model never saw."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame.from_records(synthetic_listings(rows, seed))
+    for c in ["rooms", "area_sqm", "year_built", "city", "district"]:
+        df.loc[rng.random(rows) < null_frac, c] = np.nan
+    df.loc[rng.random(rows) < null_frac, "postal_code"] = "99-999"
+    df["price_total"] = df["price_sqm"].fillna(12_000) * df["area_sqm"].fillna(60) * rng.normal(1, 0.1, rows)
+    return df
+
+
+def fit_synthetic(rows: int) -> Dict[str, Pipeline]:
+    df = synthetic_frame(rows, seed=7)
+    df = df[df["postal_code"] != "99-999"]
+    y = df.pop("price_total")
+    pre = build_preprocessor(df)[0]
+    pipes = {name: Pipeline([("pre", clone(pre)), ("model", model)]) for name, model in get_models().items()}
+    sparse = clone(pre).set_params(sparse_threshold=1.0)
+    pipes["XGBRegressor (sparse pre)"] = Pipeline([("pre", sparse), ("model", get_models()["XGBRegressor"])])
+    return {name: pipe.fit(df, y) for name, pipe in pipes.items()}
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(name: str, pipe: Pipeline, frame: pd.DataFrame, repeat: int):
+    start = time.perf_counter()
+    compiled = compile_pipeline(pipe)
+    print(f"{name}: compiled in {time.perf_counter() - start:.2f}s")
+    print(f"  {'rows':>7}  {'pipeline':>10}  {'compiled':>10}  {'records':>10}  {'speedup':>7}  max rel diff")
+    for n in BATCH_SIZES:
+        X = frame.iloc[:n]
+        records = X.to_dict("records") if n <= 1_000 else None
+        worst = check_parity(pipe, compiled, X)
+        reps = repeat if n < 10_000 else 1
+        t_pipe = _best_of(lambda: pipe.predict(X), reps)
+        t_comp = _best_of(lambda: compiled.predict(X), reps)
+        t_rec = _best_of(lambda: compiled.predict(records), reps) if records else np.nan
+        print(
+            f"  {n:>7,}  {t_pipe * 1000:8.2f}ms  {t_comp * 1000:8.2f}ms  {t_rec * 1000:8.2f}ms  "
+            f"{t_pipe / t_comp:6.1f}x  {worst:.1e}"
+        )
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--model", help="fitted best_model_*.joblib; default: fit on synthetic data")
+    ap.add_argument("--train-rows", type=int, default=20_000)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    frame = synthetic_frame(max(BATCH_SIZES)).drop(columns=["price_total"])
+    pipes = {Path(args.model).stem: joblib.load(args.model)} if args.model else fit_synthetic(args.train_rows)
+    for name, pipe in pipes.items():
+        run(name, pipe, frame, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
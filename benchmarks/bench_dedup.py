@@ -0,0 +1,83 @@
+# benchmarks/bench_dedup.py
+"""Memory and speed of the dedup index (etl/dedup.py) at growing sizes.
+
+For every size a synthetic raw CSV (benchmarks/synthetic.py) is read in
+chunks and each chunk goes through `DedupIndex.drop_duplicates`, as
+`transform_pipeline_streaming --dedup` does; the index is saved to a local
+file. Then a small delta is checked against the saved index, as an
+incremental run does. Each phase is a stage of etl/profiling.py named
+`<phase>@<size>`; the index adds a few dozen bytes of RSS per row.
+
+Usage:
+    python -m benchmarks.bench_dedup --sizes 800k,8m
+    python -m benchmarks.bench_dedup --sizes 1m --chunksize 100000
+"""
+import os
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+os.environ.setdefault("STAGE_METRICS_DIR", str(ROOT / "benchmarks" / "results"))
+
+from benchmarks.synthetic import generate_raw, parse_rows, write_csv  # noqa: E402
+from etl import profiling  # noqa: E402
+from etl.dedup import DedupIndex, DedupStats  # noqa: E402
+from etl.schema import read_csv_kwargs  # noqa: E402
+
+DELTA_ROWS = 10_000
+
+
+def chunks(csv: Path, chunksize: int):
+    with pd.read_csv(csv, chunksize=chunksize, **read_csv_kwargs()) as reader:
+        yield from reader
+
+
+def bench(rows: int, chunksize: int, workdir: Path) -> None:
+    label = f"{rows / 1e6:g}m" if rows >= 1_000_000 else f"{rows / 1e3:g}k"
+    csv = workdir / f"raw_{label}.csv"
+    write_csv(csv, rows)
+    uri = str(workdir / f"index_{label}.parquet")
+
+    stats, index = DedupStats(), DedupIndex()
+    with profiling.stage(f"dedup_full@{label}", rows_in=rows) as s:
+        s.rows_out = sum(len(index.drop_duplicates(chunk, label, stats)) for chunk in chunks(csv, chunksize))
+        index.save(uri)
+    csv.unlink()
+
+    delta = generate_raw(DELTA_ROWS, seed=7, first_id=rows + 1)
+    with profiling.stage(f"dedup_delta@{label}", rows_in=len(delta)) as s:
+        index = DedupIndex.load(uri)
+        s.rows_out = len(index.drop_duplicates(delta, "delta"))
+        index.save(uri)
+    print(f"  {label}: {stats}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", default="800k,8m", help="comma-separated row counts, e.g. 800k,8m")
+    ap.add_argument("--chunksize", type=int, default=200_000, help="rows per chunk, as transform.py --chunksize")
+    ap.add_argument("--workdir", help="scratch directory for CSV and index (default: a temp dir)")
+    args = ap.parse_args()
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="bench_dedup_"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    run_id = profiling.run_id()
+    try:
+        for rows in [parse_rows(s) for s in args.sizes.split(",")]:
+            bench(rows, args.chunksize, workdir)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    records = profiling.load_run(run_id)
+    records = records[records["stage"].str.contains("@")]
+    with pd.option_context("display.width", 200):
+        print(records[["stage", "wall_s", "peak_rss_mb", "rows_in", "rows_out"]].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
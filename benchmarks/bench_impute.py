@@ -0,0 +1,103 @@
+# benchmarks/bench_impute.py
+"""Benchmark HousingImputer against the original per-column impute functions.
+
+Usage:
+    python -m benchmarks.bench_impute --csv data/raw/housing_10k_sample.csv
+    python -m benchmarks.bench_impute --rows 10000000
+"""
+import os
+import time
+import argparse
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+# time the bare imputer, without stage metrics (etl/profiling.py)
+os.environ.setdefault("PIPELINE_PROFILE", "0")
+from etl.imputer import HousingImputer  # noqa: E402
+
+
+# ---------------------------------------------------------------------
+# Reference: the per-column implementation the imputer replaces
+# ---------------------------------------------------------------------
+def legacy_impute_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    num_cols = df.select_dtypes(include=["float64", "int64"]).columns
+    for c in num_cols:
+        if df[c].isna().any():
+            df[c] = df[c].fillna(df[c].median())
+    return df
+
+
+def legacy_impute_binary(df: pd.DataFrame, cols: List[str]) -> pd.DataFrame:
+    for c in cols:
+        if c in df.columns and df[c].isna().any():
+            df[c] = df[c].fillna(1).astype(int)
+    return df
+
+
+def synthetic_frame(rows: int, seed: int = 42, null_frac: float = 0.03) -> pd.DataFrame:
+    """Numeric housing-like columns with `null_frac` missing values each."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "listing_id": np.arange(rows, dtype="int64"),
+        "rooms": rng.integers(1, 7, rows).astype("float64"),
+        "area_sqm": rng.gamma(6.0, 10.0, rows).round(2),
+        "floor": rng.integers(0, 12, rows).astype("float64"),
+        "total_floors": rng.integers(1, 15, rows).astype("float64"),
+        "has_elevator": rng.integers(0, 2, rows).astype("float64"),
+        "year_built": rng.integers(1950, 2025, rows).astype("float64"),
+        "distance_center_km": rng.exponential(5.0, rows).round(2),
+        "price_sqm": rng.normal(12_000, 3_000, rows).round(2),
+    })
+    for c in ["rooms", "area_sqm", "floor", "total_floors", "has_elevator", "year_built", "distance_center_km"]:
+        df.loc[rng.random(rows) < null_frac, c] = np.nan
+    return df
+
+
+def _time(fn, df: pd.DataFrame, repeat: int):
+    best = np.inf
+    out = None
+    for _ in range(repeat):
+        work = df.copy()
+        start = time.perf_counter()
+        out = fn(work)
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def run(df: pd.DataFrame, label: str, repeat: int):
+    legacy = lambda d: legacy_impute_binary(legacy_impute_numeric(d), ["has_elevator"])
+    engine = lambda d: HousingImputer(binary_cols=["has_elevator"]).fit_transform(d, inplace=True)
+
+    t_legacy, out_legacy = _time(legacy, df, repeat)
+    t_engine, out_engine = _time(engine, df, repeat)
+    pd.testing.assert_frame_equal(out_legacy, out_engine)
+
+    fitted = HousingImputer(binary_cols=["has_elevator"]).fit(df)
+    t_apply, _ = _time(lambda d: fitted.transform(d, inplace=True), df, repeat)
+
+    print(f"{label}: {len(df):,} rows")
+    print(f"  legacy loop      {t_legacy:8.3f}s")
+    print(f"  fit + transform  {t_engine:8.3f}s  ({t_legacy / t_engine:,.1f}x)")
+    print(f"  transform only   {t_apply:8.3f}s  ({t_legacy / t_apply:,.1f}x, reused fill values)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--csv", help="real housing CSV, e.g. data/raw/housing_10k_sample.csv")
+    ap.add_argument("--rows", type=int, default=0, help="size of a synthetic frame")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    if args.csv:
+        df = pd.read_csv(args.csv)
+        df["date"] = pd.to_datetime(df["date"], errors="coerce")
+        run(df, Path(args.csv).name, args.repeat)
+    if args.rows:
+        run(synthetic_frame(args.rows), "synthetic", args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# benchmarks/bench_quantiles.py
+"""Accuracy and speed of the gold aggregate engine (t-digest) against exact percentiles.
+
+Synthetic gold.housing_valid rows (benchmarks/synthetic.py) go through
+etl/gold_aggregates.py, without Postgres:
+- exact: per (day, city), per-city and overall PERCENTILE_CONT with pandas,
+  as the former 240/250/270 SQL computed them;
+- sketch: `aggregate_days` (one pass: counts, sums, exact daily quartiles,
+  digests) plus `city_stats` (day digests merged per city and overall);
+- incremental: the last day arriving on top of stored day rows, i.e.
+  aggregating one day and re-merging the cities.
+
+Accuracy is reported for the city quartiles as relative error and as rank
+error (share of values below the estimate minus q), plus the change in the
+IQR outlier count of 250_gold_outliers_iqr.sql. The daily quartiles must
+match exactly.
+
+Usage:
+    python -m benchmarks.bench_quantiles --rows 800k
+    python -m benchmarks.bench_quantiles --rows 8m --compression 100,200,500
+"""
+import os
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# time the bare aggregation, without stage metrics (etl/profiling.py)
+os.environ.setdefault("PIPELINE_PROFILE", "0")
+from benchmarks.synthetic import gold_features, iter_raw, parse_rows  # noqa: E402
+from etl.gold_aggregates import ALL_CITIES, QUARTILES, aggregate_days, city_stats  # noqa: E402
+from etl.transform import transform_frame  # noqa: E402
+
+
+def aggregate_rows(rows: int, seed: int = 42) -> pd.DataFrame:
+    """Rows shaped like gold_aggregates.ROWS_SQL for `rows` synthetic raw listings."""
+    gold = pd.concat([gold_features(transform_frame(raw)) for raw in iter_raw(rows, seed)], ignore_index=True)
+    return pd.DataFrame({
+        "d": pd.to_datetime(
+            gold[["listing_year", "listing_month", "listing_day"]].set_axis(["year", "month", "day"], axis=1)
+        ).dt.strftime("%Y-%m-%d"),
+        "city": gold["city"],
+        "price_sqm": gold["price_sqm"],
+        "base_year": 2025 - gold["building_age"],
+        "elevator": gold["has_elevator_int"],
+    })
+
+
+def exact_stats(df: pd.DataFrame):
+    """Daily and per-city quartiles the way PERCENTILE_CONT computes them (linear interpolation)."""
+    daily = df.groupby(["d", "city"])["price_sqm"].quantile(list(QUARTILES)).unstack()
+    city = df.groupby("city")["price_sqm"].quantile(list(QUARTILES)).unstack()
+    city.loc[ALL_CITIES] = df["price_sqm"].quantile(list(QUARTILES)).to_numpy()
+    return daily, city
+
+
+def outliers(df: pd.DataFrame, q1: pd.Series, q3: pd.Series) -> int:
+    """Row count of 250_gold_outliers_iqr.sql (the upper fence is q1 + 1.5·IQR there)."""
+    lo, hi = q1 - 1.5 * (q3 - q1), q1 + 1.5 * (q3 - q1)
+    price = df["price_sqm"]
+    return int(((price < df["city"].map(lo)) | (price > df["city"].map(hi))).sum())
+
+
+def _best(fn, repeat: int):
+    best, out = np.inf, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def run(df: pd.DataFrame, compression: float, repeat: int) -> None:
+    t_exact, (daily_ex, city_ex) = _best(lambda: exact_stats(df), repeat)
+    t_days, days = _best(lambda: aggregate_days(df, compression), repeat)
+    t_cities, cities = _best(lambda: city_stats(days, compression), repeat)
+
+    last = df["d"].max()
+    stored, arriving = days[days["d"] < last], df[df["d"] == last]
+    t_inc, _ = _best(lambda: city_stats(pd.concat([stored, aggregate_days(arriving, compression)]), compression), repeat)
+
+    daily = days.set_index(["d", "city"])[["p25_sqm", "median_sqm", "p75_sqm"]]
+    assert np.array_equal(daily.to_numpy(), daily_ex.loc[daily.index].to_numpy()), "daily quartiles differ"
+
+    est = cities.set_index("city")[["q1_sqm", "median_sqm", "q3_sqm"]]
+    ref = city_ex.loc[est.index].to_numpy()
+    rel = np.abs(est.to_numpy() - ref) / ref
+    sorted_by_city = {c: np.sort(g.to_numpy()) for c, g in df.groupby("city")["price_sqm"]}
+    sorted_by_city[ALL_CITIES] = np.sort(df["price_sqm"].to_numpy())
+    rank = np.array([
+        [np.searchsorted(sorted_by_city[c], v) / len(sorted_by_city[c]) for v in row]
+        for c, row in zip(est.index, est.to_numpy())
+    ]) - np.array(QUARTILES)
+
+    per_city = est.drop(index=ALL_CITIES)
+    n_ex = outliers(df, city_ex[0.25].drop(ALL_CITIES), city_ex[0.75].drop(ALL_CITIES))
+    n_sk = outliers(df, per_city["q1_sqm"], per_city["q3_sqm"])
+
+    print(f"compression {compression:g}: {len(df):,} rows, {len(days):,} day×city groups, {len(est) - 1} cities")
+    print(f"  exact groupby quantiles  {t_exact:8.3f}s")
+    print(f"  aggregate_days           {t_days:8.3f}s  (incl. exact daily quartiles)")
+    print(f"  city_stats (merge)       {t_cities:8.3f}s  ({t_exact / (t_days + t_cities):,.1f}x vs exact)")
+    print(f"  one new day + re-merge   {t_inc:8.3f}s  ({len(arriving):,} rows, {t_exact / t_inc:,.1f}x)")
+    print(f"  city quartiles: max rel err {rel.max():.5f}, mean {rel.mean():.5f}; max rank err {np.abs(rank).max():.5f}")
+    print(f"  IQR outliers: exact {n_ex:,}, sketch {n_sk:,} ({(n_sk - n_ex) / max(n_ex, 1):+.3%})")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=parse_rows, default=parse_rows("800k"), help="raw listings, e.g. 100k, 8m")
+    ap.add_argument("--compression", default="200", help="comma-separated t-digest compressions")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    df = aggregate_rows(args.rows)
+    for compression in args.compression.split(","):
+        run(df, float(compression), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# benchmarks/bench_serve.py
+"""Load test of ml/serve.py: single-listing requests, with and without micro-batching.
+
+Usage:
+    python -m benchmarks.bench_serve --requests 5000 --concurrency 64
+    python -m benchmarks.bench_serve --url http://127.0.0.1:8000 --requests 2000
+    python -m benchmarks.bench_serve --in-process --requests 20000
+"""
+import sys
+import time
+import asyncio
+import argparse
+import subprocess
+from pathlib import Path
+from typing import List
+
+import httpx
+import numpy as np
+
+from ml.data_loader import FEATURE_COLS
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+CITIES = ["Warszawa", "Kraków", "Gdańsk", "Poznań", "Wrocław"]
+SEASONS = ["Winter", "Spring", "Summer", "Autumn"]
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def synthetic_listings(n: int, seed: int = 42) -> List[dict]:
+    """JSON payloads with the model's input columns (FEATURE_COLS) and plausible values."""
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(n):
+        year_built = int(rng.integers(1950, 2025))
+        total_floors = int(rng.integers(1, 15))
+        floor = int(rng.integers(0, total_floors + 1))
+        area = round(float(rng.gamma(6.0, 10.0)), 2)
+        distance = round(float(rng.exponential(5.0)), 2)
+        out.append({
+            "season": str(rng.choice(SEASONS)),
+            "listing_year": 2024,
+            "decade": year_built // 10 * 10,
+            "listing_month": int(rng.integers(1, 13)),
+            "listing_day": int(rng.integers(1, 29)),
+            "listing_day_of_week": str(rng.choice(DAYS)),
+            "city": str(rng.choice(CITIES)),
+            "district": str(rng.choice(list("ABCDEFGH"))),
+            "postal_code": f"0{int(rng.integers(0, 20))}-100",
+            "rooms": int(rng.integers(1, 6)),
+            "floor": floor,
+            "total_floors": total_floors,
+            "floor_ratio": round(floor / total_floors, 3),
+            "year_built": year_built,
+            "building_age": 2025 - year_built,
+            "area_sqm": area,
+            "area_sqm_bucket": "50-69",
+            "distance_center_km": distance,
+            "distance_km_bucket": "1-2.9",
+            "price_sqm": round(float(rng.normal(12_000, 3_000)), 2),
+            "has_elevator_int": int(rng.integers(0, 2)),
+        })
+    assert list(out[0]) == FEATURE_COLS
+    return out
+
+
+# ---------------------------------------------------------------------
+# Server process
+# ---------------------------------------------------------------------
+def start_server(port: int, artifacts: str, max_batch: int, max_wait_ms: float) -> subprocess.Popen:
+    cmd = [
+        sys.executable, "-m", "ml.serve",
+        "--port", str(port), "--artifacts", artifacts,
+        "--max-batch", str(max_batch), "--max-wait-ms", str(max_wait_ms),
+    ]
+    proc = subprocess.Popen(cmd, cwd=ROOT)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"serve.py exited with code {proc.returncode}")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise TimeoutError("serve.py did not become healthy within 60s")
+
+
+# ---------------------------------------------------------------------
+# Load generator
+# ---------------------------------------------------------------------
+async def _load(url: str, listings: List[dict], concurrency: int) -> np.ndarray:
+    latencies = np.empty(len(listings))
+    sem = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        async def one(i: int) -> None:
+            async with sem:
+                start = time.perf_counter()
+                r = await client.post("/predict", json=listings[i])
+                r.raise_for_status()
+                latencies[i] = time.perf_counter() - start
+
+        await asyncio.gather(*(one(i) for i in range(len(listings))))
+    return latencies
+
+
+def run(url: str, label: str, listings: List[dict], concurrency: int, warmup: int = 200) -> None:
+    asyncio.run(_load(url, listings[:warmup], concurrency))
+    start = time.perf_counter()
+    lat = asyncio.run(_load(url, listings, concurrency)) * 1000
+    seconds = time.perf_counter() - start
+    server = httpx.get(f"{url}/metrics").json()
+
+    print(f"{label}: {len(listings):,} requests, concurrency {concurrency}")
+    print(f"  client  p50 {np.percentile(lat, 50):7.2f} ms  p99 {np.percentile(lat, 99):7.2f} ms  "
+          f"{len(listings) / seconds:8.1f} req/s")
+    print(f"  server  p50 {server['p50_ms']:7.2f} ms  p99 {server['p99_ms']:7.2f} ms  "
+          f"mean batch {server['mean_batch_size']}")
+
+
+async def _load_batcher(batcher, listings: List[dict], concurrency: int) -> np.ndarray:
+    latencies = np.empty(len(listings))
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with sem:
+            start = time.perf_counter()
+            await batcher.predict(listings[i])
+            latencies[i] = time.perf_counter() - start
+
+    task = asyncio.create_task(batcher.run())
+    await asyncio.gather(*(one(i) for i in range(len(listings))))
+    task.cancel()
+    return latencies
+
+
+def run_in_process(artifacts: str, listings: List[dict], concurrency: int, max_batch: int, max_wait_ms: float):
+    """MicroBatcher + model without HTTP: what batching buys on the model side alone."""
+    from ml.serve import Metrics, MicroBatcher, ModelStore
+
+    store = ModelStore(Path(artifacts))
+    store.refresh()
+    for label, batch in [("no batching (max_batch=1)", 1), (f"micro-batching (max_batch={max_batch})", max_batch)]:
+        metrics = Metrics()
+        asyncio.run(_load_batcher(MicroBatcher(store, metrics, batch, max_wait_ms), listings[:200], concurrency))
+        start = time.perf_counter()
+        lat = asyncio.run(_load_batcher(MicroBatcher(store, metrics, batch, max_wait_ms), listings, concurrency)) * 1000
+        seconds = time.perf_counter() - start
+        print(f"in-process {label}: {len(listings):,} requests, concurrency {concurrency}")
+        print(f"  p50 {np.percentile(lat, 50):7.2f} ms  p99 {np.percentile(lat, 99):7.2f} ms  "
+              f"{len(listings) / seconds:8.1f} req/s  mean batch {np.mean(metrics.batch_sizes):.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--url", help="already running server; otherwise serve.py is started per mode")
+    ap.add_argument("--artifacts", default=str(ROOT / "artifacts"))
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--requests", type=int, default=5_000)
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--max-batch", type=int, default=256)
+    ap.add_argument("--max-wait-ms", type=float, default=2.0)
+    ap.add_argument("--in-process", action="store_true", help="skip HTTP, drive MicroBatcher directly")
+    args = ap.parse_args()
+
+    listings = synthetic_listings(args.requests)
+    if args.in_process:
+        run_in_process(args.artifacts, listings, args.concurrency, args.max_batch, args.max_wait_ms)
+        return
+    if args.url:
+        run(args.url, args.url, listings, args.concurrency)
+        return
+
+    modes = [("no batching (max_batch=1)", 1), (f"micro-batching (max_batch={args.max_batch})", args.max_batch)]
+    for label, max_batch in modes:
+        proc = start_server(args.port, args.artifacts, max_batch, args.max_wait_ms)
+        try:
+            run(f"http://127.0.0.1:{args.port}", label, listings, args.concurrency)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# benchmarks/bench_tasks.py
+"""Per-run overhead of the ML steps as separate scripts vs in-process tasks.
+
+The same steps run twice against the current warehouse and artifacts:
+- subprocess: one `python -m ml.<script>` per step, as the former
+  BashOperator chain of warehouse_dag.py started them (fresh interpreter,
+  imports, model unpickling and cache lookups in every step);
+- in-process: `run_tasks` of etl/tasks.py over ml_tasks.ML_TASKS, the model
+  loaded once and passed on in memory.
+
+The difference of the totals is the startup and hand-off overhead the
+in-process runner saves per DAG run; the work of the steps is identical.
+Connection settings come from the usual PG_* variables.
+
+Usage:
+    python -m benchmarks.bench_tasks
+    python -m benchmarks.bench_tasks --tasks train,feature_importance,shap,predict --repeat 3
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+from pathlib import Path
+from statistics import median
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+# both modes only measure; no stage metrics files
+os.environ.setdefault("PIPELINE_PROFILE", "0")
+
+from etl.tasks import chain, run_tasks  # noqa: E402
+
+
+def scripts(shap_rows: int) -> Dict[str, List[str]]:
+    return {
+        "train": ["-m", "ml.ml_final"],
+        "feature_importance": ["-m", "ml.feature_importance"],
+        "shap": ["-m", "ml.shap_explainer", "--rows", str(shap_rows)],
+        "predict": ["-m", "ml.predict_sample"],
+    }
+
+
+def run_subprocesses(names: List[str], shap_rows: int) -> Dict[str, float]:
+    seconds = {}
+    for name in names:
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, *scripts(shap_rows)[name]], cwd=ROOT, check=True, stdout=subprocess.DEVNULL
+        )
+        seconds[name] = time.perf_counter() - start
+    return seconds
+
+
+def run_in_process(names: List[str], shap_rows: int) -> Dict[str, float]:
+    tasks = [t for t in chain("ml") if t.name in names]
+    seconds, timed = {}, []
+    for task in tasks:
+        # wrap each step to time it exactly like the subprocess mode (imports included)
+        def timed_fn(ctx, fn=task.fn, name=task.name):
+            start = time.perf_counter()
+            out = fn(ctx)
+            seconds[name] = time.perf_counter() - start
+            return out
+
+        timed.append(type(task)(task.name, timed_fn, task.checkpoint))
+    run_tasks(timed, {"shap_rows": shap_rows})
+    return seconds
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--tasks", default="feature_importance,shap,predict",
+                    help="ML steps to run (train retrains and replaces the artifacts)")
+    ap.add_argument("--shap-rows", type=int, default=1000)
+    ap.add_argument("--repeat", type=int, default=1, help="runs per mode, alternating; medians are reported")
+    args = ap.parse_args()
+
+    names = [n for n in args.tasks.split(",") if n]
+    unknown = set(names) - set(scripts(0))
+    if unknown:
+        ap.error(f"unknown tasks: {sorted(unknown)}")
+    # the ML scripts keep artifacts/ relative to the repository root
+    os.chdir(ROOT)
+
+    runs = {"subprocess": [], "in-process": []}
+    for _ in range(args.repeat):
+        runs["subprocess"].append(run_subprocesses(names, args.shap_rows))
+        runs["in-process"].append(run_in_process(names, args.shap_rows))
+
+    print(f"\n{'step':<20} {'subprocess s':>13} {'in-process s':>13} {'saved s':>9}")
+    totals = {mode: 0.0 for mode in runs}
+    for name in names:
+        sub, inp = (median(r[name] for r in runs[mode]) for mode in runs)
+        totals["subprocess"] += sub
+        totals["in-process"] += inp
+        print(f"{name:<20} {sub:>13.2f} {inp:>13.2f} {sub - inp:>9.2f}")
+    sub, inp = totals["subprocess"], totals["in-process"]
+    print(f"{'total':<20} {sub:>13.2f} {inp:>13.2f} {sub - inp:>9.2f}  ({(sub - inp) / sub:.0%} less)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+# benchmarks/synthetic.py
+"""Synthetic housing listings with the raw schema and distributions of housing_800k.csv.
+
+The marginal distributions, missing-value rates and value ranges follow
+`REFERENCE` (df.describe() of the 800k file, notebooks/explore_raw.ipynb).
+Rows are generated in chunks with independent, seeded streams, so any size
+from 10k to 50M+ rows is reproducible and written with bounded memory.
+`gold_features` mirrors the silver/gold SQL (SQL/SQL_raw/01_staging,
+02_gold) for benchmarks of the ML side without Postgres.
+
+Usage:
+    python -m benchmarks.synthetic --rows 8000000 --out data/raw/housing_8m.csv
+    python -m benchmarks.synthetic --rows 1000000 --describe
+"""
+import argparse
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from etl.schema import HOUSING_DTYPES
+
+
+# mean, std, min, max and share of missing values per numeric column of housing_800k.csv
+REFERENCE = {
+    "rooms": (3.000561, 1.415279, 1, 5, 0.030),
+    "area_sqm": (79.010463, 21.427236, 18, 180, 0.020),
+    "floor": (7.496932, 4.611731, 0, 15, 0.050),
+    "total_floors": (10.491374, 4.033147, 4, 17, 0.040),
+    "has_elevator": (0.835563, 0.370671, 0, 1, 0.030),
+    "year_built": (1988.959352, 19.922230, 1955, 2023, 0.080),
+    "distance_center_km": (6.005034, 4.229630, 0.2, 30, 0.020),
+    "price_sqm": (6901.199188, 2544.392780, 3500, 20381, 0.0),
+    "price_total": (543344.5, 249587.8, 63000, 2540549, 0.0),
+}
+
+# Warszawa is 28% of the listings, the other cities share the rest evenly
+CITY_SHARE = {"Warszawa": 0.28, "Krakow": 0.144, "Wroclaw": 0.144, "Gdansk": 0.144, "Poznan": 0.144, "Lodz": 0.144}
+CITY_PRICE = {"Warszawa": 1.22, "Krakow": 1.08, "Wroclaw": 0.98, "Gdansk": 0.96, "Poznan": 0.88, "Lodz": 0.78}
+DISTRICTS = {
+    "Warszawa": ["Srodmiescie", "Mokotow", "Wola", "Ochota", "Praga-Poludnie", "Bielany", "Zoliborz",
+                 "Ursus", "Ursynow", "Bemowo", "Targowek"],
+    "Krakow": ["Srodmiescie", "Stare Miasto", "Krowodrza", "Podgorze", "Nowa Huta", "Pradnik Bialy",
+               "Debniki", "Bronowice"],
+    "Wroclaw": ["Srodmiescie", "Stare Miasto", "Krzyki", "Fabryczna", "Psie Pole", "Biskupin", "Lesnica"],
+    "Gdansk": ["Srodmiescie", "Wrzeszcz", "Oliwa", "Przymorze", "Chelm", "Orunia", "Zaspa"],
+    "Poznan": ["Stare Miasto", "Nowe Miasto", "Wilda", "Jezyce", "Grunwald", "Rataje", "Winogrady"],
+    "Lodz": ["Srodmiescie", "Baluty", "Widzew", "Polesie", "Gorna", "Karolew", "Retkinia", "Teofilow"],
+}
+FIRST_DATE = np.datetime64("2023-10-01")
+DAYS = 731
+
+CHUNK_ROWS = 1_000_000
+
+
+# ---------------------------------------------------------------------
+# 1) Raw listings
+# ---------------------------------------------------------------------
+def _with_nans(values: np.ndarray, share: float, rng: np.random.Generator) -> np.ndarray:
+    values = values.astype("float64")
+    values[rng.random(len(values)) < share] = np.nan
+    return values
+
+
+def generate_raw(rows: int, seed: int = 42, first_id: int = 1) -> pd.DataFrame:
+    """`rows` raw listings with ids from `first_id`, typed with HOUSING_DTYPES."""
+    rng = np.random.default_rng(seed)
+    nan = {c: ref[4] for c, ref in REFERENCE.items()}
+
+    # strings are built once per distinct value and picked by code
+    cities = list(CITY_SHARE)
+    city = rng.choice(len(cities), rows, p=np.array(list(CITY_SHARE.values())) / sum(CITY_SHARE.values()))
+    districts = sorted({d for names in DISTRICTS.values() for d in names})
+    district = np.empty(rows, dtype="int64")
+    for i, name in enumerate(cities):
+        mask = city == i
+        codes = np.array([districts.index(d) for d in DISTRICTS[name]])
+        district[mask] = codes[rng.integers(0, len(codes), mask.sum())]
+    postal_codes = [f"{i // 1000:02d}-{i % 1000:03d}" for i in range(100_000)]
+    dates = np.datetime_as_string(FIRST_DATE + np.arange(DAYS))
+
+    area = np.clip(rng.normal(79.0, 21.4, rows), 18, 180).round(1)
+    distance = np.clip(rng.gamma(2.0, 3.0, rows), 0.2, 30).round(2)
+    # log-normal price per m², dearer in Warszawa and near the centre, within the source's range
+    factor = np.array([CITY_PRICE[c] for c in cities])[city] * np.exp(-0.015 * (distance - 6))
+    price_sqm = np.clip(np.round(6_450 * factor * rng.lognormal(0, 0.32, rows)), 3_500, 20_381)
+
+    df = pd.DataFrame({
+        "listing_id": np.arange(first_id, first_id + rows),
+        "date": dates[rng.integers(0, DAYS, rows)],
+        "city": pd.Categorical.from_codes(city, cities),
+        "district": pd.Categorical.from_codes(district, districts),
+        "rooms": _with_nans(rng.integers(1, 6, rows), nan["rooms"], rng),
+        "area_sqm": _with_nans(area, nan["area_sqm"], rng),
+        "floor": _with_nans(rng.integers(0, 16, rows), nan["floor"], rng),
+        "total_floors": _with_nans(rng.integers(4, 18, rows), nan["total_floors"], rng),
+        "has_elevator": _with_nans(rng.random(rows) < REFERENCE["has_elevator"][0], nan["has_elevator"], rng),
+        "year_built": _with_nans(rng.integers(1955, 2024, rows), nan["year_built"], rng),
+        "distance_center_km": _with_nans(distance, nan["distance_center_km"], rng),
+        "postal_code": pd.Categorical.from_codes(rng.integers(0, len(postal_codes), rows), postal_codes),
+        "price_sqm": price_sqm,
+        # the total is priced before area goes missing, as in the source
+        "price_total": np.round(price_sqm * area),
+    })
+    return df.astype(HOUSING_DTYPES)
+
+
+def iter_raw(rows: int, seed: int = 42, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """`rows` listings in chunks; chunk i uses its own child seed, so the data do not depend on memory."""
+    seeds = np.random.SeedSequence(seed).spawn((rows + chunk_rows - 1) // chunk_rows)
+    for i, child in enumerate(seeds):
+        n = min(chunk_rows, rows - i * chunk_rows)
+        yield generate_raw(n, seed=int(child.generate_state(1)[0]), first_id=1 + i * chunk_rows)
+
+
+def write_csv(path: Path, rows: int, seed: int = 42, chunk_rows: int = CHUNK_ROWS) -> Path:
+    """Write `rows` listings as a raw CSV (same layout as housing_800k.csv)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for i, df in enumerate(iter_raw(rows, seed, chunk_rows)):
+        df.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    return path
+
+
+# ---------------------------------------------------------------------
+# 2) gold.housing_valid without Postgres
+# ---------------------------------------------------------------------
+def gold_features(processed: pd.DataFrame, today_year: int = 2025) -> pd.DataFrame:
+    """gold.housing_valid rows for a transformed (imputed) frame, as the gold SQL derives them.
+
+    Column types follow what `pd.read_sql` returns: float64/int64 numbers
+    and object strings.
+    """
+    df = processed
+    date = pd.to_datetime(df["date"])
+    # ::int in SQL rounds the imputed (possibly .5) medians
+    floor, total = df["floor"].round().astype("int64"), df["total_floors"].round().astype("int64")
+    year_built = df["year_built"].round().astype("int64")
+    invalid_floor = floor > total
+    month = date.dt.month
+
+    gold = pd.DataFrame({
+        "listing_id": df["listing_id"].astype("int64"),
+        "season": np.select(
+            [month.isin([12, 1, 2]), month.isin([3, 4, 5]), month.isin([6, 7, 8])],
+            ["Winter", "Spring", "Summer"], "Autumn",
+        ).astype(object),
+        "listing_year": date.dt.year.astype("int64"),
+        "decade": year_built // 10 * 10,
+        "listing_month": month.astype("int64"),
+        "listing_day": date.dt.day.astype("int64"),
+        "listing_day_of_week": date.dt.day_name().astype(object),
+        "city": df["city"].astype(str).astype(object),
+        "district": df["district"].astype(str).astype(object),
+        "postal_code": df["postal_code"].astype(str).astype(object),
+        "rooms": df["rooms"].round().astype("int64"),
+        "floor": floor,
+        "total_floors": total,
+        "floor_ratio": np.where(invalid_floor, 0.0, (floor / total.replace(0, np.nan)).round(3)),
+        "year_built": year_built,
+        "building_age": today_year - year_built,
+        "area_sqm": df["area_sqm"].astype("float64").round(2),
+        "area_sqm_bucket": pd.cut(
+            df["area_sqm"], [-np.inf, 35, 50, 70, 100, np.inf], right=False,
+            labels=["<35", "35-49", "50-69", "70-99", "100+"],
+        ).astype(object),
+        "distance_center_km": df["distance_center_km"].astype("float64").round(2),
+        "distance_km_bucket": pd.cut(
+            df["distance_center_km"], [-np.inf, 1, 3, 5, 10, np.inf], right=False,
+            labels=["<1", "1-2.9", "3-4.9", "5-9.9", "10+"],
+        ).astype(object),
+        "price_sqm": df["price_sqm"].astype("float64"),
+        "has_elevator_int": df["has_elevator"].astype("int64"),
+        "price_total": df["price_total"].astype("float64"),
+    })
+    return gold[~invalid_floor & (gold["rooms"] > 0)].reset_index(drop=True)
+
+
+# ---------------------------------------------------------------------
+# 3) Command-line interface
+# ---------------------------------------------------------------------
+def describe(df: pd.DataFrame) -> pd.DataFrame:
+    """Generated vs reference mean/std/min/max/missing share of the numeric columns."""
+    rows = []
+    for c, (mean, std, lo, hi, nan) in REFERENCE.items():
+        s = df[c].astype("float64")
+        rows.append({
+            "column": c, "mean": s.mean(), "ref_mean": mean, "std": s.std(), "ref_std": std,
+            "min": s.min(), "max": s.max(), "ref_range": f"{lo}..{hi}",
+            "missing": s.isna().mean(), "ref_missing": nan,
+        })
+    return pd.DataFrame(rows).set_index("column")
+
+
+def parse_rows(text: str) -> int:
+    """'10k', '8m', '50M' or '800000' -> number of rows."""
+    text = text.strip().lower().replace("_", "")
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=parse_rows, default=parse_rows("800k"), help="e.g. 10k, 8m, 50m")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    ap.add_argument("--out", help="CSV path to write")
+    ap.add_argument("--describe", action="store_true", help="compare the first chunk with the 800k reference")
+    args = ap.parse_args()
+
+    if args.describe:
+        first = next(iter_raw(min(args.rows, args.chunk_rows), args.seed, args.chunk_rows))
+        with pd.option_context("display.width", 160, "display.float_format", "{:,.3f}".format):
+            print(describe(first))
+            print(first["city"].value_counts(normalize=True).round(3).to_string())
+    if args.out:
+        path = write_csv(Path(args.out), args.rows, args.seed, args.chunk_rows)
+        print(f"Wrote {args.rows:,} rows → {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+# etl/copy_loader.py
+import io
+import time
+import struct
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import fsspec
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+from etl.profiling import add_bytes, profiled
+
+
+DEFAULT_BATCH_ROWS = 100_000
+
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+PGCOPY_TRAILER = struct.pack(">h", -1)
+PG_NULL = struct.pack(">i", -1)
+PG_EPOCH = np.datetime64("2000-01-01T00:00:00", "us")
+
+# a statement run in the load transaction: SQL, or SQL with %(name)s placeholders and its parameters
+PostSql = Union[str, Tuple[str, Dict[str, object]]]
+
+
+@dataclass
+class LoadStats:
+    """Throughput summary of a single load."""
+
+    rows: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    @property
+    def mb_per_sec(self) -> float:
+        return self.bytes / 1e6 / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.rows:,} rows, {self.bytes / 1e6:,.1f} MB in {self.seconds:.2f}s "
+            f"({self.rows_per_sec:,.0f} rows/s, {self.mb_per_sec:,.1f} MB/s)"
+        )
+
+
+# ---------------------------------------------------------------------
+# 1) Batched sources
+# ---------------------------------------------------------------------
+def iter_parquet(
+    uri: str,
+    batch_rows: int = DEFAULT_BATCH_ROWS,
+    storage_options: Optional[dict] = None,
+    pattern: Optional[str] = None,
+) -> Iterator[pd.DataFrame]:
+    """Stream a parquet file or hive-partitioned directory as DataFrames of at most `batch_rows` rows.
+
+    With `pattern`, only files under `uri` whose name matches the glob are read
+    (partition columns are still restored from the directory names).
+    """
+    protocol, path = fsspec.core.split_protocol(uri)
+    fs = fsspec.filesystem(protocol or "file", **(storage_options or {}))
+    if pattern:
+        path = path.rstrip("/")
+        files = fs.glob(f"{path}/**/{pattern}")
+        if not files:
+            return
+        dataset = ds.dataset(
+            files, filesystem=fs, format="parquet", partitioning="hive", partition_base_dir=path
+        )
+    else:
+        dataset = ds.dataset(path, filesystem=fs, format="parquet", partitioning="hive")
+    for batch in dataset.to_batches(batch_size=batch_rows):
+        yield batch.to_pandas()
+
+
+def iter_csv(
+    uri: str,
+    batch_rows: int = DEFAULT_BATCH_ROWS,
+    storage_options: Optional[dict] = None,
+    dtype: Optional[dict] = None,
+) -> Iterator[pd.DataFrame]:
+    """Stream a CSV file as DataFrames of at most `batch_rows` rows, parsed with `dtype`."""
+    with pd.read_csv(
+        uri, storage_options=storage_options, chunksize=batch_rows, dtype=dtype
+    ) as reader:
+        yield from reader
+
+
+def iter_frame(df: pd.DataFrame, batch_rows: int = DEFAULT_BATCH_ROWS) -> Iterator[pd.DataFrame]:
+    """Slice an in-memory DataFrame into batches of at most `batch_rows` rows (views, no copies)."""
+    for start in range(0, len(df), batch_rows):
+        yield df.iloc[start : start + batch_rows]
+
+
+# ---------------------------------------------------------------------
+# 2) COPY payload encoders
+# ---------------------------------------------------------------------
+def encode_csv(df: pd.DataFrame) -> bytes:
+    """Encode a DataFrame as COPY ... (FORMAT csv) payload (empty field = NULL)."""
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False)
+    return buf.getvalue().encode("utf-8")
+
+
+def _fixed_width_fields(values: np.ndarray, fmt: str, null: np.ndarray) -> List[bytes]:
+    """Length-prefixed big-endian fields for a fixed-width column."""
+    width = np.dtype(fmt).itemsize
+    rec = np.empty(len(values), dtype=[("len", ">i4"), ("val", fmt)])
+    rec["len"] = width
+    rec["val"] = values
+    raw = rec.tobytes()
+    step = 4 + width
+    fields = [raw[i : i + step] for i in range(0, len(raw), step)]
+    for i in np.flatnonzero(null):
+        fields[i] = PG_NULL
+    return fields
+
+
+def _binary_fields(s: pd.Series) -> List[bytes]:
+    """Encode one column as COPY BINARY fields, matching the type pandas gives it in SQL."""
+    null = s.isna().to_numpy()
+    kind = s.dtype.kind
+
+    if kind == "b":
+        values = s.to_numpy(dtype="int8", na_value=0)
+        return _fixed_width_fields(values, ">i1", null)
+    if kind in "iu":
+        fmt = ">i8" if s.dtype.itemsize == 8 else ">i4" if s.dtype.itemsize == 4 else ">i2"
+        values = s.to_numpy(dtype="int64", na_value=0)
+        return _fixed_width_fields(values, fmt, null)
+    if kind == "f":
+        fmt = ">f4" if s.dtype.itemsize == 4 else ">f8"
+        return _fixed_width_fields(s.to_numpy(dtype="float64", na_value=np.nan), fmt, null)
+    if kind == "M":
+        if getattr(s.dtype, "tz", None) is not None:
+            s = s.dt.tz_convert("UTC").dt.tz_localize(None)
+        micros = (s.to_numpy(dtype="datetime64[us]") - PG_EPOCH).astype("int64")
+        return _fixed_width_fields(micros, ">i8", null)
+
+    fields = []
+    for v, is_null in zip(s.astype(object).to_numpy(), null):
+        if is_null:
+            fields.append(PG_NULL)
+        else:
+            b = str(v).encode("utf-8")
+            fields.append(struct.pack(">i", len(b)) + b)
+    return fields
+
+
+def encode_binary(df: pd.DataFrame) -> bytes:
+    """Encode a DataFrame as COPY ... (FORMAT binary) payload."""
+    row_header = struct.pack(">h", df.shape[1])
+    columns = [_binary_fields(df[c]) for c in df.columns]
+    body = b"".join(row_header + b"".join(cells) for cells in zip(*columns))
+    return PGCOPY_HEADER + body + PGCOPY_TRAILER
+
+
+# ---------------------------------------------------------------------
+# 3) Staging load + atomic swap / upsert
+# ---------------------------------------------------------------------
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _execute(cur, stmt: PostSql, staging_sql: Optional[str] = None) -> None:
+    """Run a `post_sql` item, with `{staging}` replaced by `staging_sql` when given."""
+    sql, params = (stmt, None) if isinstance(stmt, str) else stmt
+    if staging_sql is not None:
+        sql = sql.replace("{staging}", staging_sql)
+    cur.execute(sql, params)
+
+
+def _copy_to_staging(
+    cur, frames: Iterable[pd.DataFrame], engine, schema: str, staging: str, fmt: str, stats: LoadStats
+) -> Optional[List[str]]:
+    """(Re)create `schema.staging` from the first batch and COPY all batches into it.
+
+    Returns the loaded column names, or None when `frames` was empty.
+    """
+    if fmt not in ("csv", "binary"):
+        raise ValueError(f"Unknown COPY format: {fmt}")
+    encode = encode_binary if fmt == "binary" else encode_csv
+    staging_sql = f"{_quote(schema)}.{_quote(staging)}"
+
+    columns = None
+    copy_sql = None
+    for df in frames:
+        if copy_sql is None:
+            cur.execute(f"DROP TABLE IF EXISTS {staging_sql}")
+            cur.execute(pd.io.sql.get_schema(df, staging, con=engine, schema=schema))
+            columns = list(df.columns)
+            cols = ", ".join(_quote(c) for c in columns)
+            copy_sql = f"COPY {staging_sql} ({cols}) FROM STDIN WITH (FORMAT {fmt})"
+        if df.empty:
+            continue
+        payload = encode(df)
+        cur.copy_expert(copy_sql, io.BytesIO(payload))
+        stats.rows += len(df)
+        stats.bytes += len(payload)
+        add_bytes(written=len(payload))
+    return columns
+
+
+@profiled("load.copy_frames")
+def copy_frames(
+    frames: Iterable[pd.DataFrame],
+    engine,
+    table: str,
+    schema: str = "public",
+    fmt: str = "csv",
+    post_sql: Sequence[PostSql] = (),
+) -> LoadStats:
+    """Replace `schema.table` with the rows of `frames` using COPY FROM STDIN.
+
+    Rows are copied batch by batch into a staging table created from the first
+    batch (same column types as `DataFrame.to_sql`). The staging table is
+    renamed over the target in the same transaction, so readers see either
+    the old or the complete new table. `post_sql` statements (SQL strings
+    or `(sql, params)` pairs) run in that transaction after the swap.
+    """
+    staging = f"{table}__staging"
+    target_sql = f"{_quote(schema)}.{_quote(table)}"
+    staging_sql = f"{_quote(schema)}.{_quote(staging)}"
+
+    stats = LoadStats()
+    start = time.perf_counter()
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        if _copy_to_staging(cur, frames, engine, schema, staging, fmt, stats) is None:
+            raise ValueError(f"No data to load into {schema}.{table}")
+
+        cur.execute(f"DROP TABLE IF EXISTS {target_sql}")
+        cur.execute(f"ALTER TABLE {staging_sql} RENAME TO {_quote(table)}")
+        for stmt in post_sql:
+            _execute(cur, stmt)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+@profiled("load.upsert_frames")
+def upsert_frames(
+    frames: Iterable[pd.DataFrame],
+    engine,
+    table: str,
+    key: str,
+    schema: str = "public",
+    fmt: str = "csv",
+    order_by: Optional[str] = None,
+    post_sql: Sequence[PostSql] = (),
+) -> LoadStats:
+    """Insert or replace the rows of `frames` in `schema.table`, matched on `key`.
+
+    Batches are COPYed into a delta table; existing rows with the same `key`
+    are deleted and the delta inserted in one transaction (no unique
+    constraint needed, so older duplicates are cleaned up as well). When the
+    delta itself repeats a key, the row with the highest `order_by` wins.
+    `post_sql` statements (SQL strings or `(sql, params)` pairs) run in the
+    same transaction; `{staging}` in them is replaced by the delta table name. The target is created from the
+    delta on first use.
+    """
+    staging = f"{table}__delta"
+    target_sql = f"{_quote(schema)}.{_quote(table)}"
+    staging_sql = f"{_quote(schema)}.{_quote(staging)}"
+
+    stats = LoadStats()
+    start = time.perf_counter()
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        columns = _copy_to_staging(cur, frames, engine, schema, staging, fmt, stats)
+        if columns is None:
+            conn.rollback()
+            return stats
+
+        key_sql = _quote(key)
+        cols = ", ".join(_quote(c) for c in columns)
+        order = f"{key_sql}, {_quote(order_by)} DESC NULLS LAST" if order_by else key_sql
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {target_sql} (LIKE {staging_sql})")
+        cur.execute(
+            f"CREATE INDEX IF NOT EXISTS {_quote(f'{table}_{key}_idx')} ON {target_sql} ({key_sql})"
+        )
+        cur.execute(
+            f"DELETE FROM {target_sql} t USING {staging_sql} s WHERE t.{key_sql} = s.{key_sql}"
+        )
+        cur.execute(
+            f"INSERT INTO {target_sql} ({cols}) "
+            f"SELECT DISTINCT ON ({key_sql}) {cols} FROM {staging_sql} ORDER BY {order}"
+        )
+        for stmt in post_sql:
+            _execute(cur, stmt, staging_sql)
+        cur.execute(f"DROP TABLE {staging_sql}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    stats.seconds = time.perf_counter() - start
+    return stats
@@ -0,0 +1,481 @@
+# etl/data_profile.py
+"""Column profile of a processed parquet dataset, cached per data version.
+
+The discovery and quality-check SQL (020_null_heatmap.sql,
+030_basic_statistics.sql, 01_quality_checks.sql, 03_outliers_check.sql)
+scans whole tables for null counts, min/max, mean, stddev and quartiles on
+every run. Here the same numbers come from the processed parquet output
+(etl/transform.py), computed in one streaming pass over the row batches of
+each file and kept as mergeable partial statistics per file:
+
+- rows and non-null count per column;
+- mean and sum of squared deviations (merged with Chan's formula), min, max;
+- the distinct values with their counts while a column has at most
+  MAX_EXACT_VALUES of them (rooms, floors, years, date parts: exact
+  quartiles), a t-digest (etl/quantile_sketch.py) beyond that (area, prices).
+
+Every run adds its own files, so a listing updated by a later run has a
+row in each of them. Like the loader, which upserts by listing_id, the
+profile counts only the latest version: the row of the latest run tag
+(then day partition, then row) of each listing_id. A cached table of
+(path, row, listing_id) of all files finds the superseded rows, and each
+file's partials cover its other rows only.
+
+The data version of a file is its size and ETag (mtime on local disks), the
+fingerprint of the dataset the hash of all of them. A profile read lists
+the dataset and, when the fingerprint matches the cached one, reads only
+the cached summary. Otherwise only new or rewritten files (new day
+partitions of an incremental run, a rerun of a run tag) are read, together
+with the older files some of whose rows they supersede; the stored
+partials of the other files are merged as they are.
+
+Numeric (and boolean) columns get every statistic, other columns only the
+null counts. Hive partition keys (year=/month=/day=) are profiled from the
+paths. Digest quartiles are estimates, see benchmarks/bench_quantiles.py.
+
+Usage:
+    python -m etl.data_profile --dataset housing
+    python -m etl.data_profile --dataset housing_800k.parquet --rebuild
+"""
+import json
+import hashlib
+import argparse
+from typing import Dict, Optional, Tuple
+
+import fsspec
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pandas.api.types import union_categoricals
+
+from etl import quantile_sketch
+from etl.profiling import add_bytes, profiled
+from etl.transform import PROC_BUCKET, STORAGE
+
+PROFILE_STATE = f"s3://{PROC_BUCKET}/_state/profile"
+QUARTILES = (0.25, 0.5, 0.75)
+BATCH_ROWS = 65_536
+# up to this many distinct values a column keeps exact value counts instead of a digest
+MAX_EXACT_VALUES = 2_048
+# hive partition value pyarrow writes for a null key
+HIVE_NULL = "__HIVE_DEFAULT_PARTITION__"
+ID_COL = "listing_id"
+
+PART_COLS = ["column", "rows", "n", "mean", "m2", "min", "max", "exact", "digest"]
+# `dropped`: hash of the superseded rows left out of a file's partials
+FILE_COLS = ["path", "version", "dropped", *PART_COLS]
+ID_COLS = ["path", "row", ID_COL]
+SUMMARY_COLS = ["rows", "nulls", "null_share", "min", "max", "mean", "std", "p25", "median", "p75"]
+
+
+# ---------------------------------------------------------------------
+# value counts / digests
+# ---------------------------------------------------------------------
+def _empty_part(column: str, rows: int, n: int) -> dict:
+    return {"column": column, "rows": rows, "n": n, "mean": np.nan, "m2": np.nan,
+            "min": np.nan, "max": np.nan, "exact": True, "digest": None}
+
+
+def _distinct(c: quantile_sketch.Centroids) -> quantile_sketch.Centroids:
+    """Centroids sorted by (group, mean), equal means of a group summed into one."""
+    order = np.lexsort((c.mean, c.group))
+    group, mean, weight = c.group[order], c.mean[order], c.weight[order]
+    new = np.r_[True, (group[1:] != group[:-1]) | (mean[1:] != mean[:-1])][: len(group)]
+    return quantile_sketch.Centroids(group[new], mean[new], np.bincount(np.cumsum(new) - 1, weight, int(new.sum())))
+
+
+def _merge_counts(c: quantile_sketch.Centroids, exact: np.ndarray) -> Tuple[quantile_sketch.Centroids, np.ndarray]:
+    """Merge value counts/digests per group; groups over MAX_EXACT_VALUES become digests.
+
+    `exact[g]` says whether every part of group g holds exact counts; it is
+    returned updated.
+    """
+    c = _distinct(c)
+    exact = exact & (np.bincount(c.group, minlength=len(exact)) <= MAX_EXACT_VALUES)
+    keep = exact[c.group]
+    if keep.all():
+        return c, exact
+    sketched = quantile_sketch.compress(quantile_sketch.Centroids(c.group[~keep], c.mean[~keep], c.weight[~keep]))
+    group = np.concatenate([c.group[keep], sketched.group])
+    order = np.argsort(group, kind="stable")
+    mean = np.concatenate([c.mean[keep], sketched.mean])
+    weight = np.concatenate([c.weight[keep], sketched.weight])
+    return quantile_sketch.Centroids(group[order], mean[order], weight[order]), exact
+
+
+def _count_quantiles(c: quantile_sketch.Centroids, qs, n_groups: int) -> np.ndarray:
+    """PERCENTILE_CONT of groups given as exact value counts, shape (n_groups, len(qs))."""
+    qs = np.asarray(qs, "float64")
+    out = np.full((n_groups, len(qs)), np.nan)
+    if not len(c.group):
+        return out
+    cum = np.cumsum(c.weight)
+    starts = quantile_sketch._group_starts(c.group)
+    before = (cum - c.weight)[starts][:, None]
+    n = np.add.reduceat(c.weight, starts)[:, None]
+    h = qs[None, :] * (n - 1)
+    lo = np.floor(h)
+    # value at rank r of a group: the first one whose cumulative count exceeds r
+    at_lo = c.mean[np.searchsorted(cum, before + lo, side="right")]
+    at_hi = c.mean[np.searchsorted(cum, before + np.minimum(lo + 1, n - 1), side="right")]
+    out[c.group[starts]] = at_lo + (h - lo) * (at_hi - at_lo)
+    return out
+
+
+# ---------------------------------------------------------------------
+# partial statistics
+# ---------------------------------------------------------------------
+def _is_numeric(t: pa.DataType) -> bool:
+    return pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_boolean(t)
+
+
+def batch_parts(batch: pa.RecordBatch) -> pd.DataFrame:
+    """Partial statistics (PART_COLS) of every column of one record batch."""
+    rows = batch.num_rows
+    out, groups, values, counts = [], [], [], []
+    for name, col in zip(batch.schema.names, batch.columns):
+        part = _empty_part(name, rows, rows - col.null_count)
+        if _is_numeric(col.type):
+            x = pc.cast(col, pa.float64()).to_numpy(zero_copy_only=False)
+            x = x[~np.isnan(x)]
+            if len(x):
+                mean = x.mean()
+                part.update(mean=mean, m2=float(((x - mean) ** 2).sum()), min=x.min(), max=x.max())
+                u, cnt = np.unique(x, return_counts=True)
+                groups.append(np.full(len(u), len(out), "int64"))
+                values.append(u)
+                counts.append(cnt.astype("float64"))
+        out.append(part)
+    df = pd.DataFrame(out, columns=PART_COLS)
+    if values:
+        # value counts of all numeric columns at once; the long-tailed ones are compressed
+        c = quantile_sketch.Centroids(np.concatenate(groups), np.concatenate(values), np.concatenate(counts))
+        c, exact = _merge_counts(c, np.ones(len(df), bool))
+        df["exact"] = exact
+        df["digest"] = quantile_sketch.to_strings(c, len(df))
+    return df
+
+
+def partition_parts(path: str, rows: int) -> pd.DataFrame:
+    """Partial statistics of the hive partition keys in `path` (constant within the file)."""
+    out = []
+    for segment in path.split("/")[:-1]:
+        key, sep, raw = segment.partition("=")
+        if not sep:
+            continue
+        try:
+            value = float(raw) if raw != HIVE_NULL else None
+        except ValueError:
+            out.append(_empty_part(key, rows, rows))  # a string key: present, not numeric
+            continue
+        part = _empty_part(key, rows, 0)
+        if value is not None and rows:
+            single = quantile_sketch.Centroids(np.zeros(1, "int64"), np.array([value]), np.array([float(rows)]))
+            digest = quantile_sketch.to_strings(single, 1)[0]
+            part.update(n=rows, mean=value, m2=0.0, min=value, max=value, digest=digest)
+        out.append(part)
+    return pd.DataFrame(out, columns=PART_COLS)
+
+
+def combine(parts: pd.DataFrame) -> pd.DataFrame:
+    """Merge partial statistics (PART_COLS) per column, in order of first appearance."""
+    codes, columns = pd.factorize(parts["column"])
+    k = len(columns)
+    n = parts["n"].to_numpy("float64")
+    mean = parts["mean"].to_numpy("float64")
+    m2 = parts["m2"].to_numpy("float64")
+    has = ~np.isnan(mean)
+    w = np.where(has, n, 0.0)
+
+    n_num = np.bincount(codes, w, k)
+    total_mean = np.full(k, np.nan)
+    np.divide(np.bincount(codes, w * np.nan_to_num(mean), k), n_num, out=total_mean, where=n_num > 0)
+    dev = np.where(has, mean - total_mean[codes], 0.0)
+    total_m2 = np.bincount(codes, np.where(has, m2 + n * dev ** 2, 0.0), k)
+
+    grouped = parts.groupby(codes, sort=True)
+    digests = quantile_sketch.from_strings(parts["digest"].tolist())
+    merged, exact = _merge_counts(
+        quantile_sketch.Centroids(codes[digests.group], digests.mean, digests.weight),
+        grouped["exact"].all().to_numpy(bool),
+    )
+    return pd.DataFrame({
+        "column": columns,
+        "rows": grouped["rows"].sum().to_numpy("int64"),
+        "n": grouped["n"].sum().to_numpy("int64"),
+        "mean": total_mean,
+        "m2": np.where(n_num > 0, total_m2, np.nan),
+        "min": grouped["min"].min().to_numpy("float64"),
+        "max": grouped["max"].max().to_numpy("float64"),
+        "exact": exact,
+        "digest": quantile_sketch.to_strings(merged, k),
+    })
+
+
+@profiled("profile.file")
+def profile_file(fs, path: str, drop: Optional[np.ndarray] = None) -> pd.DataFrame:
+    """Partial statistics (PART_COLS) of one parquet file, read batch by batch.
+
+    `drop` lists the (sorted) row numbers to leave out.
+    """
+    drop = np.empty(0, "int64") if drop is None else drop
+    batches = []
+    rows = start = 0
+    with fs.open(path, "rb") as f:
+        pf = pq.ParquetFile(f)
+        for batch in pf.iter_batches(batch_size=BATCH_ROWS):
+            n = batch.num_rows
+            a, b = np.searchsorted(drop, [start, start + n])
+            if a < b:
+                keep = np.ones(n, bool)
+                keep[drop[a:b] - start] = False
+                batch = batch.filter(pa.array(keep))
+            start += n
+            rows += batch.num_rows
+            batches.append(batch_parts(batch))
+        add_bytes(read=f.size)
+        if not batches:
+            # no rows: the columns are known from the schema only
+            batches.append(batch_parts(pa.RecordBatch.from_pylist([], schema=pf.schema_arrow)))
+    return combine(pd.concat([*batches, partition_parts(path, rows)], ignore_index=True))
+
+
+# ---------------------------------------------------------------------
+# latest version of each listing
+# ---------------------------------------------------------------------
+def _order(path: str) -> tuple:
+    """Sort key of a file among the versions of a listing: run tag, then day partition.
+
+    write_processed_partitions names the files `<run_tag>-<i>.parquet`; run
+    tags (housing_YYYYMMDD) sort in run order.
+    """
+    *dirs, name = path.split("/")
+    days = []
+    for segment in dirs:
+        key, sep, raw = segment.partition("=")
+        if sep:
+            try:
+                days.append(float(raw))
+            except ValueError:
+                days.append(-np.inf)  # null or string key
+    return name.rsplit("-", 1)[0], tuple(days)
+
+
+def _ids(path: Optional[str] = None, ids: Optional[np.ndarray] = None) -> pd.DataFrame:
+    if path is None:
+        return pd.DataFrame({"path": pd.Categorical([]), "row": np.empty(0, "int64"), ID_COL: np.empty(0, "int64")})
+    paths = pd.Categorical.from_codes(np.zeros(len(ids), "int8"), [path])
+    return pd.DataFrame({"path": paths, "row": np.arange(len(ids), dtype="int64"), ID_COL: ids})
+
+
+def read_ids(fs, path: str) -> pd.DataFrame:
+    """(path, row, listing_id) of every row of one parquet file; none without a listing_id column."""
+    with fs.open(path, "rb") as f:
+        pf = pq.ParquetFile(f)
+        if ID_COL not in pf.schema_arrow.names:
+            return _ids()
+        add_bytes(read=f.size)
+        return _ids(path, pf.read(columns=[ID_COL]).column(0).to_numpy(zero_copy_only=False).astype("int64"))
+
+
+def superseded(ids: pd.DataFrame) -> pd.DataFrame:
+    """Rows of `ids` (ID_COLS) whose listing_id has a later version, by `_order` of the path, then row."""
+    if ids.empty:
+        return ids
+    paths = ids["path"].cat.categories
+    rank = np.empty(len(paths), "int64")
+    rank[sorted(range(len(paths)), key=lambda i: _order(paths[i]))] = np.arange(len(paths))
+    key = ids[ID_COL].to_numpy("int64")
+    order = np.lexsort((ids["row"].to_numpy("int64"), rank[ids["path"].cat.codes.to_numpy()], key))
+    later = np.r_[key[order][1:] == key[order][:-1], False]
+    return ids.iloc[np.sort(order[later])]
+
+
+def _dropped_hash(rows: np.ndarray) -> str:
+    return hashlib.sha1(np.ascontiguousarray(rows, "int64").tobytes()).hexdigest() if len(rows) else ""
+
+
+# ---------------------------------------------------------------------
+# summary
+# ---------------------------------------------------------------------
+def summary(files: pd.DataFrame) -> pd.DataFrame:
+    """Profile per column (SUMMARY_COLS) of the per-file partials `files` (FILE_COLS).
+
+    A column missing from some files (added later) counts as null in them.
+    """
+    if files.empty:
+        return pd.DataFrame(columns=SUMMARY_COLS, index=pd.Index([], name="column"))
+    rows = int(files.drop_duplicates("path")["rows"].sum())
+    total = combine(files[PART_COLS])
+    k = len(total)
+    n = total["n"].to_numpy("float64")
+    digests = quantile_sketch.from_strings(total["digest"].tolist())
+    quartiles = np.where(
+        total["exact"].to_numpy(bool)[:, None],
+        _count_quantiles(digests, QUARTILES, k),
+        quantile_sketch.quantiles(
+            digests, QUARTILES, k, total["min"].to_numpy("float64"), total["max"].to_numpy("float64")
+        ),
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        std = np.sqrt(total["m2"].to_numpy("float64") / (n - 1))
+    std[n < 2] = np.nan
+    out = pd.DataFrame({
+        "rows": rows,
+        "nulls": (rows - n).astype("int64"),
+        "null_share": (rows - n) / rows,
+        "min": total["min"].to_numpy("float64"),
+        "max": total["max"].to_numpy("float64"),
+        "mean": total["mean"].to_numpy("float64"),
+        "std": std,
+        "p25": quartiles[:, 0],
+        "median": quartiles[:, 1],
+        "p75": quartiles[:, 2],
+    }, index=pd.Index(total["column"], name="column"))
+    return out[SUMMARY_COLS]
+
+
+# ---------------------------------------------------------------------
+# data version and cache
+# ---------------------------------------------------------------------
+def _version(info: dict) -> str:
+    """Size and ETag (S3) or mtime (local) of a file: changes when the file is rewritten."""
+    tag = str(info.get("ETag") or info.get("mtime") or "").strip('"')
+    return f"{info['size']}-{tag}"
+
+
+def list_files(fs, dataset: str) -> Dict[str, str]:
+    """path -> version of every parquet file of the dataset."""
+    root = f"{PROC_BUCKET}/{dataset}"
+    fs.invalidate_cache(root)
+    found = fs.find(root, detail=True) if fs.exists(root) else {}
+    return {
+        path: _version(info)
+        for path, info in sorted(found.items())
+        if path.endswith(".parquet") and info.get("type", "file") == "file"
+    }
+
+
+def fingerprint(versions: Dict[str, str]) -> str:
+    """Data version of the whole dataset: changes when any file is added, removed or rewritten."""
+    h = hashlib.sha1()
+    for path, version in sorted(versions.items()):
+        h.update(f"{path}\t{version}\n".encode())
+    return h.hexdigest()
+
+
+def _cache_uris(dataset: str) -> Tuple[str, str, str]:
+    """Cached summary (JSON, read on every hit), per-file partials and row ids (parquet, read on a miss)."""
+    name = dataset.strip("/").replace("/", "__")
+    return f"{PROFILE_STATE}/{name}.json", f"{PROFILE_STATE}/{name}.files.parquet", f"{PROFILE_STATE}/{name}.ids.parquet"
+
+
+def _read_summary(fs, uri: str) -> Optional[dict]:
+    if not fs.exists(uri):
+        return None
+    with fs.open(uri, "r") as f:
+        return json.load(f)
+
+
+def _read_files(fs, uri: str, ids_uri: str) -> pd.DataFrame:
+    # partials cached before the row ids were kept cover superseded rows too: read again
+    if not fs.exists(uri) or not fs.exists(ids_uri):
+        return pd.DataFrame(columns=FILE_COLS)
+    with fs.open(uri, "rb") as f:
+        files = pq.read_table(f).to_pandas()
+    return files if "dropped" in files else pd.DataFrame(columns=FILE_COLS)
+
+
+def _read_ids(fs, uri: str) -> pd.DataFrame:
+    if not fs.exists(uri):
+        return _ids()
+    with fs.open(uri, "rb") as f:
+        return pq.read_table(f, read_dictionary=["path"]).to_pandas()
+
+
+def _from_summary(doc: dict) -> pd.DataFrame:
+    profile = pd.DataFrame(doc["profile"], columns=["column", *SUMMARY_COLS])
+    dtypes = {"rows": "int64", "nulls": "int64", **{c: "float64" for c in SUMMARY_COLS[2:]}}
+    return profile.astype(dtypes).set_index("column")
+
+
+def _write(
+    fs, uris: Tuple[str, str, str], fp: str, files: pd.DataFrame, ids: pd.DataFrame, profile: pd.DataFrame
+) -> None:
+    summary_uri, files_uri, ids_uri = uris
+    # ids first: partials without their ids are never taken as done, ids without partials are dropped
+    with fs.open(ids_uri, "wb") as f:
+        pq.write_table(pa.Table.from_pandas(ids[ID_COLS], preserve_index=False), f, compression="zstd")
+    table = pa.Table.from_pandas(files[FILE_COLS].astype({"digest": "object"}), preserve_index=False)
+    with fs.open(files_uri, "wb") as f:
+        pq.write_table(table, f, compression="zstd")
+    # json's float repr round-trips exactly (DataFrame.to_json keeps 15 digits); NaN becomes null
+    frame = profile.reset_index()
+    records = frame.astype(object).where(frame.notna(), None).to_dict("records")
+    with fs.open(summary_uri, "w") as f:
+        json.dump({"fingerprint": fp, "files": len(set(files["path"])), "profile": records}, f)
+
+
+@profiled("profile.dataset")
+def profile_dataset(dataset: str, rebuild: bool = False) -> pd.DataFrame:
+    """Column profile of processed/<dataset>, read from the cache while the data version is unchanged.
+
+    Files added or rewritten since the cached version, and files with rows
+    they supersede, are profiled and merged with the stored partials of the
+    others; `rebuild` reads every file again.
+    """
+    fs = fsspec.filesystem("s3", **STORAGE)
+    uris = _cache_uris(dataset)
+    summary_uri, files_uri, ids_uri = uris
+    versions = list_files(fs, dataset)
+    fp = fingerprint(versions)
+
+    if not rebuild:
+        cached = _read_summary(fs, summary_uri)
+        if cached and cached["fingerprint"] == fp:
+            return _from_summary(cached)
+
+    stored = pd.DataFrame(columns=FILE_COLS) if rebuild else _read_files(fs, files_uri, ids_uri)
+    stored = stored[(stored["path"].map(versions) == stored["version"]).to_numpy(bool)]
+    # row ids of files read before are kept, new and rewritten files are read for theirs
+    profiled_before = set(stored["path"])
+    ids = _read_ids(fs, ids_uri)
+    ids = ids[ids["path"].isin(profiled_before).to_numpy(bool)]
+    parts = [ids, *(read_ids(fs, path) for path in versions if path not in profiled_before)]
+    ids = pd.concat([p.drop(columns="path") for p in parts], ignore_index=True)
+    ids["path"] = union_categoricals([p["path"] for p in parts]).remove_unused_categories()
+
+    # a file whose superseded rows changed (a later run updated some of its listings) is read again
+    drops = superseded(ids).groupby("path", observed=True)["row"]
+    dropped = {path: np.sort(rows.to_numpy("int64")) for path, rows in drops}
+    no_rows = np.empty(0, "int64")
+    dropped_hash = {path: _dropped_hash(dropped.get(path, no_rows)) for path in versions}
+    stored = stored[(stored["dropped"] == stored["path"].map(dropped_hash)).to_numpy(bool)]
+    done = set(stored["path"])
+    frames = [stored] if len(stored) else []
+    for path, version in versions.items():
+        if path not in done:
+            part = profile_file(fs, path, dropped.get(path, no_rows))
+            frames.append(part.assign(path=path, version=version, dropped=dropped_hash[path])[FILE_COLS])
+    print(f" Profile {dataset}: {len(versions) - len(done)} of {len(versions)} files read, "
+          f"{sum(map(len, dropped.values())):,} superseded rows left out")
+    files = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=FILE_COLS)
+
+    profile = summary(files)
+    _write(fs, uris, fp, files, ids, profile)
+    return profile
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Column profile of a processed parquet dataset (cached per data version).")
+    ap.add_argument("--dataset", default="housing", help="dataset directory in bucket 'processed'")
+    ap.add_argument("--rebuild", action="store_true", help="ignore the cached partials and read every file")
+    args = ap.parse_args()
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.float_format", "{:,.3f}".format):
+        print(profile_dataset(args.dataset, args.rebuild))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+# etl/dedup.py
+from dataclasses import dataclass
+from typing import List, Optional
+
+import fsspec
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from etl.profiling import profiled
+
+
+ID_COL = "listing_id"
+DATE_COL = "date"
+
+# A near-duplicate is the same flat listed again under another listing_id:
+# same place, building, area, distance and price. The rounding is the precision
+# listings are published with, so it only absorbs float32/float64 noise; coarser
+# buckets merged different flats of one building.
+NEAR_COLS = [
+    "city", "district", "postal_code", "rooms", "floor", "total_floors",
+    "year_built", "area_sqm", "distance_center_km", "price_total",
+]
+NEAR_ROUNDING = {"area_sqm": 0.1, "distance_center_km": 0.01, "price_total": 1.0}
+
+
+def duplicates_uri(uri: str) -> str:
+    """Where `DedupIndex.save(uri)` keeps the dropped near duplicates (next to the index)."""
+    return uri[: -len(".parquet")] + ".duplicates.parquet" if uri.endswith(".parquet") else uri + ".duplicates"
+
+
+def _normalized(df: pd.DataFrame, cols: List[str], rounding: Optional[dict] = None) -> pd.DataFrame:
+    """`cols` of `df` in one representation per kind, so the hashes do not depend on dtypes.
+
+    Numbers become float64 (float32 raw vs float64 processed), the date
+    becomes nanoseconds (raw string vs parsed datetime), strings and
+    categoricals are hashed by value anyway.
+    """
+    out = {}
+    for c in cols:
+        s = df[c]
+        if c == DATE_COL:
+            if not pd.api.types.is_datetime64_any_dtype(s.dtype):
+                codes, uniques = pd.factorize(s)
+                parsed = pd.to_datetime(uniques, errors="coerce").to_numpy("datetime64[ns]")
+                s = np.append(parsed, np.datetime64("NaT", "ns"))[codes]
+            out[c] = np.asarray(s, "datetime64[ns]").view("int64")
+        elif pd.api.types.is_numeric_dtype(s.dtype) or pd.api.types.is_bool_dtype(s.dtype):
+            values = s.to_numpy("float64", na_value=np.nan)
+            step = (rounding or {}).get(c)
+            out[c] = np.round(values / step) * step if step else values
+        else:
+            out[c] = s
+    return pd.DataFrame(out, index=df.index)
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """64-bit hash of every column of each row: equal for a row sent again unchanged."""
+    cols = [ID_COL] + [c for c in df.columns if c != ID_COL]
+    return pd.util.hash_pandas_object(_normalized(df, cols), index=False).to_numpy()
+
+
+def near_hashes(df: pd.DataFrame) -> np.ndarray:
+    """64-bit hash of NEAR_COLS after NEAR_ROUNDING: equal for the same flat under another id."""
+    cols = [c for c in NEAR_COLS if c in df.columns]
+    return pd.util.hash_pandas_object(_normalized(df, cols, NEAR_ROUNDING), index=False).to_numpy()
+
+
+def _lookup(sorted_keys: np.ndarray, keys: np.ndarray):
+    """(found, position) of each of `keys` in the sorted array `sorted_keys`."""
+    if not len(sorted_keys):
+        return np.zeros(len(keys), bool), np.zeros(len(keys), "int64")
+    pos = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return sorted_keys[pos] == keys, pos
+
+
+@dataclass
+class DedupStats:
+    rows: int = 0
+    exact: int = 0
+    near: int = 0
+
+    @property
+    def kept(self) -> int:
+        return self.rows - self.exact - self.near
+
+    def __str__(self) -> str:
+        return f"{self.rows:,} rows: {self.exact:,} exact and {self.near:,} near duplicates dropped"
+
+
+class DedupIndex:
+    """Hashes of every listing row the pipeline has let through, kept between runs.
+
+    `row_hash` (listing_id + all columns) finds rows sent again unchanged,
+    `near_hash` (NEAR_COLS, rounded) finds the same flat under another
+    listing_id. A batch is checked by binary search in sorted hash arrays,
+    so the check grows with the batch, not with the history; the state is
+    two hashes, the id and the run tag per row, read and written whole once
+    per run. Each entry records the run that added it: a rerun of the same
+    run tag first forgets its own entries, so retries do not drop their
+    rows as duplicates.
+
+    `duplicates` lists the listing_ids dropped as near duplicates and the
+    listing they duplicate. The gold layer is built from bronze.housing_raw,
+    not from the processed rows, so it excludes these ids itself
+    (silver.near_duplicates, loaded by etl/load.py).
+    """
+
+    COLUMNS = ["listing_id", "row_hash", "near_hash", "run_tag"]
+    DUPLICATE_COLUMNS = ["listing_id", "duplicate_of", "run_tag"]
+
+    def __init__(self, entries: Optional[pd.DataFrame] = None, duplicates: Optional[pd.DataFrame] = None):
+        if entries is None:
+            entries = pd.DataFrame({
+                "listing_id": np.empty(0, "int64"),
+                "row_hash": np.empty(0, "uint64"),
+                "near_hash": np.empty(0, "uint64"),
+                "run_tag": pd.Series([], dtype="string"),
+            })
+        if duplicates is None:
+            duplicates = pd.DataFrame({
+                "listing_id": np.empty(0, "int64"),
+                "duplicate_of": np.empty(0, "int64"),
+                "run_tag": pd.Series([], dtype="string"),
+            })
+        self._build(entries)
+        self._duplicates = [duplicates]
+
+    def _build(self, entries: pd.DataFrame) -> None:
+        self._parts = [entries]
+        order = np.argsort(entries["near_hash"].to_numpy(), kind="stable")
+        self._near = entries["near_hash"].to_numpy()[order]
+        self._owner = entries["listing_id"].to_numpy("int64")[order]
+        self._rows = np.sort(entries["row_hash"].to_numpy())
+
+    @property
+    def entries(self) -> pd.DataFrame:
+        if len(self._parts) > 1:
+            self._parts = [pd.concat(self._parts, ignore_index=True)]
+        return self._parts[0]
+
+    @property
+    def duplicates(self) -> pd.DataFrame:
+        """(listing_id, duplicate_of, run_tag) of the near duplicates dropped so far, one row per listing_id."""
+        if len(self._duplicates) > 1:
+            dup = pd.concat(self._duplicates, ignore_index=True)
+            self._duplicates = [dup.drop_duplicates(ID_COL, keep="last").reset_index(drop=True)]
+        return self._duplicates[0]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _add(self, added: pd.DataFrame) -> None:
+        # merged into the sorted arrays: no re-sort of the whole index per batch
+        rows = np.sort(added["row_hash"].to_numpy())
+        self._rows = np.insert(self._rows, np.searchsorted(self._rows, rows), rows)
+        order = np.argsort(added["near_hash"].to_numpy(), kind="stable")
+        near = added["near_hash"].to_numpy()[order]
+        at = np.searchsorted(self._near, near, side="right")
+        self._near = np.insert(self._near, at, near)
+        self._owner = np.insert(self._owner, at, added["listing_id"].to_numpy("int64")[order])
+        self._parts.append(added)
+
+    def forget(self, run_tag: str) -> "DedupIndex":
+        """Drop the entries and duplicates added by `run_tag` (before that run is repeated)."""
+        entries = self.entries
+        mine = (entries["run_tag"] == run_tag).to_numpy()
+        if mine.any():
+            self._build(entries[~mine].reset_index(drop=True))
+        dup = self.duplicates
+        self._duplicates = [dup[(dup["run_tag"] != run_tag).to_numpy()].reset_index(drop=True)]
+        return self
+
+    # -----------------------------------------------------------------
+    # check / update
+    # -----------------------------------------------------------------
+    @profiled("transform.dedup")
+    def drop_duplicates(self, df: pd.DataFrame, run_tag: str = "", stats: Optional[DedupStats] = None) -> pd.DataFrame:
+        """Rows of `df` that are neither exact nor near duplicates; they are added to the index.
+
+        Exact: the same row (same listing_id and values) was seen before, in
+        the index or earlier in `df`. Near: the rounded NEAR_COLS belong to
+        another listing_id seen before. A new version of an already seen
+        listing_id is kept; the loader replaces the old one. Near
+        duplicates are recorded in `duplicates`.
+        """
+        stats = stats if stats is not None else DedupStats()
+        stats.rows += len(df)
+        if df.empty:
+            return df
+        rows, near = row_hashes(df), near_hashes(df)
+        ids = df[ID_COL].to_numpy("int64")
+
+        seen, _ = _lookup(self._rows, rows)
+        exact = seen | pd.Series(rows).duplicated().to_numpy()
+
+        # owner of each near key: the indexed listing, else the first one in this batch
+        found, pos = _lookup(self._near, near)
+        first_in_batch = pd.Series(ids).groupby(near).transform("first").to_numpy()
+        owner = np.where(found, self._owner[pos] if len(self._owner) else 0, first_in_batch)
+        near_dup = ~exact & (owner != ids)
+
+        keep = ~(exact | near_dup)
+        stats.exact += int(exact.sum())
+        stats.near += int(near_dup.sum())
+        added = pd.DataFrame({
+            "listing_id": ids[keep],
+            "row_hash": rows[keep],
+            "near_hash": near[keep],
+            "run_tag": pd.Series(run_tag, index=range(int(keep.sum())), dtype="string"),
+        })
+        self._add(added)
+        self._duplicates.append(pd.DataFrame({
+            "listing_id": ids[near_dup],
+            "duplicate_of": owner[near_dup].astype("int64"),
+            "run_tag": pd.Series(run_tag, index=range(int(near_dup.sum())), dtype="string"),
+        }))
+        # take, not a boolean mask: the result is a frame of its own, later steps write into it
+        return df if keep.all() else df.take(np.flatnonzero(keep))
+
+    # -----------------------------------------------------------------
+    # persistence
+    # -----------------------------------------------------------------
+    def save(self, uri: str, storage_options: Optional[dict] = None) -> str:
+        """Write the index as parquet to a local path or s3:// URI, the duplicates to `duplicates_uri(uri)`."""
+        entries = self.entries.sort_values("near_hash", kind="stable")
+        table = pa.Table.from_pandas(entries[self.COLUMNS], preserve_index=False)
+        with fsspec.open(uri, "wb", **(storage_options or {})) as f:
+            pq.write_table(table, f, use_dictionary=["run_tag"])
+        dup = pa.Table.from_pandas(self.duplicates[self.DUPLICATE_COLUMNS], preserve_index=False)
+        with fsspec.open(duplicates_uri(uri), "wb", **(storage_options or {})) as f:
+            pq.write_table(dup, f, use_dictionary=["run_tag"])
+        return uri
+
+    @classmethod
+    def load(cls, uri: str, storage_options: Optional[dict] = None) -> Optional["DedupIndex"]:
+        """Read an index saved by `save`; None if nothing has been saved yet."""
+        fs, path = fsspec.core.url_to_fs(uri, **(storage_options or {}))
+        if not fs.exists(path):
+            return None
+        with fs.open(path, "rb") as f:
+            entries = pq.read_table(f).to_pandas()
+        entries["run_tag"] = entries["run_tag"].astype("string")
+        return cls(entries, cls.load_duplicates(uri, storage_options))
+
+    @classmethod
+    def load_duplicates(cls, uri: str, storage_options: Optional[dict] = None) -> Optional[pd.DataFrame]:
+        """Only the near duplicates of an index saved at `uri` (small; no hash arrays are built)."""
+        fs, path = fsspec.core.url_to_fs(duplicates_uri(uri), **(storage_options or {}))
+        if not fs.exists(path):
+            return None
+        with fs.open(path, "rb") as f:
+            dup = pq.read_table(f).to_pandas()
+        dup["run_tag"] = dup["run_tag"].astype("string")
+        return dup
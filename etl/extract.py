@@ -1,8 +1,24 @@
 #etl extract.py
 
 import os
+import io
+import json
+import zlib
+import base64
+import hashlib
+import argparse
+from typing import Optional
+
+import boto3
+import fsspec
 import pandas as pd
+import pyarrow.csv as pacsv
+from boto3.s3.transfer import TransferConfig
 from pathlib import Path
+from sqlalchemy import create_engine
+
+from etl.schema import apply_schema, check_columns, read_csv_kwargs
+from etl.watermark import DeltaStats, filter_new_rows, has_row_hashes, read_row_hashes, read_watermark, stage_row_hashes
 
 STORAGE = {
     "key": os.getenv("MINIO_ROOT_USER", "admin"),
@@ -10,16 +26,239 @@ STORAGE = {
     "client_kwargs": {"endpoint_url": os.getenv("S3_ENDPOINT", "http://localhost:9000")},
 }
 
+PG_URL = (
+    f"postgresql+psycopg2://{os.getenv('PG_USER','postgres')}:"
+    f"{os.getenv('PG_PASSWORD','postgres')}@"
+    f"{os.getenv('PG_HOST','localhost')}:{os.getenv('PG_PORT','5432')}/"
+    f"{os.getenv('PG_DB','warehouse')}"
+)
+
+
+RAW_BUCKET = os.getenv("RAW_BUCKET", "raw")
+
+READ_BLOCK = 1024 * 1024
+SCHEMA_SAMPLE_BYTES = 1024 * 1024
+COMPRESSION_SUFFIX = {"gzip": ".gz", "zstd": ".zst"}
+
+
+class _UploadStream:
+    """Non-seekable reader over a local CSV that scans, compresses and hashes it on the fly.
+
+    While the upload pulls bytes through `read`, the raw bytes are scanned for
+    the row count and a schema sample, optionally compressed, and the bytes
+    actually sent are hashed - one pass over the file, no DataFrame.
+    """
+
+    def __init__(self, f, compression: Optional[str] = None):
+        self._f = f
+        self._out = bytearray()
+        self._eof = False
+        self._last_byte = b""
+        self.sample = bytearray()
+        self.newlines = 0
+        self.raw_bytes = 0
+        self.sent_bytes = 0
+        self.sha256 = hashlib.sha256()
+        if compression == "gzip":
+            self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        elif compression == "zstd":
+            import zstandard  # only needed for --compression zstd (requirements.txt)
+
+            self._compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        elif compression is None:
+            self._compressor = None
+        else:
+            raise ValueError(f"Unknown compression: {compression}")
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def _fill(self, size: int):
+        while not self._eof and (size < 0 or len(self._out) < size):
+            block = self._f.read(READ_BLOCK)
+            if not block:
+                self._eof = True
+                if self._compressor is not None:
+                    self._out += self._compressor.flush()
+                break
+            self.raw_bytes += len(block)
+            self.newlines += block.count(b"\n")
+            self._last_byte = block[-1:]
+            if len(self.sample) < SCHEMA_SAMPLE_BYTES:
+                self.sample += block[: SCHEMA_SAMPLE_BYTES - len(self.sample)]
+            self._out += self._compressor.compress(block) if self._compressor else block
+
+    def read(self, size: int = -1) -> bytes:
+        self._fill(size)
+        n = len(self._out) if size < 0 else min(size, len(self._out))
+        chunk = bytes(self._out[:n])
+        del self._out[:n]
+        self.sha256.update(chunk)
+        self.sent_bytes += len(chunk)
+        return chunk
+
+    @property
+    def rows(self) -> int:
+        """Data rows (header excluded), assuming no newlines inside quoted fields."""
+        lines = self.newlines + (1 if self._last_byte not in (b"", b"\n") else 0)
+        return max(lines - 1, 0)
+
+    def schema(self) -> dict:
+        """Column types inferred by pyarrow from the first SCHEMA_SAMPLE_BYTES of the file."""
+        sample = bytes(self.sample)
+        if self.raw_bytes > len(sample):
+            sample = sample[: sample.rfind(b"\n") + 1]
+        table = pacsv.read_csv(io.BytesIO(sample))
+        return {f.name: str(f.type) for f in table.schema}
+
 
-def upload_local_csv_to_raw(local_path: str, s3_key: str):
+def _s3_client():
+    return boto3.client(
+        "s3",
+        endpoint_url=STORAGE["client_kwargs"]["endpoint_url"],
+        aws_access_key_id=STORAGE["key"],
+        aws_secret_access_key=STORAGE["secret"],
+    )
+
+
+def upload_local_csv_to_raw(
+    local_path: str,
+    s3_key: str,
+    compression: Optional[str] = None,
+    part_size_mb: int = 16,
+    max_concurrency: int = 8,
+) -> dict:
+    """Stream a local CSV to the raw bucket byte for byte (optionally compressed).
+
+    Parts are uploaded in parallel with a server-verified SHA256 per part; the
+    object size (and the full SHA256 for single-part objects) is checked
+    afterwards. Row count, schema and checksum go to `<key>.manifest.json`
+    next to the object. A compressed upload gets the codec's suffix
+    (COMPRESSION_SUFFIX) on its key, which the transform reads the codec
+    from; `manifest["key"]` is the final key to pass on.
+    """
     local = Path(local_path)
     if not local.exists():
         raise FileNotFoundError(f"Local file not found: {local}")
+    # fail before uploading anything the transform could not read
+    check_columns(pd.read_csv(local, nrows=0).columns)
+
+    suffix = COMPRESSION_SUFFIX.get(compression, "")
+    if suffix and not s3_key.endswith(suffix):
+        s3_key += suffix
+
+    client = _s3_client()
+    config = TransferConfig(
+        multipart_threshold=part_size_mb * 1024 * 1024,
+        multipart_chunksize=part_size_mb * 1024 * 1024,
+        max_concurrency=max_concurrency,
+    )
+    with local.open("rb") as f:
+        stream = _UploadStream(f, compression)
+        client.upload_fileobj(
+            stream, RAW_BUCKET, s3_key, Config=config,
+            ExtraArgs={"ChecksumAlgorithm": "SHA256"},
+        )
+
+    digest = stream.sha256.digest()
+    head = client.head_object(Bucket=RAW_BUCKET, Key=s3_key, ChecksumMode="ENABLED")
+    if head["ContentLength"] != stream.sent_bytes:
+        raise IOError(
+            f"Upload size mismatch for s3://{RAW_BUCKET}/{s3_key}: "
+            f"sent {stream.sent_bytes}, stored {head['ContentLength']}"
+        )
+    # Multipart objects carry a checksum-of-part-checksums (parts are verified on
+    # upload); a single PUT carries the SHA256 of the whole object.
+    remote_sha = head.get("ChecksumSHA256")
+    single_part = stream.sent_bytes < config.multipart_threshold
+    if single_part and remote_sha and remote_sha != base64.b64encode(digest).decode():
+        raise IOError(f"Checksum mismatch for s3://{RAW_BUCKET}/{s3_key}")
+
+    manifest = {
+        "key": s3_key,
+        "rows": stream.rows,
+        "schema": stream.schema(),
+        "compression": compression,
+        "raw_bytes": stream.raw_bytes,
+        "uploaded_bytes": stream.sent_bytes,
+        "sha256": digest.hex(),
+    }
+    client.put_object(
+        Bucket=RAW_BUCKET,
+        Key=f"{s3_key}.manifest.json",
+        Body=json.dumps(manifest, indent=2).encode("utf-8"),
+    )
+    print(
+        f"Succesfully Uploaded {local} → s3://{RAW_BUCKET}/{s3_key}  "
+        f"(rows={stream.rows:,}, {stream.raw_bytes / 1e6:,.1f} MB → {stream.sent_bytes / 1e6:,.1f} MB)"
+    )
+    return manifest
+
+
+def extract_new_rows(
+    local_path: str, s3_key: str, chunksize: int = 200_000, engine=None, run_tag: Optional[str] = None
+) -> pd.DataFrame:
+    """New or changed rows of public.housing, uploaded as a raw delta CSV and returned.
+
+    Rows past the load watermark are new; rows before it are compared with
+    the row hashes stored by earlier loads, looked up per chunk (see
+    `filter_new_rows`). The hashes of the delta are staged under `run_tag`
+    (the key's file name by default), and the load of that run tag commits
+    them. The delta CSV stays the raw checkpoint of the run; the returned
+    frame (housing dtypes, as `read_raw_csv` would parse it) lets the
+    transform continue in memory instead of reading it back.
+    """
+    local = Path(local_path)
+    if not local.exists():
+        raise FileNotFoundError(f"Local file not found: {local}")
+
+    engine = engine or create_engine(PG_URL)
+    wm = read_watermark(engine, "housing")
+    history = has_row_hashes(engine, "housing")
+    fs = fsspec.filesystem("s3", **STORAGE)
+    parts, hashes, stats = [], [], DeltaStats()
+    with fs.open(f"{RAW_BUCKET}/{s3_key}", "w") as f:
+        with pd.read_csv(local, chunksize=chunksize, **read_csv_kwargs()) as reader:
+            for i, chunk in enumerate(reader):
+                # stored hashes of this chunk's ids only, joined on the server
+                known = read_row_hashes(engine, chunk["listing_id"].to_numpy(), "housing") if history else None
+                new, h = filter_new_rows(chunk, wm, known, stats, "date", "listing_id")
+                new.to_csv(f, index=False, header=(i == 0))
+                parts.append(new)
+                hashes.append(h)
+    stage_row_hashes(engine, pd.concat(hashes, ignore_index=True), run_tag or Path(s3_key).stem, "housing")
+    # categories differ per chunk, so the concatenated columns are cast back
+    df = apply_schema(pd.concat(parts, ignore_index=True))
+    print(f"Succesfully Uploaded delta {local} → s3://{RAW_BUCKET}/{s3_key}  (rows={len(df):,}, watermark={wm})")
+    print(f" Delta: {stats}")
+    if stats.undated:
+        print(f"[WARN] {stats.undated:,} rows without a parseable date were compared by row hash only")
+    return df
+
+
+def upload_new_rows_to_raw(local_path: str, s3_key: str, chunksize: int = 200_000) -> int:
+    """Upload only rows past the load watermark of public.housing as a raw delta CSV."""
+    return len(extract_new_rows(local_path, s3_key, chunksize))
 
-    df = pd.read_csv(local)
-    s3_uri = f"s3://raw/{s3_key}"
-    df.to_csv(s3_uri, index=False, storage_options=STORAGE)
-    print(f"Succesfully Uploaded {local} → {s3_uri}  (rows={len(df):,})")
 
 if __name__ == "__main__":
-    upload_local_csv_to_raw("data/raw/housing_800k.csv", "housing_800k.csv")
\ No newline at end of file
+    ap = argparse.ArgumentParser(description="Upload local housing CSV to the raw bucket.")
+    ap.add_argument("--src", default="data/raw/housing_800k.csv")
+    ap.add_argument("--key", default="housing_800k.csv", help="key in bucket 'raw'")
+    ap.add_argument("--incremental", action="store_true", help="upload only rows past the watermark")
+    ap.add_argument("--compression", choices=["gzip", "zstd"], help="compress the upload on the fly")
+    ap.add_argument("--part-size-mb", type=int, default=16, help="multipart part size")
+    ap.add_argument("--max-concurrency", type=int, default=8, help="parallel part uploads")
+    args = ap.parse_args()
+
+    if args.incremental:
+        upload_new_rows_to_raw(args.src, args.key)
+    else:
+        manifest = upload_local_csv_to_raw(
+            args.src, args.key, args.compression, args.part_size_mb, args.max_concurrency
+        )
+        if manifest["key"] != args.key:
+            print(f"Compressed object key: {manifest['key']}  (transform.py --src {manifest['key']})")
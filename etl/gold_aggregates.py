@@ -0,0 +1,281 @@
+# etl/gold_aggregates.py
+"""Per-day and per-city price statistics of gold.housing_valid in one pass.
+
+gold.price_city_daily, the IQR fences of gold.outliers_iqr and
+gold.kpi_overview used to be three separate scans of gold.housing_valid,
+each sorting the whole table by city for PERCENTILE_CONT. Here one read of
+the rows feeds all three:
+
+- gold.price_sketches: one row per (day, city) with counts, sums and a
+  t-digest of price_sqm (etl/quantile_sketch.py). This is the stored state.
+- gold.price_city_daily: exact p25/median/p75 per (day, city), computed
+  from the same sorted values as the digests.
+- gold.city_price_stats: per city plus an 'ALL' row, with quartiles from
+  the merged day digests and sums for the KPI averages. 250 and 270 read it.
+
+gold.price_sketches_state keeps the largest listing_id already
+aggregated. A refresh re-aggregates completely every day that changed
+since the previous one: the days 210_gold_features.sql recorded in
+gold.price_days_changed (rows it inserted, updated, moved to another day
+or deleted as near duplicates) and the days that received listing_ids
+above the stored maximum (rows added to gold.housing_features by other
+means). The cities are then re-merged from the stored day digests
+without touching older rows. --full rebuilds everything.
+
+City quartiles are t-digest estimates (compression 200): rank error below
+1%, and about 0.05% relative error at city sizes. See
+benchmarks/bench_quantiles.py.
+"""
+import io
+import os
+import argparse
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from etl import quantile_sketch
+from etl.profiling import profiled
+
+SOURCE = "gold.housing_valid"
+SKETCH_TABLE = "gold.price_sketches"
+DAILY_TABLE = "gold.price_city_daily"
+CITY_TABLE = "gold.city_price_stats"
+STATE_TABLE = "gold.price_sketches_state"
+# days whose rows 210_gold_features.sql changed since the last refresh
+CHANGED_DAYS_TABLE = "gold.price_days_changed"
+ALL_CITIES = "ALL"
+QUARTILES = (0.25, 0.5, 0.75)
+
+PG_URL = (
+    f"postgresql+psycopg2://"
+    f"{os.getenv('PG_USER', 'postgres')}:"
+    f"{os.getenv('PG_PASSWORD', 'postgres')}@"
+    f"{os.getenv('PG_HOST', 'localhost')}:"
+    f"{os.getenv('PG_PORT', '5432')}/"
+    f"{os.getenv('PG_DB', 'warehouse')}"
+)
+
+SKETCH_DDL = f"""
+CREATE TABLE IF NOT EXISTS {SKETCH_TABLE} (
+    d               DATE,
+    city            TEXT,
+    n_listings      BIGINT NOT NULL,
+    price_min       DOUBLE PRECISION,
+    price_max       DOUBLE PRECISION,
+    base_year_sum   BIGINT NOT NULL,
+    base_year_n     BIGINT NOT NULL,
+    elevator_sum    BIGINT NOT NULL,
+    elevator_n      BIGINT NOT NULL,
+    digest          TEXT
+)
+"""
+
+# same columns as the former CREATE TABLE AS of 240_price_city_daily.sql
+DAILY_DDL = f"""
+CREATE TABLE IF NOT EXISTS {DAILY_TABLE} (
+    d           DATE,
+    city        TEXT,
+    median_sqm  DOUBLE PRECISION,
+    p25_sqm     DOUBLE PRECISION,
+    p75_sqm     DOUBLE PRECISION,
+    n_listings  BIGINT
+)
+"""
+
+CITY_DDL = f"""
+CREATE TABLE IF NOT EXISTS {CITY_TABLE} (
+    city            TEXT,
+    active_listings BIGINT NOT NULL,
+    q1_sqm          DOUBLE PRECISION,
+    median_sqm      DOUBLE PRECISION,
+    q3_sqm          DOUBLE PRECISION,
+    base_year_sum   BIGINT NOT NULL,
+    base_year_n     BIGINT NOT NULL,
+    elevator_sum    BIGINT NOT NULL,
+    elevator_n      BIGINT NOT NULL,
+    refreshed_at    TIMESTAMPTZ NOT NULL DEFAULT now()
+)
+"""
+
+STATE_DDL = f"""
+CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+    id              BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+    max_listing_id  BIGINT NOT NULL,
+    refreshed_at    TIMESTAMPTZ NOT NULL DEFAULT now()
+)
+"""
+
+CHANGED_DAYS_DDL = f"""
+CREATE TABLE IF NOT EXISTS {CHANGED_DAYS_TABLE} (
+    d   DATE
+)
+"""
+
+# base_year = current year - building_age: stays fixed when building_age is
+# moved on at the turn of the year, so the stored sums do not go stale
+ROWS_SQL = f"""
+SELECT listing_date AS d, city, price_sqm::float8 AS price_sqm,
+       extract(year FROM CURRENT_DATE)::int - building_age AS base_year,
+       has_elevator_int AS elevator
+FROM {SOURCE}
+"""
+
+SUM_COLS = ["base_year_sum", "base_year_n", "elevator_sum", "elevator_n"]
+DAILY_COLS = ["d", "city", "median_sqm", "p25_sqm", "p75_sqm", "n_listings"]
+SKETCH_COLS = ["d", "city", "n_listings", "price_min", "price_max", *SUM_COLS, "digest"]
+CITY_COLS = ["city", "active_listings", "q1_sqm", "median_sqm", "q3_sqm", *SUM_COLS]
+
+
+def aggregate_days(rows: pd.DataFrame, compression: float = quantile_sketch.COMPRESSION) -> pd.DataFrame:
+    """Counts, sums, exact quartiles and a digest of price_sqm per (d, city) of `rows`.
+
+    `rows` has the columns of ROWS_SQL. NULL days and cities form their own
+    groups like in GROUP BY; NULL prices are left out of the quartiles.
+    """
+    keys = rows.groupby(["d", "city"], dropna=False, sort=True)
+    out = keys.agg(
+        n_listings=("price_sqm", "size"),
+        price_min=("price_sqm", "min"),
+        price_max=("price_sqm", "max"),
+        base_year_sum=("base_year", "sum"),
+        base_year_n=("base_year", "count"),
+        elevator_sum=("elevator", "sum"),
+        elevator_n=("elevator", "count"),
+    ).reset_index()
+    out[SUM_COLS] = out[SUM_COLS].astype("int64")
+
+    n_groups = len(out)
+    values = quantile_sketch.sort_values(keys.ngroup().to_numpy(), rows["price_sqm"].to_numpy("float64"))
+    out[["p25_sqm", "median_sqm", "p75_sqm"]] = quantile_sketch.exact_quantiles(values, QUARTILES, n_groups)
+    out["digest"] = quantile_sketch.to_strings(quantile_sketch.compress(values, compression), n_groups)
+    return out
+
+
+def city_stats(days: pd.DataFrame, compression: float = quantile_sketch.COMPRESSION) -> pd.DataFrame:
+    """Per-city rows plus the ALL_CITIES row from the day rows of `aggregate_days`.
+
+    Quartiles come from merging the day digests of each city; the counts
+    and sums add up exactly.
+    """
+    codes, cities = pd.factorize(days["city"], use_na_sentinel=False)
+    n_cities = len(cities)
+    all_code = np.full(len(days), n_cities)
+
+    digests = quantile_sketch.from_strings(days["digest"].tolist())
+    merged = quantile_sketch.merge(
+        [
+            quantile_sketch.Centroids(codes[digests.group], digests.mean, digests.weight),
+            quantile_sketch.Centroids(all_code[digests.group], digests.mean, digests.weight),
+        ],
+        compression,
+    )
+    group = np.r_[codes, all_code]
+    mins = np.full(n_cities + 1, np.nan)
+    maxs = np.full(n_cities + 1, np.nan)
+    np.fmin.at(mins, group, np.r_[days["price_min"], days["price_min"]])
+    np.fmax.at(maxs, group, np.r_[days["price_max"], days["price_max"]])
+    qs = quantile_sketch.quantiles(merged, QUARTILES, n_cities + 1, mins, maxs)
+
+    sums = days.groupby(codes)[["n_listings", *SUM_COLS]].sum().reindex(range(n_cities), fill_value=0)
+    sums.loc[n_cities] = sums.sum()
+    out = pd.DataFrame({"city": [*cities, ALL_CITIES]})
+    out["active_listings"] = sums["n_listings"].to_numpy("int64")
+    out[["q1_sqm", "median_sqm", "q3_sqm"]] = qs
+    out[SUM_COLS] = sums[SUM_COLS].to_numpy("int64")
+    return out
+
+
+def _read(cur, sql: str) -> pd.DataFrame:
+    buf = io.StringIO()
+    cur.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)", buf)
+    buf.seek(0)
+    return pd.read_csv(buf, dtype={"d": str, "city": str, "digest": str})
+
+
+def _write(cur, df: pd.DataFrame, table: str) -> None:
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False)
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+
+
+@profiled("gold.aggregates")
+def refresh(engine, full: bool = False) -> Dict[str, Optional[str]]:
+    """Bring the three aggregate tables up to date with gold.housing_valid in one transaction."""
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        for ddl in (SKETCH_DDL, DAILY_DDL, CITY_DDL, STATE_DDL, CHANGED_DAYS_DDL):
+            cur.execute(ddl)
+        since = None
+        if not full:
+            cur.execute(f"SELECT max_listing_id FROM {STATE_TABLE}")
+            row = cur.fetchone()
+            since = row[0] if row else None
+        # taken first: listings committed during the refresh are picked up by the next one
+        cur.execute(f"SELECT max(listing_id) FROM {SOURCE}")
+        until = cur.fetchone()[0]
+
+        # consumed in this transaction: a failed refresh leaves them for the next one
+        cur.execute(f"DELETE FROM {CHANGED_DAYS_TABLE} RETURNING d::text")
+        changed = {d for (d,) in cur.fetchall()}
+        if since is None:
+            rows = _read(cur, ROWS_SQL)
+            cur.execute(f"TRUNCATE {SKETCH_TABLE}, {DAILY_TABLE}")
+        else:
+            # every day that got new, changed or removed listings is aggregated again from all its rows
+            cur.execute(
+                f"SELECT DISTINCT listing_date::text FROM {SOURCE} WHERE listing_id > %s AND listing_id <= %s",
+                (since, until if until is not None else since),
+            )
+            changed.update(d for (d,) in cur.fetchall())
+            conds = []
+            if any(d is not None for d in changed):
+                conds.append("d = ANY(%(days)s::date[])")
+            if None in changed:
+                conds.append("d IS NULL")
+            where = " OR ".join(conds) or "false"
+            params = {"days": [d for d in changed if d is not None]}
+            rows = _read(cur, cur.mogrify(f"SELECT * FROM ({ROWS_SQL}) r WHERE {where}", params).decode())
+            cur.execute(f"DELETE FROM {SKETCH_TABLE} WHERE {where}", params)
+            cur.execute(f"DELETE FROM {DAILY_TABLE} WHERE {where}", params)
+
+        days = aggregate_days(rows)
+        _write(cur, days[SKETCH_COLS], SKETCH_TABLE)
+        _write(cur, days[DAILY_COLS], DAILY_TABLE)
+
+        # ordered, so the merged city digests do not depend on where the day rows sit in the table
+        state = _read(cur, f"SELECT city, n_listings, price_min, price_max, {', '.join(SUM_COLS)}, digest FROM {SKETCH_TABLE} ORDER BY d, city")
+        cities = city_stats(state)
+        cur.execute(f"TRUNCATE {CITY_TABLE}")
+        _write(cur, cities[CITY_COLS], CITY_TABLE)
+        if until is not None:
+            cur.execute(
+                f"INSERT INTO {STATE_TABLE} (max_listing_id) VALUES (%s) ON CONFLICT (id) "
+                "DO UPDATE SET max_listing_id = excluded.max_listing_id, refreshed_at = now()",
+                (until,),
+            )
+        for table in (SKETCH_TABLE, DAILY_TABLE, CITY_TABLE):
+            cur.execute(f"ANALYZE {table}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return {"since": since, "rows": len(rows), "days": len(days), "cities": len(cities) - 1}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Refresh the per-day and per-city price aggregates of the gold layer.")
+    ap.add_argument("--full", action="store_true", help="rebuild from all of gold.housing_valid")
+    args = ap.parse_args()
+
+    from sqlalchemy import create_engine
+
+    print(refresh(create_engine(PG_URL), full=args.full))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# etl/imputer.py
+import json
+from typing import Dict, List, Optional
+
+import fsspec
+import numpy as np
+import pandas as pd
+
+from etl.profiling import profiled
+
+
+NUMERIC_DTYPES = ["number"]
+
+
+def _writes_through_views() -> bool:
+    """Whether writing into `df[c].to_numpy()` changes `df`: not under copy-on-write (pandas 3 default)."""
+    return int(pd.__version__.split(".")[0]) < 3 and pd.options.mode.copy_on_write is False
+
+
+class HousingImputer:
+    """Fit/apply imputation: numeric columns → median, binary columns → 1.
+
+    `fit` computes the medians of all numeric columns in one vectorized NumPy
+    pass; `transform` returns a filled copy, or with `inplace=True`
+    overwrites the NaNs of float columns where they are instead of
+    reassigning a filled copy of every column (without copy-on-write; with
+    it, the filled column is assigned). The learned values can be
+    saved and reused by later (incremental or streaming) runs instead of
+    being recomputed on each batch.
+    """
+
+    def __init__(
+        self,
+        medians: Optional[Dict[str, float]] = None,
+        binary_cols: Optional[List[str]] = None,
+        binary_fill: int = 1,
+    ):
+        self.medians = dict(medians or {})
+        self.binary_cols = list(binary_cols or [])
+        self.binary_fill = binary_fill
+
+    # -----------------------------------------------------------------
+    # fit / transform
+    # -----------------------------------------------------------------
+    @profiled("transform.imputer_fit")
+    def fit(self, df: pd.DataFrame) -> "HousingImputer":
+        """Learn the median of every numeric column of `df`."""
+        num_cols = df.select_dtypes(include=NUMERIC_DTYPES).columns
+        if len(num_cols):
+            values = df[num_cols].to_numpy(dtype="float64")
+            with np.errstate(all="ignore"):
+                medians = np.nanmedian(values, axis=0)
+            self.medians = dict(zip(num_cols, medians.tolist()))
+        return self
+
+    @profiled("transform.impute")
+    def transform(self, df: pd.DataFrame, inplace: bool = False) -> pd.DataFrame:
+        """`df` with its NaNs filled by the learned values.
+
+        Numeric columns get their median first; binary columns that are still
+        missing values afterwards (non-numeric ones) get `binary_fill` and are
+        cast to int. `df` is left as it is and a filled copy returned, unless
+        `inplace`: then `df` itself is filled and returned.
+        """
+        na = df.isna().any()
+        fills = {c: m for c, m in self.medians.items() if c in na.index and na[c]}
+        if not inplace:
+            df = df.fillna(fills)
+        else:
+            writes_through = _writes_through_views()
+            for c, m in fills.items():
+                values = df[c].to_numpy()
+                if writes_through and values.dtype.kind == "f" and values.flags.writeable:
+                    # float block view: overwrite the NaNs where they are, no column copy
+                    np.copyto(values, m, where=np.isnan(values))
+                else:
+                    df[c] = df[c].fillna(m)
+
+        binary = [c for c in self.binary_cols if c in na.index and na[c] and c not in fills]
+        if binary:
+            df.fillna({c: self.binary_fill for c in binary}, inplace=True)
+            df[binary] = df[binary].astype(int)
+        return df
+
+    def fit_transform(self, df: pd.DataFrame, inplace: bool = False) -> pd.DataFrame:
+        return self.fit(df).transform(df, inplace)
+
+    # -----------------------------------------------------------------
+    # persistence
+    # -----------------------------------------------------------------
+    def to_dict(self) -> dict:
+        return {
+            "medians": {c: (None if np.isnan(m) else m) for c, m in self.medians.items()},
+            "binary_cols": self.binary_cols,
+            "binary_fill": self.binary_fill,
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "HousingImputer":
+        medians = {c: (np.nan if m is None else m) for c, m in state["medians"].items()}
+        return cls(medians, state.get("binary_cols"), state.get("binary_fill", 1))
+
+    def save(self, uri: str, storage_options: Optional[dict] = None) -> str:
+        """Write the learned values as JSON to a local path or s3:// URI."""
+        with fsspec.open(uri, "w", **(storage_options or {})) as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return uri
+
+    @classmethod
+    def load(cls, uri: str, storage_options: Optional[dict] = None) -> Optional["HousingImputer"]:
+        """Read values saved by `save`; None if nothing has been saved yet."""
+        fs, path = fsspec.core.url_to_fs(uri, **(storage_options or {}))
+        if not fs.exists(path):
+            return None
+        with fs.open(path, "r") as f:
+            return cls.from_dict(json.load(f))
@@ -1,8 +1,24 @@
 # etl/load.py
+import io
 import os
+import argparse
+from typing import Iterable
+
 import pandas as pd
 from sqlalchemy import create_engine
 
+from etl.copy_loader import DEFAULT_BATCH_ROWS, LoadStats, copy_frames, encode_csv, iter_parquet, upsert_frames
+from etl.dedup import DedupIndex
+from etl.schema import PROCESSED_DTYPES, apply_schema
+from etl.transform import DEDUP_INDEX_URI
+from etl.watermark import (
+    ROW_HASH_DDL,
+    WATERMARK_DDL,
+    advance_watermark_sql,
+    promote_row_hashes_sql,
+    reset_row_hashes_sql,
+)
+
 STORAGE = {
     "key": os.getenv("MINIO_ROOT_USER", "admin"),
     "secret": os.getenv("MINIO_ROOT_PASSWORD", "admin12345"),
@@ -10,6 +26,7 @@ STORAGE = {
 }
 
 PROC_URI = "s3://processed/housing_800k.parquet"
+PROC_DATASET_URI = "s3://processed/housing"
 
 PG_USER = os.getenv("PG_USER", "postgres")
 PG_PASSWORD = os.getenv("PG_PASSWORD", "postgres")
@@ -19,7 +36,91 @@ PG_DB = os.getenv("PG_DB", "warehouse")
 
 PG_URL = f"postgresql+psycopg2://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DB}"
 
-df = pd.read_parquet(PROC_URI, storage_options=STORAGE)
-engine = create_engine(PG_URL)
-df.to_sql("housing", engine, schema="public", if_exists="replace", index=False)
-print(" Loaded to Postgres public.housing")
\ No newline at end of file
+# Listings the transform dropped as near duplicates (etl/dedup.py). The gold
+# layer reads bronze.housing_raw, not public.housing, so
+# 210_gold_features.sql leaves these listing_ids out by itself.
+NEAR_DUPLICATES_DDL = """
+CREATE SCHEMA IF NOT EXISTS silver;
+CREATE TABLE IF NOT EXISTS silver.near_duplicates (
+    listing_id   BIGINT PRIMARY KEY,
+    duplicate_of BIGINT NOT NULL,
+    run_tag      TEXT
+);
+"""
+
+
+def load_delta(frames: Iterable[pd.DataFrame], engine, run_tag: str, fmt: str = "csv") -> LoadStats:
+    """Upsert processed delta batches into public.housing.
+
+    The watermark and the row hashes extract staged for `run_tag` are
+    committed in the same transaction.
+    """
+    frames = (apply_schema(df, PROCESSED_DTYPES) for df in frames)
+    return upsert_frames(
+        frames, engine, "housing", key="listing_id", schema="public", fmt=fmt,
+        order_by="date",
+        post_sql=[
+            WATERMARK_DDL, advance_watermark_sql("{staging}", "housing"),
+            ROW_HASH_DDL, promote_row_hashes_sql(run_tag, "housing"),
+        ],
+    )
+
+
+def load_near_duplicates(engine) -> int:
+    """Replace silver.near_duplicates with the near duplicates saved with the dedup index."""
+    dup = DedupIndex.load_duplicates(DEDUP_INDEX_URI, storage_options=STORAGE)
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(NEAR_DUPLICATES_DDL)
+        cur.execute("TRUNCATE silver.near_duplicates")
+        if dup is not None and len(dup):
+            cur.copy_expert(
+                "COPY silver.near_duplicates (listing_id, duplicate_of, run_tag) FROM STDIN (FORMAT csv)",
+                io.BytesIO(encode_csv(dup[DedupIndex.DUPLICATE_COLUMNS])),
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return 0 if dup is None else len(dup)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load processed parquet into public.housing.")
+    ap.add_argument("--src", default=PROC_URI, help="parquet file/directory in MinIO")
+    ap.add_argument("--batch-rows", type=int, default=DEFAULT_BATCH_ROWS)
+    ap.add_argument("--format", choices=["csv", "binary"], default="csv", help="COPY format")
+    ap.add_argument(
+        "--incremental",
+        metavar="RUN_TAG",
+        help="upsert only the partition files written by this transform run tag",
+    )
+    args = ap.parse_args()
+
+    engine = create_engine(PG_URL)
+    if args.incremental:
+        src = args.src if args.src != PROC_URI else PROC_DATASET_URI
+        frames = iter_parquet(
+            src, args.batch_rows, storage_options=STORAGE, pattern=f"{args.incremental}-*.parquet"
+        )
+        stats = load_delta(frames, engine, args.incremental, args.format)
+        print(f" Upserted into Postgres public.housing: {stats}")
+    else:
+        frames = iter_parquet(args.src, args.batch_rows, storage_options=STORAGE)
+        frames = (apply_schema(df, PROCESSED_DTYPES) for df in frames)
+        stats = copy_frames(
+            frames, engine, "housing", schema="public", fmt=args.format,
+            post_sql=[
+                WATERMARK_DDL, advance_watermark_sql("public.housing", "housing", only_forward=False),
+                ROW_HASH_DDL, reset_row_hashes_sql("housing"),
+            ],
+        )
+        print(f" Loaded to Postgres public.housing: {stats}")
+    print(f" Near duplicates in silver.near_duplicates: {load_near_duplicates(engine):,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
 # etl/load_raw.py
 import os
 import argparse
-import pandas as pd
 from sqlalchemy import create_engine
 from dotenv import load_dotenv
 
+from etl.copy_loader import DEFAULT_BATCH_ROWS, copy_frames, iter_csv, iter_parquet
+from etl.schema import HOUSING_DTYPES, apply_schema
+
 load_dotenv()
 
 STORAGE = {
@@ -24,18 +26,22 @@ def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--src", required=True, help="ścieżka do pliku w MinIO, np. s3://raw/housing.csv")
     ap.add_argument("--table", default="housing_raw", help="tabela docelowa w Postgresie")
+    ap.add_argument("--batch-rows", type=int, default=DEFAULT_BATCH_ROWS, help="wierszy na jeden COPY")
+    ap.add_argument("--format", choices=["csv", "binary"], default="csv", help="format COPY")
     args = ap.parse_args()
 
-    # Wczytaj CSV / Parquet z MinIO
+    # Strumieniowo czytaj CSV / Parquet z MinIO, od razu w zadeklarowanych typach
     if args.src.endswith(".parquet"):
-        df = pd.read_parquet(args.src, storage_options=STORAGE)
+        frames = (
+            apply_schema(df) for df in iter_parquet(args.src, args.batch_rows, storage_options=STORAGE)
+        )
     else:
-        df = pd.read_csv(args.src, storage_options=STORAGE)
+        frames = iter_csv(args.src, args.batch_rows, storage_options=STORAGE, dtype=HOUSING_DTYPES)
 
     engine = create_engine(PG_URL)
-    df.to_sql(args.table, engine, schema="public", if_exists="replace", index=False)
+    stats = copy_frames(frames, engine, args.table, schema="public", fmt=args.format)
 
-    print(f"Surowe dane załadowane do tabeli {args.table} ({len(df):,} wierszy)")
+    print(f"Surowe dane załadowane do tabeli {args.table}: {stats}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
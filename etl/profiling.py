@@ -0,0 +1,402 @@
+# etl/profiling.py
+"""Per-stage metrics of the warehouse pipeline: wall/CPU time, peak RSS, rows and bytes.
+
+Every instrumented step (a `@profiled` function or a `with stage(...)`
+block) appends one JSON line to artifacts/stage_metrics/<run_id>.jsonl.
+All processes of a run share the run id through PIPELINE_RUN_ID (the
+Airflow DAG sets it to `{{ run_id }}`; without it the first stage of a
+process makes one up and exports it to its worker processes). Stages nest
+and their numbers are inclusive. Bytes read/written are the process's
+read()/write() traffic (files, pipes) plus the S3 and COPY payloads the
+stages report with `add_bytes`.
+
+Usage:
+    python -m etl.profiling show                      # list runs
+    python -m etl.profiling show RUN_ID
+    python -m etl.profiling compare BASE_RUN NEW_RUN --threshold 0.2
+    python -m etl.profiling publish RUN_ID            # → ml.stage_metrics
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import functools
+import resource
+import threading
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+
+import pandas as pd
+import psutil
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+METRICS_DIR = Path(os.getenv("STAGE_METRICS_DIR", PROJECT_ROOT / "artifacts" / "stage_metrics"))
+
+RUN_ID_ENV = "PIPELINE_RUN_ID"
+# PIPELINE_PROFILE=0: `@profiled` functions become plain calls, `stage` blocks are not recorded
+ENABLED = os.getenv("PIPELINE_PROFILE", "1") != "0"
+
+# RSS is polled this often while a stage runs (ru_maxrss covers new process peaks exactly)
+RSS_SAMPLE_S = 0.01
+
+METRICS_SCHEMA = "ml"
+METRICS_TABLE = "stage_metrics"
+
+PG_URL = (
+    f"postgresql+psycopg2://"
+    f"{os.getenv('PG_USER', 'postgres')}:"
+    f"{os.getenv('PG_PASSWORD', 'postgres')}@"
+    f"{os.getenv('PG_HOST', 'localhost')}:"
+    f"{os.getenv('PG_PORT', '5432')}/"
+    f"{os.getenv('PG_DB', 'warehouse')}"
+)
+
+
+@dataclass
+class StageRecord:
+    """Resource usage of one execution of one stage."""
+
+    run_id: str
+    stage: str
+    started_at: str
+    pid: int = field(default_factory=os.getpid)
+    ok: bool = True
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    peak_rss_mb: float = 0.0
+    rows_in: Optional[int] = None
+    rows_out: Optional[int] = None
+    bytes_read: int = 0
+    bytes_written: int = 0
+
+    def __str__(self) -> str:
+        rows = f", {self.rows_out:,} rows" if self.rows_out is not None else ""
+        return (
+            f"{self.stage}: {self.wall_s:.2f}s wall, {self.cpu_s:.2f}s CPU, "
+            f"peak RSS {self.peak_rss_mb:,.0f} MB{rows}"
+        )
+
+
+def run_id() -> str:
+    """Id of the current pipeline run; created (and exported to child processes) on first use."""
+    rid = os.environ.get(RUN_ID_ENV)
+    if not rid:
+        rid = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+        os.environ[RUN_ID_ENV] = rid
+    return rid
+
+
+def metrics_path(rid: str) -> Path:
+    return METRICS_DIR / f"{rid}.jsonl"
+
+
+# ---------------------------------------------------------------------
+# 1) Measurement
+# ---------------------------------------------------------------------
+def _cpu_seconds() -> float:
+    """CPU of this process (all threads) plus its finished, waited-for children."""
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def _io_chars(proc: psutil.Process) -> tuple:
+    """Bytes passed through read()/write() calls (Linux rchar/wchar); socket send/recv are not counted."""
+    if not hasattr(proc, "io_counters"):
+        return 0, 0
+    io = proc.io_counters()
+    return getattr(io, "read_chars", io.read_bytes), getattr(io, "write_chars", io.write_bytes)
+
+
+def _max_rss() -> int:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _RssSampler(threading.Thread):
+    """Highest RSS seen while a stage runs."""
+
+    def __init__(self, proc: psutil.Process):
+        super().__init__(daemon=True)
+        self.proc = proc
+        self.peak = proc.memory_info().rss
+        self.max_rss_before = _max_rss()
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        while not self._done.wait(RSS_SAMPLE_S):
+            self.peak = max(self.peak, self.proc.memory_info().rss)
+
+    def stop(self) -> int:
+        self._done.set()
+        self.join()
+        peak = max(self.peak, self.proc.memory_info().rss)
+        # a new process-wide high-water mark was set inside this stage: that is its exact peak
+        max_rss = _max_rss()
+        return max(peak, max_rss) if max_rss > self.max_rss_before else peak
+
+
+# records of the stages currently running in this process, outermost first
+_active: List[StageRecord] = []
+
+
+def add_bytes(read: int = 0, written: int = 0) -> None:
+    """Count network payload (S3 objects, COPY streams) towards every running stage.
+
+    read()/write() counters miss socket traffic, so stages that talk to S3
+    or Postgres report their payload sizes here.
+    """
+    for record in _active:
+        record.bytes_read += read
+        record.bytes_written += written
+
+
+def _write(record: StageRecord) -> None:
+    METRICS_DIR.mkdir(parents=True, exist_ok=True)
+    # one short append per record, so concurrent processes do not interleave lines
+    with open(metrics_path(record.run_id), "a") as f:
+        f.write(json.dumps(asdict(record)) + "\n")
+
+
+@contextmanager
+def stage(name: str, rows_in: Optional[int] = None) -> Iterator[StageRecord]:
+    """Measure the block as stage `name`; set `rows_out` on the yielded record.
+
+    The record is written when the block exits, also when it raises
+    (`ok=False`). With profiling disabled only the times are measured and
+    nothing is written.
+    """
+    record = StageRecord(run_id(), name, datetime.now(timezone.utc).isoformat(), rows_in=rows_in)
+    proc = psutil.Process()
+    sampler = _RssSampler(proc) if ENABLED else None
+    if sampler is not None:
+        sampler.start()
+    read0, written0 = _io_chars(proc)
+    cpu0 = _cpu_seconds()
+    start = time.perf_counter()
+    _active.append(record)
+    try:
+        yield record
+    except BaseException:
+        record.ok = False
+        raise
+    finally:
+        _active.remove(record)
+        record.wall_s = time.perf_counter() - start
+        record.cpu_s = _cpu_seconds() - cpu0
+        read1, written1 = _io_chars(proc)
+        record.bytes_read += read1 - read0
+        record.bytes_written += written1 - written0
+        if sampler is not None:
+            record.peak_rss_mb = sampler.stop() / 2**20
+            _write(record)
+
+
+def _rows(obj) -> Optional[int]:
+    """Row count of a frame/array, of the first item of a tuple, of an int or of a `.rows` stats object."""
+    if isinstance(obj, tuple):
+        obj = obj[0] if obj else None
+    if isinstance(obj, int) and not isinstance(obj, bool):
+        return obj
+    shape = getattr(obj, "shape", None)
+    if shape:
+        return int(shape[0])
+    rows = getattr(obj, "rows", None)
+    return rows if isinstance(rows, int) else None
+
+
+def profiled(name: str) -> Callable:
+    """Decorator: every call is a `stage(name)`.
+
+    Rows in are taken from the first argument with a shape (the input
+    DataFrame), rows out from the result (see `_rows`).
+    """
+    def decorator(fn: Callable) -> Callable:
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            rows_in = next((_rows(a) for a in args if getattr(a, "shape", None)), None)
+            with stage(name, rows_in) as record:
+                result = fn(*args, **kwargs)
+                record.rows_out = _rows(result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+# ---------------------------------------------------------------------
+# 2) Reading, publishing and comparing runs
+# ---------------------------------------------------------------------
+def load_run(rid: str, engine=None) -> pd.DataFrame:
+    """Records of run `rid` from its JSONL file, or from ml.stage_metrics with `engine`."""
+    if engine is not None:
+        from sqlalchemy import text
+
+        sql = text(f"SELECT * FROM {METRICS_SCHEMA}.{METRICS_TABLE} WHERE run_id = :rid")
+        df = pd.read_sql(sql, engine, params={"rid": rid})
+    else:
+        path = metrics_path(rid)
+        if not path.exists():
+            raise FileNotFoundError(f"No stage metrics for run {rid} ({path})")
+        df = pd.read_json(path, lines=True, dtype={"run_id": str})
+    if df.empty:
+        raise ValueError(f"No stage metrics for run {rid}")
+    return df
+
+
+def summarize(records: pd.DataFrame) -> pd.DataFrame:
+    """One row per stage: calls, summed times/rows/bytes and the highest peak RSS."""
+    return records.groupby("stage", sort=False).agg(
+        calls=("wall_s", "size"),
+        failed=("ok", lambda s: int((~s.astype(bool)).sum())),
+        wall_s=("wall_s", "sum"),
+        cpu_s=("cpu_s", "sum"),
+        peak_rss_mb=("peak_rss_mb", "max"),
+        rows_in=("rows_in", "sum"),
+        rows_out=("rows_out", "sum"),
+        mb_read=("bytes_read", lambda s: s.sum() / 1e6),
+        mb_written=("bytes_written", lambda s: s.sum() / 1e6),
+    )
+
+
+def compare(
+    base: pd.DataFrame,
+    new: pd.DataFrame,
+    threshold: float = 0.2,
+    min_seconds: float = 0.5,
+    min_rss_mb: float = 50.0,
+    per_row: bool = False,
+) -> pd.DataFrame:
+    """Stage summaries of two runs side by side, with regression flags.
+
+    A stage regresses when its wall or CPU time grows by more than
+    `threshold` (relative) and `min_seconds` (absolute), or its peak RSS by
+    more than `threshold` and `min_rss_mb`; the absolute floors keep short
+    stages from flagging on noise. With `per_row` the time changes are
+    measured per output row, for runs over different data volumes. Stages
+    missing from one run are listed without flags.
+    """
+    a, b = summarize(base), summarize(new)
+    out = a.join(b, how="outer", lsuffix="_base", rsuffix="_new", sort=False)
+    order = list(b.index) + [s for s in a.index if s not in b.index]
+    out = out.loc[order]
+
+    # base time scaled to the new run's row count (stages without rows are compared as they are)
+    scale = (out["rows_out_new"] / out["rows_out_base"]).where(out["rows_out_base"] > 0, 1.0)
+    scale = scale.fillna(1.0) if per_row else pd.Series(1.0, index=out.index)
+    flags = pd.Series("", index=out.index)
+    for col, floor in [("wall_s", min_seconds), ("cpu_s", min_seconds), ("peak_rss_mb", min_rss_mb)]:
+        old, cur = out[f"{col}_base"], out[f"{col}_new"]
+        if col != "peak_rss_mb":
+            old = old * scale
+        out[f"{col}_change"] = cur / old - 1
+        worse = (cur > old * (1 + threshold)) & (cur - old > floor)
+        flags[worse] += f"{col} "
+    out["regression"] = flags.str.strip()
+    return out
+
+
+def publish(rid: str, engine) -> int:
+    """Copy run `rid` from its JSONL file into ml.stage_metrics (replacing earlier copies)."""
+    from sqlalchemy import inspect, text
+
+    records = load_run(rid)
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {METRICS_SCHEMA}"))
+        if inspect(conn).has_table(METRICS_TABLE, schema=METRICS_SCHEMA):
+            conn.execute(
+                text(f"DELETE FROM {METRICS_SCHEMA}.{METRICS_TABLE} WHERE run_id = :rid"), {"rid": rid}
+            )
+        records.to_sql(METRICS_TABLE, conn, schema=METRICS_SCHEMA, if_exists="append", index=False)
+    return len(records)
+
+
+# ---------------------------------------------------------------------
+# 3) Command-line interface
+# ---------------------------------------------------------------------
+def print_summary(summary: pd.DataFrame) -> None:
+    print(f"{'stage':<38} {'calls':>5} {'wall s':>9} {'cpu s':>9} {'peak MB':>8} "
+          f"{'rows out':>12} {'MB read':>9} {'MB written':>10}")
+    for name, r in summary.iterrows():
+        rows = f"{r.rows_out:,.0f}" if r.rows_out else "-"
+        print(f"{name:<38} {int(r.calls):>5} {r.wall_s:>9.2f} {r.cpu_s:>9.2f} {r.peak_rss_mb:>8,.0f} "
+              f"{rows:>12} {r.mb_read:>9,.1f} {r.mb_written:>10,.1f}")
+
+
+def print_comparison(cmp: pd.DataFrame) -> None:
+    def pct(x: float) -> str:
+        return f"{x:+.0%}" if pd.notna(x) and abs(x) != float("inf") else "-"
+
+    def num(x: float, fmt: str) -> str:
+        return format(x, fmt) if pd.notna(x) else "-"
+
+    print(f"{'stage':<38} {'wall base':>9} {'wall new':>9} {'Δ':>6} {'cpu Δ':>6} "
+          f"{'peak MB':>8} {'Δ':>6} {'rows Δ':>7}  regression")
+    for name, r in cmp.iterrows():
+        rows = pct(r.rows_out_new / r.rows_out_base - 1) if r.rows_out_base else "-"
+        print(f"{name:<38} {num(r.wall_s_base, '.2f'):>9} {num(r.wall_s_new, '.2f'):>9} "
+              f"{pct(r.wall_s_change):>6} {pct(r.cpu_s_change):>6} {num(r.peak_rss_mb_new, ',.0f'):>8} "
+              f"{pct(r.peak_rss_mb_change):>6} {rows:>7}  {r.regression}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stage metrics of pipeline runs.")
+    parser.add_argument("--db", action="store_true", help="read runs from ml.stage_metrics instead of files")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    show = sub.add_parser("show", help="summary of one run (list the runs without RUN_ID)")
+    show.add_argument("run_id", nargs="?")
+
+    cmp = sub.add_parser("compare", help="compare two runs; exit code 1 on regressions")
+    cmp.add_argument("base")
+    cmp.add_argument("new")
+    cmp.add_argument("--threshold", type=float, default=0.2, help="relative growth that counts (0.2 = +20%%)")
+    cmp.add_argument("--min-seconds", type=float, default=0.5, help="ignore smaller wall/CPU growth")
+    cmp.add_argument("--min-rss-mb", type=float, default=50.0, help="ignore smaller peak RSS growth")
+    cmp.add_argument("--per-row", action="store_true", help="compare times per output row")
+
+    pub = sub.add_parser("publish", help="copy a run's JSONL file into ml.stage_metrics")
+    pub.add_argument("run_id", nargs="?", help=f"default: ${RUN_ID_ENV}")
+    args = parser.parse_args()
+
+    engine = None
+    if args.db or args.command == "publish":
+        from sqlalchemy import create_engine
+
+        engine = create_engine(PG_URL)
+
+    if args.command == "publish":
+        rid = args.run_id or os.environ.get(RUN_ID_ENV)
+        if not rid:
+            parser.error(f"publish needs RUN_ID or ${RUN_ID_ENV}")
+        rows = publish(rid, engine)
+        print(f" Published {rows:,} stage records of run {rid} → {METRICS_SCHEMA}.{METRICS_TABLE}")
+    elif args.command == "show" and args.run_id is None:
+        for path in sorted(METRICS_DIR.glob("*.jsonl"), key=lambda p: p.stat().st_mtime):
+            print(path.stem)
+    elif args.command == "show":
+        print_summary(summarize(load_run(args.run_id, engine)))
+    else:
+        result = compare(
+            load_run(args.base, engine), load_run(args.new, engine),
+            args.threshold, args.min_seconds, args.min_rss_mb, args.per_row,
+        )
+        print_comparison(result)
+        regressions = result[result["regression"] != ""]
+        if len(regressions):
+            print(f"\n {len(regressions)} stage(s) regressed more than {args.threshold:.0%}: "
+                  f"{', '.join(regressions.index)}")
+            sys.exit(1)
+        print("\n No regressions")
+
+
+if __name__ == "__main__":
+    main()
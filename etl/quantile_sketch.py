@@ -0,0 +1,170 @@
+# etl/quantile_sketch.py
+"""Mergeable quantile sketches (t-digest) for many groups at once, in NumPy.
+
+A digest summarises the values of one group as centroids (mean, weight)
+sorted by mean: single values at the tails, larger clusters towards the
+median. The k1 scale function k(q) = δ/(2π)·asin(2q − 1) bounds them, so
+every centroid covers at most one unit of k (Dunning & Ertl, "Computing
+Extremely Accurate Quantiles Using t-Digests"). Building and merging are
+the same operation, `compress`: the sorted centroids of all groups (raw
+values are centroids of weight 1) are binned by the k of their mid
+quantile in one vectorised pass, so the digests of thousands of groups
+(days × cities) are built or merged without a Python loop per group.
+Merging digests gives a digest of the union of their values, so stored
+digests can be updated with new values instead of being rebuilt.
+
+`quantiles` interpolates between centroid centres like PERCENTILE_CONT
+(linear between order statistics) and is exact as long as every centroid
+holds one value, i.e. for groups of up to about compression / π values.
+"""
+import base64
+from typing import List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+COMPRESSION = 200.0
+
+
+class Centroids(NamedTuple):
+    """Centroids of many digests, sorted by (group, mean)."""
+
+    group: np.ndarray   # int64 group index of each centroid
+    mean: np.ndarray    # float64
+    weight: np.ndarray  # float64 number of values
+
+
+def _group_starts(group: np.ndarray) -> np.ndarray:
+    """Position of the first element of each run of equal `group` values."""
+    return np.flatnonzero(np.r_[True, group[1:] != group[:-1]]) if len(group) else np.empty(0, "int64")
+
+
+def _order(group: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Permutation sorting by (group, value): values first, then a stable (radix) sort of the ints."""
+    order = np.argsort(values)
+    return order[np.argsort(group[order], kind="stable")]
+
+
+def compress(c: Centroids, compression: float = COMPRESSION) -> Centroids:
+    """Merge adjacent centroids of each group that fall into the same unit of k."""
+    if not len(c.group):
+        return c
+    starts = _group_starts(c.group)
+    cum = np.cumsum(c.weight)
+    before = cum - c.weight
+    # weight before each centroid within its group, and the group totals
+    run = np.cumsum(np.r_[True, c.group[1:] != c.group[:-1]]) - 1
+    before -= before[starts][run]
+    total = np.add.reduceat(c.weight, starts)[run]
+    q = (before + c.weight / 2) / total
+    k = np.floor(compression / (2 * np.pi) * np.arcsin(np.clip(2 * q - 1, -1, 1)))
+
+    new = np.r_[True, (c.group[1:] != c.group[:-1]) | (k[1:] != k[:-1])]
+    seg = np.cumsum(new) - 1
+    weight = np.bincount(seg, c.weight)
+    mean = np.bincount(seg, c.weight * c.mean) / weight
+    # a centroid of one value keeps it bit for bit
+    single = weight == 1
+    mean[single] = c.mean[new][single]
+    return Centroids(c.group[new], mean, weight)
+
+
+def sort_values(group: np.ndarray, values: np.ndarray) -> Centroids:
+    """`values` sorted by (group, value) as weight-1 centroids; NaNs are left out like NULLs in SQL."""
+    group, values = np.asarray(group, "int64"), np.asarray(values, "float64")
+    keep = ~np.isnan(values)
+    group, values = group[keep], values[keep]
+    order = _order(group, values)
+    return Centroids(group[order], values[order], np.ones(len(order)))
+
+
+def build(group: np.ndarray, values: np.ndarray, compression: float = COMPRESSION) -> Centroids:
+    """Digests of `values` per `group` (int codes)."""
+    return compress(sort_values(group, values), compression)
+
+
+def exact_quantiles(s: Centroids, qs: Sequence[float], n_groups: int) -> np.ndarray:
+    """PERCENTILE_CONT of the raw values returned by `sort_values`, shape (n_groups, len(qs))."""
+    qs = np.asarray(qs, "float64")
+    out = np.full((n_groups, len(qs)), np.nan)
+    if not len(s.group):
+        return out
+    starts = _group_starts(s.group)
+    n = np.diff(np.r_[starts, len(s.group)])
+    h = starts[:, None] + qs[None, :] * (n[:, None] - 1)
+    lo = np.floor(h).astype("int64")
+    hi = np.minimum(lo + 1, (starts + n - 1)[:, None])
+    out[s.group[starts]] = s.mean[lo] + (h - lo) * (s.mean[hi] - s.mean[lo])
+    return out
+
+
+def merge(parts: Sequence[Centroids], compression: float = COMPRESSION) -> Centroids:
+    """Digests of the union of `parts`, matched by group index."""
+    group = np.concatenate([p.group for p in parts])
+    mean = np.concatenate([p.mean for p in parts])
+    weight = np.concatenate([p.weight for p in parts])
+    order = _order(group, mean)
+    return compress(Centroids(group[order], mean[order], weight[order]), compression)
+
+
+def quantiles(
+    c: Centroids,
+    qs: Sequence[float],
+    n_groups: int,
+    mins: Optional[np.ndarray] = None,
+    maxs: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """(n_groups, len(qs)) quantile estimates, NaN for groups without values.
+
+    Order statistic h = q·(n − 1) is interpolated between centroid centres
+    (a centroid of w values starting at rank b is centred at b + (w − 1)/2),
+    the exact group minimum and maximum anchoring ranks 0 and n − 1.
+    """
+    qs = np.asarray(qs, "float64")
+    out = np.full((n_groups, len(qs)), np.nan)
+    if not len(c.group):
+        return out
+    n = np.bincount(c.group, c.weight, minlength=n_groups)
+    starts = _group_starts(c.group)
+    run = np.cumsum(np.r_[True, c.group[1:] != c.group[:-1]]) - 1
+    before = np.cumsum(c.weight) - c.weight
+    before -= before[starts][run]
+    centre = before + (c.weight - 1) / 2
+
+    groups = c.group[starts]
+    lo = c.mean[starts] if mins is None else np.asarray(mins, "float64")[groups]
+    ends = np.r_[starts[1:], len(c.group)] - 1
+    hi = c.mean[ends] if maxs is None else np.asarray(maxs, "float64")[groups]
+    # groups laid out one after another on one rank axis, anchors at both ends
+    offset = np.zeros(n_groups)
+    offset[groups] = np.cumsum(n[groups] + 1) - (n[groups] + 1)
+    x = np.concatenate([offset[groups], offset[c.group] + centre, offset[groups] + n[groups] - 1])
+    y = np.concatenate([lo, c.mean, hi])
+    order = np.argsort(x, kind="stable")
+    h = offset[groups][:, None] + qs[None, :] * (n[groups][:, None] - 1)
+    out[groups] = np.interp(h, x[order], y[order])
+    return out
+
+
+def to_strings(c: Centroids, n_groups: int) -> List[Optional[str]]:
+    """One base64 string (float64 means, then weights) per group; None for groups without values."""
+    out: List[Optional[str]] = [None] * n_groups
+    starts = _group_starts(c.group)
+    for s, e in zip(starts, np.r_[starts[1:], len(c.group)]):
+        out[c.group[s]] = base64.b64encode(np.r_[c.mean[s:e], c.weight[s:e]].astype("<f8").tobytes()).decode()
+    return out
+
+
+def from_strings(strings: Sequence[Optional[str]]) -> Centroids:
+    """Inverse of `to_strings`: group i gets the centroids of strings[i] (None/NaN = no values)."""
+    groups, means, weights = [], [], []
+    for i, s in enumerate(strings):
+        if not isinstance(s, str):
+            continue
+        arr = np.frombuffer(base64.b64decode(s), "<f8")
+        half = len(arr) // 2
+        groups.append(np.full(half, i, "int64"))
+        means.append(arr[:half])
+        weights.append(arr[half:])
+    if not groups:
+        return Centroids(np.empty(0, "int64"), np.empty(0), np.empty(0))
+    return Centroids(np.concatenate(groups), np.concatenate(means), np.concatenate(weights))
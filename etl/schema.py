@@ -0,0 +1,53 @@
+# etl/schema.py
+from typing import Iterable, Optional
+
+import pandas as pd
+
+
+# Declared dtypes of the raw housing dataset (housing_800k.csv and its deltas).
+# Low-cardinality strings are categoricals, the date stays a pyarrow string
+# until parse_dates. Small integer columns that contain NaNs (rooms, floors,
+# the elevator flag, the year) are float32, exact for these ranges including
+# .5 medians. Measured decimals (area, distance, prices) keep float64: in
+# float32 a value like 79.3 is not the decimal in the CSV any more.
+HOUSING_DTYPES = {
+    "listing_id": "int32",
+    "date": "string[pyarrow]",
+    "city": "category",
+    "district": "category",
+    "postal_code": "category",
+    "rooms": "float32",
+    "area_sqm": "float64",
+    "floor": "float32",
+    "total_floors": "float32",
+    "has_elevator": "float32",
+    "year_built": "float32",
+    "distance_center_km": "float64",
+    "price_sqm": "float64",
+    "price_total": "float64",
+}
+
+
+# Processed output: the same columns after parse_dates, plus derived features.
+PROCESSED_DTYPES = {**HOUSING_DTYPES, "date": "datetime64[ns]"}
+
+
+def check_columns(columns: Iterable[str]) -> None:
+    """Raise ValueError when a declared housing column is missing."""
+    missing = [c for c in HOUSING_DTYPES if c not in set(columns)]
+    if missing:
+        raise ValueError(f"Housing data is missing declared columns: {missing}")
+
+
+def read_csv_kwargs() -> dict:
+    """Keyword arguments that make `pd.read_csv` apply the housing schema while parsing."""
+    return {"dtype": HOUSING_DTYPES}
+
+
+def apply_schema(df: pd.DataFrame, dtypes: Optional[dict] = None) -> pd.DataFrame:
+    """Cast the declared columns of an already loaded DataFrame (raw schema by default)."""
+    casts = {
+        c: dt for c, dt in (dtypes or HOUSING_DTYPES).items()
+        if c in df.columns and df[c].dtype != dt
+    }
+    return df.astype(casts) if casts else df
@@ -0,0 +1,186 @@
+# etl/tasks.py
+"""Pipeline steps as importable task callables, chained in one process.
+
+A task is a function `fn(ctx) -> dict | None`. `ctx` holds the run
+parameters and everything earlier tasks returned, so data moves from step
+to step in memory (DataFrames, the fitted pipeline, one SQLAlchemy engine).
+Storage is only written at real checkpoints: the raw delta CSV, the
+processed parquet partitions, the warehouse tables and the model artifacts.
+A task that does not find its input in `ctx` (the chain was started
+part-way, e.g. `--tasks load`) reads it back from the previous checkpoint,
+like the standalone scripts do.
+
+Usage:
+    python -m etl.tasks etl --run-tag housing_20250101
+    python -m etl.tasks all --run-tag housing_20250101
+    python -m etl.tasks etl --run-tag housing_20250101 --tasks load,silver_handle_missing
+    python -m etl.tasks ml
+"""
+import os
+import time
+import argparse
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from etl.profiling import run_id, stage
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+SQL_DIR = PROJECT_ROOT / "SQL" / "SQL_raw"
+
+DEFAULT_SRC = "data/raw/housing_800k.csv"
+PROCESSED_DATASET = "housing"
+
+Context = Dict[str, Any]
+
+
+@dataclass
+class Task:
+    """One step of a chain; `checkpoint` names what it persists ("" = memory only)."""
+
+    name: str
+    fn: Callable[[Context], Optional[Context]]
+    checkpoint: str = ""
+
+
+def run_tasks(tasks: Sequence[Task], ctx: Optional[Context] = None, only: Optional[List[str]] = None) -> Context:
+    """Run `tasks` in order in this process, merging each task's outputs into the context.
+
+    `only` restricts the chain to the named tasks; the others are skipped,
+    so their outputs have to come from the checkpoints.
+    """
+    ctx = dict(ctx or {})
+    unknown = set(only or []) - {t.name for t in tasks}
+    if unknown:
+        raise ValueError(f"Unknown tasks: {sorted(unknown)}")
+    start = time.perf_counter()
+    for task in tasks:
+        if only and task.name not in only:
+            continue
+        with stage(f"task.{task.name}") as s:
+            out = task.fn(ctx) or {}
+        ctx.update(out)
+        saved = f" → {task.checkpoint}" if task.checkpoint else ""
+        print(f"[{task.name}] {s.wall_s:.2f}s (CPU {s.cpu_s:.2f}s){saved}")
+    print(f"Chain done in {time.perf_counter() - start:.2f}s (run {run_id()})")
+    return ctx
+
+
+def engine_of(ctx: Context):
+    """The chain's shared engine (one connection pool for every task)."""
+    if "engine" not in ctx:
+        from sqlalchemy import create_engine
+
+        from etl.load import PG_URL
+
+        ctx["engine"] = create_engine(ctx.get("pg_url") or PG_URL)
+    return ctx["engine"]
+
+
+# ---------------------------------------------------------------------
+# 1) ETL: raw delta → processed partitions → public.housing
+# ---------------------------------------------------------------------
+def extract(ctx: Context) -> Context:
+    from etl.extract import extract_new_rows
+
+    key = f"incremental/{ctx['run_tag']}.csv"
+    raw = extract_new_rows(ctx.get("src", DEFAULT_SRC), key, engine=engine_of(ctx), run_tag=ctx["run_tag"])
+    return {"raw": raw}
+
+
+def transform(ctx: Context) -> Context:
+    from etl.transform import transform_delta, transform_pipeline_incremental
+
+    dataset, dedup = ctx.get("dataset", PROCESSED_DATASET), ctx.get("dedup", False)
+    if "raw" in ctx:
+        df, uri = transform_delta(ctx.pop("raw"), dataset, ctx["run_tag"], dedup=dedup)
+    else:
+        key = f"incremental/{ctx['run_tag']}.csv"
+        df, uri = transform_pipeline_incremental(key, dataset, ctx["run_tag"], dedup=dedup)
+    print(f" Processed {len(df):,} rows → {uri}")
+    return {"processed": df}
+
+
+def load(ctx: Context) -> None:
+    from etl.copy_loader import iter_frame, iter_parquet
+    from etl.load import PROC_DATASET_URI, STORAGE, load_delta, load_near_duplicates
+
+    if "processed" in ctx:
+        frames = iter_frame(ctx.pop("processed"))
+    else:
+        frames = iter_parquet(PROC_DATASET_URI, storage_options=STORAGE, pattern=f"{ctx['run_tag']}-*.parquet")
+    stats = load_delta(frames, engine_of(ctx), ctx["run_tag"])
+    print(f" Upserted into Postgres public.housing: {stats}")
+    print(f" Near duplicates in silver.near_duplicates: {load_near_duplicates(engine_of(ctx)):,}")
+
+
+def data_profile(ctx: Context) -> None:
+    from etl.data_profile import profile_dataset
+
+    dataset = ctx.get("dataset", PROCESSED_DATASET)
+    print(f" Column profile of processed/{dataset}: {len(profile_dataset(dataset))} columns")
+
+
+def gold_aggregates(ctx: Context) -> None:
+    from etl.gold_aggregates import refresh
+
+    print(f" Refreshed gold price aggregates: {refresh(engine_of(ctx))}")
+
+
+def sql_task(name: str, path: str) -> Task:
+    """Task running one file of SQL/SQL_raw on the chain's engine."""
+
+    def run(ctx: Context) -> None:
+        with engine_of(ctx).begin() as conn:
+            conn.exec_driver_sql((SQL_DIR / path).read_text())
+
+    return Task(name, run, checkpoint=f"Postgres ({path})")
+
+
+ETL_TASKS = [
+    Task("extract", extract, checkpoint="s3://raw/incremental/<run_tag>.csv"),
+    Task("transform", transform, checkpoint="s3://processed/housing/<run_tag>-*.parquet"),
+    Task("load", load, checkpoint="public.housing, silver.near_duplicates"),
+    Task("data_profile", data_profile, checkpoint="s3://processed/_state/profile/housing.json"),
+    sql_task("silver_handle_missing", "01_staging/110_handle_missing_values.sql"),
+    sql_task("silver_impute_stats", "01_staging/115_refresh_impute_stats.sql"),
+    sql_task("silver_cast_normalize", "01_staging/120_cast_and_normalize.sql"),
+    sql_task("silver_logic_checks", "01_staging/130_handle_logic.sql"),
+    sql_task("gold_features", "02_gold/210_gold_features.sql"),
+    sql_task("gold_valid", "02_gold/220_gold_valid.sql"),
+    Task("gold_aggregates", gold_aggregates, checkpoint="gold.price_sketches, gold.price_city_daily, gold.city_price_stats"),
+    sql_task("gold_outliers_iqr", "02_gold/250_gold_outliers_iqr.sql"),
+    sql_task("gold_kpi", "02_gold/270_gold_kpi.sql"),
+]
+
+
+def chain(name: str) -> List[Task]:
+    """Tasks of the `etl`, `ml` or `all` chain."""
+    if name == "etl":
+        return ETL_TASKS
+    from ml.ml_tasks import ML_TASKS
+
+    return ML_TASKS if name == "ml" else ETL_TASKS + ML_TASKS
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run pipeline tasks in one process, passing data in memory.")
+    ap.add_argument("chain", choices=["etl", "ml", "all"])
+    ap.add_argument("--run-tag", help="delta name, e.g. housing_20250101 (required by the ETL tasks)")
+    ap.add_argument("--src", default=DEFAULT_SRC, help="local raw CSV the delta is extracted from")
+    ap.add_argument("--tasks", default="", help="comma-separated subset of the chain's tasks")
+    ap.add_argument("--dedup", action="store_true", help="drop duplicate listings in the transform (etl/dedup.py)")
+    args = ap.parse_args()
+
+    tasks = chain(args.chain)
+    if args.chain != "ml" and not args.run_tag:
+        ap.error("--run-tag is required for the ETL tasks")
+    src = str(Path(args.src).resolve())
+    # the ML scripts keep their artifacts/ relative to the repository root
+    os.chdir(PROJECT_ROOT)
+    ctx = {"run_tag": args.run_tag, "src": src, "dedup": args.dedup}
+    run_tasks(tasks, ctx, [t for t in args.tasks.split(",") if t])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,23 @@
 # etl/transform.py
 import os
 import argparse
-from typing import List, Tuple
+import itertools
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 import pandas as pd
 import numpy as np
+import fsspec
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pandas.tseries.api import guess_datetime_format
+
+from etl import quantile_sketch
+from etl.dedup import DedupIndex, DedupStats
+from etl.imputer import HousingImputer
+from etl.profiling import add_bytes, profiled
+from etl.schema import read_csv_kwargs
 
 
 STORAGE = {
@@ -14,61 +27,195 @@ STORAGE = {
 }
 
 RAW_BUCKET = os.getenv("RAW_BUCKET", "raw")
+# codec of a raw object by the suffix `extract.py --compression` gives its key
+RAW_COMPRESSION = {".gz": "gzip", ".zst": "zstd"}
 PROC_BUCKET = os.getenv("PROC_BUCKET", "processed")
 
+# Fill values learned by the last full run, reused by incremental runs
+IMPUTER_URI = f"s3://{PROC_BUCKET}/_state/imputer.json"
+BINARY_COLS = ["has_elevator"]
+
+# Hashes of the rows already let through, so a delta is deduplicated against the history
+# (only runs with --dedup read and extend it)
+DEDUP_INDEX_URI = f"s3://{PROC_BUCKET}/_state/dedup_index.parquet"
+
+# Columns derived from the date column; they turn into float64 when the date has NaT
+DATE_PART_COLS = ["age_years", "year", "month", "day", "dow"]
+NS_PER_DAY = 86_400 * 10**9
+
+# Frames are split for the process pool only when every worker gets this many rows
+MIN_PARALLEL_ROWS = 100_000
+
+# Hive partition columns of the full processed dataset and of the incremental one
+PARTITION_BY = ["year", "month"]
+DAY_PARTITIONS = ["year", "month", "day"]
+
+# Parquet layout: dictionary-encoded low-cardinality strings, bounded row groups
+DICTIONARY_COLS = ["city", "district", "postal_code"]
+MIN_ROWS_PER_GROUP = 32_768
+MAX_ROWS_PER_GROUP = 131_072
+
 
 # ---------------------------------------------------------------------
 # 1) Read raw data
 # ---------------------------------------------------------------------
+@profiled("transform.read_raw_csv")
 def read_raw_csv(key: str) -> pd.DataFrame:
-    """Read raw CSV file from S3/MinIO."""
+    """Read raw CSV file (.gz/.zst decompressed) from S3/MinIO with the declared housing dtypes."""
     src_uri = f"s3://{RAW_BUCKET}/{key}"
-    df = pd.read_csv(src_uri, storage_options=STORAGE)
+    with fsspec.open(src_uri, "rb", **STORAGE) as f:
+        df = pd.read_csv(f, compression=RAW_COMPRESSION.get(os.path.splitext(key)[1]), **read_csv_kwargs())
+        add_bytes(read=f.size)
     return df
 
 
+def read_raw_csv_chunks(
+    key: str, chunksize: int, usecols: Optional[List[str]] = None
+) -> Iterator[pd.DataFrame]:
+    """Read raw CSV file from S3/MinIO as a stream of DataFrames with at most `chunksize` rows.
+
+    pandas infers the compression of a .gz/.zst key itself.
+    """
+    src_uri = f"s3://{RAW_BUCKET}/{key}"
+    with pd.read_csv(
+        src_uri,
+        storage_options=STORAGE,
+        chunksize=chunksize,
+        usecols=usecols,
+        **read_csv_kwargs(),
+    ) as reader:
+        yield from reader
+
+
 # ---------------------------------------------------------------------
 # 2) Type parsing
 # ---------------------------------------------------------------------
-def parse_dates(df: pd.DataFrame, date_col: str = "date") -> pd.DataFrame:
-    """Convert string date column into datetime type."""
-    if date_col in df.columns:
-        df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
+def date_format(dates: pd.Series) -> Optional[str]:
+    """strftime format of the first non-null date string, as `pd.to_datetime` would infer it."""
+    first = dates.loc[dates.first_valid_index()] if dates.notna().any() else None
+    return guess_datetime_format(first) if isinstance(first, str) else None
+
+
+@profiled("transform.parse_dates")
+def parse_dates(df: pd.DataFrame, date_col: str = "date", fmt: Optional[str] = None) -> pd.DataFrame:
+    """Convert string date column into datetime type.
+
+    Same result as `pd.to_datetime(..., errors="coerce")`, but the format is
+    fixed once for the column (`fmt`, or the one inferred from its first
+    value) and only the distinct strings are parsed: a day column has a few
+    hundred of them per million rows.
+    """
+    if date_col not in df.columns:
+        return df
+    dates = df[date_col]
+    if pd.api.types.is_string_dtype(dates.dtype):
+        fmt = fmt or date_format(dates)
+    else:
+        fmt = None
+    if fmt is None:
+        # datetimes already, or no inferable format: pandas parses value by value
+        df[date_col] = pd.to_datetime(dates, errors="coerce")
+        return df
+    codes, uniques = pd.factorize(dates)
+    parsed = pd.to_datetime(uniques, format=fmt, errors="coerce").to_numpy("datetime64[ns]")
+    # code -1 (missing) picks the NaT appended at the end
+    values = np.append(parsed, np.datetime64("NaT", "ns"))[codes]
+    df[date_col] = pd.Series(values, index=df.index, name=date_col)
     return df
 
 
 # ---------------------------------------------------------------------
 # 3) Missing values imputation
 # ---------------------------------------------------------------------
-def impute_numeric(df: pd.DataFrame) -> pd.DataFrame:
-    """Fill NaN values in numeric columns with the median."""
-    num_cols = df.select_dtypes(include=["float64", "int64"]).columns
-    for c in num_cols:
-        if df[c].isna().any():
-            df[c] = df[c].fillna(df[c].median())
-    return df
+@profiled("transform.impute_numeric")
+def impute_numeric(
+    df: pd.DataFrame, medians: Optional[Dict[str, float]] = None
+) -> pd.DataFrame:
+    """Fill NaN values in numeric columns with the median.
+
+    `medians` holds precomputed fill values; when None they are computed from
+    `df` itself. See `HousingImputer`.
+    """
+    imputer = HousingImputer(medians) if medians is not None else HousingImputer().fit(df)
+    return imputer.transform(df)
 
 
+@profiled("transform.impute_binary")
 def impute_binary(df: pd.DataFrame, cols: List[str]) -> pd.DataFrame:
     """Fill NaN values in binary columns with 1 (assume 'yes') and cast to int."""
-    for c in cols:
-        if c in df.columns and df[c].isna().any():
-            df[c] = df[c].fillna(1).astype(int)
-    return df
+    return HousingImputer(binary_cols=cols).transform(df)
+
+
+def load_imputer() -> Optional[HousingImputer]:
+    """Fill values saved by the last full (or streaming) run, if any."""
+    return HousingImputer.load(IMPUTER_URI, storage_options=STORAGE)
+
+
+def load_dedup_index() -> DedupIndex:
+    """Dedup index saved by the previous runs; empty before the first one."""
+    return DedupIndex.load(DEDUP_INDEX_URI, storage_options=STORAGE) or DedupIndex()
 
 
 # ---------------------------------------------------------------------
 # 4) Feature engineering
 # ---------------------------------------------------------------------
+def _decompose_days(days: np.ndarray) -> Dict[str, np.ndarray]:
+    """Year, month, day and day of week (Monday = 0) of int64 days since 1970-01-01."""
+    d = days.astype("M8[D]")
+    m = d.astype("M8[M]")
+    return {
+        "year": d.astype("M8[Y]").astype("int64") + 1970,
+        "month": m.astype("int64") % 12 + 1,
+        "day": (d - m.astype("M8[D]")).astype("int64") + 1,
+        "dow": (days + 3) % 7,  # 1970-01-01 was a Thursday
+    }
+
+
+@profiled("transform.date_parts")
+def date_parts(dates: pd.Series) -> pd.DataFrame:
+    """year, month, day and dow of a datetime64[ns] Series, equal to its `.dt` accessors.
+
+    The dates are reduced to day numbers once; the parts are computed for
+    every day between the first and the last date and picked by lookup, so
+    the calendar arithmetic runs per distinct day, not per row. Like `.dt`,
+    the parts are int32, or float64 with NaN when `dates` has NaT.
+    """
+    values = dates.to_numpy("datetime64[ns]")
+    nat = np.isnat(values)
+    days = np.floor_divide(values.view("int64"), NS_PER_DAY)
+    if nat.any():
+        days[nat] = days[~nat].min() if (~nat).any() else 0
+    lo, hi = (int(days.min()), int(days.max())) if len(days) else (0, -1)
+    if hi - lo < len(days):
+        table = _decompose_days(np.arange(lo, hi + 1))
+        parts = {name: col[days - lo] for name, col in table.items()}
+    else:
+        parts = _decompose_days(days)
+    if nat.any():
+        parts = {name: np.where(nat, np.nan, col) for name, col in parts.items()}
+    else:
+        parts = {name: col.astype("int32") for name, col in parts.items()}
+    return pd.DataFrame(parts, index=dates.index)
+
+
+@profiled("transform.add_age_years")
 def add_age_years(
-    df: pd.DataFrame, date_col: str = "date", built_col: str = "year_built"
+    df: pd.DataFrame,
+    date_col: str = "date",
+    built_col: str = "year_built",
+    parts: Optional[pd.DataFrame] = None,
 ) -> pd.DataFrame:
-    """Add 'age_years' = difference between transaction year and year built (clipped at 0)."""
+    """Add 'age_years' = difference between transaction year and year built (clipped at 0).
+
+    `parts` is `date_parts(df[date_col])` when the caller already has it.
+    """
     if date_col in df.columns and built_col in df.columns:
-        df["age_years"] = (df[date_col].dt.year - df[built_col]).clip(lower=0)
+        year = (parts if parts is not None else date_parts(df[date_col]))["year"]
+        df["age_years"] = (year - df[built_col]).clip(lower=0)
     return df
 
 
+@profiled("transform.add_floor_ratio")
 def add_floor_ratio(
     df: pd.DataFrame, floor: str = "floor", total: str = "total_floors"
 ) -> pd.DataFrame:
@@ -80,47 +227,436 @@ def add_floor_ratio(
     return df
 
 
-def add_date_parts(df: pd.DataFrame, date_col: str = "date") -> pd.DataFrame:
-    """Extract year, month, day, and day-of-week from the date column."""
+@profiled("transform.add_date_parts")
+def add_date_parts(
+    df: pd.DataFrame, date_col: str = "date", parts: Optional[pd.DataFrame] = None
+) -> pd.DataFrame:
+    """Extract year, month, day, and day-of-week from the date column (see `date_parts`)."""
     if date_col in df.columns:
-        df["year"] = df[date_col].dt.year
-        df["month"] = df[date_col].dt.month
-        df["day"] = df[date_col].dt.day
-        df["dow"] = df[date_col].dt.dayofweek
+        parts = parts if parts is not None else date_parts(df[date_col])
+        for c in ["year", "month", "day", "dow"]:
+            df[c] = parts[c]
     return df
 
 
 # ---------------------------------------------------------------------
 # 5) Write processed data
 # ---------------------------------------------------------------------
-def write_processed_parquet(df: pd.DataFrame, key: str) -> str:
-    """Save processed DataFrame to S3/MinIO as parquet file."""
+def _write_options(partition_by: List[str]) -> dict:
+    """Common `pyarrow.dataset.write_dataset` arguments for processed datasets."""
+    fmt = ds.ParquetFileFormat()
+    return dict(
+        format=fmt,
+        file_options=fmt.make_write_options(
+            compression="zstd", use_dictionary=DICTIONARY_COLS, write_statistics=True
+        ),
+        partitioning=partition_by or None,
+        partitioning_flavor="hive" if partition_by else None,
+        min_rows_per_group=MIN_ROWS_PER_GROUP,
+        max_rows_per_group=MAX_ROWS_PER_GROUP,
+    )
+
+
+def _to_arrow(
+    df: pd.DataFrame, partition_by: List[str], schema: Optional[pa.Schema] = None
+) -> pa.Table:
+    """Convert to Arrow; date-part partition keys become nullable ints (no 'year=2024.0' dirs)."""
+    keys = {c: "Int32" for c in partition_by if c in DATE_PART_COLS and c in df.columns}
+    return pa.Table.from_pandas(df.astype(keys), schema=schema, preserve_index=False)
+
+
+@profiled("transform.write_processed_parquet")
+def write_processed_parquet(
+    df: pd.DataFrame, key: str, partition_by: Optional[List[str]] = None
+) -> str:
+    """Save processed DataFrame to S3/MinIO as a hive-partitioned parquet dataset."""
+    _, dst_uri = write_processed_parquet_chunks([df], key, partition_by)
+    return dst_uri
+
+
+@profiled("transform.write_processed_parquet_chunks")
+def write_processed_parquet_chunks(
+    chunks: Iterable[pd.DataFrame], key: str, partition_by: Optional[List[str]] = None
+) -> Tuple[int, str]:
+    """Write DataFrame chunks as one hive-partitioned parquet dataset processed/<key>/.
+
+    Any previous dataset under the key is replaced. `city`, `district` and
+    `postal_code` are dictionary-encoded and every row group carries column
+    statistics, so readers can prune partitions and row groups
+    (see `read_processed`).
+    """
+    partition_by = PARTITION_BY if partition_by is None else partition_by
     dst_uri = f"s3://{PROC_BUCKET}/{key}"
-    df.to_parquet(dst_uri, index=False, storage_options=STORAGE)
+    path = f"{PROC_BUCKET}/{key}"
+    fs = fsspec.filesystem("s3", **STORAGE)
+
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return 0, dst_uri
+    first_table = _to_arrow(first, partition_by)
+    schema = first_table.schema
+    rows = 0
+
+    def batches() -> Iterator[pa.RecordBatch]:
+        nonlocal rows
+        tables = (_to_arrow(c, partition_by, schema) for c in chunks)
+        for table in itertools.chain([first_table], tables):
+            rows += table.num_rows
+            yield from table.to_batches()
+
+    if fs.exists(path):
+        fs.rm(path, recursive=True)
+    ds.write_dataset(
+        batches(), path, schema=schema, filesystem=fs,
+        file_visitor=lambda f: add_bytes(written=f.size), **_write_options(partition_by)
+    )
+    return rows, dst_uri
+
+
+@profiled("transform.write_processed_partitions")
+def write_processed_partitions(df: pd.DataFrame, dataset: str, run_tag: str) -> str:
+    """Add rows to the hive-partitioned dataset processed/<dataset>/year=/month=/day=.
+
+    Every run writes its own `<run_tag>-*.parquet` file into each day it
+    touches, so reruns of the same tag overwrite and other runs are kept.
+    """
+    dst_uri = f"s3://{PROC_BUCKET}/{dataset}"
+    fs = fsspec.filesystem("s3", **STORAGE)
+    ds.write_dataset(
+        _to_arrow(df, DAY_PARTITIONS),
+        f"{PROC_BUCKET}/{dataset}",
+        filesystem=fs,
+        basename_template=f"{run_tag}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+        file_visitor=lambda f: add_bytes(written=f.size),
+        **_write_options(DAY_PARTITIONS),
+    )
     return dst_uri
 
 
+@profiled("transform.read_processed")
+def read_processed(
+    key: str,
+    columns: Optional[List[str]] = None,
+    filters: Optional[list] = None,
+) -> pd.DataFrame:
+    """Read a processed dataset, pushing column projection and filters down to parquet.
+
+    `filters` uses the pyarrow DNF form, e.g. [("city", "==", "Warszawa")] or
+    [("year", "==", 2025), ("month", ">=", 10)]; partition keys prune whole
+    directories, other columns skip row groups by their statistics.
+    """
+    fs = fsspec.filesystem("s3", **STORAGE)
+    dataset = ds.dataset(
+        f"{PROC_BUCKET}/{key}", filesystem=fs, format="parquet", partitioning="hive"
+    )
+    expr = pq.filters_to_expression(filters) if filters else None
+    return dataset.to_table(columns=columns, filter=expr).to_pandas()
+
+
 # ---------------------------------------------------------------------
 # 6) Full transformation pipeline
 # ---------------------------------------------------------------------
-def transform_pipeline(src_key: str, dst_key: str) -> Tuple[pd.DataFrame, str]:
-    """Full ETL pipeline: read → clean → feature engineering → write."""
-    df = read_raw_csv(src_key)
+@profiled("transform.transform_frame")
+def transform_frame(
+    df: pd.DataFrame, imputer: Optional[HousingImputer] = None
+) -> pd.DataFrame:
+    """Apply all cleaning and feature engineering steps to one DataFrame.
 
-    # Apply all transformations step by step
+    Without `imputer` the fill values are learned from `df` itself.
+    """
     df = parse_dates(df, "date")
-    df = impute_numeric(df)
-    df = impute_binary(df, cols=["has_elevator"])
-    df = add_age_years(df, "date", "year_built")
+    if imputer is None:
+        imputer = HousingImputer(binary_cols=BINARY_COLS).fit(df)
+    # `df` is already being changed in place (parse_dates), no need for a filled copy
+    df = imputer.transform(df, inplace=True)
+    parts = date_parts(df["date"]) if "date" in df.columns else None
+    df = add_age_years(df, "date", "year_built", parts)
     df = add_floor_ratio(df, "floor", "total_floors")
-    df = add_date_parts(df, "date")
+    df = add_date_parts(df, "date", parts)
+    return df
 
-    uri = write_processed_parquet(df, dst_key)
+
+def _to_ipc(df: pd.DataFrame) -> pa.Buffer:
+    """`df` as one Arrow IPC stream: a few column buffers instead of pickled pandas blocks."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def _from_ipc(buf: pa.Buffer) -> pd.DataFrame:
+    return pa.ipc.open_stream(buf).read_all().to_pandas()
+
+
+def _transform_part(buf: pa.Buffer, imputer: HousingImputer) -> pa.Buffer:
+    return _to_ipc(transform_frame(_from_ipc(buf), imputer))
+
+
+@profiled("transform.transform_frame_parallel")
+def transform_frame_parallel(
+    df: pd.DataFrame,
+    imputer: Optional[HousingImputer] = None,
+    workers: Optional[int] = None,
+    pool: Optional[Executor] = None,
+) -> pd.DataFrame:
+    """`transform_frame` over row ranges of `df` in a process pool, with the same result.
+
+    What depends on the whole frame happens here before the split: the
+    dates are parsed (one format for all rows) and the fill values are
+    learned when `imputer` is None. The row ranges go to the workers and
+    back as Arrow IPC streams and are concatenated in order under the
+    original index. Below MIN_PARALLEL_ROWS rows per worker the frame is
+    transformed in this process. `pool` reuses an executor across calls
+    (e.g. the chunks of a streaming run).
+
+    The IPC round trip costs about as much per row as the row-wise steps
+    themselves, so the pool pays off only with several idle cores.
+    """
+    workers = workers or os.cpu_count() or 1
+    n_parts = min(workers, len(df) // MIN_PARALLEL_ROWS)
+    if n_parts <= 1:
+        return transform_frame(df, imputer)
+    df = parse_dates(df, "date")
+    if imputer is None:
+        imputer = HousingImputer(binary_cols=BINARY_COLS).fit(df)
+
+    bounds = np.linspace(0, len(df), n_parts + 1).astype(int)
+    parts = [_to_ipc(df.iloc[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+    own_pool = pool is None
+    pool = pool or ProcessPoolExecutor(n_parts)
+    try:
+        results = pool.map(_transform_part, parts, itertools.repeat(imputer))
+        out = pd.concat([_from_ipc(buf) for buf in results], ignore_index=True)
+    finally:
+        if own_pool:
+            pool.shutdown()
+    out.index = df.index
+    return out
+
+
+@profiled("transform.pipeline")
+def transform_pipeline(
+    src_key: str,
+    dst_key: str,
+    partition_by: Optional[List[str]] = None,
+    workers: int = 1,
+    dedup: bool = False,
+) -> Tuple[pd.DataFrame, str]:
+    """Full ETL pipeline: read → (dedup) → clean → feature engineering → write.
+
+    The fill values are learned from all raw rows, as `scan_raw_csv` does for
+    the streaming run. With `dedup` the dedup index starts over with this
+    run's rows. `workers` > 1 runs the row-wise steps in a process pool
+    (`transform_frame_parallel`).
+    """
+    df = read_raw_csv(src_key)
+    df = parse_dates(df, "date")
+    imputer = HousingImputer(binary_cols=BINARY_COLS).fit(df)
+    imputer.save(IMPUTER_URI, storage_options=STORAGE)
+    index = DedupIndex() if dedup else None
+    if index is not None:
+        stats = DedupStats()
+        df = index.drop_duplicates(df, dst_key, stats)
+        print(f" Dedup: {stats}")
+    df = transform_frame_parallel(df, imputer, workers)
+    uri = write_processed_parquet(df, dst_key, partition_by)
+    if index is not None:
+        index.save(DEDUP_INDEX_URI, storage_options=STORAGE)
     return df, uri
 
 
+@profiled("transform.pipeline_incremental")
+def transform_pipeline_incremental(
+    src_key: str, dataset: str, run_tag: str, workers: int = 1, dedup: bool = False
+) -> Tuple[pd.DataFrame, str]:
+    """Incremental ETL pipeline: transform one raw delta file into per-day partitions.
+
+    Missing values are filled with the values saved by the last full run, so
+    a small delta is not imputed with its own (noisy) medians. Before any
+    full run they are learned from the delta and saved.
+    """
+    return transform_delta(read_raw_csv(src_key), dataset, run_tag, workers, dedup)
+
+
+def transform_delta(
+    df: pd.DataFrame, dataset: str, run_tag: str, workers: int = 1, dedup: bool = False
+) -> Tuple[pd.DataFrame, str]:
+    """`transform_pipeline_incremental` for a raw delta that is already in memory.
+
+    With `dedup`, rows already seen by earlier runs (exact or near
+    duplicates, see `DedupIndex`) are dropped before the transform; the
+    index is saved once the partitions are written. A rerun of `run_tag` is
+    checked against the history without its own earlier attempt.
+    """
+    dst_uri = f"s3://{PROC_BUCKET}/{dataset}"
+    if df.empty:
+        return df, dst_uri
+    imputer = load_imputer()
+    if imputer is None:
+        imputer = HousingImputer(binary_cols=BINARY_COLS).fit(parse_dates(df, "date"))
+        imputer.save(IMPUTER_URI, storage_options=STORAGE)
+    index = load_dedup_index().forget(run_tag) if dedup else None
+    if index is not None:
+        stats = DedupStats()
+        df = index.drop_duplicates(df, run_tag, stats)
+        print(f" Dedup: {stats}")
+    if not df.empty:
+        df = transform_frame_parallel(df, imputer, workers)
+        write_processed_partitions(df, dataset, run_tag)
+    if index is not None:
+        index.save(DEDUP_INDEX_URI, storage_options=STORAGE)
+    return df, dst_uri
+
+
 # ---------------------------------------------------------------------
-# 7) Command-line interface
+# 7) Streaming pipeline (bounded memory)
+# ---------------------------------------------------------------------
+# distinct values up to which a column's scan median comes from value counts
+MAX_EXACT_VALUES = 2_048
+
+
+def _merge_dtype(a: np.dtype, b: np.dtype) -> np.dtype:
+    """Dtype pandas would infer for a column if both chunks were read together."""
+    if a == b:
+        return a
+    if isinstance(a, pd.CategoricalDtype) and isinstance(b, pd.CategoricalDtype):
+        # a single read infers the sorted union of the categories of all chunks
+        return pd.CategoricalDtype(a.categories.union(b.categories))
+    if a == object or b == object:
+        return np.dtype(object)
+    return np.result_type(a, b)
+
+
+def _is_numeric(dtype) -> bool:
+    """Numeric as `select_dtypes("number")` sees it: no bools, no categoricals."""
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+def _median_from_counts(counts: pd.Series) -> float:
+    """Exact median of the values described by a value -> count Series."""
+    counts = counts.sort_index()
+    cum = counts.to_numpy().cumsum()
+    n = cum[-1]
+    values = counts.index.to_numpy(dtype="float64")
+    lo = values[np.searchsorted(cum, (n - 1) // 2, side="right")]
+    hi = values[np.searchsorted(cum, n // 2, side="right")]
+    return float((lo + hi) / 2)
+
+
+@profiled("transform.scan_raw_csv")
+def scan_raw_csv(
+    key: str, chunksize: int, date_col: str = "date"
+) -> Tuple[Dict[str, np.dtype], Dict[str, float], bool]:
+    """Stats passes over the raw CSV needed to stream it with in-memory results.
+
+    Returns the dtype of every column as a single read would infer it, the
+    median of every numeric column (like `HousingImputer.fit`, so a later
+    delta can be filled in any column) and whether the date column contains
+    unparseable values. Medians come from value counts while a column has at
+    most MAX_EXACT_VALUES distinct values (rooms, floors, flags, years:
+    exact); beyond that the column is kept as a t-digest. Columns with NaNs,
+    which this run fills, that outgrow the cap get their exact median from a
+    second, column-pruned read. Memory is bounded by the number of distinct
+    values, not by the number of rows.
+    """
+    dtypes: Dict[str, np.dtype] = {}
+    counts: Dict[str, pd.Series] = {}
+    digests: Dict[str, quantile_sketch.Centroids] = {}
+    null_cols = set()
+    date_has_nat = False
+    for chunk in read_raw_csv_chunks(key, chunksize):
+        for c, dt in chunk.dtypes.items():
+            dtypes[c] = _merge_dtype(dtypes[c], dt) if c in dtypes else dt
+            if not _is_numeric(dt):
+                continue
+            if c in digests:
+                d = quantile_sketch.build(np.zeros(len(chunk), "int64"), chunk[c].to_numpy("float64", na_value=np.nan))
+                digests[c] = quantile_sketch.merge([digests[c], d])
+                continue
+            vc = chunk[c].value_counts()
+            counts[c] = counts[c].add(vc, fill_value=0) if c in counts else vc
+            if len(counts[c]) > MAX_EXACT_VALUES:
+                vc = counts.pop(c).sort_index()
+                digests[c] = quantile_sketch.compress(quantile_sketch.Centroids(
+                    np.zeros(len(vc), "int64"), vc.index.to_numpy("float64"), vc.to_numpy("float64")
+                ))
+        null_cols.update(chunk.columns[chunk.isna().any()])
+        if date_col in chunk.columns and not date_has_nat:
+            date_has_nat = bool(parse_dates(chunk, date_col)[date_col].isna().any())
+
+    num_cols = [c for c, dt in dtypes.items() if _is_numeric(dt)]
+    medians = {c: _median_from_counts(counts[c]) for c in num_cols if c in counts and len(counts[c])}
+    medians.update({
+        c: float(quantile_sketch.quantiles(digests[c], [0.5], 1)[0, 0])
+        for c in num_cols
+        if c in digests and c not in null_cols
+    })
+    exact_cols = [c for c in num_cols if c in digests and c in null_cols]
+    if not exact_cols:
+        return dtypes, medians, date_has_nat
+
+    counts = {}
+    for chunk in read_raw_csv_chunks(key, chunksize, usecols=exact_cols):
+        for c in exact_cols:
+            vc = chunk[c].value_counts()
+            counts[c] = counts[c].add(vc, fill_value=0) if c in counts else vc
+    medians.update({c: _median_from_counts(counts[c]) for c in exact_cols if len(counts[c])})
+    return dtypes, medians, date_has_nat
+
+
+@profiled("transform.pipeline_streaming")
+def transform_pipeline_streaming(
+    src_key: str,
+    dst_key: str,
+    chunksize: int,
+    partition_by: Optional[List[str]] = None,
+    workers: int = 1,
+    dedup: bool = False,
+) -> Tuple[int, str]:
+    """Chunked ETL pipeline with the same output as `transform_pipeline`.
+
+    Global statistics come from `scan_raw_csv`; afterwards every chunk goes
+    through the regular transformation steps (and, with `dedup`, the dedup
+    index) and is streamed into the parquet dataset, so peak memory depends
+    on `chunksize` only (plus the index, a few dozen bytes per row).
+    """
+    dtypes, medians, date_has_nat = scan_raw_csv(src_key, chunksize, "date")
+    imputer = HousingImputer(medians, binary_cols=BINARY_COLS)
+    imputer.save(IMPUTER_URI, storage_options=STORAGE)
+    index, stats = (DedupIndex() if dedup else None), DedupStats()
+
+    def transformed_chunks(pool: Optional[Executor]) -> Iterator[pd.DataFrame]:
+        for df in read_raw_csv_chunks(src_key, chunksize):
+            # categoricals too: every chunk gets the categories of the whole file
+            casts = {c: dt for c, dt in dtypes.items() if df[c].dtype != dt}
+            df = df.astype(casts)
+            if index is not None:
+                df = index.drop_duplicates(df, dst_key, stats)
+            if df.empty:
+                continue
+            df = transform_frame_parallel(df, imputer, workers, pool)
+            if date_has_nat:
+                parts = [c for c in DATE_PART_COLS if c in df.columns]
+                df[parts] = df[parts].astype("float64")
+            yield df
+
+    if workers <= 1:
+        rows, uri = write_processed_parquet_chunks(transformed_chunks(None), dst_key, partition_by)
+    else:
+        # one pool for all chunks
+        with ProcessPoolExecutor(workers) as pool:
+            rows, uri = write_processed_parquet_chunks(transformed_chunks(pool), dst_key, partition_by)
+    if index is not None:
+        print(f" Dedup: {stats}")
+        index.save(DEDUP_INDEX_URI, storage_options=STORAGE)
+    return rows, uri
+
+
+# ---------------------------------------------------------------------
+# 8) Command-line interface
 # ---------------------------------------------------------------------
 def main():
     parser = argparse.ArgumentParser(
@@ -134,12 +670,56 @@ def main():
     parser.add_argument(
         "--dst",
         required=True,
-        help="Filename in bucket 'processed', e.g. housing_800k.parquet",
+        help="Dataset directory in bucket 'processed', e.g. housing_800k.parquet "
+        "(or housing with --incremental)",
+    )
+    parser.add_argument(
+        "--partition-by",
+        default=",".join(PARTITION_BY),
+        help="Comma-separated hive partition columns, e.g. year,month or city ('' = none)",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=0,
+        help="Stream the CSV in chunks of this many rows (0 = load it whole)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Treat --src as a raw delta and append it to per-day partitions of --dst",
+    )
+    parser.add_argument(
+        "--run-tag",
+        help="Name of the files this run writes into each partition (default: --src stem)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes for the row-wise transform steps (0 = all cores)",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Drop exact and near duplicate listings (etl/dedup.py) and extend the dedup index",
     )
     args = parser.parse_args()
+    workers = args.workers or os.cpu_count() or 1
+    partition_by = [c for c in args.partition_by.split(",") if c]
 
-    df, uri = transform_pipeline(args.src, args.dst)
-    print(f" Processed {len(df):,} rows → {uri}")
+    if args.incremental:
+        run_tag = args.run_tag or os.path.splitext(os.path.basename(args.src))[0]
+        df, uri = transform_pipeline_incremental(args.src, args.dst, run_tag, workers, args.dedup)
+        rows = len(df)
+    elif args.chunksize > 0:
+        rows, uri = transform_pipeline_streaming(
+            args.src, args.dst, args.chunksize, partition_by, workers, args.dedup
+        )
+    else:
+        df, uri = transform_pipeline(args.src, args.dst, partition_by, workers, args.dedup)
+        rows = len(df)
+    print(f" Processed {rows:,} rows → {uri}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,258 @@
+# etl/watermark.py
+import io
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import inspect, text
+
+from etl.dedup import row_hashes
+
+WATERMARK_SCHEMA = "public"
+WATERMARK_TABLE = "etl_watermark"
+
+WATERMARK_DDL = f"""
+CREATE TABLE IF NOT EXISTS {WATERMARK_SCHEMA}.{WATERMARK_TABLE} (
+    dataset         TEXT PRIMARY KEY,
+    max_date        TIMESTAMP NOT NULL,
+    max_listing_id  BIGINT NOT NULL,
+    updated_at      TIMESTAMPTZ NOT NULL DEFAULT now()
+)
+"""
+
+# Hash of every row as last loaded, to find rows changed at or before the
+# watermark. Extract stages the hashes of its delta per run tag; the load
+# moves them into ROW_HASH_TABLE in the transaction that upserts the rows.
+ROW_HASH_TABLE = "etl_row_hashes"
+PENDING_HASH_TABLE = "etl_row_hashes_pending"
+
+ROW_HASH_DDL = f"""
+CREATE TABLE IF NOT EXISTS {WATERMARK_SCHEMA}.{ROW_HASH_TABLE} (
+    dataset     TEXT NOT NULL,
+    listing_id  BIGINT NOT NULL,
+    row_hash    BIGINT NOT NULL,
+    PRIMARY KEY (dataset, listing_id)
+);
+CREATE TABLE IF NOT EXISTS {WATERMARK_SCHEMA}.{PENDING_HASH_TABLE} (
+    dataset     TEXT NOT NULL,
+    run_tag     TEXT NOT NULL,
+    listing_id  BIGINT NOT NULL,
+    row_hash    BIGINT NOT NULL
+);
+"""
+
+Watermark = Tuple[pd.Timestamp, int]
+# SQL with %(name)s placeholders and its bind parameters (a `post_sql` item of etl/copy_loader.py)
+Statement = Tuple[str, Dict[str, str]]
+
+
+@dataclass
+class DeltaStats:
+    rows: int = 0
+    new: int = 0
+    changed: int = 0
+    undated: int = 0
+    undated_kept: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.rows:,} rows: {self.new:,} new (past the watermark or late), {self.changed:,} changed before it; "
+            f"{self.undated:,} without a date ({self.undated_kept:,} of them new or changed)"
+        )
+
+
+def read_watermark(engine, dataset: str = "housing") -> Optional[Watermark]:
+    """Return the (date, listing_id) high-water mark of `dataset`, None before the first load."""
+    if not inspect(engine).has_table(WATERMARK_TABLE, schema=WATERMARK_SCHEMA):
+        return None
+    with engine.connect() as conn:
+        row = conn.execute(
+            text(
+                f"SELECT max_date, max_listing_id FROM {WATERMARK_SCHEMA}.{WATERMARK_TABLE} "
+                "WHERE dataset = :dataset"
+            ),
+            {"dataset": dataset},
+        ).first()
+    return (pd.Timestamp(row[0]), int(row[1])) if row else None
+
+
+def has_row_hashes(engine, dataset: str = "housing") -> bool:
+    """Whether a delta load stored row hashes for `dataset` since its last full load."""
+    if not inspect(engine).has_table(ROW_HASH_TABLE, schema=WATERMARK_SCHEMA):
+        return False
+    with engine.connect() as conn:
+        return bool(conn.execute(
+            text(f"SELECT EXISTS (SELECT 1 FROM {WATERMARK_SCHEMA}.{ROW_HASH_TABLE} WHERE dataset = :dataset)"),
+            {"dataset": dataset},
+        ).scalar())
+
+
+def read_row_hashes(engine, ids: np.ndarray, dataset: str = "housing") -> pd.Series:
+    """Stored row hash of the listing_ids in `ids` that have one (sorted by listing_id).
+
+    The ids are copied into a temporary table and joined on the server, so
+    only the rows of the batch leave Postgres, not the whole history.
+    """
+    ids_buf = io.StringIO("\n".join(map(str, np.unique(np.asarray(ids, "int64")))))
+    out = io.StringIO()
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("CREATE TEMP TABLE batch_ids (listing_id BIGINT PRIMARY KEY) ON COMMIT DROP")
+        cur.copy_expert("COPY batch_ids (listing_id) FROM STDIN", ids_buf)
+        # COPY takes no bind parameters: mogrify binds (and quotes) the dataset on the client
+        copy_sql = cur.mogrify(
+            f"COPY (SELECT h.listing_id, h.row_hash FROM {WATERMARK_SCHEMA}.{ROW_HASH_TABLE} h "
+            "JOIN batch_ids b USING (listing_id) "
+            "WHERE h.dataset = %(dataset)s ORDER BY h.listing_id) TO STDOUT (FORMAT csv)",
+            {"dataset": dataset},
+        )
+        cur.copy_expert(copy_sql.decode(), out)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    pairs = np.array(out.getvalue().replace(",", " ").split(), "int64").reshape(-1, 2)
+    return pd.Series(pairs[:, 1], index=pd.Index(pairs[:, 0], name="listing_id"))
+
+
+def filter_new_rows(
+    df: pd.DataFrame,
+    wm: Optional[Watermark],
+    known: Optional[pd.Series] = None,
+    stats: Optional[DeltaStats] = None,
+    date_col: str = "date",
+    id_col: str = "listing_id",
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Rows of `df` the warehouse does not hold yet, and the row hashes to record for them.
+
+    A row is new when it is strictly after the watermark in (date,
+    listing_id) order, changed when its hash differs from the one stored in
+    `known` (sorted by listing_id, as `read_row_hashes` returns it). Rows
+    without a parseable date cannot be ordered against the watermark and
+    are compared by hash only; `stats` counts them.
+
+    `known` is None on the first incremental run after a full load, when no
+    row hashes are stored yet: rows not past the watermark are then taken
+    as loaded and only their hash is recorded. Once hashes exist, a row
+    without one is a listing the warehouse never saw (a late arrival or an
+    undated row) and is kept.
+    """
+    stats = stats if stats is not None else DeltaStats()
+    dates = pd.to_datetime(df[date_col], errors="coerce")
+    undated = dates.isna().to_numpy()
+    hashes = row_hashes(df).view("int64")
+    if wm is None:
+        after = np.ones(len(df), bool)
+    else:
+        wm_date, wm_id = wm
+        after = ((dates > wm_date) | ((dates == wm_date) & (df[id_col] > wm_id))).to_numpy()
+    ids = df[id_col].to_numpy("int64")
+    found, stored = np.zeros(len(df), bool), np.zeros(len(df), "int64")
+    history = known is not None
+    if history and len(known):
+        keys = known.index.to_numpy("int64")
+        pos = np.minimum(np.searchsorted(keys, ids), len(keys) - 1)
+        found, stored = keys[pos] == ids, known.to_numpy()[pos]
+    unknown = ~found
+    changed = ~after & found & (stored != hashes)
+    late = ~after & unknown & history
+    keep = after | changed | late
+
+    stats.rows += len(df)
+    stats.new += int((after | late).sum())
+    stats.changed += int(changed.sum())
+    stats.undated += int(undated.sum())
+    stats.undated_kept += int((undated & keep).sum())
+    record = keep | unknown
+    return df[keep], pd.DataFrame({id_col: ids[record], "row_hash": hashes[record]})
+
+
+def stage_row_hashes(engine, hashes: pd.DataFrame, run_tag: str, dataset: str = "housing") -> None:
+    """Stage the row hashes of the delta of `run_tag`; `promote_row_hashes_sql` commits them with its load.
+
+    Pending hashes of earlier runs are dropped: a run that never loaded left
+    its stored hashes as they were, so its rows are extracted again.
+    """
+    hashes = hashes.drop_duplicates("listing_id", keep="last")
+    buf = io.StringIO()
+    pd.DataFrame({
+        "dataset": dataset, "run_tag": run_tag,
+        "listing_id": hashes["listing_id"].to_numpy(), "row_hash": hashes["row_hash"].to_numpy(),
+    }).to_csv(buf, index=False, header=False)
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(ROW_HASH_DDL)
+        cur.execute(
+            f"DELETE FROM {WATERMARK_SCHEMA}.{PENDING_HASH_TABLE} WHERE dataset = %s", (dataset,)
+        )
+        buf.seek(0)
+        cur.copy_expert(
+            f"COPY {WATERMARK_SCHEMA}.{PENDING_HASH_TABLE} (dataset, run_tag, listing_id, row_hash) "
+            "FROM STDIN (FORMAT csv)",
+            buf,
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def promote_row_hashes_sql(run_tag: str, dataset: str = "housing") -> Statement:
+    """SQL moving the pending row hashes of `run_tag` into ROW_HASH_TABLE, for the load transaction."""
+    pending = f"{WATERMARK_SCHEMA}.{PENDING_HASH_TABLE}"
+    where = "dataset = %(dataset)s AND run_tag = %(run_tag)s"
+    sql = f"""
+        INSERT INTO {WATERMARK_SCHEMA}.{ROW_HASH_TABLE} AS h (dataset, listing_id, row_hash)
+        SELECT DISTINCT ON (listing_id) dataset, listing_id, row_hash FROM {pending} WHERE {where}
+        ORDER BY listing_id
+        ON CONFLICT (dataset, listing_id) DO UPDATE SET row_hash = EXCLUDED.row_hash;
+        DELETE FROM {pending} WHERE {where};
+    """
+    return sql, {"dataset": dataset, "run_tag": run_tag}
+
+
+def reset_row_hashes_sql(dataset: str = "housing") -> Statement:
+    """SQL forgetting the row hashes of `dataset`, for a full reload (the next delta takes rows as loaded)."""
+    return (
+        f"DELETE FROM {WATERMARK_SCHEMA}.{ROW_HASH_TABLE} WHERE dataset = %(dataset)s",
+        {"dataset": dataset},
+    )
+
+
+def advance_watermark_sql(
+    source: str,
+    dataset: str = "housing",
+    date_col: str = "date",
+    id_col: str = "listing_id",
+    only_forward: bool = True,
+) -> Statement:
+    """SQL setting the watermark of `dataset` to the newest row of `source`.
+
+    Meant to run inside the load transaction, so the watermark only moves
+    together with the rows it describes. A full reload passes
+    `only_forward=False` to reset it to whatever the new table holds.
+    """
+    guard = (
+        "WHERE (EXCLUDED.max_date, EXCLUDED.max_listing_id) > (w.max_date, w.max_listing_id)"
+        if only_forward
+        else ""
+    )
+    sql = f"""
+        INSERT INTO {WATERMARK_SCHEMA}.{WATERMARK_TABLE} AS w (dataset, max_date, max_listing_id, updated_at)
+        SELECT %(dataset)s, m.d, (SELECT max({id_col}) FROM {source} s WHERE s.{date_col} = m.d), now()
+        FROM (SELECT max({date_col}) AS d FROM {source}) m
+        WHERE m.d IS NOT NULL
+        ON CONFLICT (dataset) DO UPDATE
+        SET max_date = EXCLUDED.max_date,
+            max_listing_id = EXCLUDED.max_listing_id,
+            updated_at = EXCLUDED.updated_at
+        {guard}
+    """
+    return sql, {"dataset": dataset}
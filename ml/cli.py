@@ -0,0 +1,116 @@
+# ml/cli.py
+"""Jeden punkt wejścia do skryptów ML; moduł komendy importowany dopiero przy jej uruchomieniu.
+`python -m ml.cli predict --only-changed`, `python -m ml.cli importtime` (kod 1 ponad budżet importu).
+"""
+import os
+import sys
+import argparse
+import importlib
+import subprocess
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+# subcommand -> (module, function run with the remaining arguments in sys.argv)
+COMMANDS = {
+    "train": ("ml.ml_final", "train_and_evaluate"),
+    "importance": ("ml.feature_importance", "main"),
+    "shap": ("ml.shap_explainer", "main"),
+    "predict": ("ml.predict_sample", "main"),
+    "compile": ("ml.compiled_model", "main"),
+    "serve": ("ml.serve", "main"),
+}
+
+# import time budgets in ms (~1.5-2x the value measured on one CPU; before the
+# lazy imports predict took ~2000 ms, shap ~3000 ms, importance ~1150 ms).
+# compile and serve need xgboost and scikit-learn to unpickle what they load.
+IMPORT_BUDGET_MS = {
+    "train": 3000,
+    "importance": 1000,
+    "shap": 1500,
+    "predict": 1200,
+    "compile": 3000,
+    "serve": 3500,
+}
+
+
+def import_time(module: str):
+    """(łączne µs, {pakiet najwyższego poziomu: łączne µs}) świeżego `import module`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    total, packages = 0, {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        name = name.strip()
+        if name == module:
+            total = int(cumulative)
+        elif "." not in name:
+            packages[name] = max(packages.get(name, 0), int(cumulative))
+    return total, packages
+
+
+def report_import_times(commands, repeat: int = 3, top: int = 5) -> bool:
+    """Wypisuje czas importu każdej komendy; False, gdy któraś przekracza budżet."""
+    ok = True
+    print(f"{'command':<12} {'module':<20} {'import ms':>10} {'budget ms':>10}  heaviest packages (ms)")
+    for command in commands:
+        module = COMMANDS[command][0]
+        # best of `repeat` runs: the first one also pays for cold disk caches
+        total, packages = min((import_time(module) for _ in range(repeat)), key=lambda r: r[0])
+        ms, budget = total / 1000, IMPORT_BUDGET_MS[command]
+        heaviest = sorted(packages.items(), key=lambda kv: -kv[1])[:top]
+        flag = "" if ms <= budget else "  OVER BUDGET"
+        ok &= ms <= budget
+        print(
+            f"{command:<12} {module:<20} {ms:>10.0f} {budget:>10}  "
+            + ", ".join(f"{name} {us / 1000:.0f}" for name, us in heaviest) + flag
+        )
+    return ok
+
+
+def main():
+    ap = argparse.ArgumentParser(
+        description="Skrypty ML: " + ", ".join(COMMANDS) + ", importtime.",
+        usage="%(prog)s {" + ",".join(COMMANDS) + ",importtime} [argumenty skryptu]",
+    )
+    ap.add_argument("command", choices=[*COMMANDS, "importtime"])
+    ap.add_argument("args", nargs=argparse.REMAINDER, help="przekazywane do skryptu (--help pokaże jego opcje)")
+    args = ap.parse_args()
+
+    if args.command == "importtime":
+        rep = argparse.ArgumentParser(prog=f"{ap.prog} importtime")
+        rep.add_argument("commands", nargs="*", help="domyślnie wszystkie")
+        rep.add_argument("--repeat", type=int, default=3)
+        opts = rep.parse_args(args.args)
+        unknown = set(opts.commands) - set(COMMANDS)
+        if unknown:
+            rep.error(f"unknown commands: {sorted(unknown)}")
+        sys.exit(0 if report_import_times(opts.commands or list(COMMANDS), opts.repeat) else 1)
+
+    if args.command == "train":
+        tr = argparse.ArgumentParser(prog=f"{ap.prog} train", description="Trenowanie i wybór najlepszego modelu.")
+        tr.add_argument("--models", help="np. XGBRegressor,RandomForest (domyślnie ML_MODELS albo wszystkie)")
+        tr.add_argument("--mode", choices=["full", "incremental"], help="pełne wyszukiwanie albo douczenie (domyślnie TRAIN_MODE, full)")
+        opts = tr.parse_args(args.args)
+        if opts.models:
+            # ml_final czyta ML_MODELS przy imporcie
+            os.environ["ML_MODELS"] = opts.models
+        if opts.mode:
+            os.environ["TRAIN_MODE"] = opts.mode
+        args.args = []
+
+    module, fn = COMMANDS[args.command]
+    sys.argv = [f"{ap.prog} {args.command}", *args.args]
+    getattr(importlib.import_module(module), fn)()
+
+
+if __name__ == "__main__":
+    main()
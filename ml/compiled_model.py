@@ -0,0 +1,365 @@
+# ml/compiled_model.py
+import argparse
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import xgboost as xgb
+
+
+COMPILED_PREFIX = "compiled_model_"
+PARITY_RTOL = 1e-5
+# wider `pre` outputs (e.g. one-hot postal codes) are built as CSR: a dense
+# 50k-row batch × 50k columns would be 10 GB of mostly zeros
+DENSE_MAX_FEATURES = 2_048
+
+Records = Union[pd.DataFrame, Dict[str, Any], Sequence[Dict[str, Any]]]
+
+
+# ---------------------------------------------------------------------
+# 1) Compiled artifact
+# ---------------------------------------------------------------------
+@dataclass
+class CompiledModel:
+    """Dopasowany `Pipeline(pre, model)` jako tablice NumPy i jeden booster XGBoost.
+    Powyżej DENSE_MAX_FEATURES kolumn macierz jest CSR; brakujące zera idą tam, gdzie 0.0 (`_compile_trees`).
+    """
+
+    num_cols: List[str]
+    num_median: np.ndarray
+    num_mean: np.ndarray
+    num_scale: np.ndarray
+    num_offset: int
+    cat_cols: List[str]
+    cat_fill: List[Any]
+    cat_categories: List[np.ndarray]
+    cat_offsets: List[int]
+    n_features: int
+    booster: xgb.Booster
+    missing: float = np.nan
+    model_name: str = ""
+    _indexes: List[pd.Index] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self._indexes = [pd.Index(c) for c in self.cat_categories]
+
+    def transform(self, X: Records) -> Union[np.ndarray, sp.csr_matrix]:
+        """Wyjście `pre` dla `X` (ramka, jedno ogłoszenie lub lista) jako float32; CSR powyżej DENSE_MAX_FEATURES."""
+        if isinstance(X, dict):
+            X = [X]
+        if isinstance(X, pd.DataFrame):
+            num = X[self.num_cols].to_numpy(dtype="float64")
+            cats = [X[c].to_numpy(dtype=object) for c in self.cat_cols]
+        else:
+            # missing keys behave like DataFrame.from_records: NaN, then imputed
+            num = np.array([[r.get(c, np.nan) for c in self.num_cols] for r in X], dtype="float64")
+            num = num.reshape(len(X), len(self.num_cols))
+            cats = [np.array([r.get(c, np.nan) for r in X], dtype=object) for c in self.cat_cols]
+
+        n = len(num)
+        num = (np.where(np.isnan(num), self.num_median, num) - self.num_mean) / self.num_scale
+        positions = []
+        for values, fill, index in zip(cats, self.cat_fill, self._indexes):
+            # SimpleImputer treats only NaN as missing in object columns (None stays a value)
+            missing = values != values
+            if missing.any():
+                values = np.where(missing, fill, values)
+            # unknown categories stay all-zero (handle_unknown="ignore")
+            positions.append(index.get_indexer(values))
+        if self.n_features > DENSE_MAX_FEATURES:
+            return self._csr(num, positions)
+
+        out = np.zeros((n, self.n_features), dtype="float32")
+        out[:, self.num_offset : self.num_offset + len(self.num_cols)] = num
+        rows = np.arange(n)
+        for pos, offset in zip(positions, self.cat_offsets):
+            hit = pos >= 0
+            out[rows[hit], offset + pos[hit]] = 1.0
+        return out
+
+    def _csr(self, num: np.ndarray, positions: List[np.ndarray]) -> sp.csr_matrix:
+        n = len(num)
+        # (first column, columns, values) blocks in output order, so each row's indices come out sorted
+        blocks = [(self.num_offset, np.broadcast_to(self.num_offset + np.arange(len(self.num_cols)), num.shape), num)]
+        for pos, offset in zip(positions, self.cat_offsets):
+            blocks.append((offset, np.where(pos >= 0, offset + pos, -1)[:, None], np.ones((n, 1))))
+        blocks.sort(key=lambda b: b[0])
+        cols = np.hstack([b[1] for b in blocks])
+        data = np.hstack([b[2] for b in blocks])
+        keep = cols >= 0
+        indptr = np.concatenate([[0], np.cumsum(keep.sum(axis=1))])
+        return sp.csr_matrix((data[keep].astype("float32"), cols[keep], indptr), shape=(n, self.n_features))
+
+    def predict(self, X: Records) -> np.ndarray:
+        return self.booster.inplace_predict(self.transform(X), missing=self.missing).astype("float64")
+
+    def contributions(self, Xt) -> np.ndarray:
+        """Dokładne wartości TreeSHAP macierzy po `transform`; ostatnia kolumna to wartość oczekiwana."""
+        dm = xgb.DMatrix(Xt, missing=self.missing)
+        return self.booster.predict(dm, pred_contribs=True)
+
+
+# ---------------------------------------------------------------------
+# 2) Preprocessor → tables
+# ---------------------------------------------------------------------
+def _steps(transformer) -> list:
+    return [s for _, s in transformer.steps] if hasattr(transformer, "steps") else [transformer]
+
+
+def _compile_pre(pre) -> dict:
+    """Tablice ColumnTransformera zbudowanego jak `ml_final.build_preprocessor`."""
+    from sklearn.impute import SimpleImputer
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+    if pre.remainder != "drop":
+        raise TypeError("CompiledModel supports only remainder='drop'")
+
+    tables = {"cat_cols": [], "cat_fill": [], "cat_categories": [], "cat_offsets": []}
+    offset = 0
+    for name, transformer, cols in pre.transformers_:
+        if transformer == "drop" or not len(cols):
+            continue
+        steps = _steps(transformer)
+        kinds = [type(s) for s in steps]
+        if kinds == [SimpleImputer, StandardScaler] and steps[0].strategy in ("median", "mean"):
+            imputer, scaler = steps
+            if np.isnan(imputer.statistics_).any():
+                raise TypeError(f"{name}: a column was empty at fit time")
+            tables.update(
+                num_cols=list(cols),
+                num_median=imputer.statistics_.astype("float64"),
+                num_mean=scaler.mean_ if scaler.with_mean else np.zeros(len(cols)),
+                num_scale=scaler.scale_ if scaler.with_std else np.ones(len(cols)),
+                num_offset=offset,
+            )
+            offset += len(cols)
+        elif kinds == [SimpleImputer, OneHotEncoder] and steps[0].strategy == "most_frequent":
+            imputer, encoder = steps
+            if encoder.drop is not None or encoder.handle_unknown != "ignore":
+                raise TypeError(f"{name}: only OneHotEncoder(handle_unknown='ignore') without drop")
+            for c, fill, categories in zip(cols, imputer.statistics_, encoder.categories_):
+                tables["cat_cols"].append(c)
+                tables["cat_fill"].append(fill)
+                tables["cat_categories"].append(np.asarray(categories, dtype=object))
+                tables["cat_offsets"].append(offset)
+                offset += len(categories)
+        else:
+            raise TypeError(f"{name}: unsupported steps {[k.__name__ for k in kinds]}")
+
+    if "num_cols" not in tables:
+        tables.update(num_cols=[], num_median=np.empty(0), num_mean=np.empty(0), num_scale=np.empty(0), num_offset=0)
+    tables["n_features"] = offset
+    return tables
+
+
+# ---------------------------------------------------------------------
+# 3) Tree ensemble → XGBoost booster
+# ---------------------------------------------------------------------
+def _threshold_lt(threshold: np.ndarray) -> np.ndarray:
+    """float32 `t'`, dla którego `x < t'` ⇔ `x <= threshold` dla każdego float32 x.
+    sklearn idzie w lewo przy `x <= threshold` (float64), XGBoost przy `x < split_condition` (float32).
+    """
+    t32 = threshold.astype("float32")
+    t32 = np.where(t32.astype("float64") > threshold, np.nextafter(t32, np.float32(-np.inf)), t32)
+    return np.nextafter(t32, np.float32(np.inf))
+
+
+def _tree_json(tree, tree_id: int, scale: float, n_features: int) -> dict:
+    """Jedno drzewo sklearn w schemacie JSON XGBoost, liście razy `scale`.
+    Węzły numerowane wszerz; pokrycia węzłów idą do `sum_hessian` (TreeSHAP), braki tam, gdzie 0.0.
+    """
+    order, i = [0], 0
+    while i < len(order):
+        node = order[i]
+        i += 1
+        if tree.children_left[node] >= 0:
+            order += [tree.children_left[node], tree.children_right[node]]
+    order = np.asarray(order)
+    new_id = np.empty_like(order)
+    new_id[order] = np.arange(len(order))
+
+    left, right = tree.children_left[order], tree.children_right[order]
+    leaf = left < 0
+    left = np.where(leaf, -1, new_id[np.maximum(left, 0)])
+    right = np.where(leaf, -1, new_id[np.maximum(right, 0)])
+    n = len(order)
+    parents = np.full(n, 2147483647)
+    parents[left[~leaf]] = np.flatnonzero(~leaf)
+    parents[right[~leaf]] = np.flatnonzero(~leaf)
+    values = (tree.value[order, 0, 0] * scale).astype("float32")
+    conditions = np.where(leaf, values, _threshold_lt(tree.threshold[order]))
+
+    return {
+        "base_weights": values.tolist(),
+        "categories": [],
+        "categories_nodes": [],
+        "categories_segments": [],
+        "categories_sizes": [],
+        "default_left": np.where(leaf, 0, 0 < conditions).astype(int).tolist(),
+        "id": tree_id,
+        "left_children": left.tolist(),
+        "loss_changes": [0.0] * n,
+        "parents": parents.tolist(),
+        "right_children": right.tolist(),
+        "split_conditions": conditions.astype("float32").tolist(),
+        "split_indices": np.maximum(tree.feature[order], 0).tolist(),
+        "split_type": [0] * n,
+        "sum_hessian": tree.weighted_n_node_samples[order].tolist(),
+        "tree_param": {
+            "num_deleted": "0",
+            "num_feature": str(n_features),
+            "num_nodes": str(n),
+            "size_leaf_vector": "1",
+        },
+    }
+
+
+def _booster_from_trees(trees: list, scale: float, base_score: float, n_features: int) -> xgb.Booster:
+    """Booster regresji XGBoost liczący `base_score + scale * suma wartości drzew`."""
+    n = len(trees)
+    model = {
+        "learner": {
+            "attributes": {},
+            "feature_names": [],
+            "feature_types": [],
+            "gradient_booster": {
+                "model": {
+                    "gbtree_model_param": {"num_parallel_tree": "1", "num_trees": str(n)},
+                    "iteration_indptr": list(range(n + 1)),
+                    "tree_info": [0] * n,
+                    "trees": [_tree_json(t, i, scale, n_features) for i, t in enumerate(trees)],
+                },
+                "name": "gbtree",
+            },
+            "learner_model_param": {
+                # float32 in E notation: XGBoost falls back to 0.5 on longer decimals
+                "base_score": f"{np.float32(base_score):.8E}",
+                "boost_from_average": "0",
+                "num_class": "0",
+                "num_feature": str(n_features),
+                "num_target": "1",
+            },
+            "objective": {"name": "reg:squarederror", "reg_loss_param": {"scale_pos_weight": "1"}},
+        },
+        "version": [int(v) for v in xgb.__version__.split(".")[:3]],
+    }
+    booster = xgb.Booster()
+    booster.load_model(bytearray(json.dumps(model).encode()))
+    return booster
+
+
+def _zero_default_left(booster: xgb.Booster) -> xgb.Booster:
+    """Kopia `booster` kierująca braki tam, gdzie 0.0; bez NaN predykcje się nie zmieniają."""
+    model = json.loads(booster.save_raw("json"))
+    for tree in model["learner"]["gradient_booster"]["model"]["trees"]:
+        conditions = np.asarray(tree["split_conditions"], dtype="float32")
+        leaf = np.asarray(tree["left_children"]) < 0
+        tree["default_left"] = np.where(leaf, 0, 0 < conditions).astype(int).tolist()
+    out = xgb.Booster()
+    out.load_model(bytearray(json.dumps(model).encode()))
+    return out
+
+
+def _compile_trees(model, n_features: int, sparse_input: bool) -> Tuple[xgb.Booster, float]:
+    """(booster, wartość braku) odtwarzające `model.predict` na wyjściu `pre`."""
+    from sklearn.dummy import DummyRegressor
+    from sklearn.ensemble import ExtraTreesRegressor, GradientBoostingRegressor, RandomForestRegressor
+    from sklearn.tree import DecisionTreeRegressor
+
+    if isinstance(model, xgb.XGBRegressor):
+        booster = model.get_booster()
+        try:
+            # predict() stops at the best iteration after early stopping
+            booster = booster[: model.best_iteration + 1]
+        except AttributeError:
+            pass
+        # a sparse `pre` output hides its zeros from XGBoost, which then treats them as missing
+        if sparse_input:
+            return booster, 0.0
+        return _zero_default_left(booster), model.missing
+
+    if getattr(model, "n_outputs_", 1) != 1:
+        raise TypeError("CompiledModel supports single-output regressors only")
+    if isinstance(model, (RandomForestRegressor, ExtraTreesRegressor)):
+        trees = [e.tree_ for e in model.estimators_]
+        return _booster_from_trees(trees, 1 / len(trees), 0.0, n_features), np.nan
+    if isinstance(model, GradientBoostingRegressor):
+        if model.init_ == "zero":
+            base = 0.0
+        elif isinstance(model.init_, DummyRegressor):
+            base = float(np.ravel(model.init_.constant_)[0])
+        else:
+            raise TypeError("GradientBoostingRegressor with a custom init estimator")
+        trees = [e.tree_ for e in model.estimators_[:, 0]]
+        return _booster_from_trees(trees, model.learning_rate, base, n_features), np.nan
+    if isinstance(model, DecisionTreeRegressor):
+        return _booster_from_trees([model.tree_], 1.0, 0.0, n_features), np.nan
+    raise TypeError(f"CompiledModel does not support {type(model).__name__}")
+
+
+def compile_pipeline(pipe) -> CompiledModel:
+    """Kompiluje dopasowany `Pipeline([("pre", ...), ("model", ...)])`; TypeError, gdy nieobsługiwany."""
+    pre, model = pipe.named_steps["pre"], pipe.named_steps["model"]
+    tables = _compile_pre(pre)
+    booster, missing = _compile_trees(model, tables["n_features"], bool(pre.sparse_output_))
+    return CompiledModel(**tables, booster=booster, missing=missing, model_name=type(model).__name__)
+
+
+# ---------------------------------------------------------------------
+# 4) Parity + export
+# ---------------------------------------------------------------------
+def check_parity(pipe, compiled: CompiledModel, X: pd.DataFrame, rtol: float = PARITY_RTOL) -> float:
+    """Największa różnica względna do `pipe.predict(X)`; ValueError powyżej `rtol`.
+    Booster sumuje drzewa we float32, więc zgodność jest do zaokrąglenia float32.
+    """
+    expected = pipe.predict(X)
+    got = compiled.predict(X)
+    rel = np.abs(got - expected) / np.maximum(np.abs(expected), 1.0)
+    worst = float(rel.max()) if len(rel) else 0.0
+    if worst > rtol:
+        i = int(rel.argmax())
+        raise ValueError(
+            f"Compiled model differs from the pipeline: row {i} {got[i]:,.4f} vs {expected[i]:,.4f} "
+            f"(rel {worst:.2e} > {rtol:.0e})"
+        )
+    return worst
+
+
+def export_compiled(pipe, path: Path, X_check: Optional[pd.DataFrame] = None) -> Path:
+    """Kompiluje `pipe`, sprawdza go na `X_check` i zapisuje przez joblib."""
+    compiled = compile_pipeline(pipe)
+    if X_check is not None:
+        worst = check_parity(pipe, compiled, X_check)
+        print(f"Parzystość z pipeline: {len(X_check):,} wierszy, maks. błąd względny {worst:.2e}")
+    joblib.dump(compiled, path)
+    print(f"Zapisano skompilowany model do: {path}")
+    return path
+
+
+def main():
+    from sqlalchemy import create_engine
+    from ml.data_loader import PG_URL, TARGET_COL, load_frame
+
+    ap = argparse.ArgumentParser(description="Compile a best_model_*.joblib pipeline for fast inference.")
+    ap.add_argument("--model", required=True, help="artifacts/best_model_<name>.joblib")
+    ap.add_argument("--out", help="domyślnie compiled_model_<name>.joblib obok modelu")
+    ap.add_argument("--check-frac", type=float, default=0.01, help="próbka gold.housing_valid do testu parzystości")
+    args = ap.parse_args()
+
+    model_path = Path(args.model)
+    out = Path(args.out) if args.out else model_path.with_name(
+        model_path.name.replace("best_model_", COMPILED_PREFIX, 1)
+    )
+    X_check = None
+    if args.check_frac > 0:
+        X_check = load_frame(create_engine(PG_URL), args.check_frac).drop(columns=[TARGET_COL])
+    export_compiled(joblib.load(model_path), out, X_check)
+
+
+if __name__ == "__main__":
+    main()
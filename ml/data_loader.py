@@ -0,0 +1,314 @@
+# ml/data_loader.py
+import argparse
+import os
+import resource
+import tempfile
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+
+TABLE_NAME = "gold.housing_valid"
+TARGET_COL = "price_total"
+ID_COL = "listing_id"
+
+# Kolumny wejściowe modeli: bez identyfikatora, surowej daty i stałej flagi
+# (w housing_valid zawsze false) - reszta jak w SELECT *.
+FEATURE_COLS = [
+    "season",
+    "listing_year",
+    "decade",
+    "listing_month",
+    "listing_day",
+    "listing_day_of_week",
+    "city",
+    "district",
+    "postal_code",
+    "rooms",
+    "floor",
+    "total_floors",
+    "floor_ratio",
+    "year_built",
+    "building_age",
+    "area_sqm",
+    "area_sqm_bucket",
+    "distance_center_km",
+    "distance_km_bucket",
+    "price_sqm",
+    "has_elevator_int",
+]
+
+DEFAULT_CHUNK_ROWS = 100_000
+HASH_BUCKETS = 1_000_000
+
+PG_URL = (
+    f"postgresql+psycopg2://"
+    f"{os.getenv('PG_USER', 'postgres')}:"
+    f"{os.getenv('PG_PASSWORD', 'postgres')}@"
+    f"{os.getenv('PG_HOST', 'localhost')}:"
+    f"{os.getenv('PG_PORT', '5432')}/"
+    f"{os.getenv('PG_DB', 'warehouse')}"
+)
+
+
+@dataclass
+class ReadStats:
+    """Transfer summary of one read from Postgres."""
+
+    rows: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    peak_rss_mb: float = 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.rows:,} rows, {self.bytes / 1e6:,.1f} MB in pandas, {self.seconds:.2f}s, "
+            f"peak RSS {self.peak_rss_mb:,.0f} MB"
+        )
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# ---------------------------------------------------------------------
+# 1) Server-side sampling + column projection
+# ---------------------------------------------------------------------
+def hash_bucket_sql(seed: int = 42) -> str:
+    """Stable pseudo-random bucket in [0, HASH_BUCKETS) of each listing.
+
+    gold.housing_valid is a view, so TABLESAMPLE is not available; hashing
+    the key samples the same rows on every run and on every Postgres node.
+    """
+    return f"mod(abs(hashtextextended({ID_COL}::text, {int(seed)})), {HASH_BUCKETS})"
+
+
+def select_sql(
+    columns: Sequence[str],
+    frac: float = 1.0,
+    seed: int = 42,
+    exclude_frac: float = 0.0,
+    table: str = TABLE_NAME,
+    after_id: Optional[int] = None,
+) -> str:
+    """SELECT of `columns` keeping about `frac` of the rows, decided in Postgres.
+
+    `exclude_frac` drops the top buckets first, so a holdout taken with
+    `holdout_sql` never overlaps the sample. `after_id` keeps only listings
+    with a larger listing_id (rows added since a model was trained).
+    """
+    cols = ", ".join(columns)
+    hi = int(HASH_BUCKETS * (1 - exclude_frac) * min(frac, 1.0))
+    conds = [f"{hash_bucket_sql(seed)} < {hi}"] if hi < HASH_BUCKETS else []
+    if after_id is not None:
+        conds.append(f"{ID_COL} > {int(after_id)}")
+    where = f" WHERE {' AND '.join(conds)}" if conds else ""
+    return f"SELECT {cols} FROM {table}{where}"
+
+
+def holdout_sql(columns: Sequence[str], frac: float, seed: int = 42, table: str = TABLE_NAME) -> str:
+    """SELECT of the top `frac` hash buckets (the complement of `select_sql(exclude_frac=frac)`)."""
+    cols = ", ".join(columns)
+    lo = int(HASH_BUCKETS * (1 - frac))
+    return f"SELECT {cols} FROM {table} WHERE {hash_bucket_sql(seed)} >= {lo}"
+
+
+def iter_chunks(
+    engine, sql: str, chunk_rows: int = DEFAULT_CHUNK_ROWS, stats: Optional[ReadStats] = None
+) -> Iterator[pd.DataFrame]:
+    """Stream the result of `sql` through a server-side cursor, `chunk_rows` rows at a time."""
+    start = time.perf_counter()
+    with engine.connect().execution_options(stream_results=True) as conn:
+        for chunk in pd.read_sql(text(sql), conn, chunksize=chunk_rows):
+            if stats is not None:
+                stats.rows += len(chunk)
+                stats.bytes += int(chunk.memory_usage(deep=True).sum())
+            yield chunk
+    if stats is not None:
+        stats.seconds = time.perf_counter() - start
+        stats.peak_rss_mb = _peak_rss_mb()
+
+
+def load_frame(
+    engine,
+    frac: float = 1.0,
+    seed: int = 42,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    columns: Optional[List[str]] = None,
+    after_id: Optional[int] = None,
+    exclude_frac: float = 0.0,
+) -> pd.DataFrame:
+    """Feature columns + target of a server-side sample, read in chunks."""
+    stats = ReadStats()
+    cols = (columns or FEATURE_COLS) + [TARGET_COL]
+    sql = select_sql(cols, frac, seed, exclude_frac=exclude_frac, after_id=after_id)
+    chunks = list(iter_chunks(engine, sql, chunk_rows, stats))
+    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=cols)
+    print(f"Wczytano {TABLE_NAME} (frac={frac}): {stats}")
+    return df
+
+
+def load_holdout(
+    engine,
+    frac: float,
+    seed: int = 42,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    columns: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """Feature columns + target of the top `frac` hash buckets (see `holdout_sql`)."""
+    cols = (columns or FEATURE_COLS) + [TARGET_COL]
+    chunks = list(iter_chunks(engine, holdout_sql(cols, frac, seed), chunk_rows))
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=cols)
+
+
+def max_id(engine, table: str = TABLE_NAME) -> Optional[int]:
+    """Largest listing_id in `table`, None when it is empty."""
+    with engine.connect() as conn:
+        value = conn.execute(text(f"SELECT max({ID_COL}) FROM {table}")).scalar()
+    return None if value is None else int(value)
+
+
+# ---------------------------------------------------------------------
+# 2) XGBoost external memory
+# ---------------------------------------------------------------------
+@lru_cache(maxsize=None)
+def postgres_batch_iter():
+    """The `PostgresBatchIter` class, defined on first use so that importing this module does not load XGBoost."""
+    import xgboost as xgb
+
+    class PostgresBatchIter(xgb.DataIter):
+        """Feeds XGBoost chunk by chunk from Postgres, through a fitted preprocessor.
+
+        XGBoost calls `reset` + `next` for every pass over the data and keeps
+        its own compressed pages in `cache_dir`, so the rows never sit in
+        pandas all at once.
+        """
+
+        def __init__(self, engine, sql: str, pre, chunk_rows: int, cache_dir: str):
+            self.engine = engine
+            self.sql = sql
+            self.pre = pre
+            self.chunk_rows = chunk_rows
+            self.stats = ReadStats()
+            self._chunks = None
+            super().__init__(cache_prefix=os.path.join(cache_dir, "housing"))
+
+        def reset(self) -> None:
+            self._chunks = None
+
+        def next(self, input_data) -> bool:
+            if self._chunks is None:
+                self.stats = ReadStats()
+                self._chunks = iter_chunks(self.engine, self.sql, self.chunk_rows, self.stats)
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return False
+            y = chunk.pop(TARGET_COL).to_numpy(dtype="float32")
+            input_data(data=self.pre.transform(chunk), label=y)
+            return True
+
+    return PostgresBatchIter
+
+
+def train_xgb_external(
+    engine,
+    params: dict,
+    num_boost_round: int = 200,
+    holdout_frac: float = 0.1,
+    fit_frac: float = 0.05,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    seed: int = 42,
+):
+    """Train XGBoost on all rows except a hashed holdout, without loading them into pandas.
+
+    The preprocessor is fitted on a `fit_frac` sample (medians, scaling,
+    one-hot categories), the training rows are streamed into an external
+    memory `ExtMemQuantileDMatrix`, and the holdout stops boosting early.
+    Returns a `Pipeline(pre, XGBRegressor)` like `ml_final` produces.
+    """
+    import xgboost as xgb
+    from sklearn.pipeline import Pipeline
+    from ml.ml_final import build_preprocessor
+
+    cols = FEATURE_COLS + [TARGET_COL]
+    sample = load_frame(engine, fit_frac, seed)
+    pre = build_preprocessor(sample)[0].fit(sample.drop(columns=[TARGET_COL]), sample[TARGET_COL])
+
+    holdout = load_holdout(engine, holdout_frac, seed, chunk_rows)
+    y_hold = holdout.pop(TARGET_COL)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        it = postgres_batch_iter()(
+            engine, select_sql(cols, seed=seed, exclude_frac=holdout_frac), pre, chunk_rows, cache_dir
+        )
+        start = time.perf_counter()
+        dtrain = xgb.ExtMemQuantileDMatrix(it)
+        dvalid = xgb.QuantileDMatrix(pre.transform(holdout), label=y_hold, ref=dtrain)
+        booster = xgb.train(
+            {"tree_method": "hist", "eval_metric": "mae", **params},
+            dtrain,
+            num_boost_round=num_boost_round,
+            evals=[(dvalid, "holdout")],
+            early_stopping_rounds=20,
+            verbose_eval=False,
+        )
+        seconds = time.perf_counter() - start
+        n_rows = dtrain.num_row()
+        del dtrain, dvalid, it  # release the cache pages before the directory goes
+
+    model = xgb.XGBRegressor()
+    model.load_model(bytearray(booster.save_raw("ubj")))
+    pipe = Pipeline([("pre", pre), ("model", model)])
+    mae = float(np.mean(np.abs(pipe.predict(holdout) - y_hold)))
+    print(
+        f"XGBoost external memory: {n_rows:,} wierszy, {seconds:.2f}s, "
+        f"best_iteration={booster.best_iteration}, MAE holdout={mae:,.2f}, "
+        f"peak RSS {_peak_rss_mb():,.0f} MB"
+    )
+    return pipe
+
+
+# ---------------------------------------------------------------------
+# 3) CLI: compare transfer / memory
+# ---------------------------------------------------------------------
+def main():
+    ap = argparse.ArgumentParser(description="Measure training data reads from gold.housing_valid.")
+    ap.add_argument(
+        "--mode",
+        choices=["select-all", "sampled", "external"],
+        default="sampled",
+        help="select-all = dawne SELECT * + df.sample, sampled = próbka po stronie serwera, "
+        "external = XGBoost na wszystkich wierszach z external memory",
+    )
+    ap.add_argument("--frac", type=float, default=0.05)
+    ap.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    args = ap.parse_args()
+
+    engine = create_engine(PG_URL)
+    if args.mode == "select-all":
+        start = time.perf_counter()
+        df = pd.read_sql(f"SELECT * FROM {TABLE_NAME}", engine)
+        full_bytes = df.memory_usage(deep=True).sum()
+        df = df.sample(frac=args.frac, random_state=42)
+        print(
+            f"SELECT * + sample: {len(df):,} rows kept, {full_bytes / 1e6:,.1f} MB transferred to pandas, "
+            f"{time.perf_counter() - start:.2f}s, peak RSS {_peak_rss_mb():,.0f} MB"
+        )
+    elif args.mode == "sampled":
+        load_frame(engine, args.frac, chunk_rows=args.chunk_rows)
+    else:
+        train_xgb_external(
+            engine,
+            {"learning_rate": 0.05, "max_depth": 5, "subsample": 0.8, "colsample_bytree": 0.8, "seed": 42},
+            chunk_rows=args.chunk_rows,
+        )
+
+
+if __name__ == "__main__":
+    main()
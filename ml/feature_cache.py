@@ -0,0 +1,184 @@
+# ml/feature_cache.py
+import hashlib
+import json
+import shutil
+from pathlib import Path
+from typing import Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import scipy.sparse as sp
+from sqlalchemy import text
+
+from ml.data_loader import FEATURE_COLS, ID_COL, TABLE_NAME, TARGET_COL, load_frame, select_sql
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+CACHE_DIR = PROJECT_ROOT / "artifacts" / "feature_cache"
+MAX_VERSIONS = 3
+
+SOURCE_COLS = [ID_COL] + FEATURE_COLS + [TARGET_COL]
+SOURCE_FILE = "source.arrow"
+META_FILE = "meta.json"
+# sample (frac, seed) of the last training run: readers of the cache use the same data version
+TRAINING_FILE = "training.json"
+DEFAULT_FRAC, DEFAULT_SEED = 0.05, 42
+
+
+# ---------------------------------------------------------------------
+# 1) Keys
+# ---------------------------------------------------------------------
+def data_version(engine, frac: float = 0.05, seed: int = 42, table: str = TABLE_NAME) -> str:
+    """Fingerprint of the rows `load_frame(frac, seed)` would return.
+
+    Postgres aggregates a row count and an order-independent sum of row
+    hashes over the sampled rows and columns, so only two numbers cross the
+    wire; any insert, delete or update of a sampled row changes the version.
+    """
+    rows = select_sql(SOURCE_COLS, frac, seed, table=table)
+    sql = f"SELECT count(*), coalesce(sum(hashtextextended(t::text, 0)::numeric), 0) FROM ({rows}) t"
+    with engine.connect() as conn:
+        n, h = conn.execute(text(sql)).one()
+    key = f"{table}|{','.join(SOURCE_COLS)}|{frac}|{seed}|{n}|{h}"
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def record_training_sample(frac: float, seed: int) -> None:
+    """Remember the sample the saved model was trained on (see `training_sample`)."""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    (CACHE_DIR / TRAINING_FILE).write_text(json.dumps({"frac": frac, "seed": seed}))
+
+
+def training_sample() -> Tuple[float, int]:
+    """(frac, seed) of the last training run, so SHAP reads the version training cached.
+
+    Halving trains on the view without the drift holdout, random search on 5%; before
+    the first training run the 5% sample.
+    """
+    path = CACHE_DIR / TRAINING_FILE
+    if not path.exists():
+        return DEFAULT_FRAC, DEFAULT_SEED
+    sample = json.loads(path.read_text())
+    return float(sample["frac"]), int(sample["seed"])
+
+
+def preprocessor_key(pre) -> str:
+    """Hash of a fitted preprocessor (its learned medians, scales and categories)."""
+    return joblib.hash(pre)[:16]
+
+
+def _version_dir(version: str) -> Path:
+    return CACHE_DIR / version
+
+
+def _evict(keep: str) -> None:
+    """Drop all but the MAX_VERSIONS most recently used data versions."""
+    versions = sorted(
+        (p for p in CACHE_DIR.iterdir() if p.is_dir()), key=lambda p: p.stat().st_mtime, reverse=True
+    )
+    for old in [p for p in versions if p.name != keep][MAX_VERSIONS - 1 :]:
+        shutil.rmtree(old, ignore_errors=True)
+        print(f"Usunięto starą wersję cache: {old.name}")
+
+
+# ---------------------------------------------------------------------
+# 2) Source rows (features + target + listing_id)
+# ---------------------------------------------------------------------
+def load_source(engine, frac: float = 0.05, seed: int = 42) -> Tuple[pd.DataFrame, str]:
+    """Sampled source rows of the current data version, from cache or Postgres.
+
+    Returns (frame, version). The frame is stored as uncompressed Arrow IPC
+    and memory-mapped on later reads.
+    """
+    version = data_version(engine, frac, seed)
+    path = _version_dir(version) / SOURCE_FILE
+    if path.exists():
+        path.parent.touch()
+        df = feather.read_table(path, memory_map=True).to_pandas()
+        print(f"Cache cech: wersja {version}, {len(df):,} wierszy z {path}")
+        return df, version
+
+    df = load_frame(engine, frac, seed, columns=[ID_COL] + FEATURE_COLS)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), tmp, compression="uncompressed")
+    tmp.replace(path)
+    _evict(keep=version)
+    print(f"Cache cech: zapisano wersję {version} → {path}")
+    return df, version
+
+
+# ---------------------------------------------------------------------
+# 3) Preprocessed matrix
+# ---------------------------------------------------------------------
+def _matrix_dir(version: str, pre) -> Path:
+    return _version_dir(version) / preprocessor_key(pre)
+
+
+def materialize(df: pd.DataFrame, pre, version: str) -> Path:
+    """Write `pre.transform(df)` of a data version as .npy files that can be memory-mapped."""
+    out = _matrix_dir(version, pre)
+    if (out / META_FILE).exists():
+        return out
+    X = pre.transform(df.drop(columns=[c for c in (ID_COL, TARGET_COL) if c in df.columns]))
+    out.mkdir(parents=True, exist_ok=True)
+    if sp.issparse(X):
+        X = X.tocsr()
+        for part in ("data", "indices", "indptr"):
+            np.save(out / f"X_{part}.npy", getattr(X, part))
+        fmt = "csr"
+    else:
+        np.save(out / "X.npy", np.ascontiguousarray(X, dtype="float64"))
+        fmt = "dense"
+    try:
+        feature_names = [str(f) for f in pre.get_feature_names_out()]
+    except Exception:
+        feature_names = None
+    meta = {"format": fmt, "shape": list(X.shape), "feature_names": feature_names}
+    (out / META_FILE).write_text(json.dumps(meta, indent=2))
+    print(f"Cache cech: macierz {fmt} {X.shape} → {out}")
+    return out
+
+
+def load_matrix(version: str, pre) -> Optional[Tuple[object, dict]]:
+    """Memory-mapped (matrix, meta) cached for `version` and `pre`; None when not materialized."""
+    out = _matrix_dir(version, pre)
+    if not (out / META_FILE).exists():
+        return None
+    meta = json.loads((out / META_FILE).read_text())
+    if meta["format"] == "csr":
+        parts = [np.load(out / f"X_{p}.npy", mmap_mode="r") for p in ("data", "indices", "indptr")]
+        X = sp.csr_matrix(tuple(parts), shape=tuple(meta["shape"]), copy=False)
+    else:
+        X = np.load(out / "X.npy", mmap_mode="r")
+    return X, meta
+
+
+def features_for(
+    engine,
+    pre,
+    frac: Optional[float] = None,
+    seed: Optional[int] = None,
+    source: Optional[Tuple[pd.DataFrame, str]] = None,
+):
+    """(source frame, preprocessed matrix, meta) for the current data version, building what is missing.
+
+    Without `frac`/`seed` the sample of the last training run is read
+    (`training_sample`). `source` is a (frame, version) pair `load_source`
+    already returned in this process; it skips the version query and the
+    read of the rows.
+    """
+    if source is None:
+        trained_frac, trained_seed = training_sample()
+        frac = trained_frac if frac is None else frac
+        seed = trained_seed if seed is None else seed
+    df, version = source if source is not None else load_source(engine, frac, seed)
+    cached = load_matrix(version, pre)
+    if cached is None:
+        materialize(df, pre, version)
+        cached = load_matrix(version, pre)
+    X, meta = cached
+    return df, X, meta
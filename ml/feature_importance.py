@@ -1,21 +1,18 @@
 import joblib
 import pandas as pd
-import matplotlib.pyplot as plt
 from pathlib import Path
 
+from ml.model_lookup import require_best_model
+
 
 ARTIFACTS_DIR = Path("artifacts")
-MODEL_PATH = next(ARTIFACTS_DIR.glob("best_model_*.joblib"), None)
 OUTPUT_CSV = ARTIFACTS_DIR / "feature_importance.csv"
 OUTPUT_PNG = ARTIFACTS_DIR / "feature_importance.png"
 
 
-def main():
-    if MODEL_PATH is None:
-        raise FileNotFoundError("Nie znaleziono pliku best_model_*.joblib w artifacts/")
-
-    print(f"Ładowanie modelu: {MODEL_PATH} ...")
-    model = joblib.load(MODEL_PATH)
+def feature_importance(model, top: int = 20) -> pd.DataFrame:
+    """TOP cech według feature_importances_ dopasowanego pipeline'u → CSV + wykres."""
+    import matplotlib.pyplot as plt
 
     pre = model.named_steps["pre"]
     model_step = model.named_steps["model"]
@@ -32,7 +29,7 @@ def main():
     df = pd.DataFrame(
         {"feature": feature_names, "importance": importances}
     ).sort_values("importance", ascending=False)
-    df_top = df.head(20).reset_index(drop=True)
+    df_top = df.head(top).reset_index(drop=True)
 
     df_top.to_csv(OUTPUT_CSV, index=False)
     print(f"Zapisano CSV → {OUTPUT_CSV}")
@@ -40,12 +37,19 @@ def main():
     plt.figure(figsize=(8, 10))
     plt.barh(df_top["feature"], df_top["importance"])
     plt.gca().invert_yaxis()
-    plt.title("Feature Importance - TOP 20")
+    plt.title(f"Feature Importance - TOP {top}")
     plt.tight_layout()
     plt.savefig(OUTPUT_PNG)
     plt.close()
 
     print(f"Zapisano wykres → {OUTPUT_PNG}")
+    return df_top
+
+
+def main():
+    model_path = require_best_model(ARTIFACTS_DIR)
+    print(f"Ładowanie modelu: {model_path} ...")
+    feature_importance(joblib.load(model_path))
     print("DONE ✔")
 
 
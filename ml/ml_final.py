@@ -1,23 +1,26 @@
 import os
+import copy
 from pathlib import Path
+from typing import Optional
 
 import joblib
 import pandas as pd
 import numpy as np
-import time
-import hashlib
 from datetime import datetime, timezone
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.impute import SimpleImputer
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 from sklearn.metrics import mean_absolute_error, root_mean_squared_error, r2_score
-from sklearn.model_selection import RandomizedSearchCV
-from xgboost import XGBRegressor
+
+from etl.profiling import profiled, run_id as pipeline_run_id, stage
+from ml.data_loader import FEATURE_COLS, ID_COL, load_frame, load_holdout, max_id
+from ml.feature_cache import load_source, materialize, record_training_sample
+from ml.model_lookup import best_model_path, hash256, mark_best_model
+from ml.train_scheduler import cpu_budget, halving_search, train_models
 
 
 # 1.Konfiguracja
@@ -28,6 +31,75 @@ ARTIFACTS_DIR.mkdir(exist_ok=True, parents=True)
 TARGET_COL = "price_total"          
 TABLE_NAME = "gold.housing_valid"   
 
+# Liczba procesów treningu (0 = wszystkie rdzenie, po jednym wątku na proces)
+TRAIN_WORKERS = int(os.getenv("TRAIN_WORKERS", "0")) or None
+
+# Holdout kontroli dryfu: górne kubełki hasha listing_id (te same wiersze w każdym
+# runie, ~2% gold.housing_valid); żaden trening ich nie widzi
+DRIFT_HOLDOUT_FRAC = float(os.getenv("DRIFT_HOLDOUT_FRAC", "0.02"))
+
+# Tryb wyszukiwania hiperparametrów:
+#   random  - 5 losowych punktów siatki na 5% próbce (dotychczasowy)
+#   halving - successive halving po pełnych siatkach na całych danych (bez holdoutu dryfu),
+#             XGBoost z early stopping na zbiorze testowym
+SEARCH_MODE = os.getenv("SEARCH_MODE", "random")
+SAMPLE_FRAC = {"random": 0.05, "halving": 1.0 - DRIFT_HOLDOUT_FRAC}
+
+# Trenowane modele, np. ML_MODELS=XGBRegressor (puste = wszystkie z get_models)
+ML_MODELS = [m for m in os.getenv("ML_MODELS", "").split(",") if m]
+
+# Tryb treningu:
+#   full        - zawsze pełne wyszukiwanie wszystkich modeli (domyślny)
+#   incremental - douczenie zapisanego najlepszego modelu na wierszach dodanych od
+#                 ostatniego runu (XGBoost: kolejne rundy boostingu, RandomForest /
+#                 GradientBoosting: warm_start z dodatkowymi drzewami); pełne
+#                 wyszukiwanie tylko przy dryfie MAE albo braku poprzedniego runu
+TRAIN_MODE = os.getenv("TRAIN_MODE", "full")
+TRAIN_MODES = ["full", "incremental"]
+# dopuszczalny wzrost MAE na holdoucie dryfu względem ostatniego pełnego wyszukiwania (0.10 = +10%)
+MAE_DRIFT = float(os.getenv("MAE_DRIFT", "0.10"))
+# douczenie: rundy XGBoost / drzewa RandomForest i GradientBoosting na jeden run
+WARM_ROUNDS = int(os.getenv("WARM_ROUNDS", "20"))
+WARM_TREES = int(os.getenv("WARM_TREES", "10"))
+# mniej nowych wierszy = model bez zmian; po tylu douczeniach z rzędu pełne wyszukiwanie
+# (drzew przybywa z każdym runem)
+MIN_NEW_ROWS = int(os.getenv("MIN_NEW_ROWS", "200"))
+MAX_WARM_RUNS = int(os.getenv("MAX_WARM_RUNS", "30"))
+
+MODEL_RUNS_TABLE = "ml.model_runs"
+# train_mode / base_mae / mae_threshold / max_listing_id: stan trybu przyrostowego,
+# dopisywane do tabel sprzed jego wprowadzenia (stare wiersze = pełne runy bez progu)
+MODEL_RUNS_DDL = f"""
+CREATE SCHEMA IF NOT EXISTS ml;
+CREATE TABLE IF NOT EXISTS {MODEL_RUNS_TABLE} (
+    run_id          TEXT,
+    model_name      TEXT,
+    mae             DOUBLE PRECISION,
+    rmse            DOUBLE PRECISION,
+    r2              DOUBLE PRECISION,
+    train_rows      BIGINT,
+    valid_rows      BIGINT,
+    scored_at       TIMESTAMPTZ,
+    pipeline_sha    TEXT
+);
+ALTER TABLE {MODEL_RUNS_TABLE}
+    ADD COLUMN IF NOT EXISTS train_mode      TEXT,
+    ADD COLUMN IF NOT EXISTS base_mae        DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS mae_threshold   DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS max_listing_id  BIGINT;
+"""
+
+LAST_RUN_SQL = f"""
+SELECT model_name, mae, coalesce(base_mae, mae) AS base_mae, mae_threshold, max_listing_id,
+       (SELECT count(*) FROM {MODEL_RUNS_TABLE} w
+         WHERE w.train_mode = 'incremental'
+           AND w.scored_at > (SELECT max(scored_at) FROM {MODEL_RUNS_TABLE}
+                               WHERE coalesce(train_mode, 'full') = 'full')) AS warm_runs
+FROM {MODEL_RUNS_TABLE}
+ORDER BY scored_at DESC
+LIMIT 1
+"""
+
 PG_URL = (
     f"postgresql+psycopg2://"
     f"{os.getenv('PG_USER', 'postgres')}:"
@@ -37,18 +109,12 @@ PG_URL = (
     f"{os.getenv('PG_DB', 'warehouse')}"
 )
 
-def hash256(path: Path) -> str:
-    h = hashlib.sha256()
-    with path.open("rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
-    return h.hexdigest() 
-
-def load_data() -> pd.DataFrame:
+@profiled("ml.load_data")
+def load_data(frac: float = 0.05):
+    # próbka losowana w Postgresie (hash listing_id), tylko kolumny cech + target;
+    # ta sama wersja danych jest potem czytana z cache przez SHAP
     engine = create_engine(PG_URL)
-    df = pd.read_sql(f"SELECT * FROM {TABLE_NAME}", engine)
-    df = df.sample(frac= 0.05, random_state=42) 
-    return df
+    return load_source(engine, frac=frac, seed=42)
 
 def build_preprocessor(df: pd.DataFrame) -> ColumnTransformer:
     num_cols = df.select_dtypes(include=["float64", "int64"]).columns.to_list()
@@ -73,21 +139,37 @@ def build_preprocessor(df: pd.DataFrame) -> ColumnTransformer:
 
     return pre_processor, num_cols, cat_cols
 
-def get_models():
-    models = {
-        "RandomForest": RandomForestRegressor(
+MODEL_NAMES = ["RandomForest", "GradientBoosting", "XGBRegressor"]
+
+def get_models(names=None):
+    # rodzina modelu jest importowana tylko, gdy model jest trenowany
+    names = names or MODEL_NAMES
+    unknown = set(names) - set(MODEL_NAMES)
+    if unknown:
+        raise ValueError(f"Nieznane modele: {sorted(unknown)}")
+    models = {}
+    if "RandomForest" in names:
+        from sklearn.ensemble import RandomForestRegressor
+
+        models["RandomForest"] = RandomForestRegressor(
         n_estimators=50,
         max_depth=12,
         n_jobs=-1,
         random_state=42
-    ),
-        "GradientBoosting": GradientBoostingRegressor(
+    )
+    if "GradientBoosting" in names:
+        from sklearn.ensemble import GradientBoostingRegressor
+
+        models["GradientBoosting"] = GradientBoostingRegressor(
         learning_rate=0.05,
         n_estimators=50,
         max_depth=3,
         random_state=42
-    ),
-        "XGBRegressor": XGBRegressor(
+    )
+    if "XGBRegressor" in names:
+        from xgboost import XGBRegressor
+
+        models["XGBRegressor"] = XGBRegressor(
         n_estimators=200,
         learning_rate=0.05,
         max_depth=5,
@@ -96,8 +178,7 @@ def get_models():
         random_state=42,
         eval_metric="logloss",
         n_jobs=-1
-    )  
-    }
+    )
     return models
 
 def param_grids():
@@ -125,8 +206,160 @@ def param_grids():
 
     return param_grids
 
-def train_and_evaluate():
-    df = load_data()
+def save_best_model(name: str, pipe: Pipeline, X_check: pd.DataFrame):
+    """Zapis best_model_<name>.joblib + wskaźnik dla czytelników + model skompilowany; zwraca (ścieżka, sha256)."""
+    path = ARTIFACTS_DIR / f"best_model_{name}.joblib"
+    joblib.dump(pipe, path)
+    mark_best_model(path)
+    print(f"Zapisano pipeline do: {path}")
+
+    pipeline_sha = hash256(path)
+    print(f"SHA256 pipeline’u: {pipeline_sha}")
+
+    # szybka ścieżka inferencji (tablice NumPy + natywny predyktor drzew), sprawdzona na zbiorze walidacyjnym;
+    # nieudana kompilacja nie przerywa treningu, ale nie może zostawić modelu skompilowanego z poprzedniego runu
+    from ml.compiled_model import COMPILED_PREFIX, export_compiled
+
+    compiled_path = ARTIFACTS_DIR / f"{COMPILED_PREFIX}{name}.joblib"
+    try:
+        export_compiled(pipe, compiled_path, X_check=X_check)
+    except (TypeError, ValueError) as e:
+        print(f"[WARN] Bez modelu skompilowanego: {e}")
+        compiled_path.unlink(missing_ok=True)
+    return path, pipeline_sha
+
+def record_run(engine, row: dict) -> None:
+    """Dopisuje run do ml.model_runs (tabela i nowe kolumny tworzone w razie potrzeby)."""
+    with engine.begin() as conn:
+        conn.exec_driver_sql(MODEL_RUNS_DDL)
+    pd.DataFrame([row]).to_sql("model_runs", engine, schema="ml", if_exists="append", index=False)
+    print("Zapisano metadane runu do ml.model_runs")
+
+def last_run(engine) -> Optional[dict]:
+    """Ostatni run z ml.model_runs (próg MAE, watermark listing_id, douczenia od pełnego runu); None przed pierwszym."""
+    if not inspect(engine).has_table("model_runs", schema="ml"):
+        return None
+    with engine.begin() as conn:
+        conn.exec_driver_sql(MODEL_RUNS_DDL)
+        row = conn.execute(text(LAST_RUN_SQL)).mappings().first()
+    return dict(row) if row else None
+
+def warm_start(pipe: Pipeline, X: pd.DataFrame, y: pd.Series) -> Pipeline:
+    """Kopia dopasowanego `pipe` douczona na (X, y); `pre` zostaje bez zmian.
+
+    XGBoost dostaje WARM_ROUNDS kolejnych rund boostingu od najlepszej
+    iteracji zapisanego modelu, RandomForest i GradientBoosting WARM_TREES
+    drzew (warm_start) uczonych tylko na nowych wierszach.
+    """
+    pipe = copy.deepcopy(pipe)
+    pre, model = pipe.named_steps["pre"], pipe.named_steps["model"]
+    Xt = pre.transform(X)
+    if "warm_start" in model.get_params():
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + WARM_TREES)
+        model.fit(Xt, y)
+        return pipe
+    booster = model.get_booster()
+    try:
+        # drzewa po najlepszej iteracji (early stopping) nie są kontynuowane
+        booster = booster[: model.best_iteration + 1]
+    except AttributeError:
+        pass
+    model.set_params(n_estimators=WARM_ROUNDS, early_stopping_rounds=None)
+    model.fit(Xt, y, xgb_model=booster, verbose=False)
+    # best_iteration przeniesione z zapisanego modelu obcinałoby predict do starych rund
+    model.get_booster().set_attr(best_iteration=None, best_score=None)
+    return pipe
+
+@profiled("ml.train_incremental")
+def train_incremental():
+    """Douczenie najlepszego modelu na wierszach gold.housing_valid dodanych od ostatniego runu.
+
+    Zwraca to co `train_and_evaluate` (bez próbki źródłowej) albo None, gdy
+    potrzebne jest pełne wyszukiwanie: brak poprzedniego runu z progiem lub
+    zapisanego modelu, MAX_WARM_RUNS douczeń od ostatniego pełnego runu albo
+    MAE na holdoucie dryfu powyżej progu zapisanego przy pełnym runie.
+    Watermark listing_id przesuwa się tylko razem z zapisanym douczonym modelem.
+    """
+    engine = create_engine(PG_URL)
+    last = last_run(engine)
+    path = best_model_path()
+    if last is None or last["mae_threshold"] is None or last["max_listing_id"] is None or path is None:
+        print("Brak poprzedniego runu z progiem MAE albo zapisanego modelu - pełne wyszukiwanie")
+        return None
+    if path.name != f"best_model_{last['model_name']}.joblib":
+        print(f"Zapisany model {path.name} nie jest modelem ostatniego runu ({last['model_name']}) - pełne wyszukiwanie")
+        return None
+    if last["warm_runs"] >= MAX_WARM_RUNS:
+        print(f"{last['warm_runs']} douczeń od ostatniego pełnego runu - pełne wyszukiwanie")
+        return None
+
+    # nowe wiersze bez holdoutu dryfu: ten zostaje do porównania modeli
+    new = load_frame(
+        engine, frac=1.0, columns=[ID_COL] + FEATURE_COLS,
+        after_id=int(last["max_listing_id"]), exclude_frac=DRIFT_HOLDOUT_FRAC,
+    )
+    pipe = joblib.load(path)
+    if len(new) < MIN_NEW_ROWS:
+        print(f"Nowych wierszy: {len(new):,} (< {MIN_NEW_ROWS}) - model bez zmian")
+        return path, pipe, None, None
+
+    X_train = new.drop(columns=[ID_COL, TARGET_COL])
+    y_train = new[TARGET_COL]
+    with stage("ml.warm_start", rows_in=len(X_train)) as warm_stage:
+        updated = warm_start(pipe, X_train, y_train)
+
+    holdout = load_holdout(engine, DRIFT_HOLDOUT_FRAC)
+    y_valid = holdout.pop(TARGET_COL)
+    mae_before = mean_absolute_error(y_valid, pipe.predict(holdout))
+    y_pred_valid = updated.predict(holdout)
+    mae = mean_absolute_error(y_valid, y_pred_valid)
+    print(
+        f"Douczenie {last['model_name']}: {len(X_train):,} nowych wierszy w {warm_stage.wall_s:.2f}s, "
+        f"MAE na holdoucie ({len(holdout):,} wierszy) {mae_before:,.2f} → {mae:,.2f} "
+        f"(próg {last['mae_threshold']:,.2f})"
+    )
+    if min(mae, mae_before) > last["mae_threshold"]:
+        print(f"Dryf: MAE {min(mae, mae_before):,.2f} powyżej progu {last['mae_threshold']:,.2f} - pełne wyszukiwanie")
+        return None
+    if mae > mae_before:
+        # nowe wiersze nie trafiły do żadnego modelu: watermark zostaje, następny run douczy na nich
+        print("Douczony model nie jest lepszy - zostaje poprzedni")
+        return path, pipe, None, None
+
+    path, pipeline_sha = save_best_model(last["model_name"], updated, holdout)
+    record_run(engine, {
+        "run_id": pipeline_run_id(),
+        "model_name": last["model_name"],
+        "mae": mae,
+        "rmse": root_mean_squared_error(y_valid, y_pred_valid),
+        "r2": r2_score(y_valid, y_pred_valid),
+        "train_rows": len(X_train),
+        "valid_rows": len(holdout),
+        "scored_at": datetime.now(timezone.utc),
+        "pipeline_sha": pipeline_sha,
+        "train_mode": "incremental",
+        "base_mae": last["base_mae"],
+        "mae_threshold": last["mae_threshold"],
+        "max_listing_id": int(new[ID_COL].max()),
+    })
+    return path, updated, None, None
+
+def train_and_evaluate(mode: Optional[str] = None):
+    mode = mode or TRAIN_MODE
+    if mode not in TRAIN_MODES:
+        raise ValueError(f"Nieznany TRAIN_MODE: {mode}")
+    if SEARCH_MODE not in SAMPLE_FRAC:
+        raise ValueError(f"Nieznany SEARCH_MODE: {SEARCH_MODE}")
+    if mode == "incremental":
+        updated = train_incremental()
+        if updated is not None:
+            return updated
+
+    # watermark douczeń: największy listing_id źródła przed odczytem próbki, nie próbki
+    # (wiersze dodane później douczy następny run)
+    source_max_id = max_id(create_engine(PG_URL))
+    source, data_ver = load_data(SAMPLE_FRAC[SEARCH_MODE])
+    df = source.drop(columns=[ID_COL])
     y = df[TARGET_COL]
     X = df.drop(columns=[TARGET_COL])
     pre_processor, num_cols, cat_cols = build_preprocessor(df)
@@ -139,7 +372,7 @@ def train_and_evaluate():
         X_temp, y_temp, test_size=0.5, random_state=42
     )
 
-    models = get_models()
+    models = get_models(ML_MODELS)
     grids = param_grids()
     results = []
 
@@ -149,39 +382,42 @@ def train_and_evaluate():
     best_rmse = None
     best_r2 = None
 
-    for name, model in models.items():
-        print(f"\n=== Trenowany model: {name} ===")
-
-        pipe = Pipeline([
+    pipes = {
+        name: Pipeline([
             ("pre", pre_processor),
             ("model", model)
         ])
+        for name, model in models.items()
+    }
 
-        search = RandomizedSearchCV(
-            estimator=pipe,
-            param_distributions=grids[name],
-            n_iter=5,
-            scoring="neg_mean_absolute_error",
-            cv=2,
-            n_jobs=1,
-            verbose=1,
-            random_state=42
-        )
-
-        start = time.time()
-
-        try:
-            search.fit(X_train, y_train)
-            best_pipe = search.best_estimator_
-            best_params = search.best_params_
-        except Exception as e:
-            print(f"[ERROR] RandomizedSearchCV failed for {name}: {e}")
-            best_pipe = pipe.fit(X_train, y_train)
-            best_params = None
-
-        end = time.time()
+    workers, threads = cpu_budget(TRAIN_WORKERS)
+    print(
+        f"\n=== Trening {len(pipes)} modeli ({SEARCH_MODE}): "
+        f"{workers} procesów × {threads} wątków ==="
+    )
+    with stage(f"ml.search_{SEARCH_MODE}", rows_in=len(X_train)) as search_stage:
+        if SEARCH_MODE == "halving":
+            # early stopping na zbiorze testowym, walidacyjny zostaje do porównania modeli
+            searches = halving_search(
+                pipes, grids, X_train, y_train,
+                factor=3, cv=2, random_state=42, n_workers=TRAIN_WORKERS,
+                eval_set=(X_test, y_test), verbose=1
+            )
+        else:
+            searches = train_models(
+                pipes, grids, X_train, y_train,
+                n_iter=5, cv=2, random_state=42, n_workers=TRAIN_WORKERS
+            )
+    print(f"Łączny czas trenowania: {search_stage.wall_s:.2f}s (CPU {search_stage.cpu_s:.2f}s)")
+
+    for name, search in searches.items():
+        print(f"\n=== Trenowany model: {name} ===")
+        best_pipe = search.best_pipe
+        best_params = search.best_params
 
-        y_pred_valid = best_pipe.predict(X_valid)
+        with stage(f"ml.predict_valid.{name}", rows_in=len(X_valid)) as predict_stage:
+            y_pred_valid = best_pipe.predict(X_valid)
+            predict_stage.rows_out = len(y_pred_valid)
 
         mae  = mean_absolute_error(y_valid, y_pred_valid)
         rmse = root_mean_squared_error(y_valid, y_pred_valid)
@@ -198,7 +434,7 @@ def train_and_evaluate():
         print(f"MAE  = {mae:,.2f}")
         print(f"RMSE = {rmse:,.2f}")
         print(f"R²   = {r2:,.4f}")
-        print(f"Czas trenowania: {end - start:.2f}s")
+        print(f"Czas trenowania (suma dopasowań): {search.seconds:.2f}s")
 
         if mae < best_mae:
             best_mae = mae
@@ -212,20 +448,27 @@ def train_and_evaluate():
     results_df.to_csv(results_path, index=False)
     print(f"\nZapisano metryki: {results_path}")
 
-    best_model_path = ARTIFACTS_DIR / f"best_model_{best_model_name}.joblib"
-    joblib.dump(best_pipeline, best_model_path)
     print(f"Najlepszy model: {best_model_name} (MAE={best_mae:,.2f})")
-    print(f"Zapisano pipeline do: {best_model_path}")
+    best_model_path, pipeline_sha = save_best_model(best_model_name, best_pipeline, X_valid)
 
-    pipeline_sha = hash256(best_model_path)
-    print(f"SHA256 pipeline’u: {pipeline_sha}")
+    # próg dryfu liczony na tym samym holdoucie, na którym douczenia są sprawdzane
+    holdout = load_holdout(create_engine(PG_URL), DRIFT_HOLDOUT_FRAC)
+    holdout_mae = mean_absolute_error(holdout.pop(TARGET_COL), best_pipeline.predict(holdout))
+    print(f"MAE na holdoucie dryfu ({len(holdout):,} wierszy): {holdout_mae:,.2f}")
+
+    # macierz cech po `pre` najlepszego modelu - SHAP mapuje ją z dysku;
+    # zapisany frac próbki, żeby SHAP liczył wersję danych tak jak trening (halving: bez holdoutu dryfu)
+    materialize(source, best_pipeline.named_steps["pre"], data_ver)
+    record_training_sample(SAMPLE_FRAC[SEARCH_MODE], 42)
 
-    run_id = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+    # ten sam run_id co w ml.stage_metrics (PIPELINE_RUN_ID z DAG-a)
+    run_id = pipeline_run_id()
     scored_at = datetime.now(timezone.utc)
     train_rows = len(X_train)
     valid_rows = len(X_valid)
 
-    run_row = pd.DataFrame([{
+    # próg dryfu dla kolejnych douczeń i watermark wierszy, do których sięgał ten run
+    record_run(create_engine(PG_URL), {
         "run_id": run_id,
         "model_name": best_model_name,
         "mae": best_mae,
@@ -235,17 +478,13 @@ def train_and_evaluate():
         "valid_rows": valid_rows,
         "scored_at": scored_at,
         "pipeline_sha": pipeline_sha,
-    }])
-
-    engine = create_engine(PG_URL)
-    run_row.to_sql(
-        "model_runs",
-        engine,
-        schema="ml",
-        if_exists="append",
-        index=False
-    )
-    print("Zapisano metadane runu do ml.model_runs")
+        "train_mode": "full",
+        "base_mae": holdout_mae,
+        "mae_threshold": holdout_mae * (1 + MAE_DRIFT),
+        "max_listing_id": source_max_id,
+    })
+    # dla kolejnych zadań w tym samym procesie (etl/tasks.py) - bez ponownego wczytywania
+    return best_model_path, best_pipeline, source, data_ver
 
 if __name__ == "__main__":
     train_and_evaluate()
\ No newline at end of file
@@ -0,0 +1,75 @@
+# ml/ml_tasks.py
+"""ML steps of the pipeline as task callables for etl/tasks.py.
+
+train → feature_importance → shap → predict run in one process. The fitted
+pipeline, its path and the training sample with its data version are passed
+on in memory, so the later steps neither unpickle the model again nor
+re-query the data version of the feature cache. best_model_*.joblib and
+the feature cache stay the checkpoints for steps run on their own; the
+process pools of SHAP and batch scoring load the model from that file.
+"""
+from pathlib import Path
+from typing import Any, Tuple
+
+import joblib
+
+from etl.tasks import Context, Task
+
+SHAP_ROWS = 5000
+
+
+def _best_model(ctx: Context) -> Tuple[Path, Any]:
+    """(path, pipeline) of the model trained in this chain, else the one saved in artifacts/."""
+    if "model" in ctx:
+        return ctx["model_path"], ctx["model"]
+    from ml.model_lookup import require_best_model
+
+    path = require_best_model()
+    ctx.update(model_path=path, model=joblib.load(path))
+    return ctx["model_path"], ctx["model"]
+
+
+def train(ctx: Context) -> Context:
+    from ml.ml_final import train_and_evaluate
+
+    path, pipe, source, version = train_and_evaluate()
+    out = {"model_path": path, "model": pipe}
+    if source is not None:
+        # an incremental run loads only the new rows: shap reads its sample from the feature cache
+        out["source"] = (source, version)
+    return out
+
+
+def feature_importance(ctx: Context) -> None:
+    from ml.feature_importance import feature_importance as top_features
+
+    top_features(_best_model(ctx)[1])
+
+
+def shap(ctx: Context) -> None:
+    from ml.shap_explainer import explain_model
+
+    path, pipe = _best_model(ctx)
+    explain_model(path, pipe, rows=ctx.get("shap_rows", SHAP_ROWS), source=ctx.get("source"))
+
+
+def predict(ctx: Context) -> None:
+    from sqlalchemy import create_engine
+
+    from ml.model_lookup import hash256
+    from ml.predict_sample import PG_URL, last_scored_at, score_all
+
+    # like `predict_sample.py --only-changed`: the nightly run scores only the gold rows changed
+    # since this model last scored, and a newly trained model scores every listing
+    engine = create_engine(PG_URL)
+    path = _best_model(ctx)[0]
+    stats, _, _ = score_all(engine, model_path=path, changed_since=last_scored_at(engine, hash256(path)))
+    print(f"Zapisano predykcje: {stats}")
+
+
+ML_TASKS = [
+    Task("train", train, checkpoint="artifacts/best_model_*.joblib, ml.model_runs"),
+    Task("feature_importance", feature_importance, checkpoint="artifacts/feature_importance.csv"),
+    Task("shap", shap, checkpoint="artifacts/shap_values.parquet"),
+    Task("predict", predict, checkpoint="ml.housing_predictions"),
+]
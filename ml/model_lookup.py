@@ -0,0 +1,60 @@
+# ml/model_lookup.py
+"""Where the current best model is, without globbing artifacts/ on every import.
+
+`ml_final` records the file it saved in artifacts/best_model.latest. Readers
+take that name; the glob is only a fallback for artifacts trained before
+the pointer existed (the newest file wins, not whichever the directory
+lists first). `best_model_path` caches the answer for the life of the
+process; long-running readers (ml/serve.py) call `find_best_model`.
+"""
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+ARTIFACTS_DIR = Path("artifacts")
+MODEL_GLOB = "best_model_*.joblib"
+LATEST_FILE = "best_model.latest"
+
+
+def hash256(path: Path) -> str:
+    """SHA256 pliku modelu: jego tożsamość w ml.housing_predictions i przy przeładowaniu serwera."""
+    h = hashlib.sha256()
+    with Path(path).open("rb") as f:
+        for chunk in iter(lambda: f.read(8192), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def mark_best_model(path: Path) -> None:
+    """Point readers at `path` (a best_model_*.joblib in its artifacts directory)."""
+    path = Path(path)
+    tmp = path.with_name(LATEST_FILE + ".tmp")
+    tmp.write_text(path.name + "\n")
+    tmp.replace(path.with_name(LATEST_FILE))
+    best_model_path.cache_clear()
+
+
+def find_best_model(artifacts_dir: Path = ARTIFACTS_DIR) -> Optional[Path]:
+    """The latest best_model_*.joblib in `artifacts_dir`, None when there is none (not cached)."""
+    artifacts_dir = Path(artifacts_dir)
+    latest = artifacts_dir / LATEST_FILE
+    if latest.exists():
+        path = artifacts_dir / latest.read_text().strip()
+        if path.exists():
+            return path
+    candidates = list(artifacts_dir.glob(MODEL_GLOB))
+    return max(candidates, key=lambda p: p.stat().st_mtime) if candidates else None
+
+
+@lru_cache(maxsize=None)
+def best_model_path(artifacts_dir: Path = ARTIFACTS_DIR) -> Optional[Path]:
+    """`find_best_model`, cached until `mark_best_model` points at another file."""
+    return find_best_model(artifacts_dir)
+
+
+def require_best_model(artifacts_dir: Path = ARTIFACTS_DIR) -> Path:
+    path = best_model_path(artifacts_dir)
+    if path is None:
+        raise FileNotFoundError(f"Nie znaleziono pliku {MODEL_GLOB} w {artifacts_dir}/")
+    return path
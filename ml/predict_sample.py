@@ -1,23 +1,45 @@
-# ml/predict_new.py
+# ml/predict_sample.py
+import io
 import os
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 from datetime import datetime, timezone
+from typing import Iterator, Optional, Tuple
 
 import joblib
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+
+from etl.profiling import add_bytes, profiled
+from ml.data_loader import FEATURE_COLS, ID_COL
+from ml.model_lookup import hash256, require_best_model
 
 # --- Stałe ---
 ARTIFACTS_DIR = Path("artifacts")
 ARTIFACTS_DIR.mkdir(exist_ok=True, parents=True)
 
-MODEL_PATH = next(ARTIFACTS_DIR.glob("best_model_*.joblib"))
-
 TARGET_COL = "price_total"
 SOURCE_TABLE = "gold.housing_valid"  
 PRED_SCHEMA = "ml"
 PRED_TABLE = "housing_predictions"    
 
+PRED_DDL = f"""
+CREATE TABLE IF NOT EXISTS {PRED_SCHEMA}.{PRED_TABLE} (
+    listing_id              BIGINT,
+    predicted_price_total   DOUBLE PRECISION,
+    scored_at               TIMESTAMPTZ,
+    model_path              TEXT,
+    model_sha               TEXT
+);
+ALTER TABLE {PRED_SCHEMA}.{PRED_TABLE} ADD COLUMN IF NOT EXISTS model_sha TEXT;
+CREATE INDEX IF NOT EXISTS {PRED_TABLE}_model_sha_idx ON {PRED_SCHEMA}.{PRED_TABLE} (model_sha, {ID_COL});
+"""
+
 PG_URL = (
     f"postgresql+psycopg2://"
     f"{os.getenv('PG_USER', 'postgres')}:"
@@ -29,14 +51,16 @@ PG_URL = (
 
 
 def load_model():
-    print(f"Ładowanie modelu z: {MODEL_PATH}")
-    model = joblib.load(MODEL_PATH)
+    model_path = require_best_model(ARTIFACTS_DIR)
+    print(f"Ładowanie modelu z: {model_path}")
+    model = joblib.load(model_path)
     return model
 
 
 def load_new_flats(engine, n: int = 10) -> pd.DataFrame:
     """
     Na start: weź 10 losowych mieszkań z gold.housing_valid.
+    Zawsze świeże wiersze z widoku, nie próbka treningowa z cache cech.
     """
     query = f"""
         SELECT *
@@ -44,36 +68,65 @@ def load_new_flats(engine, n: int = 10) -> pd.DataFrame:
         ORDER BY random()
         LIMIT {n}
     """
-    df = pd.read_sql(query, engine)
-    return df
+    return pd.read_sql(query, engine)
 
 
-def main():
-    engine = create_engine(PG_URL)
-    model = load_model()
+def write_excel_report(df: pd.DataFrame, pred_df: pd.DataFrame, now: datetime) -> Path:
+    """Raport Excel: cechy + predykcja + różnica względem ceny (jeśli jest)."""
+    report_df = df.merge(pred_df, on="listing_id", how="inner")
+
+    if TARGET_COL in report_df.columns:
+        report_df["diff"] = report_df["predicted_price_total"] - report_df[TARGET_COL]
+        report_df["diff_pct"] = (
+            report_df["diff"] / report_df[TARGET_COL].replace(0, pd.NA) * 100
+        ).round(2)
+
+    report_excel = report_df.copy()
+    for col in ("scored_at", "updated_at"):
+        if col in report_excel.columns and pd.api.types.is_datetime64tz_dtype(report_excel[col]):
+            report_excel[col] = report_excel[col].dt.tz_localize(None)
+    
+    if "listing_date" in report_excel.columns:
+        report_excel["listing_date"] = pd.to_datetime(report_excel["listing_date"]).dt.date
+
 
+    excel_name = f"predictions_{now.strftime('%Y%m%d_%H%M')}.xlsx"
+    excel_path = ARTIFACTS_DIR / excel_name
+    report_excel.to_excel(excel_path, index=False)
+    print(f"Zapisano raport do Excela → {excel_path}")
+
+    print("Podgląd 5 wierszy:")
+    print(report_excel.head())
+    return excel_path
+
+
+@profiled("predict.score_sample")
+def score_sample(engine, model, n: int = 10):
+    """Dotychczasowy tryb: n losowych mieszkań, to_sql + raport Excel."""
     print("Pobieranie mieszkań do wyceny...")
-    df = load_new_flats(engine, n=10)
+    df = load_new_flats(engine, n=n)
 
     if "listing_id" not in df.columns:
         raise ValueError("Brakuje kolumny 'listing_id' w gold.housing_valid")
-    id_cols = ["listing_id"]
-
-    feature_df = df.drop(columns=[c for c in [TARGET_COL] if c in df.columns])
 
     print("Liczenie predykcji...")
-    y_pred = model.predict(feature_df)
+    y_pred = model.predict(df[FEATURE_COLS])
 
     now = datetime.now(timezone.utc)
+    model_path = require_best_model(ARTIFACTS_DIR)
 
     pred_df = pd.DataFrame({
         "listing_id": df["listing_id"],
         "predicted_price_total": y_pred,
         "scored_at": now,
-        "model_path": str(MODEL_PATH.name),
+        "model_path": model_path.name,
+        "model_sha": hash256(model_path),
     })
 
     print("Zapisywanie predykcji do bazy...")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"CREATE SCHEMA IF NOT EXISTS {PRED_SCHEMA}")
+        conn.exec_driver_sql(PRED_DDL)
     pred_df.to_sql(
         PRED_TABLE,
         engine,
@@ -83,32 +136,220 @@ def main():
     )
     print(f"Zapisano {len(pred_df)} predykcji {PRED_SCHEMA}.{PRED_TABLE}")
 
-    
-    report_df = df.merge(pred_df, on="listing_id", how="inner")
+    write_excel_report(df, pred_df, now)
 
-    if TARGET_COL in report_df.columns:
-        report_df["diff"] = report_df["predicted_price_total"] - report_df[TARGET_COL]
-        report_df["diff_pct"] = (
-            report_df["diff"] / report_df[TARGET_COL].replace(0, pd.NA) * 100
-        ).round(2)
 
-    report_excel = report_df.copy()
-    if "scored_at" in report_excel.columns:
-        if pd.api.types.is_datetime64tz_dtype(report_excel["scored_at"]):
-            report_excel["scored_at"] = report_excel["scored_at"].dt.tz_localize(None)
-    
-    if "listing_date" in report_excel.columns:
-        report_excel["listing_date"] = pd.to_datetime(report_excel["listing_date"]).dt.date
+# ---------------------------------------------------------------------
+# Batch scoring całej tabeli
+# ---------------------------------------------------------------------
+@dataclass
+class ScoreStats:
+    """Czasy etapów batch scoringu (predict = suma po workerach)."""
 
+    rows: int = 0
+    batches: int = 0
+    fetch_s: float = 0.0
+    predict_s: float = 0.0
+    write_s: float = 0.0
+    wall_s: float = 0.0
 
-    excel_name = f"predictions_{now.strftime('%Y%m%d_%H%M')}.xlsx"
-    excel_path = ARTIFACTS_DIR / excel_name
-    report_excel.to_excel(excel_path, index=False)
-    print(f"Zapisano raport do Excela → {excel_path}")
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.wall_s if self.wall_s else 0.0
 
-    print("Podgląd 5 wierszy:")
-    print(report_excel.head())
+    def __str__(self) -> str:
+        return (
+            f"{self.rows:,} wierszy w {self.batches} paczkach, {self.wall_s:.2f}s "
+            f"({self.rows_per_sec:,.0f} wierszy/s) | fetch {self.fetch_s:.2f}s, "
+            f"predict {self.predict_s:.2f}s, COPY {self.write_s:.2f}s"
+        )
+
+
+def iter_pages(
+    engine, batch_rows: int, after_id: int = 0, changed_since: Optional[datetime] = None
+) -> Iterator[pd.DataFrame]:
+    """Strony gold.housing_valid po listing_id (keyset pagination, bez OFFSET i sortowania całej tabeli).
+
+    listing_id nie jest unikalny w widoku, więc pełna strona jest ucinana
+    przed swoim ostatnim id, a kolejna zaczyna się od niego - duplikaty nie
+    trafiają na granicę dwóch stron. `changed_since` zostawia tylko wiersze
+    o updated_at późniejszym (zmienione przez 210_gold_features.sql).
+    """
+    cols = ", ".join([ID_COL] + FEATURE_COLS + [TARGET_COL])
+    changed = "" if changed_since is None else "AND updated_at > :since "
+    sql = text(
+        f"SELECT {cols} FROM {SOURCE_TABLE} WHERE {ID_COL} > :after {changed}"
+        f"ORDER BY {ID_COL} LIMIT :n"
+    )
+    with engine.connect() as conn:
+        while True:
+            params = {"after": after_id, "n": batch_rows, "since": changed_since}
+            page = pd.read_sql(sql, conn, params=params)
+            if page.empty:
+                return
+            last_id = int(page[ID_COL].iloc[-1])
+            if len(page) == batch_rows:
+                head = page[page[ID_COL] < last_id]
+                if not head.empty:
+                    page, last_id = head, int(head[ID_COL].iloc[-1])
+            yield page
+            after_id = last_id
+
+
+_worker_model = None
+
+
+def _init_worker(model_path: str) -> None:
+    """Każdy worker ładuje model raz; wewnętrzne wątki modelu = 1, równoległość daje pula."""
+    global _worker_model
+    _worker_model = joblib.load(model_path)
+    est = _worker_model.named_steps["model"]
+    if "n_jobs" in est.get_params():
+        est.set_params(n_jobs=1)
+
+
+@profiled("predict.batch")
+def _predict_batch(features: pd.DataFrame) -> Tuple[np.ndarray, float]:
+    start = time.perf_counter()
+    y_pred = _worker_model.predict(features)
+    return y_pred, time.perf_counter() - start
+
+
+def _copy_predictions(cur, pred_df: pd.DataFrame) -> None:
+    buf = io.StringIO()
+    pred_df.to_csv(buf, index=False, header=False)
+    add_bytes(written=buf.tell())
+    buf.seek(0)
+    cols = ", ".join(pred_df.columns)
+    cur.copy_expert(f"COPY {PRED_SCHEMA}.{PRED_TABLE} ({cols}) FROM STDIN WITH (FORMAT csv)", buf)
+
+
+def last_scored_at(engine, model_sha: str) -> Optional[datetime]:
+    """Początek ostatniej wyceny modelem o tym sha256 (None dla nowego modelu lub bez tabeli)."""
+    if not inspect(engine).has_table(PRED_TABLE, schema=PRED_SCHEMA):
+        return None
+    with engine.begin() as conn:
+        conn.exec_driver_sql(PRED_DDL)
+        sql = text(f"SELECT max(scored_at) FROM {PRED_SCHEMA}.{PRED_TABLE} WHERE model_sha = :sha")
+        return conn.execute(sql, {"sha": model_sha}).scalar()
+
+
+@profiled("predict.score_all")
+def score_all(
+    engine,
+    batch_rows: int = 50_000,
+    workers: Optional[int] = None,
+    after_id: int = 0,
+    report_rows: int = 0,
+    model_path: Optional[Path] = None,
+    changed_since: Optional[datetime] = None,
+) -> Tuple[ScoreStats, Optional[pd.DataFrame], Optional[pd.DataFrame]]:
+    """Wycena całego widoku: strony z Postgresa → predict w puli procesów → COPY do ml.housing_predictions.
+
+    Pobieranie kolejnych stron i COPY idą w głównym procesie, równolegle z
+    predykcją w workerach (w locie najwyżej 2 paczki na workera). Wszystko
+    jest zapisywane w jednej transakcji. Zwraca statystyki oraz, przy
+    `report_rows`, losową próbkę wierszy i predykcji do raportu. Bez
+    `model_path` wycenia aktualnym najlepszym modelem z artifacts/.
+    scored_at to czas startu transakcji według Postgresa, na tym samym
+    zegarze co updated_at, z którym porównuje go `changed_since`.
+    """
+    workers = workers or os.cpu_count() or 1
+    model_path = Path(model_path or require_best_model(ARTIFACTS_DIR))
+    model_sha = hash256(model_path)
+    stats = ScoreStats()
+    samples, rng = [], np.random.default_rng(42)
+
+    start = time.perf_counter()
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(f"CREATE SCHEMA IF NOT EXISTS {PRED_SCHEMA}")
+        cur.execute(PRED_DDL)
+        cur.execute("SELECT now()")
+        now = cur.fetchone()[0]
+        scored_at = now.isoformat()
+
+        def write(page: pd.DataFrame, y_pred: np.ndarray, predict_s: float) -> None:
+            pred_df = pd.DataFrame({
+                "listing_id": page[ID_COL].to_numpy(),
+                "predicted_price_total": y_pred,
+                "scored_at": scored_at,  # stały tekst ISO: to_csv nie formatuje daty w każdym wierszu
+                "model_path": str(model_path.name),
+                "model_sha": model_sha,
+            })
+            t = time.perf_counter()
+            _copy_predictions(cur, pred_df)
+            stats.write_s += time.perf_counter() - t
+            stats.predict_s += predict_s
+            stats.rows += len(pred_df)
+            stats.batches += 1
+            if report_rows:
+                take = np.sort(rng.choice(len(page), min(report_rows, len(page)), replace=False))
+                samples.append((page.iloc[take], pred_df.iloc[take].assign(scored_at=now)))
+
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(str(model_path),)) as pool:
+            in_flight = deque()
+            pages = iter_pages(engine, batch_rows, after_id, changed_since)
+            while True:
+                t = time.perf_counter()
+                page = next(pages, None)
+                stats.fetch_s += time.perf_counter() - t
+                if page is not None:
+                    features = page.drop(columns=[ID_COL, TARGET_COL])
+                    in_flight.append((page, pool.submit(_predict_batch, features)))
+                # zapisuj w kolejności stron, gdy kolejka pełna lub dane się skończyły
+                while in_flight and (page is None or len(in_flight) >= 2 * workers):
+                    done_page, future = in_flight.popleft()
+                    write(done_page, *future.result())
+                if page is None:
+                    break
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    stats.wall_s = time.perf_counter() - start
+
+    if not samples:
+        return stats, None, None
+    report = pd.concat([p for p, _ in samples], ignore_index=True)
+    preds = pd.concat([q for _, q in samples], ignore_index=True)
+    keep = np.sort(rng.choice(len(report), min(report_rows, len(report)), replace=False))
+    return stats, report.iloc[keep], preds.iloc[keep]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Wycena mieszkań najlepszym modelem.")
+    ap.add_argument(
+        "--mode", choices=["batch", "sample"], default="batch",
+        help="batch = cały gold.housing_valid przez COPY, sample = 10 losowych + Excel",
+    )
+    ap.add_argument("--batch-rows", type=int, default=50_000, help="wierszy na paczkę predykcji")
+    ap.add_argument("--workers", type=int, default=0, help="procesy predykcji (0 = wszystkie rdzenie)")
+    ap.add_argument(
+        "--only-changed", action="store_true",
+        help="tylko wiersze zmienione od ostatniej wyceny tym samym modelem (nowy model wycenia wszystko)",
+    )
+    ap.add_argument("--excel-sample", type=int, default=0, help="losowe wiersze do raportu Excel (0 = bez)")
+    args = ap.parse_args()
+
+    model_path = require_best_model(ARTIFACTS_DIR)
+    engine = create_engine(PG_URL)
+    if args.mode == "sample":
+        score_sample(engine, load_model())
+        return
+
+    since = last_scored_at(engine, hash256(model_path)) if args.only_changed else None
+    print(f"Batch scoring {SOURCE_TABLE} (zmienione po: {since or 'wszystko'}) modelem {model_path.name} ...")
+    stats, report, preds = score_all(
+        engine, args.batch_rows, args.workers or None, 0, args.excel_sample, model_path, changed_since=since
+    )
+    print(f"Zapisano predykcje do {PRED_SCHEMA}.{PRED_TABLE}: {stats}")
+    if report is not None:
+        write_excel_report(report, preds, preds["scored_at"].iloc[0])
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
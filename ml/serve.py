@@ -0,0 +1,271 @@
+# ml/serve.py
+"""Online wycena pojedynczych mieszkań najlepszym modelem.
+
+Serwer trzyma pipeline w pamięci, przeładowuje go, gdy artifacts/best_model.latest
+wskaże inny model albo plik modelu się zmieni (inne SHA256), a równoległe żądania skleja w
+jedną paczkę dla `predict`. Predykcje liczy skompilowana wersja pipeline'u
+(ml/compiled_model.py), jeśli da się go skompilować.
+
+Usage:
+    python ml/serve.py --port 8000
+    curl -X POST localhost:8000/predict -H 'Content-Type: application/json' \\
+         -d '{"city": "Warszawa", "rooms": 3, "area_sqm": 54.2, ...}'
+"""
+import os
+import time
+import asyncio
+import argparse
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import joblib
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI, HTTPException
+
+from ml.compiled_model import CompiledModel, compile_pipeline
+from ml.model_lookup import MODEL_GLOB, find_best_model, hash256
+
+
+ARTIFACTS_DIR = Path(os.getenv("ARTIFACTS_DIR", "artifacts"))
+
+MAX_BATCH = 256
+MAX_WAIT_MS = 2.0
+RELOAD_INTERVAL_S = 10.0
+METRICS_WINDOW = 10_000
+
+
+# ---------------------------------------------------------------------
+# 1) Model + hot reload
+# ---------------------------------------------------------------------
+@dataclass
+class LoadedModel:
+    pipe: Any
+    path: Path
+    sha: str
+    columns: List[str]
+    compiled: Optional[CompiledModel] = None
+    loaded_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+    def predict(self, listings: List[Dict[str, Any]]) -> np.ndarray:
+        if self.compiled is not None:
+            return self.compiled.predict(listings)
+        return self.pipe.predict(pd.DataFrame.from_records(listings, columns=self.columns or None))
+
+
+class ModelStore:
+    """Najlepszy model wg model_lookup; SHA liczone tylko, gdy plik się zmienił (mtime/rozmiar)."""
+
+    def __init__(self, artifacts_dir: Path = ARTIFACTS_DIR):
+        self.artifacts_dir = artifacts_dir
+        self.current: Optional[LoadedModel] = None
+        self._stat = None
+
+    def refresh(self) -> bool:
+        """Wczytaj model, jeśli na dysku jest inny niż w pamięci; True przy zmianie."""
+        # bez cache best_model_path: wskaźnik zmienia inny proces (ml_final)
+        path = find_best_model(self.artifacts_dir)
+        if path is None:
+            return False
+        st = path.stat()
+        stat = (path, st.st_mtime_ns, st.st_size)
+        if stat == self._stat:
+            return False
+        self._stat = stat
+        sha = hash256(path)
+        if self.current is not None and sha == self.current.sha:
+            return False
+        pipe = joblib.load(path)
+        pre = pipe.named_steps["pre"]
+        columns = list(getattr(pre, "feature_names_in_", []))
+        try:
+            compiled = compile_pipeline(pipe)
+        except TypeError as e:  # nieobsługiwany pipeline - predykcja przez sklearn
+            print(f"[WARN] Bez kompilacji modelu: {e}")
+            compiled = None
+        self.current = LoadedModel(pipe, path, sha, columns, compiled)
+        print(f"Załadowano model {path.name} (sha {sha[:12]}, skompilowany: {compiled is not None})")
+        return True
+
+
+# ---------------------------------------------------------------------
+# 2) Metrics
+# ---------------------------------------------------------------------
+class Metrics:
+    """Latencja i przepustowość z ostatnich METRICS_WINDOW żądań."""
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.finished = deque(maxlen=window)
+        self.batch_sizes = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+
+    def observe(self, latency_s: float) -> None:
+        self.requests += 1
+        self.latencies.append(latency_s)
+        self.finished.append(time.perf_counter())
+
+    def snapshot(self) -> dict:
+        lat = np.asarray(self.latencies) * 1000
+        span = self.finished[-1] - self.finished[0] if len(self.finished) > 1 else 0.0
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "p50_ms": round(float(np.percentile(lat, 50)), 3) if lat.size else None,
+            "p99_ms": round(float(np.percentile(lat, 99)), 3) if lat.size else None,
+            "throughput_rps": round((len(self.finished) - 1) / span, 1) if span else None,
+            "mean_batch_size": round(float(np.mean(self.batch_sizes)), 2) if self.batch_sizes else None,
+        }
+
+
+# ---------------------------------------------------------------------
+# 3) Micro-batching
+# ---------------------------------------------------------------------
+class MicroBatcher:
+    """Skleja żądania z okna `max_wait_ms` (najwyżej `max_batch`) w jedno `predict`."""
+
+    def __init__(self, store: ModelStore, metrics: Metrics, max_batch: int, max_wait_ms: float):
+        self.store = store
+        self.metrics = metrics
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def predict(self, listing: Dict[str, Any]) -> Tuple[float, str]:
+        """(cena, SHA modelu, który ją policzył)."""
+        fut = asyncio.get_running_loop().create_future()
+        await self.queue.put((listing, fut))
+        return await fut
+
+    async def run(self) -> None:
+        while True:
+            batch = [await self.queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            model = self.store.current
+            listings, futures = zip(*batch)
+            self.metrics.batch_sizes.append(len(batch))
+            # predict w wątku, żeby pętla zdarzeń dalej przyjmowała żądania
+            results = await asyncio.to_thread(predict_each, model, list(listings))
+            for fut, y in zip(futures, results):
+                if fut.done():
+                    continue
+                if isinstance(y, Exception):
+                    self.metrics.errors += 1
+                    fut.set_exception(y)
+                else:
+                    fut.set_result((float(y), model.sha))
+
+
+def predict_each(model: LoadedModel, listings: List[Dict[str, Any]]) -> List[Union[float, Exception]]:
+    """Predykcja paczki; gdy się nie uda, wiersz po wierszu, żeby błąd dostało tylko złe żądanie."""
+    try:
+        return list(model.predict(listings))
+    except Exception as e:
+        if len(listings) == 1:
+            return [e]
+    out = []
+    for listing in listings:
+        try:
+            out.append(model.predict([listing])[0])
+        except Exception as e:
+            out.append(e)
+    return out
+
+
+# ---------------------------------------------------------------------
+# 4) App
+# ---------------------------------------------------------------------
+def create_app(
+    artifacts_dir: Path = ARTIFACTS_DIR,
+    max_batch: int = MAX_BATCH,
+    max_wait_ms: float = MAX_WAIT_MS,
+    reload_interval_s: float = RELOAD_INTERVAL_S,
+) -> FastAPI:
+    store = ModelStore(artifacts_dir)
+    metrics = Metrics()
+
+    async def watch_models() -> None:
+        while True:
+            await asyncio.sleep(reload_interval_s)
+            try:
+                await asyncio.to_thread(store.refresh)
+            except Exception as e:  # zostaje poprzedni model
+                print(f"[ERROR] Przeładowanie modelu nie powiodło się: {e}")
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        store.refresh()
+        if store.current is None:
+            raise FileNotFoundError(f"Nie znaleziono {MODEL_GLOB} w {artifacts_dir}/")
+        app.state.batcher = MicroBatcher(store, metrics, max_batch, max_wait_ms)
+        tasks = [asyncio.create_task(app.state.batcher.run()), asyncio.create_task(watch_models())]
+        yield
+        for t in tasks:
+            t.cancel()
+
+    app = FastAPI(title="mini-warehouse-ml prediction", lifespan=lifespan)
+
+    @app.post("/predict")
+    async def predict(payload: Union[Dict[str, Any], List[Dict[str, Any]]]):
+        start = time.perf_counter()
+        listings = payload if isinstance(payload, list) else [payload]
+        try:
+            results = await asyncio.gather(*(app.state.batcher.predict(x) for x in listings))
+        except Exception as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        metrics.observe(time.perf_counter() - start)
+        preds = [y for y, _ in results]
+        body = {"model_sha": results[-1][1]}
+        if isinstance(payload, list):
+            return {**body, "predicted_price_total": preds}
+        return {**body, "predicted_price_total": preds[0]}
+
+    @app.get("/health")
+    async def health():
+        model = store.current
+        return {
+            "model": model.path.name,
+            "model_sha": model.sha,
+            "compiled": model.compiled is not None,
+            "loaded_at": model.loaded_at.isoformat(),
+        }
+
+    @app.get("/metrics")
+    async def get_metrics():
+        return {**metrics.snapshot(), "model_sha": store.current.sha}
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    ap = argparse.ArgumentParser(description="HTTP serwer predykcji z micro-batchingiem.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--artifacts", default=str(ARTIFACTS_DIR))
+    ap.add_argument("--max-batch", type=int, default=MAX_BATCH, help="1 = bez micro-batchingu")
+    ap.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    ap.add_argument("--reload-interval", type=float, default=RELOAD_INTERVAL_S)
+    args = ap.parse_args()
+
+    app = create_app(Path(args.artifacts), args.max_batch, args.max_wait_ms, args.reload_interval)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,30 @@
 import pandas as pd
 import joblib
 import numpy as np
-if not hasattr(np, "bool"):
-    np.bool = bool
-import shap
-import matplotlib.pyplot as plt
+import argparse
+import time
+import pyarrow as pa
+import pyarrow.parquet as pq
+import scipy.sparse as sp
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from sqlalchemy import create_engine
+from typing import List, Optional, Tuple
 import os
 
+from etl.profiling import profiled, stage
+from ml.data_loader import ID_COL
+from ml.feature_cache import features_for
+from ml.model_lookup import require_best_model
+
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 ARTIFACTS_DIR = PROJECT_ROOT / "artifacts"
-MODEL_PATH = next(ARTIFACTS_DIR.glob("best_model_*.joblib"))
 OUTPUT_PNG = ARTIFACTS_DIR / "shap_summary.png"
-OUTPUT_CSV = ARTIFACTS_DIR / "shap_values.csv"
+OUTPUT_PARQUET = ARTIFACTS_DIR / "shap_values.parquet"
+OUTPUT_IMPORTANCE = ARTIFACTS_DIR / "shap_importance.csv"
+
+CHUNK_ROWS = 1_000
+Z95 = 1.96
 
 PG_URL = (
     f"postgresql+psycopg2://"
@@ -24,67 +35,232 @@ PG_URL = (
     f"{os.getenv('PG_DB', 'warehouse')}"
 )
 
-TARGET_COL = "price_total"
-TABLE_NAME = "gold.housing_valid"
+@profiled("shap.load_sample")
+def load_sample(pre, n: Optional[int] = 5000, seed: int = 42, source=None):
+    """Losowa kolejność wierszy macierzy cech z cache (memory-map), bez ponownego czytania tabeli.
 
-def load_sample():
-    """Pobiera próbkę 2% do SHAP (żeby nie zabić pamięci)"""
+    Zwraca (listing_id, X, kolejność); `n=None` = wszystkie wiersze. Macierz
+    zostaje rzadka, jeśli `pre` zwraca CSR. `source` = (ramka, wersja) z
+    treningu w tym samym procesie.
+    """
     engine = create_engine(PG_URL)
-    df = pd.read_sql(f"SELECT * FROM {TABLE_NAME}", engine)
-    return df.sample(5000, random_state=42)
+    df, X, _ = features_for(engine, pre, source=source)
+    order = np.random.default_rng(seed).permutation(X.shape[0])
+    if n is not None:
+        order = order[:n]
+    return df[ID_COL].to_numpy(), X, order
 
-def main():
-    print(f"Ładowanie modelu: {MODEL_PATH}")
-    model = joblib.load(MODEL_PATH)
+def source_features(pre) -> Tuple[List[str], sp.csr_matrix]:
+    """Kolumny źródłowe i macierz (cechy po `pre` × kolumny), która sumuje one-hoty do kolumny.
 
-    pre = model.named_steps["pre"]
-    model_step = model.named_steps["model"]
+    SHAP jest addytywny, więc suma wartości kolumn one-hot to wartość SHAP
+    całej cechy kategorycznej.
+    """
+    names, groups = [], []
+    for _, transformer, cols in pre.transformers_:
+        if transformer == "drop" or not len(cols):
+            continue
+        last = transformer.steps[-1][1] if hasattr(transformer, "steps") else transformer
+        widths = [len(c) for c in last.categories_] if hasattr(last, "categories_") else [1] * len(cols)
+        for col, width in zip(cols, widths):
+            groups += [len(names)] * width
+            names.append(col)
+    groups = np.asarray(groups)
+    G = sp.csr_matrix((np.ones(len(groups), dtype="float32"), (np.arange(len(groups)), groups)))
+    return names, G
 
-    print("Pobieranie próby danych...")
-    df = load_sample()
-    X = df.drop(columns=[TARGET_COL])
+# --- Workery: model ładowany raz na proces ---
+_worker = {}
 
-    print("Transformacja danych...")
-    X_pre = pre.transform(X)
+def _init_worker(model_path: str, threads: int, group: bool) -> None:
+    """XGBoost: natywny TreeSHAP boostera (`pred_contribs`), który przyjmuje CSR bez
+    zagęszczania; pozostałe drzewa: shap.TreeExplainer na gęstych paczkach.
+    XGBoost i shap są importowane dopiero tutaj, w procesie, który liczy."""
+    from xgboost import XGBRegressor
 
-    if hasattr(X_pre, "toarray"):
-        X_pre = X_pre.toarray()
+    from ml.compiled_model import compile_pipeline
 
-    X_pre = X_pre.astype("float64")
+    pipe = joblib.load(model_path)
+    model = pipe.named_steps["model"]
+    if isinstance(model, XGBRegressor):
+        compiled = compile_pipeline(pipe)
+        compiled.booster.set_param({"nthread": threads})
+        _worker.update(compiled=compiled, explainer=None)
+    else:
+        if not hasattr(np, "bool"):
+            np.bool = bool
+        import shap
 
-    print("Obliczanie wartości SHAP...")
-    explainer = shap.TreeExplainer(model_step)
-    shap_values = explainer.shap_values(X_pre)
+        _worker.update(compiled=None, explainer=shap.TreeExplainer(model))
+    _worker["G"] = source_features(pipe.named_steps["pre"])[1] if group else None
 
-    print("Zapis do CSV...")
-    pd.DataFrame(shap_values).to_csv(OUTPUT_CSV, index=False)
-    print(f"Zapisano SHAP CSV → {OUTPUT_CSV}")
+def _tree_explainer_values(X) -> np.ndarray:
+    explainer = _worker["explainer"]
+    X = X.toarray() if sp.issparse(X) else np.asarray(X)
+    values = explainer.shap_values(X.astype("float64"))
+    base = np.full((len(X), 1), np.ravel(explainer.expected_value)[0])
+    return np.hstack([values, base])
 
-    print("Rysowanie wykresu (bar plot)...")
+def _explain_chunk(X) -> Tuple[np.ndarray, float, float]:
+    """(wartości SHAP float32, wartość oczekiwana, sekundy) jednej paczki."""
+    start = time.perf_counter()
+    compiled = _worker["compiled"]
+    contrib = compiled.contributions(X) if compiled is not None else _tree_explainer_values(X)
+    values, base = contrib[:, :-1], float(contrib[0, -1])
+    if _worker["G"] is not None:
+        values = (_worker["G"].T @ values.T).T
+    return np.asarray(values, dtype="float32"), base, time.perf_counter() - start
+
+def _chunks(X, order: np.ndarray, chunk_rows: int):
+    for i in range(0, len(order), chunk_rows):
+        idx = np.sort(order[i : i + chunk_rows])
+        yield idx, X[idx]
+
+def explain(
+    X,
+    order: np.ndarray,
+    workers: int = 1,
+    chunk_rows: int = CHUNK_ROWS,
+    group: bool = True,
+    tolerance: Optional[float] = None,
+    model_path: Optional[Path] = None,
+):
+    """Wartości SHAP wierszy `order` liczone paczkami w puli procesów.
 
+    Z `tolerance` (tryb próbkowany) kończy, gdy połowa 95% przedziału
+    ufności średniego |SHAP| każdej cechy jest ≤ `tolerance` × największa
+    średnia |SHAP| (przybliżenie normalne); wiersze bierze w losowej
+    kolejności `order`, paczka po paczce. Zwraca (indeksy wierszy,
+    wartości, wartość oczekiwana, sekundy obliczeń).
+    """
+    threads = 1 if workers > 1 else (os.cpu_count() or 1)
+    initargs = (str(model_path or require_best_model(ARTIFACTS_DIR)), threads, group)
+    pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=initargs) if workers > 1 else None
+    if pool is None:
+        _init_worker(*initargs)
+
+    rows, parts, base, seconds = [], [], 0.0, 0.0
+    pending = _chunks(X, order, chunk_rows)
     try:
-        feature_names = pre.get_feature_names_out()
-    except Exception:
-        feature_names = None
+        while True:
+            # fala `workers` paczek, potem (w trybie próbkowanym) test przedziału ufności
+            wave = [c for _, c in zip(range(workers), pending)]
+            if not wave:
+                break
+            mats = [m for _, m in wave]
+            results = pool.map(_explain_chunk, mats) if pool else map(_explain_chunk, mats)
+            for (idx, _), (values, base, s) in zip(wave, results):
+                rows.append(idx)
+                parts.append(values)
+                seconds += s
+            if tolerance is not None:
+                done, half, top = _converged(np.vstack(parts), tolerance)
+                print(f"  {sum(map(len, rows)):,} wierszy: maks. ±{half:,.2f} przy top {top:,.2f}")
+                if done:
+                    break
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return np.concatenate(rows), np.vstack(parts), base, seconds
 
-    plt.figure(figsize=(10, 8))
-    shap.summary_plot(
-        shap_values,
-        X_pre,
-        feature_names=feature_names,
-        show=False,
-        plot_type="bar",    
-        max_display=20      
-    )
+def importance(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Średnie |SHAP| cech i połowa ich 95% przedziału ufności."""
+    abs_values = np.abs(values, dtype="float64")
+    if len(abs_values) < 2:
+        return abs_values.mean(axis=0), np.full(abs_values.shape[1], np.inf)
+    return abs_values.mean(axis=0), Z95 * abs_values.std(axis=0, ddof=1) / np.sqrt(len(abs_values))
+
+def _converged(values: np.ndarray, tolerance: float) -> Tuple[bool, float, float]:
+    mean_abs, ci95 = importance(values)
+    top, half = float(mean_abs.max()), float(ci95.max())
+    return half <= tolerance * top, half, top
 
+@profiled("shap.write_values")
+def write_values(
+    path: Path, listing_ids: np.ndarray, values: np.ndarray, names: List[str], base: float, mode: str,
+    model_path: Optional[Path] = None,
+):
+    """Wartości SHAP jako Parquet: listing_id + kolumna float32 na cechę, wartość oczekiwana w metadanych."""
+    table = pa.table({ID_COL: listing_ids, **{name: values[:, j] for j, name in enumerate(names)}})
+    model_name = Path(model_path or require_best_model(ARTIFACTS_DIR)).name
+    meta = {b"expected_value": repr(base).encode(), b"mode": mode.encode(), b"model": model_name.encode()}
+    pq.write_table(table.replace_schema_metadata({**(table.schema.metadata or {}), **meta}), path)
+
+def plot_importance(imp: pd.DataFrame, path: Path, max_display: int = 20):
+    import matplotlib.pyplot as plt
+
+    top = imp.head(max_display).iloc[::-1]
+    plt.figure(figsize=(10, 8))
+    plt.barh(top["feature"], top["mean_abs_shap"], xerr=top["ci95"], color="#1E88E5")
+    plt.xlabel("mean(|SHAP value|) ± 95% CI")
     plt.tight_layout()
-    plt.savefig(OUTPUT_PNG, bbox_inches="tight")
+    plt.savefig(path, bbox_inches="tight")
     plt.close()
 
+def explain_model(
+    model_path: Path,
+    model=None,
+    rows: Optional[int] = 5000,
+    tolerance: Optional[float] = None,
+    workers: int = 0,
+    chunk_rows: int = CHUNK_ROWS,
+    group: bool = True,
+    source=None,
+) -> pd.DataFrame:
+    """SHAP modelu `model_path` → Parquet, CSV ważności i wykres; zwraca ważność cech.
+
+    `model` i `source` (ramka, wersja danych) pozwalają pominąć ponowne
+    wczytanie, gdy trening działał w tym samym procesie.
+    """
+    if model is None:
+        print(f"Ładowanie modelu: {model_path}")
+        model = joblib.load(model_path)
+    pre = model.named_steps["pre"]
+    names = source_features(pre)[0] if group else [str(f) for f in pre.get_feature_names_out()]
+
+    print("Pobieranie próby danych...")
+    listing_ids, X, order = load_sample(pre, rows, source=source)
+    kind = "CSR" if sp.issparse(X) else "dense"
+    print(f"Macierz cech: {X.shape[0]:,} × {X.shape[1]:,} ({kind}), do wyjaśnienia: {len(order):,} wierszy")
+
+    mode = "sampled" if tolerance else "exact"
+    print(f"Obliczanie wartości SHAP ({mode})...")
+    with stage(f"shap.explain_{mode}", rows_in=len(order)) as explain_stage:
+        idx, values, base, seconds = explain(
+            X, order, workers or os.cpu_count() or 1, chunk_rows, group, tolerance, model_path
+        )
+        explain_stage.rows_out = len(idx)
+    print(f"SHAP: {len(idx):,} wierszy w {explain_stage.wall_s:.2f}s (obliczenia {seconds:.2f}s)")
+
+    write_values(OUTPUT_PARQUET, listing_ids[idx], values, names, base, mode, model_path)
+    print(f"Zapisano SHAP Parquet → {OUTPUT_PARQUET}")
+
+    mean_abs, ci95 = importance(values)
+    imp = pd.DataFrame({"feature": names, "mean_abs_shap": mean_abs, "ci95": ci95})
+    imp = imp.sort_values("mean_abs_shap", ascending=False)
+    imp.to_csv(OUTPUT_IMPORTANCE, index=False)
+    print(f"Zapisano ważność cech → {OUTPUT_IMPORTANCE}")
+
+    print("Rysowanie wykresu (bar plot)...")
+    plot_importance(imp, OUTPUT_PNG)
     print(f"Wykres zapisany → {OUTPUT_PNG}")
+    return imp
+
+def main():
+    ap = argparse.ArgumentParser(description="Wartości SHAP najlepszego modelu.")
+    ap.add_argument("--rows", type=int, default=5000, help="liczba wierszy (0 = wszystkie z cache)")
+    ap.add_argument("--tolerance", type=float, default=None,
+                    help="tryb próbkowany: stop, gdy 95%% CI średniego |SHAP| ≤ tolerance × największa średnia")
+    ap.add_argument("--workers", type=int, default=0, help="procesy (0 = wszystkie rdzenie)")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    ap.add_argument("--no-group", action="store_true", help="osobna kolumna na każdy one-hot")
+    args = ap.parse_args()
+
+    explain_model(
+        require_best_model(ARTIFACTS_DIR), rows=args.rows or None, tolerance=args.tolerance, workers=args.workers,
+        chunk_rows=args.chunk_rows, group=not args.no_group,
+    )
     print("DONE ✔")
 
 if __name__ == "__main__":
     main()
-
-    
\ No newline at end of file
@@ -0,0 +1,277 @@
+# ml/train_scheduler.py
+import math
+import os
+import sys
+import time
+import warnings
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, parallel_config
+from sklearn.base import clone
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import KFold, ParameterGrid, ParameterSampler
+from sklearn.pipeline import Pipeline
+
+from etl.profiling import stage
+
+
+EARLY_STOPPING_ROUNDS = 20
+
+EvalSet = Tuple[pd.DataFrame, pd.Series]
+
+
+@dataclass
+class SearchResult:
+    """Outcome of the hyperparameter search of one model."""
+
+    name: str
+    best_pipe: Pipeline
+    best_params: Optional[dict]
+    best_score: float
+    cv_results: pd.DataFrame = field(repr=False)
+    seconds: float = 0.0  # summed duration of this model's fits (search + refit)
+
+
+def cpu_budget(n_workers: Optional[int] = None) -> Tuple[int, int]:
+    """Split the available cores into (processes, threads per process).
+
+    Without `n_workers` every core runs its own single-threaded fit, which
+    scales best for many small fits. With fewer workers the remaining cores
+    go to the estimators' own threads (RandomForest / XGBoost `n_jobs`), so
+    processes × threads never exceeds the core count.
+    """
+    cores = os.cpu_count() or 1
+    workers = max(1, min(n_workers or cores, cores))
+    return workers, max(1, cores // workers)
+
+
+# ---------------------------------------------------------------------
+# 1) Single fits (run inside the worker processes)
+# ---------------------------------------------------------------------
+def _with_threads(pipe: Pipeline, params: dict, threads: int) -> Pipeline:
+    """Fresh copy of `pipe` with `params` applied and inner parallelism capped at `threads`."""
+    est = clone(pipe).set_params(**params)
+    if "n_jobs" in est.named_steps["model"].get_params():
+        est.set_params(model__n_jobs=threads)
+    return est
+
+
+def _fit_pipe(est: Pipeline, X, y, eval_set: Optional[EvalSet] = None) -> Pipeline:
+    """Fit `est`; an XGBoost model stops early on `eval_set` when one is given.
+
+    The eval set goes through the preprocessor fitted on `X`, so the model
+    sees it in the same feature space. `n_estimators` becomes an upper bound
+    and the fitted booster predicts with its best iteration.
+    """
+    model = est.named_steps["model"]
+    # an XGBoost model implies xgboost is already imported; other families never load it
+    xgb = sys.modules.get("xgboost")
+    if eval_set is None or xgb is None or not isinstance(model, xgb.XGBRegressor):
+        return est.fit(X, y)
+    pre = est.named_steps["pre"]
+    X_es, y_es = eval_set
+    Xt = pre.fit_transform(X, y)
+    model.set_params(early_stopping_rounds=EARLY_STOPPING_ROUNDS, eval_metric="mae")
+    model.fit(Xt, y, eval_set=[(pre.transform(X_es), y_es)], verbose=False)
+    # keeps best_iteration, but later plain fits (no eval set) still work
+    model.set_params(early_stopping_rounds=None)
+    return est
+
+
+def _stage_name(kind: str, pipe: Pipeline) -> str:
+    return f"fit.{kind}.{type(pipe.named_steps['model']).__name__}"
+
+
+def _fit_score(pipe, params, threads, X, y, train_idx, test_idx, eval_set=None) -> Tuple[float, float]:
+    """Fit one (candidate, fold) task; returns (validation MAE or NaN on failure, seconds)."""
+    start = time.perf_counter()
+    est = _with_threads(pipe, params, threads)
+    with stage(_stage_name("cv", pipe), rows_in=len(train_idx)) as record:
+        try:
+            _fit_pipe(est, X.iloc[train_idx], y.iloc[train_idx], eval_set)
+            mae = mean_absolute_error(y.iloc[test_idx], est.predict(X.iloc[test_idx]))
+            record.rows_out = len(test_idx)
+        except Exception as e:
+            warnings.warn(f"Fit failed for {params}: {e}")
+            mae = np.nan
+            record.ok = False
+    return mae, time.perf_counter() - start
+
+
+def _refit(pipe, params, threads, X, y, eval_set=None) -> Tuple[Pipeline, float]:
+    start = time.perf_counter()
+    with stage(_stage_name("refit", pipe), rows_in=len(X)):
+        est = _fit_pipe(_with_threads(pipe, params, threads), X, y, eval_set)
+    return est, time.perf_counter() - start
+
+
+# ---------------------------------------------------------------------
+# 2) Scheduling
+# ---------------------------------------------------------------------
+def _run_fits(tasks: list, pipes, X, y, workers, threads, eval_set, verbose) -> List[Tuple[float, float]]:
+    """Score (name, params, train_idx, test_idx) tasks on the process pool."""
+    with parallel_config(backend="loky", inner_max_num_threads=threads):
+        return Parallel(n_jobs=workers, verbose=verbose)(
+            delayed(_fit_score)(pipes[name], params, threads, X, y, train_idx, test_idx, eval_set)
+            for name, params, train_idx, test_idx in tasks
+        )
+
+
+def _pick_best(name: str, candidates: List[dict], mean_mae: pd.Series) -> Tuple[Optional[dict], float]:
+    """Lowest mean MAE, first candidate among equal scores; None when every fit failed."""
+    if mean_mae.notna().any():
+        i = int(mean_mae.idxmin())
+        return candidates[i], float(mean_mae.loc[i])
+    # nothing converged: fall back to the pipeline's default parameters
+    print(f"[ERROR] Hyperparameter search failed for {name}, fitting defaults")
+    return None, np.nan
+
+
+def _refit_best(pipes, best, cv_results, X, y, workers, eval_set, verbose) -> Dict[str, SearchResult]:
+    """Refit every model's winner on all of `X`; few tasks, so each gets more threads."""
+    refit_workers = min(workers, len(pipes))
+    refit_threads = max(1, (os.cpu_count() or 1) // refit_workers)
+    with parallel_config(backend="loky", inner_max_num_threads=refit_threads):
+        fitted = Parallel(n_jobs=refit_workers, verbose=verbose)(
+            delayed(_refit)(pipes[name], best[name][0] or {}, refit_threads, X, y, eval_set)
+            for name in pipes
+        )
+
+    results = {}
+    for name, (pipe, refit_seconds) in zip(pipes, fitted):
+        params, score = best[name]
+        model_results = cv_results[cv_results["model"] == name].reset_index(drop=True)
+        results[name] = SearchResult(
+            name=name,
+            best_pipe=pipe,
+            best_params=params,
+            best_score=score,
+            cv_results=model_results,
+            seconds=float(model_results["fit_seconds"].sum()) + refit_seconds,
+        )
+    return results
+
+
+def train_models(
+    pipes: Dict[str, Pipeline],
+    grids: Dict[str, dict],
+    X: pd.DataFrame,
+    y: pd.Series,
+    n_iter: int = 5,
+    cv: int = 2,
+    random_state: int = 42,
+    n_workers: Optional[int] = None,
+    eval_set: Optional[EvalSet] = None,
+    verbose: int = 0,
+) -> Dict[str, SearchResult]:
+    """Randomized search of several pipelines on one shared process pool.
+
+    Equivalent to one `RandomizedSearchCV(n_iter, cv, scoring=MAE,
+    random_state)` per model, but the whole model × candidate × fold grid is
+    flattened into independent tasks, so the cores stay busy across models
+    instead of finishing one search before starting the next. Candidates and
+    folds are drawn with the same seeds as `RandomizedSearchCV`, every task
+    is a fixed-seed fit and ties are broken by candidate order, so the best
+    model does not depend on the number of workers. The winning candidates
+    are refit on all of `X` in a second parallel round.
+    """
+    workers, threads = cpu_budget(n_workers)
+    folds = list(KFold(n_splits=cv).split(X))
+    candidates = {
+        name: list(ParameterSampler(grids.get(name, {}), n_iter, random_state=random_state))
+        for name in pipes
+    }
+    keys = [
+        (name, i, f)
+        for name in pipes
+        for i in range(len(candidates[name]))
+        for f in range(len(folds))
+    ]
+    tasks = [(name, candidates[name][i], *folds[f]) for name, i, f in keys]
+
+    scores = _run_fits(tasks, pipes, X, y, workers, threads, eval_set, verbose)
+    cv_results = pd.DataFrame(
+        [(*key, *score) for key, score in zip(keys, scores)],
+        columns=["model", "candidate", "fold", "mae", "fit_seconds"],
+    )
+    mean_mae = cv_results.groupby(["model", "candidate"], sort=False)["mae"].mean()
+    best = {name: _pick_best(name, candidates[name], mean_mae.loc[name]) for name in pipes}
+    return _refit_best(pipes, best, cv_results, X, y, workers, eval_set, verbose)
+
+
+def halving_search(
+    pipes: Dict[str, Pipeline],
+    grids: Dict[str, dict],
+    X: pd.DataFrame,
+    y: pd.Series,
+    factor: int = 3,
+    cv: int = 2,
+    min_resources: int = 1_000,
+    random_state: int = 42,
+    n_workers: Optional[int] = None,
+    eval_set: Optional[EvalSet] = None,
+    verbose: int = 0,
+) -> Dict[str, SearchResult]:
+    """Successive halving over the full grids of several pipelines.
+
+    Round 0 scores every grid point of every model on a small, seeded subset
+    of each training fold; each following round keeps the best `1/factor`
+    candidates per model and trains them on `factor` times more rows, up to
+    the whole fold. Large grids get extra rounds at the smallest budget, so
+    at most `factor` candidates reach the full-size round, and a model stops
+    racing once a single candidate is left. Rounds run on the same process
+    pool as `train_models`, mixing the models' tasks. With `eval_set`,
+    XGBoost fits stop early on it, so its `n_estimators` is only an upper
+    bound.
+    """
+    workers, threads = cpu_budget(n_workers)
+    folds = list(KFold(n_splits=cv).split(X))
+    order = np.random.RandomState(random_state).permutation(len(X))
+    candidates = {name: list(ParameterGrid(grids.get(name, {}))) for name in pipes}
+
+    max_resources = min(len(train_idx) for train_idx, _ in folds)
+    n_rounds = 1 + int(math.log(max(max_resources / min_resources, 1), factor))
+    budgets = [int(max_resources / factor ** (n_rounds - 1 - r)) for r in range(n_rounds)]
+    # aggressive elimination: extra cheap rounds until the full-data round sees at most `factor` candidates
+    most = max(len(c) for c in candidates.values())
+    if most > factor ** (n_rounds - 1):
+        extra = math.ceil(math.log(most / factor ** (n_rounds - 1), factor))
+        budgets = [budgets[0]] * extra + budgets
+
+    alive = {name: list(range(len(c))) for name, c in candidates.items()}
+    rows = []
+    for r, n_samples in enumerate(budgets):
+        # same rows for every candidate of a round: the first n_samples of a fixed shuffle
+        subsets = [
+            (np.sort(order[np.isin(order, train_idx)][:n_samples]), test_idx)
+            for train_idx, test_idx in folds
+        ]
+        # a model down to one candidate is done, its refit trains on all of X anyway
+        racing = [name for name in pipes if len(alive[name]) > 1 or r == 0]
+        keys = [(name, i, f) for name in racing for i in alive[name] for f in range(len(subsets))]
+        if not keys:
+            break
+        tasks = [(name, candidates[name][i], *subsets[f]) for name, i, f in keys]
+
+        scores = _run_fits(tasks, pipes, X, y, workers, threads, eval_set, verbose)
+        if verbose:
+            print(f"Runda {r}: {len(tasks)} dopasowań na {n_samples:,} wierszach")
+
+        round_results = pd.DataFrame(
+            [(*key, r, n_samples, *score) for key, score in zip(keys, scores)],
+            columns=["model", "candidate", "fold", "round", "n_samples", "mae", "fit_seconds"],
+        )
+        rows.append(round_results)
+        mean_mae = round_results.groupby(["model", "candidate"], sort=False)["mae"].mean()
+        for name in racing:
+            ranked = mean_mae.loc[name].fillna(np.inf).sort_values(kind="stable")
+            alive[name] = ranked.index[: max(1, math.ceil(len(ranked) / factor))].tolist()
+
+    cv_results = pd.concat(rows, ignore_index=True)
+    last = cv_results[cv_results["round"] == cv_results.groupby("model")["round"].transform("max")]
+    mean_mae = last.groupby(["model", "candidate"], sort=False)["mae"].mean()
+    best = {name: _pick_best(name, candidates[name], mean_mae.loc[name]) for name in pipes}
+    return _refit_best(pipes, best, cv_results, X, y, workers, eval_set, verbose)
@@ -0,0 +1,105 @@
+# tests/conftest.py
+"""Shared fixtures; pytest.ini puts the repository root on sys.path, so tests import `etl.*` and `ml.*`."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def _listings(rows: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "area_sqm": rng.uniform(20, 150, rows).round(1),
+        "rooms": rng.integers(1, 6, rows).astype("float64"),
+        "year_built": rng.integers(1950, 2025, rows).astype("float64"),
+        "distance_center_km": rng.uniform(0, 20, rows).round(2),
+        "city": rng.choice(["Warszawa", "Kraków", "Gdańsk", "Wrocław"], rows).astype(object),
+        "postal_code": np.char.add("0", rng.integers(1000, 1400, rows).astype(str)).astype(object),
+    })
+    for c in ["area_sqm", "year_built", "city"]:
+        df.loc[rng.random(rows) < 0.05, c] = np.nan
+    return df
+
+
+@pytest.fixture(autouse=True, scope="session")
+def stage_metrics_dir(tmp_path_factory):
+    """Stage records of test runs go to a temporary directory, not to artifacts/stage_metrics/."""
+    from etl import profiling
+
+    path = tmp_path_factory.mktemp("stage_metrics")
+    with pytest.MonkeyPatch.context() as mp:
+        # worker processes import profiling anew and read the directory from the environment
+        mp.setenv("STAGE_METRICS_DIR", str(path))
+        mp.setattr(profiling, "METRICS_DIR", path)
+        yield path
+
+
+@pytest.fixture(scope="session")
+def listings():
+    """Factory of model inputs `(rows, seed) -> DataFrame`, with NaNs in numeric and categorical columns."""
+    return _listings
+
+
+@pytest.fixture
+def pg_engine():
+    """Engine of the scratch database $TEST_PG_URL, its warehouse schemas emptied; skipped without it."""
+    url = os.getenv("TEST_PG_URL")
+    if not url:
+        pytest.skip("TEST_PG_URL not set")
+    from sqlalchemy import create_engine
+
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        for schema in ("public", "bronze", "silver", "gold", "ml"):
+            conn.exec_driver_sql(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        conn.exec_driver_sql("CREATE SCHEMA public")
+    yield engine
+    engine.dispose()
+
+
+def _gold_frame(n: int = 3_000) -> pd.DataFrame:
+    """Synthetic rows with the columns of gold.housing_valid."""
+    rng = np.random.default_rng(9)
+    dates = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, n), unit="D")
+    area = rng.uniform(20, 150, n).round(1)
+    price_sqm = rng.uniform(8_000, 30_000, n).round(2)
+    floor, total = rng.integers(0, 10, n), rng.integers(10, 20, n)
+    year_built = rng.integers(1950, 2025, n)
+    return pd.DataFrame({
+        "listing_id": np.arange(1, n + 1),
+        "listing_date": dates.date,
+        "season": np.where(dates.month.isin([6, 7, 8]), "summer", "other"),
+        "listing_year": dates.year,
+        "decade": year_built // 10 * 10,
+        "listing_month": dates.month,
+        "listing_day": dates.day,
+        "listing_day_of_week": dates.dayofweek,
+        "city": rng.choice(["Warszawa", "Kraków", "Gdańsk"], n),
+        "district": rng.choice(["Mokotów", "Wola", "Podgórze"], n),
+        "postal_code": rng.choice(["00-001", "30-002", "80-003"], n),
+        "rooms": rng.integers(1, 6, n),
+        "floor": floor,
+        "total_floors": total,
+        "floor_ratio": floor / total,
+        "year_built": year_built,
+        "building_age": 2025 - year_built,
+        "area_sqm": area,
+        "area_sqm_bucket": np.where(area < 50, "small", "large"),
+        "distance_center_km": rng.uniform(0, 20, n).round(2),
+        "distance_km_bucket": rng.choice(["near", "far"], n),
+        "price_sqm": price_sqm,
+        "has_elevator_int": rng.integers(0, 2, n),
+        "invalid_floor_flag": False,
+        "price_total": (area * price_sqm).round(2),
+    })
+
+
+@pytest.fixture
+def gold(pg_engine):
+    """gold.housing_valid as a view, like in the warehouse."""
+    _gold_frame().to_sql("housing_src", pg_engine, schema="public", index=False)
+    with pg_engine.begin() as conn:
+        conn.exec_driver_sql("CREATE SCHEMA gold")
+        conn.exec_driver_sql("CREATE VIEW gold.housing_valid AS SELECT * FROM public.housing_src")
+    return pg_engine
@@ -0,0 +1,85 @@
+# tests/test_compiled_model.py
+"""CompiledModel against pipe.predict for every model family, dense and CSR `pre` output."""
+import numpy as np
+import pytest
+import scipy.sparse as sp
+from sklearn.base import clone
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.pipeline import Pipeline
+from xgboost import XGBRegressor
+
+from ml.compiled_model import PARITY_RTOL, check_parity, compile_pipeline
+from ml.ml_final import build_preprocessor
+
+MODELS = {
+    "RandomForest": lambda: RandomForestRegressor(n_estimators=20, max_depth=8, random_state=0),
+    "GradientBoosting": lambda: GradientBoostingRegressor(n_estimators=30, max_depth=3, random_state=0),
+    "XGBRegressor": lambda: XGBRegressor(n_estimators=30, max_depth=4, learning_rate=0.2, random_state=0),
+}
+
+
+@pytest.fixture(scope="module")
+def data(listings):
+    train = listings(2_000, seed=1)
+    y = train["area_sqm"].fillna(60) * 12_000 - train["distance_center_km"] * 3_000
+    check = listings(500, seed=2)
+    check.loc[:4, "postal_code"] = "99-999"  # categories never seen in training
+    return train, y, check
+
+
+@pytest.mark.parametrize("sparse", [False, True], ids=["dense", "csr"])
+@pytest.mark.parametrize("name", list(MODELS))
+def test_compiled_matches_pipeline(data, name, sparse):
+    train, y, check = data
+    pre = build_preprocessor(train)[0]
+    pre = clone(pre).set_params(sparse_threshold=1.0 if sparse else 0.0)
+    pipe = Pipeline([("pre", pre), ("model", MODELS[name]())]).fit(train, y)
+    assert pipe.named_steps["pre"].sparse_output_ == sparse
+
+    compiled = compile_pipeline(pipe)
+    assert check_parity(pipe, compiled, check) <= PARITY_RTOL
+    # one listing as a dict, the way serve.py passes requests
+    record = check.iloc[[7]].to_dict("records")[0]
+    np.testing.assert_allclose(compiled.predict(record), pipe.predict(check.iloc[[7]]), rtol=PARITY_RTOL)
+
+
+
+@pytest.mark.parametrize("name", list(MODELS))
+def test_wide_outputs_are_built_as_csr(data, name, monkeypatch):
+    from ml import compiled_model
+
+    train, y, check = data
+    pipe = Pipeline([("pre", build_preprocessor(train)[0]), ("model", MODELS[name]())]).fit(train, y)
+    monkeypatch.setattr(compiled_model, "DENSE_MAX_FEATURES", 8)  # fewer than the one-hot columns
+    compiled = compile_pipeline(pipe)
+    assert sp.issparse(compiled.transform(check))
+    # zeros left out of the CSR take the same branch as an explicit 0.0
+    assert check_parity(pipe, compiled, check) <= PARITY_RTOL
+
+def test_check_parity_rejects_a_different_model(data):
+    train, y, check = data
+    pre = build_preprocessor(train)[0]
+    pipe = Pipeline([("pre", pre), ("model", MODELS["XGBRegressor"]())]).fit(train, y)
+    other = Pipeline([("pre", clone(pre)), ("model", MODELS["XGBRegressor"]())]).fit(train, y * 1.5)
+    with pytest.raises(ValueError):
+        check_parity(pipe, compile_pipeline(other), check)
+
+
+def test_failed_export_keeps_training_and_removes_stale_file(data, tmp_path, monkeypatch):
+    from ml import compiled_model
+    from ml import ml_final
+
+    train, y, check = data
+    pipe = Pipeline([("pre", build_preprocessor(train)[0]), ("model", MODELS["XGBRegressor"]())]).fit(train, y)
+    stale = tmp_path / f"{compiled_model.COMPILED_PREFIX}XGBRegressor.joblib"
+    stale.write_bytes(b"model of a previous run")
+    monkeypatch.setattr(ml_final, "ARTIFACTS_DIR", tmp_path)
+    monkeypatch.setattr(ml_final, "mark_best_model", lambda path: None)
+
+    def fail(*args, **kwargs):
+        raise ValueError("parity")
+
+    monkeypatch.setattr(compiled_model, "export_compiled", fail)
+    path, sha = ml_final.save_best_model("XGBRegressor", pipe, check)
+    assert path.exists() and len(sha) == 64
+    assert not stale.exists()
@@ -0,0 +1,112 @@
+# tests/test_copy_loader.py
+"""COPY loads of etl/copy_loader.py: both payload formats, batching, the staging-table swap and upserts."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from etl.copy_loader import LoadStats, copy_frames, encode_binary, iter_parquet, upsert_frames
+
+
+def _frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "listing_id": np.array([1, 2, 3, 4], dtype="int64"),
+        "rooms": np.array([1, 2, 3, 4], dtype="int32"),
+        "price": [1.5, np.nan, -2.25, 1e12],
+        "city": ["Kraków", None, 'a "quoted", line\nbreak', "Gdańsk"],
+        "date": pd.to_datetime(["2024-01-01 00:00:00", None, "1999-12-31 23:59:59.5", "2024-02-29 12:00:00"], format="ISO8601"),
+        "has_elevator": [True, False, True, False],
+    })
+
+
+def _read(engine, table: str = "housing") -> pd.DataFrame:
+    return pd.read_sql(f"SELECT * FROM public.{table} ORDER BY listing_id", engine)
+
+
+def test_binary_payload_framing():
+    payload = encode_binary(_frame().iloc[:2])
+    assert payload.startswith(b"PGCOPY\n\xff\r\n\x00")
+    assert payload.endswith(b"\xff\xff")
+    # a NULL field is its length -1 with no data
+    assert b"\xff\xff\xff\xff" in encode_binary(pd.DataFrame({"x": [np.nan]}))
+
+
+def test_iter_parquet_bounds_the_batches(tmp_path):
+    df = pd.DataFrame({"x": np.arange(10)})
+    df.to_parquet(tmp_path / "part.parquet")
+    batches = list(iter_parquet(str(tmp_path / "part.parquet"), batch_rows=4))
+    assert [len(b) for b in batches] == [4, 4, 2]
+    pd.testing.assert_frame_equal(pd.concat(batches, ignore_index=True), df)
+
+
+@pytest.mark.parametrize("fmt", ["csv", "binary"])
+def test_copy_matches_to_sql(pg_engine, fmt):
+    df = _frame()
+    df.to_sql("expected", pg_engine, index=False)
+    stats = copy_frames([df.iloc[:3], df.iloc[3:]], pg_engine, "housing", fmt=fmt)
+    assert isinstance(stats, LoadStats) and stats.rows == 4 and stats.bytes > 0
+
+    pd.testing.assert_frame_equal(_read(pg_engine), _read(pg_engine, "expected"))
+    with pg_engine.connect() as conn:
+        types = conn.exec_driver_sql(
+            "SELECT table_name, column_name, data_type FROM information_schema.columns "
+            "WHERE table_schema = 'public' ORDER BY ordinal_position"
+        ).fetchall()
+    by_table = {t: [(c, d) for tt, c, d in types if tt == t] for t in ("housing", "expected")}
+    assert by_table["housing"] == by_table["expected"]
+
+
+def test_failed_load_keeps_the_old_table(pg_engine):
+    copy_frames([_frame()], pg_engine, "housing")
+
+    def frames():
+        yield _frame().iloc[:2]
+        raise RuntimeError("source went away")
+
+    with pytest.raises(RuntimeError):
+        copy_frames(frames(), pg_engine, "housing")
+    assert len(_read(pg_engine)) == 4
+    with pg_engine.connect() as conn:
+        left = conn.exec_driver_sql("SELECT to_regclass('public.housing__staging')").scalar()
+    assert left is None
+
+
+def test_new_load_replaces_every_row(pg_engine):
+    copy_frames([_frame()], pg_engine, "housing")
+    copy_frames([_frame().iloc[:1]], pg_engine, "housing", fmt="binary")
+    assert _read(pg_engine)["listing_id"].tolist() == [1]
+    with pytest.raises(ValueError):
+        copy_frames([], pg_engine, "housing")
+
+
+def _rows(ids, prices, days) -> pd.DataFrame:
+    return pd.DataFrame({
+        "listing_id": ids,
+        "price": prices,
+        "date": pd.to_datetime([f"2024-01-{d:02d}" for d in days]),
+    })
+
+
+def test_upsert_replaces_rows_by_key(pg_engine):
+    upsert_frames([_rows([1, 2, 3], [10.0, 20.0, 30.0], [1, 1, 1])], pg_engine, "housing", key="listing_id")
+    # id 2 twice in the delta: the newer date wins; id 4 is new
+    delta = _rows([2, 2, 4], [21.0, 22.0, 40.0], [3, 2, 2])
+    stats = upsert_frames([delta.iloc[:2], delta.iloc[2:]], pg_engine, "housing", key="listing_id", order_by="date")
+    assert stats.rows == 3
+    out = _read(pg_engine)
+    assert out["listing_id"].tolist() == [1, 2, 3, 4]
+    assert out["price"].tolist() == [10.0, 21.0, 30.0, 40.0]
+
+
+def test_upsert_runs_post_sql_in_its_transaction(pg_engine):
+    upsert_frames([_rows([1], [10.0], [1])], pg_engine, "housing", key="listing_id")
+    log = "CREATE TABLE IF NOT EXISTS public.loads AS SELECT count(*) AS n FROM {staging}"
+    upsert_frames([_rows([2], [20.0], [1])], pg_engine, "housing", key="listing_id", post_sql=[log])
+    assert pd.read_sql("SELECT n FROM public.loads", pg_engine)["n"].tolist() == [1]
+
+    with pytest.raises(Exception):
+        upsert_frames(
+            [_rows([1, 3], [11.0, 30.0], [2, 2])], pg_engine, "housing", key="listing_id",
+            post_sql=[("SELECT 1 / %(zero)s", {"zero": 0})],
+        )
+    assert _read(pg_engine)["price"].tolist() == [10.0, 20.0]  # rolled back with the failing statement
+    assert upsert_frames([], pg_engine, "housing", key="listing_id").rows == 0
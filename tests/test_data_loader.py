@@ -0,0 +1,41 @@
+# tests/test_data_loader.py
+"""Server-side sampling of ml/data_loader.py on $TEST_PG_URL: seeded, reproducible, feature columns only."""
+import numpy as np
+import pandas as pd
+
+from ml.data_loader import FEATURE_COLS, TARGET_COL, holdout_sql, iter_chunks, load_frame, select_sql
+
+
+def test_sample_is_seeded_and_reads_features_only(gold):
+    sample = load_frame(gold, frac=0.2, seed=1)
+    assert list(sample.columns) == FEATURE_COLS + [TARGET_COL]
+    assert 0.15 * 3_000 < len(sample) < 0.25 * 3_000
+    pd.testing.assert_frame_equal(load_frame(gold, frac=0.2, seed=1, chunk_rows=100), sample)
+    other = load_frame(gold, frac=0.2, seed=2)
+    assert not sample[TARGET_COL].isin(other[TARGET_COL]).all()
+    assert len(load_frame(gold)) == 3_000
+
+
+def test_holdout_is_the_complement_of_the_training_rows(gold):
+    def ids(sql):
+        return pd.concat(iter_chunks(gold, sql, 500))["listing_id"]
+
+    train = ids(select_sql(["listing_id"], seed=3, exclude_frac=0.1))
+    hold = ids(holdout_sql(["listing_id"], 0.1, seed=3))
+    assert not set(train) & set(hold)
+    assert sorted(set(train) | set(hold)) == list(range(1, 3_001))
+    assert 0.05 * 3_000 < len(hold) < 0.15 * 3_000
+    # a smaller training sample stays inside the non-holdout rows
+    assert set(ids(select_sql(["listing_id"], frac=0.5, seed=3, exclude_frac=0.1))) <= set(train)
+
+
+def test_external_memory_xgboost_trains_on_the_non_holdout_rows(gold, tmp_path, monkeypatch):
+    from ml.data_loader import train_xgb_external
+
+    monkeypatch.chdir(tmp_path)  # ml_final creates its artifacts dir on import
+    pipe = train_xgb_external(
+        gold, {"max_depth": 3, "seed": 0}, num_boost_round=30, fit_frac=0.5, chunk_rows=500
+    )
+    sample = load_frame(gold, frac=0.1)
+    pred = pipe.predict(sample.drop(columns=[TARGET_COL]))
+    assert np.mean(np.abs(pred - sample[TARGET_COL])) < sample[TARGET_COL].std()
@@ -0,0 +1,113 @@
+# tests/test_data_profile.py
+"""etl/data_profile.py: only the latest version of each listing counts, and the cache follows updates."""
+import fsspec
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from etl import data_profile
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    """Local stand-in for processed/housing; returns a writer of one run's file for one day."""
+    fs = fsspec.filesystem("file", auto_mkdir=True)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(data_profile.fsspec, "filesystem", lambda *a, **k: fs)
+    monkeypatch.setattr(data_profile, "PROFILE_STATE", str(tmp_path / "state"))
+
+    def write(run_tag: str, day: int, ids, prices):
+        path = tmp_path / f"processed/housing/year=2024/month=1/day={day}/{run_tag}-0.parquet"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        pq.write_table(pa.table({"listing_id": np.asarray(ids, "int64"), "price_total": np.asarray(prices, "float64")}), path)
+
+    return write
+
+
+def _files_read(monkeypatch):
+    """List that collects the day/file of every file `profile_dataset` reads."""
+    read = []
+    profile_file = data_profile.profile_file
+
+    def spy(fs, path, drop=None):
+        read.append("/".join(path.split("/")[-2:]))
+        return profile_file(fs, path, drop)
+
+    monkeypatch.setattr(data_profile, "profile_file", spy)
+    return read
+
+
+def test_updated_listings_count_once(dataset, monkeypatch):
+    dataset("housing_20240101", 1, [1, 2, 3], [100.0, 200.0, 300.0])
+    dataset("housing_20240102", 2, [4, 5], [400.0, 500.0])
+    first = data_profile.profile_dataset("housing")
+    assert first.loc["price_total", "rows"] == 5 and first.loc["price_total", "mean"] == 300.0
+
+    # a later run updates listing 2 (another day) and 4 (same day as before)
+    dataset("housing_20240103", 3, [2, 6], [1_200.0, 600.0])
+    dataset("housing_20240103", 2, [4], [1_400.0])
+    read = _files_read(monkeypatch)
+    profile = data_profile.profile_dataset("housing")
+    latest = [100.0, 1_200.0, 300.0, 1_400.0, 500.0, 600.0]
+    assert profile.loc["price_total", "rows"] == 6
+    assert profile.loc["price_total", "mean"] == pytest.approx(np.mean(latest))
+    assert profile.loc["price_total", "max"] == 1_400.0
+    # the new files and the two older ones with a superseded row
+    assert sorted(read) == [
+        "day=1/housing_20240101-0.parquet", "day=2/housing_20240102-0.parquet",
+        "day=2/housing_20240103-0.parquet", "day=3/housing_20240103-0.parquet",
+    ]
+
+    read.clear()
+    pd.testing.assert_frame_equal(data_profile.profile_dataset("housing"), profile)  # cached summary
+    assert read == []
+
+    # only new listings: no other file is read
+    dataset("housing_20240104", 4, [7], [700.0])
+    profile = data_profile.profile_dataset("housing")
+    assert read == ["day=4/housing_20240104-0.parquet"]
+    assert profile.loc["price_total", "rows"] == 7
+    pd.testing.assert_frame_equal(data_profile.profile_dataset("housing", rebuild=True), profile)
+
+
+def test_order_follows_run_tag_then_day():
+    paths = [
+        "processed/housing/year=2024/month=10/day=1/housing_20240102-0.parquet",
+        "processed/housing/year=2024/month=2/day=1/housing_20240102-0.parquet",
+        "processed/housing/year=2024/month=12/day=1/housing_20240101-0.parquet",
+    ]
+    assert sorted(paths, key=data_profile._order) == [paths[2], paths[1], paths[0]]
+
+
+def test_statistics_match_pandas(dataset, tmp_path):
+    rng = np.random.default_rng(4)
+    frames = []
+    for day in (1, 2, 3):
+        n = 20_000
+        df = pd.DataFrame({
+            "listing_id": np.arange(n, dtype="int64") + day * n,
+            "rooms": rng.integers(1, 6, n).astype("float64"),  # few values: exact quartiles
+            "price_total": rng.lognormal(13, 0.4, n),          # long tail: t-digest
+            "city": rng.choice(["Warszawa", "Kraków"], n),
+        })
+        df.loc[rng.random(n) < 0.05, "rooms"] = np.nan
+        path = tmp_path / f"processed/housing/year=2024/month=1/day={day}/housing_2024010{day}-0.parquet"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(path, index=False)
+        frames.append(df.assign(day=float(day)))
+    full = pd.concat(frames, ignore_index=True)
+
+    profile = data_profile.profile_dataset("housing")
+    assert profile.loc["city", "nulls"] == 0 and np.isnan(profile.loc["city", "mean"])
+    for col in ["rooms", "price_total", "day"]:
+        s = full[col]
+        got = profile.loc[col]
+        assert got["nulls"] == s.isna().sum()
+        assert (got["min"], got["max"]) == (s.min(), s.max())
+        assert got["mean"] == pytest.approx(s.mean(), rel=1e-9)
+        assert got["std"] == pytest.approx(s.std(), rel=1e-9)
+        rtol = 1e-2 if col == "price_total" else 0
+        quartiles = got[["p25", "median", "p75"]].to_numpy("float64")
+        np.testing.assert_allclose(quartiles, s.quantile([0.25, 0.5, 0.75]), rtol=rtol)
@@ -0,0 +1,119 @@
+# tests/test_dedup.py
+"""etl/dedup.py: the hash index across runs, reruns and chunked batches."""
+import numpy as np
+import pandas as pd
+
+from etl import load
+from etl.dedup import DedupIndex, DedupStats
+
+
+def _raw(ids, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n = len(ids)
+    return pd.DataFrame({
+        "listing_id": np.asarray(ids, "int64"),
+        "date": rng.choice(["2024-01-01", "2024-01-02", "2024-01-03"], n),
+        "city": pd.Categorical(rng.choice(["Warszawa", "Krakow"], n)),
+        "district": rng.choice(["Wola", "Mokotow"], n).astype(object),
+        "postal_code": np.char.add("0", rng.integers(1000, 1100, n).astype(str)).astype(object),
+        "rooms": rng.integers(1, 6, n).astype("float64"),
+        "floor": rng.integers(0, 10, n).astype("float64"),
+        "total_floors": np.full(n, 10.0),
+        "year_built": rng.integers(1950, 2024, n).astype("float64"),
+        "area_sqm": rng.uniform(20, 150, n).round(1),
+        "distance_center_km": rng.uniform(0, 20, n).round(2),
+        "price_total": rng.uniform(2e5, 2e6, n).round(-2),
+    })
+
+
+def test_later_runs_are_checked_against_the_saved_index(tmp_path):
+    uri = str(tmp_path / "index.parquet")
+    first = _raw(range(1, 501))
+    assert DedupIndex.load(uri) is None
+    index = DedupIndex()
+    index.drop_duplicates(first, "run1")
+    index.save(uri)
+
+    second = pd.concat([
+        first.iloc[:10],                                   # sent again unchanged
+        first.iloc[10:15].assign(listing_id=lambda d: d["listing_id"] + 1_000),  # same flats, new ids
+        first.iloc[15:20].assign(price_total=lambda d: d["price_total"] + 50_000),  # new versions
+        _raw(range(2_000, 2_010), seed=1),
+    ], ignore_index=True)
+    stats = DedupStats()
+    index = DedupIndex.load(uri)
+    kept = index.drop_duplicates(second, "run2", stats)
+    assert (stats.exact, stats.near, stats.kept) == (10, 5, 15)
+    assert len(index) == 515
+    index.save(uri)
+
+    dup = DedupIndex.load_duplicates(uri)
+    assert sorted(dup["listing_id"]) == list(range(1_011, 1_016))
+    assert set(dup["run_tag"]) == {"run2"}
+    assert kept["listing_id"].tolist() == list(range(16, 21)) + list(range(2_000, 2_010))
+
+
+def test_a_rerun_forgets_its_own_entries(tmp_path):
+    uri = str(tmp_path / "index.parquet")
+    batch = _raw(range(1, 101))
+    index = DedupIndex()
+    index.drop_duplicates(batch, "run1")
+    index.save(uri)
+
+    stats = DedupStats()
+    kept = DedupIndex.load(uri).forget("run1").drop_duplicates(batch, "run1", stats)
+    assert len(kept) == 100 and stats.exact == 0
+
+
+def test_near_duplicates_need_the_same_flat_and_price():
+    flat = _raw([1])
+    relisted = pd.concat([
+        flat.assign(listing_id=2),                                            # the same flat
+        flat.assign(listing_id=3, area_sqm=flat["area_sqm"].astype("float32")),  # float32 read of it
+        flat.assign(listing_id=4, area_sqm=flat["area_sqm"] + 0.4),          # another flat, same building
+        flat.assign(listing_id=5, price_total=flat["price_total"] + 500),    # another price
+    ], ignore_index=True)
+    index, stats = DedupIndex(), DedupStats()
+    index.drop_duplicates(flat, "run1")
+    kept = index.drop_duplicates(relisted, "run2", stats)
+    assert stats.near == 2
+    assert kept["listing_id"].tolist() == [4, 5]
+
+
+def test_chunks_give_the_result_of_one_batch():
+    df = _raw(np.arange(1, 3_001))
+    exact = df.iloc[::7]
+    near = df.iloc[::11].assign(listing_id=lambda d: d["listing_id"] + 100_000)
+    rows = pd.concat([df, exact, near]).sample(frac=1, random_state=0).reset_index(drop=True)
+
+    whole, whole_stats = DedupIndex(), DedupStats()
+    expected = whole.drop_duplicates(rows, "full", whole_stats)
+    chunked, stats = DedupIndex(), DedupStats()
+    kept = pd.concat([
+        chunked.drop_duplicates(rows.iloc[i : i + 700], "full", stats) for i in range(0, len(rows), 700)
+    ])
+
+    # a copy of a near duplicate counts as exact in one batch and as near across chunks
+    assert stats.kept == whole_stats.kept < len(rows)
+    assert kept.index.tolist() == expected.index.tolist()
+    pd.testing.assert_frame_equal(
+        chunked.duplicates.sort_values("listing_id", ignore_index=True),
+        whole.duplicates.sort_values("listing_id", ignore_index=True),
+    )
+
+
+def test_near_duplicates_are_loaded_for_the_gold_layer(pg_engine, tmp_path, monkeypatch):
+    uri = str(tmp_path / "index.parquet")
+    first = _raw(range(1, 51))
+    index = DedupIndex()
+    index.drop_duplicates(first, "run1")
+    index.drop_duplicates(first.iloc[:5].assign(listing_id=lambda d: d["listing_id"] + 100), "run2")
+    index.save(uri)
+    monkeypatch.setattr(load, "DEDUP_INDEX_URI", uri)
+    monkeypatch.setattr(load, "STORAGE", {})
+
+    for _ in range(2):  # replaced, not appended
+        assert load.load_near_duplicates(pg_engine) == 5
+    with pg_engine.connect() as conn:
+        rows = conn.exec_driver_sql("SELECT listing_id, duplicate_of FROM silver.near_duplicates ORDER BY 1").all()
+    assert rows == [(101 + i, 1 + i) for i in range(5)]
@@ -0,0 +1,94 @@
+# tests/test_extract.py
+"""The streaming raw upload of etl/extract.py: one pass counts, samples, compresses and hashes the file."""
+import gzip
+import hashlib
+import io
+import json
+
+import pytest
+
+from etl import extract
+from etl.schema import HOUSING_DTYPES
+
+CSV = b"listing_id,city,price_total\n1,Warszawa,500000.5\n2,Krak\xc3\xb3w,\n3,Gda\xc5\x84sk,750000\n"
+
+
+def _drain(stream, size: int) -> bytes:
+    out = b""
+    while chunk := stream.read(size):
+        out += chunk
+    return out
+
+
+@pytest.mark.parametrize("size", [1, 7, -1])
+def test_stream_passes_bytes_through(size):
+    stream = extract._UploadStream(io.BytesIO(CSV))
+    sent = _drain(stream, size)
+    assert sent == CSV
+    assert stream.rows == 3
+    assert stream.raw_bytes == stream.sent_bytes == len(CSV)
+    assert stream.sha256.hexdigest() == hashlib.sha256(CSV).hexdigest()
+    assert stream.schema() == {"listing_id": "int64", "city": "string", "price_total": "double"}
+
+
+def test_stream_counts_a_last_row_without_newline():
+    stream = extract._UploadStream(io.BytesIO(CSV.rstrip(b"\n")))
+    _drain(stream, 5)
+    assert stream.rows == 3
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+def test_stream_compresses_and_hashes_what_is_sent(compression, monkeypatch):
+    monkeypatch.setattr(extract, "READ_BLOCK", 16)
+    stream = extract._UploadStream(io.BytesIO(CSV * 50), compression)
+    sent = _drain(stream, 100)
+    if compression == "gzip":
+        raw = gzip.decompress(sent)
+    else:
+        import zstandard
+
+        raw = zstandard.ZstdDecompressor().decompressobj().decompress(sent)
+    assert raw == CSV * 50
+    assert stream.raw_bytes == len(raw) and stream.sent_bytes == len(sent)
+    assert stream.sha256.hexdigest() == hashlib.sha256(sent).hexdigest()
+
+
+class _Bucket:
+    """The calls upload_local_csv_to_raw makes on its S3 client, kept in a dict."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def upload_fileobj(self, f, bucket, key, Config, ExtraArgs):
+        self.objects[key] = _drain(f, Config.multipart_chunksize)
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[Key] = Body
+
+    def head_object(self, Bucket, Key, ChecksumMode):
+        return {"ContentLength": len(self.objects[Key])}
+
+
+def test_upload_writes_object_and_manifest(tmp_path, monkeypatch):
+    bucket = _Bucket()
+    monkeypatch.setattr(extract, "_s3_client", lambda: bucket)
+    src = tmp_path / "housing.csv"
+    row = ",".join("1" for _ in HOUSING_DTYPES)
+    src.write_text(",".join(HOUSING_DTYPES) + "\n" + f"{row}\n" * 3)
+
+    manifest = extract.upload_local_csv_to_raw(str(src), "housing.csv", compression="gzip")
+    assert manifest["key"] == "housing.csv.gz"
+    assert gzip.decompress(bucket.objects["housing.csv.gz"]) == src.read_bytes()
+    assert json.loads(bucket.objects["housing.csv.gz.manifest.json"]) == manifest
+    assert manifest["rows"] == 3
+    assert manifest["sha256"] == hashlib.sha256(bucket.objects["housing.csv.gz"]).hexdigest()
+
+
+def test_upload_rejects_a_file_without_the_declared_columns(tmp_path, monkeypatch):
+    bucket = _Bucket()
+    monkeypatch.setattr(extract, "_s3_client", lambda: bucket)
+    src = tmp_path / "housing.csv"
+    src.write_bytes(CSV)
+    with pytest.raises(ValueError, match="district"):
+        extract.upload_local_csv_to_raw(str(src), "housing.csv")
+    assert bucket.objects == {}
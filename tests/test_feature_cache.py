@@ -0,0 +1,92 @@
+# tests/test_feature_cache.py
+"""Versioned feature cache of ml/feature_cache.py: data versions, cached rows and memory-mapped matrices."""
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.sparse as sp
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from ml import feature_cache
+from ml.feature_cache import (
+    data_version,
+    load_matrix,
+    load_source,
+    materialize,
+    record_training_sample,
+    training_sample,
+)
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(feature_cache, "CACHE_DIR", tmp_path / "feature_cache")
+    return tmp_path / "feature_cache"
+
+
+def _update(engine, listing_id: int) -> None:
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"UPDATE public.housing_src SET rooms = rooms + 1 WHERE listing_id = {listing_id}")
+
+
+def test_version_changes_with_sampled_rows_only(gold):
+    version = data_version(gold, frac=0.2, seed=1)
+    assert data_version(gold, frac=0.2, seed=1) == version
+    assert data_version(gold, frac=0.2, seed=2) != version
+
+    ids = set(feature_cache.load_frame(gold, 0.2, 1, columns=["listing_id"])["listing_id"])
+    _update(gold, next(i for i in range(1, 3_001) if i not in ids))
+    assert data_version(gold, frac=0.2, seed=1) == version
+    _update(gold, min(ids))
+    assert data_version(gold, frac=0.2, seed=1) != version
+
+
+def test_source_rows_are_read_once_per_version(gold, cache_dir, monkeypatch):
+    df, version = load_source(gold, 0.2, 1)
+    assert (cache_dir / version / "source.arrow").exists()
+
+    def no_read(*args, **kwargs):
+        raise AssertionError("read Postgres although the version is cached")
+
+    monkeypatch.setattr(feature_cache, "load_frame", no_read)
+    cached, cached_version = load_source(gold, 0.2, 1)
+    assert cached_version == version
+    assert cached.equals(df)
+
+
+def test_only_recent_versions_are_kept(gold, cache_dir, monkeypatch):
+    monkeypatch.setattr(feature_cache, "MAX_VERSIONS", 2)
+    versions = []
+    for listing_id in (1, 2, 3):
+        _update(gold, listing_id)
+        versions.append(load_source(gold, 1.0, 1)[1])
+    assert sorted(p.name for p in cache_dir.iterdir()) == sorted(versions[1:])
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_matrix_round_trip(cache_dir, sparse):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "listing_id": np.arange(50),
+        "area_sqm": rng.uniform(20, 150, 50),
+        "city": rng.choice(["Warszawa", "Kraków"], 50),
+        "price_total": rng.uniform(1e5, 1e6, 50),
+    })
+    pre = ColumnTransformer(
+        [("num", StandardScaler(), ["area_sqm"]), ("cat", OneHotEncoder(), ["city"])],
+        sparse_threshold=1.0 if sparse else 0.0,
+    ).fit(df.drop(columns=["listing_id", "price_total"]))
+    assert load_matrix("v1", pre) is None
+    materialize(df, pre, "v1")
+    X, meta = load_matrix("v1", pre)
+    expected = pre.transform(df.drop(columns=["listing_id", "price_total"]))
+    assert meta["format"] == ("csr" if sparse else "dense")
+    assert meta["feature_names"] == list(pre.get_feature_names_out())
+    np.testing.assert_array_equal(X.toarray() if sparse else X, expected.toarray() if sparse else expected)
+    assert sp.issparse(X) == sparse
+
+
+def test_readers_use_the_sample_of_the_last_training_run(cache_dir):
+    assert training_sample() == (0.05, 42)
+    record_training_sample(1.0, 7)
+    assert training_sample() == (1.0, 7)
@@ -0,0 +1,103 @@
+# tests/test_gold_aggregates.py
+"""etl/gold_aggregates.py: aggregate_days / city_stats, and an incremental refresh equal to a full one."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from etl.gold_aggregates import (
+    ALL_CITIES,
+    CHANGED_DAYS_TABLE,
+    CITY_TABLE,
+    DAILY_TABLE,
+    QUARTILES,
+    SKETCH_TABLE,
+    aggregate_days,
+    city_stats,
+    refresh,
+)
+
+
+@pytest.fixture(scope="module")
+def rows():
+    """Rows shaped like gold_aggregates.ROWS_SQL."""
+    rng = np.random.default_rng(5)
+    n = 60_000
+    df = pd.DataFrame({
+        "d": pd.to_datetime("2025-01-01") + pd.to_timedelta(rng.integers(0, 40, n), unit="D"),
+        "city": rng.choice(["Warszawa", "Kraków", "Gdańsk"], n).astype(object),
+        "price_sqm": rng.lognormal(9.5, 0.3, n).round(2),
+        "base_year": rng.integers(1950, 2025, n).astype("float64"),
+        "elevator": rng.integers(0, 2, n).astype("float64"),
+    })
+    df["d"] = df["d"].dt.strftime("%Y-%m-%d")
+    df.loc[rng.random(n) < 0.01, "price_sqm"] = np.nan
+    df.loc[rng.random(n) < 0.01, "base_year"] = np.nan
+    df.loc[:9, "city"] = None  # NULL city: a group of its own
+    return df
+
+
+def test_daily_rows_are_exact(rows):
+    days = aggregate_days(rows)
+    # same group order as aggregate_days: sorted, NULL city last
+    keys = rows.groupby(["d", "city"], dropna=False, sort=True)
+    for col, q in zip(["p25_sqm", "median_sqm", "p75_sqm"], QUARTILES):
+        np.testing.assert_array_equal(days[col], keys["price_sqm"].quantile(q))
+    np.testing.assert_array_equal(days["n_listings"], keys.size())
+    np.testing.assert_array_equal(days["base_year_n"], keys["base_year"].count())
+    np.testing.assert_array_equal(days["elevator_sum"], keys["elevator"].sum())
+
+
+def test_city_stats_from_day_rows(rows):
+    cities = city_stats(aggregate_days(rows))
+    assert cities["city"].iloc[-1] == ALL_CITIES
+    assert cities["active_listings"].iloc[-1] == len(rows)
+    for _, got in cities.iloc[:-1].iterrows():
+        part = rows[rows["city"].isna()] if pd.isna(got["city"]) else rows[rows["city"] == got["city"]]
+        assert got["active_listings"] == len(part)
+        assert got["base_year_sum"] == part["base_year"].sum()
+        if len(part) > 100:
+            est = got[["q1_sqm", "median_sqm", "q3_sqm"]].to_numpy("float64")
+            ranks = np.searchsorted(np.sort(part["price_sqm"].dropna()), est) / part["price_sqm"].count()
+            assert np.abs(ranks - np.array(QUARTILES)).max() < 0.01
+
+
+def test_incremental_days_equal_a_full_pass(rows):
+    # refresh() re-aggregates only the days that got new listings and re-merges the stored day rows
+    last = rows["d"].max()
+    stored = aggregate_days(rows[rows["d"] != last])
+    arriving = aggregate_days(rows[rows["d"] == last])
+    incremental = pd.concat([stored, arriving]).sort_values(["d", "city"], na_position="last").reset_index(drop=True)
+    full = aggregate_days(rows).sort_values(["d", "city"], na_position="last").reset_index(drop=True)
+    pd.testing.assert_frame_equal(incremental, full)
+    pd.testing.assert_frame_equal(city_stats(incremental), city_stats(full))
+
+
+def _tables(engine) -> dict:
+    with engine.connect() as conn:
+        return {
+            SKETCH_TABLE: pd.read_sql(f"SELECT * FROM {SKETCH_TABLE} ORDER BY d, city", conn),
+            DAILY_TABLE: pd.read_sql(f"SELECT * FROM {DAILY_TABLE} ORDER BY d, city", conn),
+            CITY_TABLE: pd.read_sql(f"SELECT * FROM {CITY_TABLE} ORDER BY city", conn).drop(columns="refreshed_at"),
+        }
+
+
+def test_refresh_of_new_and_changed_days_equals_a_full_rebuild(gold):
+    assert refresh(gold)["since"] is None
+    new = pd.read_sql("SELECT * FROM public.housing_src WHERE listing_id <= 20", gold)
+    new = new.assign(listing_id=new["listing_id"] + 3_000, listing_date=pd.Timestamp("2024-06-01").date())
+    new.to_sql("housing_src", gold, schema="public", index=False, if_exists="append")
+    with gold.begin() as conn:
+        # as 210_gold_features.sql does for an updated listing
+        day = conn.exec_driver_sql(
+            "UPDATE public.housing_src SET price_sqm = 99999 WHERE listing_id = 5 RETURNING listing_date"
+        ).scalar()
+        conn.exec_driver_sql(f"INSERT INTO {CHANGED_DAYS_TABLE} VALUES (%(d)s)", {"d": day})
+
+    stats = refresh(gold)
+    assert stats["since"] == 3_000 and stats["rows"] < 3_000
+    incremental = _tables(gold)
+    refresh(gold, full=True)
+    for table, expected in _tables(gold).items():
+        pd.testing.assert_frame_equal(incremental[table], expected, obj=table)
+    assert incremental[DAILY_TABLE]["n_listings"].sum() == 3_020
+    assert incremental[SKETCH_TABLE]["price_max"].max() == 99999  # the recorded day was aggregated again
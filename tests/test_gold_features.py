@@ -0,0 +1,114 @@
+# tests/test_gold_features.py
+"""Incremental build of gold.housing_features (SQL/SQL_raw/02_gold/210_gold_features.sql) on $TEST_PG_URL."""
+import pytest
+from sqlalchemy import text
+
+from etl.load import NEAR_DUPLICATES_DDL
+from etl.tasks import ETL_TASKS
+
+SILVER_TO_GOLD = [
+    "silver_handle_missing", "silver_impute_stats", "silver_cast_normalize", "silver_logic_checks", "gold_features",
+]
+
+# the warehouse schemas are created once by hand, outside the pipeline
+RAW_DDL = """
+CREATE SCHEMA bronze;
+CREATE SCHEMA silver;
+CREATE SCHEMA gold;
+CREATE TABLE bronze.housing_raw (
+    listing_id text, date text, city text, district text, postal_code text, rooms text, area_sqm text,
+    floor text, total_floors text, has_elevator text, year_built text, distance_center_km text,
+    price_sqm double precision, price_total double precision
+);
+"""
+
+RAW_ROWS = """
+INSERT INTO bronze.housing_raw
+SELECT i::text, (date '2024-01-01' + (i % 5))::text, CASE WHEN i % 2 = 0 THEN 'warszawa' ELSE 'krakow' END,
+       'wola', '00-' || (100 + i % 7), (1 + i % 4)::text, (30 + i)::text, (i % 5)::text, '10', (i % 2)::text,
+       (1960 + i % 50)::text, (1.5 + i % 9)::text, 10000 + i, (10000 + i) * (30 + i)
+FROM generate_series(:lo, :hi) i
+"""
+
+
+def _build(engine) -> None:
+    ctx = {"engine": engine}
+    for task in ETL_TASKS:
+        if task.name in SILVER_TO_GOLD:
+            task.fn(ctx)
+
+
+def _gold(engine, col: str = "price_total") -> dict:
+    with engine.connect() as conn:
+        return dict(conn.execute(text(f"SELECT listing_id, {col} FROM gold.housing_features")).all())
+
+
+@pytest.fixture
+def warehouse(pg_engine):
+    with pg_engine.begin() as conn:
+        conn.exec_driver_sql(RAW_DDL + NEAR_DUPLICATES_DDL)
+        conn.execute(text(RAW_ROWS), {"lo": 1, "hi": 40})
+    _build(pg_engine)
+    return pg_engine
+
+
+def test_first_build_takes_every_listing(warehouse):
+    assert sorted(_gold(warehouse)) == list(range(1, 41))
+
+
+def test_rebuild_picks_up_inserted_and_updated_bronze_rows(warehouse):
+    before = _gold(warehouse, "updated_at")
+    with warehouse.begin() as conn:
+        conn.exec_driver_sql("TRUNCATE gold.price_days_changed")
+        conn.execute(text(RAW_ROWS), {"lo": 41, "hi": 45})
+        conn.exec_driver_sql("UPDATE bronze.housing_raw SET price_total = price_total + 1000 WHERE listing_id = '7'")
+        # an edit made directly in gold is only overwritten once its bronze row changes
+        conn.exec_driver_sql("UPDATE gold.housing_features SET price_total = 1 WHERE listing_id IN (3, 7)")
+    _build(warehouse)
+
+    gold = _gold(warehouse)
+    assert sorted(gold) == list(range(1, 46))
+    assert gold[7] == (10000 + 7) * (30 + 7) + 1000
+    assert gold[3] == 1
+    updated = _gold(warehouse, "updated_at")
+    assert updated[3] == before[3] and updated[7] > before[7] and updated[41] > before[7]
+    with warehouse.connect() as conn:
+        days = conn.execute(text("SELECT count(DISTINCT d) FROM gold.price_days_changed")).scalar()
+    assert days == 5
+
+
+def test_a_listing_repeated_in_bronze_keeps_its_latest_row(warehouse):
+    with warehouse.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO bronze.housing_raw SELECT listing_id, '2024-03-01', city, district, postal_code, rooms, "
+            "area_sqm, floor, total_floors, has_elevator, year_built, distance_center_km, price_sqm, 123456 "
+            "FROM bronze.housing_raw WHERE listing_id = '7'"
+        )
+    _build(warehouse)
+    with warehouse.connect() as conn:
+        rows = conn.exec_driver_sql("SELECT price_total FROM gold.housing_features WHERE listing_id = 7").all()
+    assert rows == [(123456,)]
+
+
+def test_impute_stats_wait_for_the_week_or_a_delete(warehouse):
+    def source_rows() -> int:
+        with warehouse.connect() as conn:
+            return conn.exec_driver_sql("SELECT source_rows FROM silver.housing_impute_stats").scalar()
+
+    assert source_rows() == 40
+    with warehouse.begin() as conn:
+        conn.execute(text(RAW_ROWS), {"lo": 41, "hi": 45})
+    _build(warehouse)
+    assert source_rows() == 40
+
+    with warehouse.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM silver.housing_impute_stats")
+    _build(warehouse)
+    assert source_rows() == 45
+
+
+def test_near_duplicates_are_removed_on_the_next_build(warehouse):
+    with warehouse.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO silver.near_duplicates VALUES (12, 2, 'test')")
+    _build(warehouse)
+    assert 12 not in _gold(warehouse)
@@ -0,0 +1,98 @@
+# tests/test_imputer.py
+"""HousingImputer fills and the streaming scan of etl/transform.py learns the same fill values."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from etl import transform
+from etl.imputer import HousingImputer
+from etl.schema import read_csv_kwargs
+
+
+@pytest.fixture
+def raw_csv(tmp_path):
+    rng = np.random.default_rng(11)
+    n = 5_000
+    df = pd.DataFrame({
+        "listing_id": np.arange(1, n + 1),
+        "date": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, n), unit="D"),
+        "city": rng.choice(["Warszawa", "Kraków"], n),
+        "district": rng.choice(["Mokotów", "Podgórze", "Wola"], n),
+        "postal_code": rng.choice(["00-001", "30-002"], n),
+        "rooms": rng.integers(1, 6, n).astype("float64"),
+        "area_sqm": rng.uniform(20, 150, n).round(1),
+        "floor": rng.integers(0, 10, n).astype("float64"),
+        "total_floors": rng.integers(10, 20, n).astype("float64"),
+        "has_elevator": rng.integers(0, 2, n).astype("float64"),
+        "year_built": rng.integers(1950, 2025, n).astype("float64"),
+        "distance_center_km": rng.uniform(0, 20, n).round(2),
+        "price_sqm": rng.uniform(8_000, 25_000, n).round(2),
+        "price_total": rng.uniform(300_000, 2_000_000, n).round(2),
+    })
+    for c in ["rooms", "area_sqm", "year_built"]:
+        df.loc[rng.random(n) < 0.05, c] = np.nan
+    path = tmp_path / "raw.csv"
+    df.to_csv(path, index=False)
+    return path
+
+
+def test_fill_under_copy_on_write():
+    df = pd.DataFrame({"a": [1.0, np.nan, 3.0], "b": [np.nan, 2.0, 2.0]})
+    imputer = HousingImputer().fit(df)
+    with pd.option_context("mode.copy_on_write", True):
+        out = imputer.transform(df.copy())
+    assert out.notna().all().all()
+    assert out["a"].tolist() == [1.0, 2.0, 3.0]
+
+
+def test_transform_leaves_the_input_alone():
+    df = pd.DataFrame({"a": [1.0, np.nan, 3.0], "b": [np.nan, 2.0, 2.0], "flag": [1.0, np.nan, 0.0]})
+    before = df.copy()
+    imputer = HousingImputer(binary_cols=["flag"]).fit(df[["a", "b"]])
+    out = imputer.transform(df)
+    pd.testing.assert_frame_equal(df, before)
+    assert out["a"].tolist() == [1.0, 2.0, 3.0]
+    assert out["flag"].tolist() == [1, 1, 0]
+
+
+def test_transform_inplace_fills_the_input():
+    df = pd.DataFrame({"a": [1.0, np.nan, 3.0], "b": [np.nan, 2.0, 2.0]})
+    out = HousingImputer().fit(df).transform(df, inplace=True)
+    assert out is df
+    assert df.notna().all().all()
+
+
+@pytest.fixture
+def scan(raw_csv, monkeypatch):
+    def chunks(key, chunksize, usecols=None):
+        with pd.read_csv(raw_csv, chunksize=chunksize, usecols=usecols, **read_csv_kwargs()) as reader:
+            yield from reader
+
+    monkeypatch.setattr(transform, "read_raw_csv_chunks", chunks)
+    fitted = HousingImputer().fit(pd.read_csv(raw_csv, **read_csv_kwargs())).medians
+    return lambda: transform.scan_raw_csv("raw.csv", 1_000)[1], fitted
+
+
+def test_streaming_scan_learns_every_numeric_column(scan):
+    run, fitted = scan
+    medians = run()
+    assert set(medians) == set(fitted)
+    for c in set(fitted) - {"price_sqm", "price_total"}:  # up to MAX_EXACT_VALUES distinct values: exact
+        assert medians[c] == fitted[c]
+    for c in ["price_sqm", "price_total"]:
+        assert medians[c] == pytest.approx(fitted[c], rel=5e-3)
+
+    # a delta with NaNs in columns the full file had none in is filled too
+    delta = pd.DataFrame({"price_sqm": [np.nan, 10_000.0], "distance_center_km": [np.nan, 1.0]})
+    assert HousingImputer(medians).transform(delta).notna().all().all()
+
+
+def test_streaming_scan_sketches_high_cardinality_columns(scan, monkeypatch):
+    run, fitted = scan
+    monkeypatch.setattr(transform, "MAX_EXACT_VALUES", 100)
+    medians = run()
+    assert set(medians) == set(fitted)
+    for c in ["rooms", "area_sqm", "year_built", "has_elevator", "floor"]:  # NaNs or few values: exact
+        assert medians[c] == fitted[c]
+    for c in ["distance_center_km", "price_sqm", "price_total"]:  # no NaNs, sketched
+        assert medians[c] == pytest.approx(fitted[c], rel=5e-3)
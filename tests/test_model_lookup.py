@@ -0,0 +1,56 @@
+# tests/test_model_lookup.py
+"""ml/model_lookup.py and ml/cli.py: the best-model pointer and scripts that start without the heavy packages."""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from ml.model_lookup import LATEST_FILE, best_model_path, find_best_model, hash256, mark_best_model, require_best_model
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+
+def _model(tmp_path: Path, name: str, mtime: int) -> Path:
+    path = tmp_path / f"best_model_{name}.joblib"
+    path.write_bytes(name.encode())
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_pointer_wins_over_the_newest_file(tmp_path):
+    old, new = _model(tmp_path, "Ridge", 1_000), _model(tmp_path, "XGBRegressor", 2_000)
+    assert find_best_model(tmp_path) == new  # no pointer: the newest file
+
+    mark_best_model(old)
+    assert (tmp_path / LATEST_FILE).read_text().strip() == old.name
+    assert find_best_model(tmp_path) == old
+
+    old.unlink()  # a pointer to a removed file falls back to the glob
+    assert find_best_model(tmp_path) == new
+
+
+def test_cached_lookup_follows_mark_best_model(tmp_path):
+    first, second = _model(tmp_path, "Ridge", 2_000), _model(tmp_path, "XGBRegressor", 1_000)
+    assert best_model_path(tmp_path) == first
+    mark_best_model(second)
+    assert best_model_path(tmp_path) == second == require_best_model(tmp_path)
+    assert hash256(second) != hash256(first)
+
+
+def test_require_best_model_without_a_model(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        require_best_model(tmp_path)
+
+
+@pytest.mark.parametrize(
+    "module", ["ml.cli", "ml.model_lookup", "ml.predict_sample", "ml.shap_explainer", "ml.feature_importance"]
+)
+def test_scripts_import_without_the_model_packages(module):
+    code = (
+        f"import sys, {module}; "
+        "print(','.join(p for p in ('sklearn', 'xgboost', 'matplotlib', 'shap') if p in sys.modules))"
+    )
+    proc = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True)
+    assert proc.stdout.strip() == ""
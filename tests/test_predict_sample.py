@@ -0,0 +1,82 @@
+# tests/test_predict_sample.py
+"""Keyset pages and batch scoring of ml/predict_sample.py on $TEST_PG_URL."""
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.dummy import DummyRegressor
+from sklearn.pipeline import Pipeline
+from sqlalchemy import text
+
+from ml.data_loader import FEATURE_COLS, ID_COL, TARGET_COL
+from ml.model_lookup import hash256
+from ml.predict_sample import PRED_SCHEMA, PRED_TABLE, iter_pages, last_scored_at, score_all
+
+
+def _rows(ids) -> pd.DataFrame:
+    df = pd.DataFrame({c: 1 for c in FEATURE_COLS}, index=range(len(ids)))
+    df.insert(0, ID_COL, ids)
+    df[TARGET_COL] = 100.0
+    return df
+
+
+def _append(engine, ids) -> None:
+    _rows(ids).to_sql("housing_valid", engine, schema="gold", if_exists="append", index=False)
+
+
+def _model(tmp_path, name: str, value: float):
+    path = tmp_path / f"best_model_{name}.joblib"
+    pipe = Pipeline([("model", DummyRegressor(strategy="constant", constant=value))])
+    joblib.dump(pipe.fit(_rows([1]), [value]), path)
+    return path
+
+
+def _scored(engine) -> pd.DataFrame:
+    sql = f"SELECT {ID_COL}, predicted_price_total, model_sha FROM {PRED_SCHEMA}.{PRED_TABLE}"
+    return pd.read_sql(text(sql), engine)
+
+
+@pytest.fixture
+def gold(pg_engine):
+    """A plain gold.housing_valid table with repeated ids (overrides the view of conftest.py)."""
+    with pg_engine.begin() as conn:
+        conn.exec_driver_sql("CREATE SCHEMA gold")
+    # listing_id is not unique in the view: 3 rows of id 5, 2 of id 9
+    _append(pg_engine, [1, 2, 3, 4, 5, 5, 5, 6, 7, 8, 9, 9, 10])
+    with pg_engine.begin() as conn:
+        conn.exec_driver_sql("ALTER TABLE gold.housing_valid ADD COLUMN updated_at timestamptz NOT NULL DEFAULT now()")
+    return pg_engine
+
+
+def test_pages_never_split_an_id_and_cover_every_row(gold):
+    pages = list(iter_pages(gold, batch_rows=4))
+    ids = np.concatenate([p[ID_COL].to_numpy() for p in pages])
+    assert sorted(ids) == [1, 2, 3, 4, 5, 5, 5, 6, 7, 8, 9, 9, 10]
+    for before, after in zip(pages, pages[1:]):
+        assert before[ID_COL].max() < after[ID_COL].min()
+    assert sorted(pd.concat(iter_pages(gold, batch_rows=4, after_id=8))[ID_COL]) == [9, 9, 10]
+
+
+def _score_changed(engine, model_path) -> None:
+    since = last_scored_at(engine, hash256(model_path))
+    score_all(engine, batch_rows=4, workers=1, model_path=model_path, changed_since=since)
+
+
+def test_only_changed_rows_are_rescored_until_the_model_changes(gold, tmp_path):
+    first = _model(tmp_path, "a", 1.0)
+    _score_changed(gold, first)
+    assert len(_scored(gold)) == 13
+
+    _append(gold, [11, 12])
+    with gold.begin() as conn:
+        conn.exec_driver_sql("UPDATE gold.housing_valid SET updated_at = now() WHERE listing_id = 3")
+    _score_changed(gold, first)
+    counts = _scored(gold)[ID_COL].value_counts()
+    assert counts.sum() == 16 and counts[3] == 2 and counts[11] == 1 and counts[4] == 1
+
+    second = _model(tmp_path, "b", 2.0)
+    assert last_scored_at(gold, hash256(second)) is None
+    _score_changed(gold, second)
+    scored = _scored(gold)
+    latest = scored[scored["model_sha"] == hash256(second)]
+    assert len(latest) == 15 and (latest["predicted_price_total"] == 2.0).all()
@@ -0,0 +1,90 @@
+# tests/test_profiling.py
+"""Stage records of etl/profiling.py and the regression gate of `compare`."""
+import json
+import sys
+
+import pandas as pd
+import pytest
+
+from etl import profiling
+
+
+def _run(rid: str, **stages) -> str:
+    """Write run `rid` with one record per stage: name=(wall_s, peak_rss_mb, rows_out)."""
+    with open(profiling.metrics_path(rid), "w") as f:
+        for name, (wall, rss, rows) in stages.items():
+            record = profiling.StageRecord(rid, name, "2026-01-01T00:00:00", wall_s=wall, cpu_s=wall,
+                                           peak_rss_mb=rss, rows_out=rows)
+            f.write(json.dumps(profiling.asdict(record)) + "\n")
+    return rid
+
+
+def _compare(monkeypatch, *args) -> int:
+    monkeypatch.setattr(sys, "argv", ["profiling.py", "compare", *args])
+    try:
+        profiling.main()
+    except SystemExit as exc:
+        return exc.code
+    return 0
+
+
+def test_stage_writes_a_record_per_block():
+    rid = profiling.run_id()
+    with profiling.stage("test.block", rows_in=3) as record:
+        record.rows_out = 2
+    with pytest.raises(RuntimeError), profiling.stage("test.block"):
+        raise RuntimeError
+    records = profiling.load_run(rid)
+    mine = records[records["stage"] == "test.block"].tail(2)
+    assert list(mine["ok"]) == [True, False]
+    assert mine["rows_out"].iloc[0] == 2
+
+
+
+def test_profiled_takes_rows_from_frames_and_counts_network_bytes():
+    @profiling.profiled("test.head3")
+    def head3(df):
+        profiling.add_bytes(read=1_000, written=10)
+        return df.head(3)
+
+    head3(pd.DataFrame({"a": range(5)}))
+    record = profiling.load_run(profiling.run_id()).iloc[-1]
+    assert record["stage"] == "test.head3"
+    assert (record["rows_in"], record["rows_out"]) == (5, 3)
+    assert record["bytes_read"] >= 1_000 and record["bytes_written"] >= 10
+
+def test_compare_exits_1_on_a_regression(monkeypatch, capsys):
+    _run("base", extract=(10.0, 100, 1000), load=(5.0, 100, 1000))
+    _run("slow", extract=(10.5, 100, 1000), load=(8.0, 100, 1000))
+    assert _compare(monkeypatch, "base", "slow") == 1
+    assert "load" in capsys.readouterr().out.splitlines()[-1]
+
+
+def test_compare_exits_0_within_threshold_and_floors(monkeypatch, capsys):
+    _run("base", extract=(10.0, 100, 1000), load=(0.2, 100, 1000))
+    # +10% on a long stage, +150% but only 0.3 s on a short one, +40 MB RSS: all noise
+    _run("same", extract=(11.0, 140, 1000), load=(0.5, 100, 1000))
+    assert _compare(monkeypatch, "base", "same") == 0
+    assert "No regressions" in capsys.readouterr().out
+
+
+def test_compare_flags_peak_rss(monkeypatch):
+    _run("base", transform=(1.0, 200, 1000))
+    _run("fat", transform=(1.0, 400, 1000))
+    assert _compare(monkeypatch, "base", "fat") == 1
+    assert _compare(monkeypatch, "base", "fat", "--min-rss-mb", "500") == 0
+
+
+def test_compare_per_row_scales_base_times(monkeypatch):
+    _run("base", transform=(10.0, 100, 1000))
+    _run("double", transform=(20.0, 100, 2000))
+    assert _compare(monkeypatch, "base", "double") == 1
+    assert _compare(monkeypatch, "base", "double", "--per-row") == 0
+
+
+def test_publish_replaces_an_earlier_copy(pg_engine):
+    rid = _run("publish-test", load=(1.0, 100.0, 10), train=(2.0, 200.0, 10))
+    assert profiling.publish(rid, pg_engine) == 2
+    assert profiling.publish(rid, pg_engine) == 2
+    published = profiling.load_run(rid, pg_engine)
+    assert sorted(published["stage"]) == ["load", "train"]
@@ -0,0 +1,71 @@
+# tests/test_quantile_sketch.py
+"""etl/quantile_sketch.py against exact percentiles (PERCENTILE_CONT = numpy's linear method)."""
+import numpy as np
+import pytest
+
+from etl import quantile_sketch
+
+
+def _groups(sizes, seed=0):
+    rng = np.random.default_rng(seed)
+    group = np.repeat(np.arange(len(sizes)), sizes)
+    values = rng.lognormal(9.5, 0.3, len(group))
+    return group, values
+
+
+def test_exact_quantiles_match_percentile_cont():
+    group, values = _groups([1, 2, 7, 500])
+    values[3] = np.nan  # left out like NULL
+    out = quantile_sketch.exact_quantiles(quantile_sketch.sort_values(group, values), [0.25, 0.5, 0.75], 5)
+    for g in range(4):
+        v = values[group == g]
+        np.testing.assert_allclose(out[g], np.nanquantile(v, [0.25, 0.5, 0.75]))
+    assert np.isnan(out[4]).all()  # group without values
+
+
+def test_small_groups_are_exact():
+    # up to about compression / pi values every centroid holds one value
+    group, values = _groups([5, 30, 60])
+    out = quantile_sketch.quantiles(quantile_sketch.build(group, values), [0.1, 0.5, 0.9], 3)
+    for g in range(3):
+        np.testing.assert_allclose(out[g], np.quantile(values[group == g], [0.1, 0.5, 0.9]))
+
+
+def test_large_group_rank_error():
+    group, values = _groups([200_000])
+    est = quantile_sketch.quantiles(quantile_sketch.build(group, values), [0.25, 0.5, 0.75], 1)[0]
+    ranks = np.searchsorted(np.sort(values), est) / len(values)
+    assert np.abs(ranks - [0.25, 0.5, 0.75]).max() < 0.01
+
+
+def test_merge_matches_digest_of_the_union():
+    group, values = _groups([50_000, 20_000], seed=1)
+    half = np.arange(len(values)) % 2 == 0
+    merged = quantile_sketch.merge([
+        quantile_sketch.build(group[half], values[half]), quantile_sketch.build(group[~half], values[~half]),
+    ])
+    whole = quantile_sketch.build(group, values)
+    np.testing.assert_allclose(np.bincount(merged.group, merged.weight), np.bincount(group))
+    q_merged = quantile_sketch.quantiles(merged, [0.25, 0.5, 0.75], 2)
+    q_whole = quantile_sketch.quantiles(whole, [0.25, 0.5, 0.75], 2)
+    np.testing.assert_allclose(q_merged, q_whole, rtol=2e-3)
+
+
+def test_compress_bounds_the_centroid_count():
+    group, values = _groups([100_000])
+    assert len(quantile_sketch.build(group, values, compression=100).mean) <= 100
+
+
+def test_strings_round_trip():
+    group, values = _groups([3, 0, 40])
+    digest = quantile_sketch.build(group, values)
+    strings = quantile_sketch.to_strings(digest, 3)
+    assert strings[1] is None
+    back = quantile_sketch.from_strings(strings)
+    for a, b in zip(back, digest):
+        np.testing.assert_array_equal(a, b)
+
+
+@pytest.mark.parametrize("strings", [[], [None, float("nan")]])
+def test_from_strings_without_values(strings):
+    assert len(quantile_sketch.from_strings(strings).group) == 0
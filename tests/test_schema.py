@@ -0,0 +1,61 @@
+# tests/test_schema.py
+"""The declared housing dtypes of etl/schema.py: applied while parsing and by cast."""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from etl.schema import HOUSING_DTYPES, PROCESSED_DTYPES, apply_schema, check_columns, read_csv_kwargs
+
+
+def _csv(n: int = 2_000) -> str:
+    rng = np.random.default_rng(11)
+    df = pd.DataFrame({
+        "listing_id": np.arange(n),
+        "date": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, n), unit="D"),
+        "city": rng.choice(["Warszawa", "Kraków", "Gdańsk"], n),
+        "district": rng.choice(["Mokotów", "Wola", "Podgórze"], n),
+        "postal_code": rng.choice(["00-001", "30-002", "80-003"], n),
+        "rooms": rng.integers(1, 6, n).astype("float64"),
+        "area_sqm": rng.uniform(20, 150, n).round(1),
+        "floor": rng.integers(0, 10, n).astype("float64"),
+        "total_floors": rng.integers(10, 20, n).astype("float64"),
+        "has_elevator": rng.integers(0, 2, n).astype("float64"),
+        "year_built": rng.integers(1950, 2025, n).astype("float64"),
+        "distance_center_km": rng.uniform(0, 20, n).round(2),
+        "price_sqm": rng.uniform(8_000, 30_000, n).round(2),
+        "price_total": rng.uniform(300_000, 2_000_000, n).round(2),
+    })
+    df.loc[::7, "rooms"] = np.nan
+    df.loc[0, "area_sqm"] = 79.3
+    return df.to_csv(index=False)
+
+
+def test_parsing_applies_the_declared_dtypes():
+    text = _csv()
+    default = pd.read_csv(io.StringIO(text))
+    typed = pd.read_csv(io.StringIO(text), **read_csv_kwargs())
+    assert all(typed[c].dtype == dt for c, dt in HOUSING_DTYPES.items())
+    assert typed.memory_usage(deep=True).sum() < default.memory_usage(deep=True).sum() / 2
+    assert typed.loc[0, "area_sqm"] == 79.3  # decimals stay exact
+    assert typed["rooms"].isna().sum() == default["rooms"].isna().sum()
+    pd.testing.assert_series_equal(typed["price_total"], default["price_total"])
+
+
+def test_apply_schema_casts_declared_columns_only():
+    df = pd.DataFrame({"city": ["Warszawa"], "rooms": [2], "extra": ["x"]})
+    out = apply_schema(df)
+    assert str(out["city"].dtype) == "category"
+    assert out["rooms"].dtype == np.float32
+    assert out["extra"].dtype == object
+    assert apply_schema(out) is out  # nothing left to cast
+
+    processed = apply_schema(pd.DataFrame({"date": pd.to_datetime(["2024-01-01"])}), PROCESSED_DTYPES)
+    assert processed["date"].dtype == "datetime64[ns]"
+
+
+def test_check_columns_names_the_missing_ones():
+    check_columns(HOUSING_DTYPES)
+    with pytest.raises(ValueError, match=r"\['district', 'price_sqm'\]"):
+        check_columns([c for c in HOUSING_DTYPES if c not in ("district", "price_sqm")])
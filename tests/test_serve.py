@@ -0,0 +1,110 @@
+# tests/test_serve.py
+"""ml/serve.py: micro-batches, a bad listing failing only its own request, and model hot reload."""
+import asyncio
+import os
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.linear_model import Ridge
+from sklearn.pipeline import Pipeline
+from xgboost import XGBRegressor
+
+from ml.ml_final import build_preprocessor
+from ml.model_lookup import mark_best_model
+from ml.serve import Metrics, MicroBatcher, ModelStore
+
+
+@pytest.fixture(scope="module")
+def store(listings, tmp_path_factory):
+    train = listings(1_000, seed=3)
+    y = train["area_sqm"].fillna(60) * 12_000
+    pipe = Pipeline([("pre", build_preprocessor(train)[0]), ("model", XGBRegressor(n_estimators=10))]).fit(train, y)
+    artifacts = tmp_path_factory.mktemp("artifacts")
+    joblib.dump(pipe, artifacts / "best_model_XGBRegressor.joblib")
+    store = ModelStore(artifacts)
+    assert store.refresh()
+    return store
+
+
+async def _predict_concurrently(store, requests, max_batch: int = 64):
+    batcher = MicroBatcher(store, Metrics(), max_batch=max_batch, max_wait_ms=50)
+    runner = asyncio.create_task(batcher.run())
+    try:
+        return await asyncio.gather(*(batcher.predict(x) for x in requests), return_exceptions=True), batcher.metrics
+    finally:
+        runner.cancel()
+
+
+def test_bad_listing_fails_alone(store, listings):
+    good = listings(3, seed=4).to_dict("records")
+    bad = {**good[0], "area_sqm": "pięćdziesiąt"}
+    results, metrics = asyncio.run(_predict_concurrently(store, [good[0], bad, good[1], good[2]]))
+
+    assert isinstance(results[1], Exception)
+    assert not any(isinstance(r, Exception) for r in results[:1] + results[2:])
+    assert list(metrics.batch_sizes) == [4]
+    assert metrics.errors == 1
+    expected = store.current.pipe.predict(listings(3, seed=4))
+    np.testing.assert_allclose([r[0] for r in results[:1] + results[2:]], expected, rtol=1e-5)
+
+
+def test_batches_are_capped_at_max_batch(store, listings):
+    rows = listings(10, seed=5)
+    results, metrics = asyncio.run(_predict_concurrently(store, rows.to_dict("records"), max_batch=4))
+    assert list(metrics.batch_sizes) == [4, 4, 2]
+    np.testing.assert_allclose([r[0] for r in results], store.current.pipe.predict(rows), rtol=1e-5)
+    assert {r[1] for r in results} == {store.current.sha}
+
+
+def test_store_reloads_only_a_changed_model(listings, tmp_path):
+    train = listings(200, seed=6)
+    y = train["rooms"] * 100_000
+
+    def save(n_estimators: int, name: str):
+        pipe = Pipeline([("pre", build_preprocessor(train)[0]), ("model", XGBRegressor(n_estimators=n_estimators))])
+        joblib.dump(pipe.fit(train, y), tmp_path / name)
+        return tmp_path / name
+
+    first = save(5, "best_model_XGBRegressor.joblib")
+    store = ModelStore(tmp_path)
+    assert store.refresh()
+    sha = store.current.sha
+    assert not store.refresh()
+
+    os.utime(first, ns=(first.stat().st_atime_ns, first.stat().st_mtime_ns + 10**9))  # touched, same bytes
+    assert not store.refresh() and store.current.sha == sha
+
+    second = save(6, "best_model_RandomForest.joblib")
+    os.utime(second, ns=(second.stat().st_atime_ns, first.stat().st_mtime_ns + 10**9))
+    assert store.refresh()
+    assert store.current.path == second and store.current.sha != sha
+
+
+def test_store_serves_an_uncompilable_pipeline_through_sklearn(listings, tmp_path):
+    train = listings(200, seed=7)
+    pipe = Pipeline([("pre", build_preprocessor(train)[0]), ("model", Ridge())]).fit(train, train["rooms"])
+    joblib.dump(pipe, tmp_path / "best_model_Ridge.joblib")
+    store = ModelStore(tmp_path)
+    assert store.refresh()
+    assert store.current.compiled is None
+    rows = listings(5, seed=8)
+    np.testing.assert_allclose(store.current.predict(rows.to_dict("records")), pipe.predict(rows))
+
+
+def test_refresh_follows_the_best_model_pointer(listings, tmp_path):
+    train = listings(500, seed=5)
+    y = train["area_sqm"].fillna(60) * 12_000
+    for name, rounds in [("XGBRegressor", 5), ("GradientBoosting", 10)]:
+        pipe = Pipeline([("pre", build_preprocessor(train)[0]), ("model", XGBRegressor(n_estimators=rounds))])
+        joblib.dump(pipe.fit(train, y), tmp_path / f"best_model_{name}.joblib")
+    xgb, gbr = tmp_path / "best_model_XGBRegressor.joblib", tmp_path / "best_model_GradientBoosting.joblib"
+
+    # the pointer wins over the newest file
+    mark_best_model(xgb)
+    store = ModelStore(tmp_path)
+    assert store.refresh() and store.current.path == xgb
+    assert not store.refresh()
+
+    mark_best_model(gbr)
+    assert store.refresh() and store.current.path == gbr
@@ -0,0 +1,94 @@
+# tests/test_shap_explainer.py
+"""Chunked SHAP of ml/shap_explainer.py: grouped values add up to the prediction."""
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.pipeline import Pipeline
+from xgboost import XGBRegressor
+
+from ml import shap_explainer
+from ml.compiled_model import compile_pipeline
+from ml.ml_final import build_preprocessor
+from ml.shap_explainer import explain, importance, source_features, write_values
+
+
+def _pipe(listings, model, sparse: bool):
+    train = listings(1_000, seed=11)
+    y = train["area_sqm"].fillna(60) * 12_000 + train["rooms"] * 5_000
+    pre = clone(build_preprocessor(train)[0]).set_params(sparse_threshold=1.0 if sparse else 0.0)
+    return Pipeline([("pre", pre), ("model", model)]).fit(train, y)
+
+
+@pytest.fixture
+def xgb_model(listings, tmp_path, monkeypatch):
+    pipe = _pipe(listings, XGBRegressor(n_estimators=30, max_depth=4, random_state=0), sparse=True)
+    path = tmp_path / "best_model_XGBRegressor.joblib"
+    joblib.dump(pipe, path)
+    monkeypatch.setattr(shap_explainer, "ARTIFACTS_DIR", tmp_path)
+    return pipe
+
+
+def test_one_hot_columns_are_grouped_by_source_column(xgb_model):
+    pre = xgb_model.named_steps["pre"]
+    names, G = source_features(pre)
+    assert names == [c for _, _, cols in pre.transformers_ for c in cols]
+    assert G.shape == (len(pre.get_feature_names_out()), len(names))
+    np.testing.assert_array_equal(G.sum(axis=1), 1)  # every output column belongs to one source column
+
+
+@pytest.mark.parametrize("group", [True, False])
+def test_values_plus_expected_value_reproduce_the_prediction(xgb_model, listings, group):
+    rows = listings(300, seed=12)
+    X = xgb_model.named_steps["pre"].transform(rows)
+    order = np.random.default_rng(0).permutation(len(rows))
+    idx, values, base, _ = explain(X, order, workers=1, chunk_rows=64, group=group)
+    assert sorted(idx) == list(range(len(rows)))
+    assert values.dtype == np.float32
+    assert values.shape[1] == (len(source_features(xgb_model.named_steps["pre"])[0]) if group else X.shape[1])
+    np.testing.assert_allclose(values.sum(axis=1) + base, xgb_model.predict(rows.iloc[idx]), rtol=1e-5)
+
+
+def test_sampled_mode_stops_once_the_ci_is_narrow(xgb_model, listings):
+    rows = listings(1_000, seed=13)
+    X = xgb_model.named_steps["pre"].transform(rows)
+    order = np.random.default_rng(0).permutation(len(rows))
+    idx, values, _, _ = explain(X, order, workers=1, chunk_rows=100, tolerance=0.5)
+    assert len(idx) < len(rows)
+    mean_abs, ci95 = importance(values)
+    assert ci95.max() <= 0.5 * mean_abs.max()
+
+
+def test_tree_explainer_path_matches_the_converted_booster(listings, tmp_path, monkeypatch):
+    pytest.importorskip("shap")
+    pipe = _pipe(listings, RandomForestRegressor(n_estimators=10, max_depth=6, random_state=0), sparse=False)
+    joblib.dump(pipe, tmp_path / "best_model_RandomForest.joblib")
+    monkeypatch.setattr(shap_explainer, "ARTIFACTS_DIR", tmp_path)
+    rows = listings(50, seed=14)
+    X = pipe.named_steps["pre"].transform(rows)
+    idx, values, base, _ = explain(X, np.arange(len(rows)), workers=1, group=False)  # shap.TreeExplainer
+    contrib = compile_pipeline(pipe).contributions(X)  # node covers filled by the conversion
+    np.testing.assert_allclose(values, contrib[:, :-1], rtol=1e-4, atol=1e-2)
+    np.testing.assert_allclose(values.sum(axis=1) + base, pipe.predict(rows), rtol=1e-5)
+
+
+def test_converted_trees_are_additive(listings):
+    pipe = _pipe(listings, RandomForestRegressor(n_estimators=10, max_depth=6, random_state=0), sparse=False)
+    rows = listings(50, seed=14)
+    contrib = compile_pipeline(pipe).contributions(pipe.named_steps["pre"].transform(rows))
+    np.testing.assert_allclose(contrib.sum(axis=1), pipe.predict(rows), rtol=1e-5)
+
+
+def test_values_parquet_keeps_ids_names_and_expected_value(xgb_model, tmp_path):
+    values = np.arange(6, dtype="float32").reshape(3, 2)
+    write_values(tmp_path / "shap.parquet", np.array([7, 8, 9]), values, ["area_sqm", "city"], 1.5, "exact")
+    table = pq.read_table(tmp_path / "shap.parquet")
+    assert table.schema.metadata[b"expected_value"] == b"1.5"
+    assert table.schema.metadata[b"model"] == b"best_model_XGBRegressor.joblib"
+    pd.testing.assert_frame_equal(
+        table.to_pandas(),
+        pd.DataFrame({"listing_id": [7, 8, 9], "area_sqm": values[:, 0], "city": values[:, 1]}),
+    )
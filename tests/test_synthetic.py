@@ -0,0 +1,46 @@
+# tests/test_synthetic.py
+"""Synthetic listings of benchmarks/synthetic.py: seeded, typed like the raw CSV, gold rows like the SQL."""
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import REFERENCE, gold_features, iter_raw, parse_rows, write_csv
+from etl.schema import HOUSING_DTYPES
+from ml.data_loader import FEATURE_COLS, ID_COL, TARGET_COL
+
+
+def test_chunks_are_seeded_and_typed():
+    first = pd.concat(iter_raw(5_000, seed=3, chunk_rows=2_000), ignore_index=True)
+    again = pd.concat(iter_raw(5_000, seed=3, chunk_rows=2_000), ignore_index=True)
+    pd.testing.assert_frame_equal(first, again)
+    assert not first["price_sqm"].equals(pd.concat(iter_raw(5_000, seed=4, chunk_rows=2_000))["price_sqm"])
+    assert first[ID_COL].tolist() == list(range(1, 5_001))
+    assert all(first[c].dtype == dt for c, dt in HOUSING_DTYPES.items())
+
+
+def test_means_and_missing_shares_follow_the_reference():
+    df = pd.concat(iter_raw(20_000, seed=5, chunk_rows=20_000), ignore_index=True)
+    for c, (mean, _, _, _, nan) in REFERENCE.items():
+        s = df[c].astype("float64")
+        assert s.mean() == pytest.approx(mean, rel=0.1), c
+        assert s.isna().mean() == pytest.approx(nan, abs=0.01), c
+
+
+def test_csv_is_written_chunk_by_chunk(tmp_path):
+    path = write_csv(tmp_path / "raw.csv", 2_500, seed=6, chunk_rows=1_000)
+    df = pd.read_csv(path, dtype=HOUSING_DTYPES)
+    expected = pd.concat(iter_raw(2_500, seed=6, chunk_rows=1_000), ignore_index=True)
+    assert len(df) == 2_500
+    pd.testing.assert_series_equal(df["price_total"], expected["price_total"])
+
+
+def test_gold_rows_have_the_model_columns():
+    raw = pd.concat(iter_raw(3_000, seed=7, chunk_rows=3_000), ignore_index=True)
+    processed = raw.fillna(raw.median(numeric_only=True)).fillna({"city": "Warszawa"})
+    gold = gold_features(processed)
+    assert set(FEATURE_COLS + [ID_COL, TARGET_COL]) <= set(gold.columns)
+    assert (gold["floor"] <= gold["total_floors"]).all()  # invalid floors are filtered out, as in the view
+    assert 0 < len(gold) <= len(raw)
+
+
+def test_sizes_parse_with_suffixes():
+    assert [parse_rows(t) for t in ("10k", "8m", "50M", "800_000")] == [10_000, 8_000_000, 50_000_000, 800_000]
@@ -0,0 +1,114 @@
+# tests/test_train_scheduler.py
+"""The shared-pool searches of ml/train_scheduler.py: randomized search as RandomizedSearchCV, and halving."""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import Ridge
+from sklearn.model_selection import ParameterGrid, RandomizedSearchCV
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from xgboost import XGBRegressor
+
+from ml import train_scheduler
+from ml.train_scheduler import cpu_budget, halving_search, train_models
+
+
+def _data(n: int = 300):
+    rng = np.random.default_rng(5)
+    X = pd.DataFrame(rng.normal(size=(n, 4)), columns=["a", "b", "c", "d"])
+    y = pd.Series(3 * X["a"] - 2 * X["b"] ** 2 + rng.normal(scale=0.1, size=n))
+    return X, y
+
+
+PIPES = {
+    "rf": Pipeline([("pre", StandardScaler()), ("model", RandomForestRegressor(n_estimators=10, random_state=0))]),
+    "ridge": Pipeline([("pre", StandardScaler()), ("model", Ridge())]),
+}
+GRIDS = {
+    "rf": {"model__max_depth": [2, 4, 8, None], "model__min_samples_leaf": [1, 5, 20]},
+    "ridge": {"model__alpha": [0.01, 0.1, 1.0, 10.0, 100.0]},
+}
+
+
+def test_matches_randomized_search_cv():
+    X, y = _data()
+    results = train_models(PIPES, GRIDS, X, y, n_iter=4, cv=3, random_state=42, n_workers=1)
+    for name, pipe in PIPES.items():
+        search = RandomizedSearchCV(
+            pipe, GRIDS[name], n_iter=4, cv=3, random_state=42, scoring="neg_mean_absolute_error"
+        ).fit(X, y)
+        assert results[name].best_params == search.best_params_
+        assert results[name].best_score == pytest.approx(-search.best_score_, rel=1e-12)
+        np.testing.assert_array_equal(results[name].best_pipe.predict(X), search.best_estimator_.predict(X))
+        assert len(results[name].cv_results) == 4 * 3
+
+
+def test_worker_count_does_not_change_the_result():
+    X, y = _data()
+    one = train_models(PIPES, GRIDS, X, y, n_iter=3, cv=2, n_workers=1)
+    two = train_models(PIPES, GRIDS, X, y, n_iter=3, cv=2, n_workers=2)
+    for name in PIPES:
+        pd.testing.assert_frame_equal(
+            one[name].cv_results.drop(columns="fit_seconds"), two[name].cv_results.drop(columns="fit_seconds")
+        )
+        assert one[name].best_params == two[name].best_params
+        np.testing.assert_array_equal(one[name].best_pipe.predict(X), two[name].best_pipe.predict(X))
+
+
+def test_failed_search_falls_back_to_defaults():
+    X, y = _data(50)
+    with pytest.warns(UserWarning, match="Fit failed"):
+        results = train_models(
+            {"ridge": PIPES["ridge"]}, {"ridge": {"model__alpha": [-1.0]}}, X, y, n_iter=1, n_workers=1
+        )
+    assert results["ridge"].best_params is None
+    assert np.isnan(results["ridge"].best_score)
+    assert results["ridge"].best_pipe.predict(X).shape == (50,)
+
+
+def test_cpu_budget_never_oversubscribes(monkeypatch):
+    monkeypatch.setattr(train_scheduler.os, "cpu_count", lambda: 8)
+    assert cpu_budget() == (8, 1)
+    assert cpu_budget(2) == (2, 4)
+    assert cpu_budget(3) == (3, 2)
+    assert cpu_budget(32) == (8, 1)
+
+
+def test_halving_keeps_the_best_third_on_growing_budgets():
+    X, y = _data(600)
+    grids = {**GRIDS, "ridge": {"model__alpha": list(np.logspace(-3, 5, 12))}}
+    results = halving_search(PIPES, grids, X, y, factor=3, cv=2, min_resources=30, n_workers=1)
+    for name, res in results.items():
+        rounds = res.cv_results.groupby("round")
+        # 12 candidates > 3**2: one extra round at the smallest budget; racing ends at one survivor
+        assert rounds["n_samples"].first().tolist() == [33, 33, 100]
+        assert rounds["candidate"].nunique().tolist() == [12, 4, 2]
+        mean_mae = res.cv_results.groupby(["round", "candidate"])["mae"].mean()
+        for r in (1, 2):
+            kept = set(res.cv_results.loc[res.cv_results["round"] == r, "candidate"])
+            assert kept == set(mean_mae.loc[r - 1].nsmallest(len(kept)).index)
+        best = mean_mae.loc[2].idxmin()
+        assert res.best_params == list(ParameterGrid(grids[name]))[best]
+        assert res.best_score == mean_mae.loc[2, best]
+
+
+def test_halving_finds_a_clear_winner():
+    X, y = _data(600)
+    y = 3 * X["a"] - 2 * X["b"]
+    grid = {"ridge": {"model__alpha": [1e5, 1e4, 1e-3, 1e3]}}
+    results = halving_search({"ridge": PIPES["ridge"]}, grid, X, y, min_resources=30, n_workers=1)
+    assert results["ridge"].best_params == {"model__alpha": 1e-3}
+
+
+def test_xgboost_stops_early_on_the_eval_set():
+    X, y = _data(600)
+    pipe = Pipeline([("pre", StandardScaler()), ("model", XGBRegressor(n_estimators=2_000, learning_rate=0.3))])
+    results = train_models(
+        {"xgb": pipe}, {"xgb": {"model__max_depth": [2, 3]}}, X.iloc[:400], y.iloc[:400],
+        n_iter=2, n_workers=1, eval_set=(X.iloc[400:], y.iloc[400:]),
+    )
+    model = results["xgb"].best_pipe.named_steps["model"]
+    assert model.best_iteration < 1_999
+    assert model.get_params()["early_stopping_rounds"] is None  # plain refits still work
+    results["xgb"].best_pipe.fit(X, y)
@@ -0,0 +1,185 @@
+# tests/test_transform.py
+"""etl/transform.py: streaming and in-memory transforms agree; processed output is a partitioned dataset."""
+import fsspec
+import numpy as np
+import pandas as pd
+import pytest
+
+from etl import transform
+
+
+@pytest.fixture
+def raw_csv(tmp_path):
+    rng = np.random.default_rng(7)
+    n = 2_000
+    df = pd.DataFrame({
+        "listing_id": np.arange(1, n + 1),
+        "date": (pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, n), unit="D")).strftime("%Y-%m-%d"),
+        "city": rng.choice(["Warszawa", "Kraków", "Gdańsk"], n),
+        "rooms": rng.integers(1, 6, n).astype("float64"),
+        "area_sqm": rng.uniform(20, 150, n).round(1),
+        "floor": rng.integers(0, 10, n).astype("float64"),
+        "total_floors": rng.integers(10, 20, n).astype("float64"),
+        "has_elevator": rng.integers(0, 2, n).astype("float64"),
+        "year_built": rng.integers(1950, 2025, n).astype("float64"),
+        "price_total": rng.uniform(300_000, 2_000_000, n).round(2),
+    })
+    for c in ["rooms", "area_sqm", "year_built", "has_elevator"]:
+        df.loc[rng.random(n) < 0.05, c] = np.nan
+    df.loc[[3, 777], "date"] = "not a date"
+    path = tmp_path / "raw.csv"
+    df.to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def local_io(raw_csv, tmp_path, monkeypatch):
+    """Raw reads from `raw_csv` instead of MinIO; written frames are collected in the returned list."""
+    written = []
+
+    def chunks(key, chunksize, usecols=None):
+        with pd.read_csv(raw_csv, chunksize=chunksize, usecols=usecols) as reader:
+            yield from reader
+
+    def write_chunks(frames, key, *args, **kwargs):
+        frames = list(frames)
+        written.append(pd.concat(frames, ignore_index=True))
+        return sum(len(f) for f in frames), key
+
+    monkeypatch.setattr(transform, "read_raw_csv", lambda key: pd.read_csv(raw_csv))
+    monkeypatch.setattr(transform, "read_raw_csv_chunks", chunks)
+    monkeypatch.setattr(transform, "write_processed_parquet", lambda df, key, *a, **k: written.append(df) or key)
+    monkeypatch.setattr(transform, "write_processed_parquet_chunks", write_chunks)
+    monkeypatch.setattr(transform, "IMPUTER_URI", str(tmp_path / "imputer.json"))
+    monkeypatch.setattr(transform, "STORAGE", {})
+    return written
+
+
+@pytest.mark.parametrize("chunksize", [300, 2_000])
+def test_streaming_output_equals_in_memory_output(local_io, chunksize):
+    transform.transform_pipeline("raw.csv", "full")
+    rows, _ = transform.transform_pipeline_streaming("raw.csv", "streamed", chunksize)
+    full, streamed = local_io
+    assert rows == len(full) == 2_000
+    pd.testing.assert_frame_equal(streamed, full.reset_index(drop=True), check_exact=True)
+
+
+def test_streaming_fills_with_medians_of_the_whole_file(raw_csv, local_io):
+    transform.transform_pipeline_streaming("raw.csv", "streamed", 250)
+    (streamed,) = local_io
+    raw = pd.read_csv(raw_csv)
+    for c in ["rooms", "area_sqm", "year_built"]:
+        missing = raw[c].isna()
+        assert missing.any()
+        assert (streamed.loc[missing, c] == raw[c].median()).all()
+    assert streamed["date"].isna().sum() == 2  # unparseable dates stay NaT, their parts NaN
+    assert streamed.loc[streamed["date"].isna(), "year"].isna().all()
+
+
+def test_incremental_run_fills_with_the_saved_values(raw_csv, local_io, monkeypatch):
+    transform.transform_pipeline("raw.csv", "full")
+    delta = pd.read_csv(raw_csv).head(20).assign(rooms=np.nan)
+    monkeypatch.setattr(transform, "read_raw_csv", lambda key: delta.copy())
+    monkeypatch.setattr(transform, "write_processed_partitions", lambda df, dataset, run_tag: dataset)
+    out, _ = transform.transform_pipeline_incremental("delta.csv", "housing", "run1")
+    assert (out["rooms"] == pd.read_csv(raw_csv)["rooms"].median()).all()
+
+
+def test_delta_dedup_is_opt_in_and_kept_across_runs(raw_csv, local_io, tmp_path, monkeypatch):
+    monkeypatch.setattr(transform, "DEDUP_INDEX_URI", str(tmp_path / "dedup_index.parquet"))
+    monkeypatch.setattr(transform, "write_processed_partitions", lambda df, dataset, run_tag: dataset)
+    first = pd.read_csv(raw_csv).head(50)
+    resent = pd.concat([
+        first.head(10),                                                       # sent again
+        first.iloc[10:15].assign(listing_id=lambda d: d["listing_id"] + 10_000),  # same flats, new ids
+    ], ignore_index=True)
+
+    assert len(transform.transform_delta(first.copy(), "housing", "run1", dedup=True)[0]) == 50
+    assert transform.transform_delta(resent.copy(), "housing", "run2", dedup=True)[0].empty
+    assert len(transform.transform_delta(resent.copy(), "housing", "run3")[0]) == 15
+    # a retry of run1 is not checked against its own first attempt
+    assert len(transform.transform_delta(first.copy(), "housing", "run1", dedup=True)[0]) == 50
+
+
+@pytest.mark.parametrize("nat", [False, True])
+def test_dates_and_their_parts_match_pandas(raw_csv, nat):
+    raw = pd.read_csv(raw_csv, usecols=["date"])
+    if not nat:
+        raw = raw[raw["date"] != "not a date"]
+    raw.loc[raw.index[:5], "date"] = "2024-02-29"
+    expected = pd.to_datetime(raw["date"], errors="coerce")
+    dates = transform.parse_dates(raw.copy())["date"]
+    pd.testing.assert_series_equal(dates, expected)
+    dt = expected.dt
+    pd.testing.assert_frame_equal(
+        transform.date_parts(dates),
+        pd.DataFrame({"year": dt.year, "month": dt.month, "day": dt.day, "dow": dt.dayofweek}),
+    )
+
+
+@pytest.mark.parametrize("dates", [True, False])
+def test_parallel_transform_equals_the_serial_one(raw_csv, monkeypatch, dates):
+    monkeypatch.setattr(transform, "MIN_PARALLEL_ROWS", 500)  # 2 000 rows -> 3 row ranges
+    raw = pd.read_csv(raw_csv)
+    if not dates:
+        raw = raw.drop(columns="date")
+    raw.index += 10  # the original index survives the round trip
+    serial = transform.transform_frame(raw.copy())
+    parallel = transform.transform_frame_parallel(raw.copy(), workers=3)
+    pd.testing.assert_frame_equal(parallel, serial, check_exact=True)
+
+
+@pytest.fixture
+def local_bucket(tmp_path, monkeypatch):
+    """Processed datasets go to a local directory instead of MinIO."""
+    local = fsspec.filesystem("file")
+    monkeypatch.setattr(transform.fsspec, "filesystem", lambda *a, **k: local)
+    monkeypatch.setattr(transform, "PROC_BUCKET", str(tmp_path / "processed"))
+    return tmp_path / "processed"
+
+
+def _processed(n: int = 1_000) -> pd.DataFrame:
+    rng = np.random.default_rng(3)
+    dates = pd.Timestamp("2024-11-01") + pd.to_timedelta(rng.integers(0, 90, n), unit="D")
+    return pd.DataFrame({
+        "listing_id": np.arange(n, dtype="int64"),
+        "date": dates,
+        "city": rng.choice(["Warszawa", "Kraków", "Gdańsk"], n),
+        "price_total": rng.uniform(300_000, 2_000_000, n).round(2),
+        "year": dates.year.astype("float64"),
+        "month": dates.month.astype("float64"),
+        "day": dates.day.astype("float64"),
+    })
+
+
+def test_processed_dataset_is_partitioned_and_filtered_on_read(local_bucket):
+    df = _processed()
+    transform.write_processed_parquet(df, "housing")
+    dirs = sorted(p.relative_to(local_bucket / "housing").as_posix()
+                  for p in (local_bucket / "housing").glob("year=*/month=*"))
+    assert dirs == ["year=2024/month=11", "year=2024/month=12", "year=2025/month=1"]
+
+    out = transform.read_processed(
+        "housing", columns=["listing_id", "city"], filters=[("year", "==", 2024), ("city", "==", "Kraków")]
+    )
+    expected = df.loc[(df["year"] == 2024) & (df["city"] == "Kraków"), "listing_id"]
+    assert list(out.columns) == ["listing_id", "city"]
+    assert sorted(out["listing_id"]) == sorted(expected)
+
+    transform.write_processed_parquet(df.head(10), "housing", partition_by=["city"])
+    parts = list((local_bucket / "housing").iterdir())  # the earlier year/month dataset is replaced
+    assert len(parts) == df.head(10)["city"].nunique()
+    assert all(p.name.startswith("city=") for p in parts)
+    assert len(transform.read_processed("housing", filters=[("city", "==", "Gdańsk")])) == (
+        df.head(10)["city"] == "Gdańsk"
+    ).sum()
+
+
+def test_day_partitions_keep_other_runs(local_bucket):
+    df = _processed(50)
+    transform.write_processed_partitions(df, "housing", "run1")
+    transform.write_processed_partitions(df.head(5), "housing", "run2")
+    transform.write_processed_partitions(df.assign(price_total=1.0), "housing", "run1")  # rerun overwrites
+    out = transform.read_processed("housing")
+    assert len(out) == 55
+    assert (out["price_total"] == 1.0).sum() == 50
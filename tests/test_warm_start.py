@@ -0,0 +1,166 @@
+# tests/test_warm_start.py
+"""ml_final.warm_start: every model family gets more trees or rounds, and they count in predict;
+train_incremental: watermark and drift holdout."""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.dummy import DummyRegressor
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import Pipeline
+from xgboost import DMatrix, XGBRegressor
+
+from ml import ml_final
+from ml.data_loader import FEATURE_COLS, ID_COL, TARGET_COL, holdout_sql, select_sql
+from ml.ml_final import build_preprocessor, warm_start
+
+
+def _target(df):
+    return df["area_sqm"].fillna(60) * 12_000 - df["distance_center_km"] * 3_000
+
+
+@pytest.fixture(scope="module")
+def data(listings):
+    train, new, check = listings(1_500, seed=4), listings(600, seed=5), listings(300, seed=6)
+    new = new.assign(area_sqm=new["area_sqm"] * 1.3)  # the new rows moved: the old model is off
+    return train, new, check
+
+
+def _fit(model, train):
+    return Pipeline([("pre", build_preprocessor(train)[0]), ("model", model)]).fit(train, _target(train))
+
+
+def test_xgboost_continues_after_the_best_iteration(data):
+    train, new, check = data
+    pre = build_preprocessor(train)[0].fit(train)
+    model = XGBRegressor(n_estimators=300, learning_rate=0.3, max_depth=4, early_stopping_rounds=5, random_state=0)
+    model.fit(pre.transform(train), _target(train), eval_set=[(pre.transform(check), _target(check))], verbose=False)
+    pipe = Pipeline([("pre", pre), ("model", model)])
+    best = model.best_iteration
+    assert best + 1 < model.get_booster().num_boosted_rounds()  # stopped early: later rounds exist
+
+    updated = warm_start(pipe, new, _target(new))
+    booster = updated.named_steps["model"].get_booster()
+    assert booster.num_boosted_rounds() == best + 1 + ml_final.WARM_ROUNDS
+    assert "best_iteration" not in booster.attributes()
+    # predict uses the new rounds, not the old best iteration
+    Xt = pre.transform(check)
+    np.testing.assert_allclose(updated.predict(check), booster.predict(DMatrix(Xt)), rtol=1e-6)
+    assert not np.allclose(updated.predict(check), pipe.predict(check))
+    assert pipe.named_steps["model"].get_booster().num_boosted_rounds() > best + 1  # the saved model is untouched
+
+
+@pytest.mark.parametrize("model", [
+    RandomForestRegressor(n_estimators=10, max_depth=6, random_state=0),
+    GradientBoostingRegressor(n_estimators=20, max_depth=3, random_state=0),
+], ids=["RandomForest", "GradientBoosting"])
+def test_warm_start_adds_trees(data, model):
+    train, new, check = data
+    pipe = _fit(model, train)
+    n = len(pipe.named_steps["model"].estimators_)
+
+    updated = warm_start(pipe, new, _target(new))
+    assert len(updated.named_steps["model"].estimators_) == n + ml_final.WARM_TREES
+    assert len(pipe.named_steps["model"].estimators_) == n
+    assert not np.allclose(updated.predict(check), pipe.predict(check))
+
+
+# ---------------------------------------------------------------------
+# train_incremental against Postgres (skipped without $TEST_PG_URL)
+# ---------------------------------------------------------------------
+def _gold_rows(ids: np.ndarray, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n = len(ids)
+    df = pd.DataFrame({c: rng.integers(1, 5, n).astype("float64") for c in FEATURE_COLS})
+    for c in ["season", "city", "district", "postal_code", "area_sqm_bucket", "distance_km_bucket"]:
+        df[c] = rng.choice(["a", "b", "c"], n)
+    df["area_sqm"] = rng.uniform(20, 150, n).round(1)
+    df.insert(0, ID_COL, ids)
+    df[TARGET_COL] = df["area_sqm"] * 10_000 + df["rooms"] * 50_000
+    return df
+
+
+@pytest.fixture
+def warehouse(pg_engine, tmp_path, monkeypatch):
+    """gold.housing_valid with 3,000 listings, a full run recorded; artifacts in a temporary directory."""
+    from ml import feature_cache
+    from ml import model_lookup
+
+    monkeypatch.setattr(ml_final, "PG_URL", pg_engine.url.render_as_string(hide_password=False))
+    monkeypatch.setattr(ml_final, "ML_MODELS", ["XGBRegressor"])
+    monkeypatch.setattr(ml_final, "MIN_NEW_ROWS", 100)
+    monkeypatch.setattr(feature_cache, "CACHE_DIR", tmp_path / "feature_cache")
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "artifacts").mkdir()
+    model_lookup.best_model_path.cache_clear()
+
+    with pg_engine.begin() as conn:
+        conn.exec_driver_sql("CREATE SCHEMA gold")
+    _gold_rows(np.arange(1, 3_001), seed=1).to_sql("housing_valid", pg_engine, schema="gold", index=False)
+    _, _, source, _ = ml_final.train_and_evaluate("full")
+    yield source
+    model_lookup.best_model_path.cache_clear()
+
+
+def _runs(engine) -> pd.DataFrame:
+    return pd.read_sql("SELECT * FROM ml.model_runs ORDER BY scored_at", engine)
+
+
+def _add_rows(engine, first: int, n: int) -> None:
+    _gold_rows(np.arange(first, first + n), seed=first).to_sql(
+        "housing_valid", engine, schema="gold", index=False, if_exists="append"
+    )
+
+
+def _fitted(model, engine) -> Pipeline:
+    df = pd.read_sql("SELECT * FROM gold.housing_valid", engine)
+    X, y = df.drop(columns=[ID_COL, TARGET_COL]), df[TARGET_COL]
+    return Pipeline([("pre", build_preprocessor(X)[0]), ("model", model)]).fit(X, y)
+
+
+def test_full_run_marks_the_source_max_id(warehouse, pg_engine):
+    run = _runs(pg_engine).iloc[-1]
+    assert warehouse[ID_COL].max() < 3_000  # the 5% sample misses the newest listing
+    assert (run["train_mode"], run["max_listing_id"]) == ("full", 3_000)
+    assert run["mae_threshold"] == pytest.approx(run["base_mae"] * (1 + ml_final.MAE_DRIFT))
+
+
+def test_losing_warm_model_keeps_model_and_watermark(warehouse, pg_engine, monkeypatch):
+    _add_rows(pg_engine, 3_001, 500)
+    saved = ml_final.best_model_path().read_bytes()
+    monkeypatch.setattr(ml_final, "warm_start", lambda pipe, X, y: _fitted(DummyRegressor(), pg_engine))
+
+    path, pipe, _, _ = ml_final.train_incremental()
+    assert path.read_bytes() == saved
+    assert len(_runs(pg_engine)) == 1  # nothing trained on the new rows: the watermark stays at 3,000
+
+
+def test_better_warm_model_is_saved_and_advances_the_watermark(warehouse, pg_engine, monkeypatch):
+    _add_rows(pg_engine, 3_001, 500)
+    monkeypatch.setattr(ml_final, "warm_start", lambda pipe, X, y: _fitted(LinearRegression(), pg_engine))
+
+    path, pipe, _, _ = ml_final.train_incremental()
+    assert isinstance(pipe.named_steps["model"], LinearRegression)
+    runs = _runs(pg_engine)
+    trained = pd.read_sql(select_sql([ID_COL], exclude_frac=ml_final.DRIFT_HOLDOUT_FRAC, after_id=3_000), pg_engine)
+    holdout = pd.read_sql(holdout_sql([ID_COL], ml_final.DRIFT_HOLDOUT_FRAC), pg_engine)
+    assert list(runs["train_mode"]) == ["full", "incremental"]
+    assert runs["max_listing_id"].iloc[-1] == trained[ID_COL].max()
+    assert runs["valid_rows"].iloc[-1] == len(holdout)  # drift checked on the whole holdout
+
+
+def test_drift_above_the_threshold_asks_for_a_full_search(warehouse, pg_engine):
+    _add_rows(pg_engine, 3_001, 500)
+    with pg_engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE ml.model_runs SET mae_threshold = 1")
+    assert ml_final.train_incremental() is None
+
+
+def test_few_new_rows_keep_the_model_and_many_warm_runs_force_a_full_search(warehouse, pg_engine, monkeypatch):
+    _add_rows(pg_engine, 3_001, 50)
+    saved = ml_final.best_model_path().read_bytes()
+    path, _, _, _ = ml_final.train_incremental()
+    assert path.read_bytes() == saved and len(_runs(pg_engine)) == 1
+
+    monkeypatch.setattr(ml_final, "MAX_WARM_RUNS", 0)
+    assert ml_final.train_incremental() is None
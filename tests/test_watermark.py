@@ -0,0 +1,119 @@
+# tests/test_watermark.py
+"""Delta selection of etl/watermark.py: new rows past the mark, changed rows before it, undated rows."""
+import pandas as pd
+
+from etl.copy_loader import copy_frames, upsert_frames
+from etl.watermark import (
+    ROW_HASH_DDL, WATERMARK_DDL, DeltaStats, advance_watermark_sql, filter_new_rows, has_row_hashes,
+    promote_row_hashes_sql, read_row_hashes, read_watermark, reset_row_hashes_sql, stage_row_hashes,
+)
+
+
+def _raw():
+    return pd.DataFrame({
+        "listing_id": [1, 2, 3, 4, 5],
+        "date": ["2024-01-01", "2024-01-02", "2024-01-02", "not a date", "2024-01-03"],
+        "price_total": [100.0, 200.0, 300.0, 400.0, 500.0],
+    })
+
+
+def _known(hashes: pd.DataFrame) -> pd.Series:
+    return hashes.set_index("listing_id")["row_hash"].sort_index()
+
+
+def test_first_run_takes_every_row():
+    stats = DeltaStats()
+    rows, hashes = filter_new_rows(_raw(), None, stats=stats)
+    assert rows["listing_id"].tolist() == [1, 2, 3, 4, 5]
+    assert hashes["listing_id"].tolist() == [1, 2, 3, 4, 5]
+    assert (stats.new, stats.undated, stats.undated_kept) == (5, 1, 1)
+
+
+def test_changed_and_undated_rows_before_the_mark():
+    _, hashes = filter_new_rows(_raw(), None)
+    known = _known(hashes)
+    wm = (pd.Timestamp("2024-01-02"), 2)
+
+    df = _raw()
+    stats = DeltaStats()
+    rows, _ = filter_new_rows(df, wm, known, stats)
+    assert rows["listing_id"].tolist() == [3, 5]  # unchanged rows before the mark stay out
+    assert (stats.changed, stats.undated, stats.undated_kept) == (0, 1, 0)
+
+    df.loc[df["listing_id"].isin([1, 4]), "price_total"] += 1
+    stats = DeltaStats()
+    rows, recorded = filter_new_rows(df, wm, known, stats)
+    assert rows["listing_id"].tolist() == [1, 3, 4, 5]
+    assert (stats.new, stats.changed, stats.undated_kept) == (2, 2, 1)
+    assert recorded["listing_id"].tolist() == [1, 3, 4, 5]
+
+
+def test_first_run_after_a_full_load_takes_rows_as_loaded():
+    wm = (pd.Timestamp("2024-01-02"), 2)
+    rows, recorded = filter_new_rows(_raw(), wm, known=None)
+    assert rows["listing_id"].tolist() == [3, 5]
+    assert recorded["listing_id"].tolist() == [1, 2, 3, 4, 5]
+
+
+def test_unknown_ids_are_kept_once_hashes_are_stored():
+    known = pd.Series([11, 22], index=pd.Index([1, 2], name="listing_id"))
+    wm = (pd.Timestamp("2025-01-02"), 2)
+    df = pd.DataFrame({
+        "listing_id": [3, 4],
+        "date": ["2024-12-01", "garbage"],  # late and undated
+        "price_total": [300.0, 400.0],
+    })
+    stats = DeltaStats()
+    rows, recorded = filter_new_rows(df, wm, known, stats)
+    assert rows["listing_id"].tolist() == [3, 4]
+    assert recorded["listing_id"].tolist() == [3, 4]
+    assert (stats.new, stats.undated_kept) == (2, 1)
+
+
+def _load_delta(engine, rows: pd.DataFrame, run_tag: str) -> None:
+    rows = rows.assign(date=pd.to_datetime(rows["date"], errors="coerce"))
+    upsert_frames(
+        [rows], engine, "housing", key="listing_id", order_by="date",
+        post_sql=[WATERMARK_DDL, advance_watermark_sql("{staging}"), ROW_HASH_DDL, promote_row_hashes_sql(run_tag)],
+    )
+
+
+def test_delta_load_commits_watermark_and_row_hashes(pg_engine):
+    run_tag = "housing_2024'01"  # bound as a parameter, not spliced into the SQL
+    rows, hashes = filter_new_rows(_raw(), None)
+    stage_row_hashes(pg_engine, hashes, run_tag)
+    assert read_watermark(pg_engine) is None
+    _load_delta(pg_engine, rows, run_tag)
+
+    assert read_watermark(pg_engine) == (pd.Timestamp("2024-01-03"), 5)
+    stored = read_row_hashes(pg_engine, [5, 1, 99, 1])
+    assert stored.index.tolist() == [1, 5]
+    assert stored.tolist() == _known(hashes).loc[[1, 5]].tolist()
+
+    # the next delta only takes the changed row, its hash replaces the stored one
+    df = _raw()
+    df.loc[df["listing_id"] == 2, "price_total"] += 1
+    rows, hashes = filter_new_rows(df, read_watermark(pg_engine), read_row_hashes(pg_engine, df["listing_id"]))
+    assert rows["listing_id"].tolist() == [2]
+    stage_row_hashes(pg_engine, hashes, "next")
+    _load_delta(pg_engine, rows, "next")
+    assert read_row_hashes(pg_engine, [2]).tolist() == hashes["row_hash"].tolist()
+    assert read_watermark(pg_engine) == (pd.Timestamp("2024-01-03"), 5)  # only moves forward
+
+
+def test_full_reload_resets_watermark_and_row_hashes(pg_engine):
+    rows, hashes = filter_new_rows(_raw(), None)
+    stage_row_hashes(pg_engine, hashes, "delta")
+    _load_delta(pg_engine, rows, "delta")
+    assert has_row_hashes(pg_engine)
+
+    older = rows[rows["listing_id"] <= 2].assign(date=lambda d: pd.to_datetime(d["date"]))
+    copy_frames(
+        [older], pg_engine, "housing",
+        post_sql=[
+            WATERMARK_DDL, advance_watermark_sql("public.housing", only_forward=False),
+            ROW_HASH_DDL, reset_row_hashes_sql(),
+        ],
+    )
+    assert read_watermark(pg_engine) == (pd.Timestamp("2024-01-02"), 2)
+    assert not has_row_hashes(pg_engine)